@@ -0,0 +1,2 @@
+# the library version, which is part of the result cache keys so that cached speed maps are not reused across versions
+__version__ = '0.1.0'
@@ -1,36 +1,267 @@
+import argparse
+import os
 import sys
+from speedmap import batch_runner
+from speedmap.batch_ingest import OUTPUT_EXTENSIONS, PartitionError, write_speed_maps
 from speedmap.bus_on_route import BusOnRoute
+from speedmap.cleaning import DUPLICATE_POLICIES, REGRESSION_POLICIES, PingCleaner
+from speedmap.metrics import NULL_METRICS, PhaseMetrics
+from speedmap.result_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE, KEY_MODES, ResultCache
+from speedmap.segment_writers import FORMATS, get_segment_writer
+from speedmap.streaming_bus_on_route import StreamingBusOnRoute
+from speedmap.trip_splitter import DEFAULT_MAX_GAP, TripSplitter
 
 
-def main():
+def get_argument_parser() -> argparse.ArgumentParser:
     """
-    Runs the speedmap module when executed from the command line interface and prints a collection of speed map segment
-    objects as json to console
+    Gets the parser of the speedmap command line arguments
+
+    Returns:
+        argparse.ArgumentParser: the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m speedmap", description="Compute the speed map of a bus on a route from a ping file",
+        epilog="run 'python -m speedmap batch --help' for the resumable batch runner over a manifest of ping files")
+    parser.add_argument(
+        "file_path",
+        help="the location of the ping file, or with --output-dir a directory or glob pattern of ping files")
+    parser.add_argument("segment_length", help="the length of a speed map segment, in meters")
+    parser.add_argument(
+        "--format", choices=FORMATS, default="jsonl", dest="output_format",
+        help="the output format of the speed map segments (default: jsonl)")
+    parser.add_argument("--output", help="the location of the output file (default: standard output)")
+    parser.add_argument(
+        "--workers", type=int,
+        help="mesh the stops in this many worker processes, for routes with many stops (default: 1)")
+    parser.add_argument(
+        "--memory-budget", type=float,
+        help="sort the pings out of core within this memory budget, in MiB, and stream the segments as each stop is "
+             "completed, for ping files larger than memory")
+    parser.add_argument(
+        "--merge-tolerance", type=float,
+        help="merge runs of speed graph edges whose speeds are within this relative tolerance before meshing, e.g. "
+             "0.01, which speeds up dense feeds and keeps each unrounded segment speed within this relative error. "
+             "0 merges only equal speeds. Not used with --memory-budget (default: no merging)")
+    parser.add_argument(
+        "--output-dir",
+        help="process every ping file of the file path in a process pool and write one speed map file per partition "
+             "to this directory")
+    parser.add_argument(
+        "--partition-pattern",
+        help="with --output-dir, a regular expression whose groups in each file path are the partition key, e.g. "
+             "'(bus_[0-9]+)/' (default: the file name)")
+    parser.add_argument(
+        "--partition-field",
+        help="with --output-dir, partition the pings by this json field of each line instead, e.g. busId")
+    parser.add_argument(
+        "--processes", type=int,
+        help="with --output-dir, the number of worker processes (default: the number of CPUs)")
+    parser.add_argument(
+        "--split-trips", metavar="DIRECTORY",
+        help="split a continuous feed of several trips of the route at stop_id sequence resets and time gaps, and "
+             "write the speed map of each trip to trip_<n> files in this directory as soon as the trip is complete")
+    parser.add_argument(
+        "--max-gap", type=float, default=DEFAULT_MAX_GAP / 1000,
+        help="with --split-trips, start a new trip after this many seconds without pings (default: 1800)")
+    parser.add_argument(
+        "--clean", action="store_true",
+        help="quarantine malformed lines instead of stopping, and clean duplicate timestamps and distance regressions "
+             "before the speed graph is built. With --output-dir, a failed partition does not stop the others")
+    parser.add_argument(
+        "--quarantine",
+        help="with --clean, write the malformed lines to this json lines file (with --output-dir, a quarantine file is "
+             "written next to each speed map file)")
+    parser.add_argument(
+        "--duplicates", choices=DUPLICATE_POLICIES, default='drop',
+        help="with --clean, drop pings sharing the timestamp of the previous ping, or average them (default: drop)")
+    parser.add_argument(
+        "--regressions", choices=REGRESSION_POLICIES, default='clamp',
+        help="with --clean, clamp pings behind the previous ping of their stop to its distance, or drop them "
+             "(default: clamp)")
+    parser.add_argument(
+        "--cache", action=argparse.BooleanOptionalAction, default=False,
+        help="reuse the speed map of a previous run over the same file and segment length from an on-disk cache, "
+             "skipping parsing and meshing. Not used with --clean, whose quarantine file and counters need the pings "
+             "to be read, nor with --memory-budget, whose segments are streamed rather than held (default: off)")
+    parser.add_argument(
+        "--cache-dir", default=DEFAULT_CACHE_DIR, help="the location of the cache (default: ~/.cache/speedmap)")
+    parser.add_argument(
+        "--cache-size", type=float, default=DEFAULT_MAX_SIZE / (1 << 20),
+        help="the size limit of the cache in MiB, over which the least recently used speed maps are evicted "
+             "(default: 1024)")
+    parser.add_argument(
+        "--cache-key", choices=KEY_MODES, default='stat',
+        help="identify the input file by its path, size and modification time, or by a hash of its content "
+             "(default: stat)")
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="print the wall time and item count of each phase to standard error")
+    parser.add_argument(
+        "--profile-memory", action="store_true",
+        help="also trace the peak memory of each phase, which slows down the run")
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs the speedmap module when executed from the command line interface and writes the speed map segments to
+    the console or an output file, as json lines, CSV or fixed-width binary records. The `batch` subcommand runs
+    `speedmap.batch_runner` instead
+
+    Args:
+        argv (List[str]): the command line arguments, defaults to sys.argv
 
     Raises:
         FileNotFoundError: raised if input file path is not a valid input file
         ValueError: raised if segment_length cannot be parsed to a value
     """
-    # validate arguments count
-    if len(sys.argv)-1 != 2:
-        raise SystemError("2 input arguments are expected, but " + str(len(sys.argv)-1) + " were given")
+
+    # run a batch over a manifest of ping files
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['batch']:
+        batch_runner.main(argv[1:])
+        return
 
     # retrieve the command line arguments
-    file_path = sys.argv[1]
+    args = get_argument_parser().parse_args(argv)
     try:
-        segment_length = float(sys.argv[2])
+        segment_length = float(args.segment_length)
     except ValueError:
         raise ValueError("Segment length must be numeric")
 
-    # instantiate a BusOnRoute object from file
-    bus_on_route = BusOnRoute.from_file(file_path)
+    if args.output_dir is not None:
+
+        # write a speed map file per partition of the ping files, reporting the failed partitions
+        try:
+            write_speed_maps(
+                [args.file_path], args.output_dir, segment_length, output_format=args.output_format,
+                partition_pattern=args.partition_pattern, partition_field=args.partition_field,
+                processes=args.processes, clean=args.clean)
+        except PartitionError as error:
+            for key, message in error.errors.items():
+                sys.stderr.write("partition " + key + " failed: " + message + "\n")
+            raise SystemExit(1)
+        return
+
+    metrics = PhaseMetrics(trace_memory=args.profile_memory) if args.profile or args.profile_memory \
+        else NULL_METRICS
+
+    cleaner = PingCleaner(args.duplicates, args.regressions, args.quarantine) if args.clean else None
+    cache_options = {'merge_tolerance': args.merge_tolerance} if args.merge_tolerance is not None else {}
+
+    if args.split_trips is not None:
+
+        # write the speed map of each trip as soon as the trip is complete, holding a single trip in memory
+        try:
+            write_trip_speed_maps(
+                args.file_path, args.split_trips, segment_length, args.output_format, int(args.max_gap * 1000),
+                cleaner)
+        finally:
+            if cleaner is not None:
+                cleaner.close()
+        if cleaner is not None:
+            write_cleaning_counters(cleaner)
+        return
+
+    # look the speed map up in the cache before reading the file. The cleaner has to see the pings to quarantine and
+    # count them, and a streamed speed map would have to be held in memory to be stored, so neither is cached
+    cache, cache_key, segments = None, None, None
+    if args.cache and (cleaner is not None or args.memory_budget is not None):
+        sys.stderr.write("cache: not used with --clean or --memory-budget\n")
+    elif args.cache:
+        cache = ResultCache(args.cache_dir, int(args.cache_size * (1 << 20)), args.cache_key)
+        with metrics.phase('cache') as phase:
+            cache_key = cache.get_key(args.file_path, segment_length, cache_options)
+            segments = cache.get(cache_key)
+            phase.items = len(segments) if segments is not None else 0
+
+    if segments is None:
+        if args.memory_budget is not None:
+
+            # stream the segments from an external sort of the file, they are computed while they are written
+            streaming_bus_on_route = StreamingBusOnRoute(segment_length)
+            segments = streaming_bus_on_route.iter_speed_map_from_file(
+                args.file_path, memory_budget=int(args.memory_budget * (1 << 20)), cleaner=cleaner)
+
+        else:
+
+            # instantiate a BusOnRoute object from file
+            bus_on_route = BusOnRoute.from_file(args.file_path, metrics=metrics, cleaner=cleaner)
+
+            # compute the speed map segments for the bus route
+            segments = bus_on_route.get_speed_map(
+                segment_length, workers=args.workers, merge_tolerance=args.merge_tolerance)
+
+        # store the computed speed map in the cache
+        if cache is not None:
+            cache.put(cache_key, segments)
+
+    # write the segments in buffered batches
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        with metrics.phase('write') as phase:
+            with get_segment_writer(args.output_format, output) as writer:
+                writer.write_all(segments)
+            phase.items = writer.count
+    finally:
+        if args.output:
+            output.close()
+        if cleaner is not None:
+            cleaner.close()
+        metrics.close()
+
+    # print the cleaning counters
+    if cleaner is not None:
+        write_cleaning_counters(cleaner)
+
+    # print the phase breakdown
+    if metrics.enabled:
+        sys.stderr.write(metrics.format_report() + "\n")
+
+
+def write_cleaning_counters(cleaner: PingCleaner):
+    """
+    Prints the counts of the records changed by a PingCleaner to standard error
+
+    Args:
+        cleaner (PingCleaner): the cleaner
+    """
+    sys.stderr.write("cleaning: " + ", ".join(
+        name + "=" + str(count) for name, count in cleaner.counters.to_dict().items()) + "\n")
+
+
+def write_trip_speed_maps(
+        file_path: str,
+        output_dir: str,
+        segment_length: float,
+        output_format: str = 'jsonl',
+        max_gap: int = DEFAULT_MAX_GAP,
+        cleaner=None) -> int:
+    """
+    Splits a continuous ping feed into trips and writes the speed map of each trip to its own file, named trip_<n>
+    with the trips numbered from 1 in feed order
+
+    Args:
+        file_path (str): the location of the ping feed file
+        output_dir (str): the directory of the speed map files, created when missing
+        segment_length (float): a user defined length for a speed map segment, in meters
+        output_format (str): the output format, one of `speedmap.segment_writers.FORMATS`
+        max_gap (int): the longest time between two pings of the same trip, in milliseconds
+        cleaner (PingCleaner): when given, the pings are cleaned as they stream, see `speedmap.cleaning.PingCleaner`
+
+    Returns:
+        int: the number of trips written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    trip_splitter = TripSplitter(max_gap)
 
-    # compute the speed map segments for the bus route
-    segments = bus_on_route.get_speed_map(segment_length)
+    for trip in trip_splitter.iter_trips_from_file(file_path, cleaner):
+        output_path = os.path.join(
+            output_dir, "trip_" + str(trip_splitter.trips_count) + OUTPUT_EXTENSIONS[output_format])
+        with open(output_path, "wb") as output, get_segment_writer(output_format, output) as writer:
+            writer.write_all(trip.get_speed_map(segment_length))
 
-    # enumerate over each segment and print the output as a json
-    for segment in segments:
-        print(segment.__dict__)
+    return trip_splitter.trips_count
 
 
 if __name__ == "__main__":
@@ -0,0 +1,345 @@
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from json import loads
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.cleaning import PingCleaner
+from speedmap.compressed_input import iter_lines, strip_compression_extension
+from speedmap.mesh import ENGINES, validate_segment_length
+from speedmap.ping import Ping
+from speedmap.ping_array import PingArray, PingFormatError
+from speedmap.segment_writers import FORMATS, get_segment_writer
+
+# the file extension of the speed map output of each format
+OUTPUT_EXTENSIONS = {'jsonl': '.jsonl', 'csv': '.csv', 'binary': '.spms'}
+
+# the characters of a partition key which are replaced in output file names
+_UNSAFE_FILE_NAME_CHARACTERS = re.compile(r'[^A-Za-z0-9._=-]+')
+
+# the extension of the quarantine file of each partition, next to its speed map file
+QUARANTINE_EXTENSION = '.quarantine.jsonl'
+
+# the name of the quarantine file of the lines without a partition key, when partitioning by field
+UNPARTITIONED_QUARANTINE_NAME = '_unpartitioned' + QUARANTINE_EXTENSION
+
+
+class PartitionError(Exception):
+    """
+    Raised after a cleaned batch when some partitions failed, once every other partition has been written
+
+    Attributes:
+        errors (Dict[str, str]): the error of each failed partition, by partition key
+        output_paths (Dict[str, str]): the locations of the speed map files of the partitions which were written
+    """
+
+    def __init__(self, errors: Dict[str, str], output_paths: Dict[str, str]):
+        super().__init__(str(len(errors)) + " partitions failed: " + ", ".join(errors))
+        self.errors = errors
+        self.output_paths = output_paths
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """
+    Expands files, directories and glob patterns into the list of ping files they designate
+
+    Args:
+        paths (Iterable[str]): file paths, directories, whose files are found recursively, or glob patterns, where
+            ** matches any number of directories
+
+    Returns:
+        List[str]: the ping file paths, sorted and without duplicates
+
+    Raises:
+        FileNotFoundError: raised when a path is neither a file, a directory nor a glob pattern matching a file
+    """
+    file_paths = set()
+    for path in paths:
+        path = str(path)
+        if os.path.isfile(path):
+            file_paths.add(path)
+        elif os.path.isdir(path):
+            for directory, _, file_names in os.walk(path):
+                file_paths.update(os.path.join(directory, file_name) for file_name in file_names)
+        else:
+            matches = [match for match in glob.glob(path, recursive=True) if os.path.isfile(match)]
+            if not matches:
+                raise FileNotFoundError("No ping files found at " + path)
+            file_paths.update(matches)
+    return sorted(file_paths)
+
+
+def get_path_partition(file_path: str, partition_pattern: Optional[str] = None) -> str:
+    """
+    Gets the partition key of a ping file from its path
+
+    Args:
+        file_path (str): the location of the ping file
+        partition_pattern (Optional[str]): a regular expression searched in the path, with forward slashes as
+            separators. The key is the groups of the match joined by '/', or the whole match when it has no groups.
+            Defaults to the file name without its extensions, e.g. bus_1 for bus_1.jsonl.gz
+
+    Returns:
+        str: the partition key
+
+    Raises:
+        ValueError: raised when the pattern does not match the path
+    """
+    if partition_pattern is None:
+        return os.path.splitext(os.path.basename(strip_compression_extension(file_path)))[0]
+
+    match = re.search(partition_pattern, file_path.replace(os.sep, '/'))
+    if match is None:
+        raise ValueError("Partition pattern does not match " + file_path)
+    groups = match.groups()
+    return '/'.join(str(group) for group in groups) if groups else match.group(0)
+
+
+def get_output_path(output_dir: str, key: str, output_format: str) -> str:
+    """
+    Gets the location of the speed map file of a partition
+
+    Args:
+        output_dir (str): the directory of the speed map files
+        key (str): the partition key, whose characters other than letters, digits and ._=- are replaced by '_'
+        output_format (str): the output format of the speed map segments, 'jsonl', 'csv' or 'binary'
+
+    Returns:
+        str: the location of the speed map file
+    """
+    return os.path.join(output_dir, _UNSAFE_FILE_NAME_CHARACTERS.sub('_', key) + OUTPUT_EXTENSIONS[output_format])
+
+
+def ingest_files(
+        paths: Iterable[str],
+        partition_pattern: Optional[str] = None,
+        partition_field: Optional[str] = None,
+        processes: Optional[int] = None) -> Dict[str, BusOnRoute]:
+    """
+    Parses ping files in a process pool and groups their pings into a BusOnRoute per partition, e.g. per bus
+
+    The partition of a ping is either taken from the path of its file, see `get_path_partition`, or from a json
+    field of the ping line, such as a bus identifier, when partition_field is given. The pings of a partition are
+    joined in file order and sorted by timestamp.
+
+    Args:
+        paths (Iterable[str]): files, directories or glob patterns, see `expand_paths`
+        partition_pattern (Optional[str]): the regular expression of the partition key in the file paths
+        partition_field (Optional[str]): the json field of the partition key of each ping, used instead of the path
+        processes (Optional[int]): the number of worker processes, defaults to the number of CPUs. When 1, the files
+            are parsed in the current process
+
+    Returns:
+        Dict[str, BusOnRoute]: a dictionary where the keys are the partition keys, in sorted order, and the values
+            are the BusOnRoute of each partition
+
+    Raises:
+        FileNotFoundError: raised when a path designates no ping file
+        ValueError: raised when the partition pattern does not match a path or the number of processes is invalid
+        PingFormatError: raised when a line of a ping file is malformed
+    """
+    partitions, _ = _get_partitions(expand_paths(paths), partition_pattern, partition_field, processes)
+    ping_arrays = _map(_join_partition, list(partitions.values()), processes)
+    return {key: BusOnRoute(ping_array) for key, ping_array in zip(partitions, ping_arrays)}
+
+
+def write_speed_maps(
+        paths: Iterable[str],
+        output_dir: str,
+        segment_length: float,
+        output_format: str = 'jsonl',
+        partition_pattern: Optional[str] = None,
+        partition_field: Optional[str] = None,
+        processes: Optional[int] = None,
+        engine: str = 'python',
+        clean: bool = False) -> Dict[str, str]:
+    """
+    Computes the speed map of every partition of ping files in a process pool and writes each one to its own file
+
+    Each worker parses, sorts, meshes and writes whole partitions, so only file paths and segment counts pass
+    between the processes when partitioning by path.
+
+    Args:
+        paths (Iterable[str]): files, directories or glob patterns, see `expand_paths`
+        output_dir (str): the directory of the speed map files, created when missing. Each file is named after its
+            partition key, with characters other than letters, digits and ._=- replaced by '_'
+        segment_length (float): a user defined length for a speed map segment, in meters
+        output_format (str): the output format of the speed map segments, 'jsonl', 'csv' or 'binary'
+        partition_pattern (Optional[str]): the regular expression of the partition key in the file paths
+        partition_field (Optional[str]): the json field of the partition key of each ping, used instead of the path
+        processes (Optional[int]): the number of worker processes, defaults to the number of CPUs
+        engine (str): the meshing engine, either 'python' or 'numpy'
+        clean (bool): when True, the pings of each partition go through a PingCleaner, which writes the malformed
+            lines to a quarantine file next to the speed map file, and a partition which still fails does not stop
+            the other partitions
+
+    Returns:
+        Dict[str, str]: a dictionary where the keys are the partition keys, in sorted order, and the values are the
+            locations of their speed map files
+
+    Raises:
+        FileNotFoundError: raised when a path designates no ping file
+        ValueError: raised when an argument is invalid or the partition keys of two partitions map to the same file
+        PingFormatError: raised when a line of a ping file is malformed and clean is False
+        PartitionError: raised when clean is True and some partitions failed, after the others are written
+    """
+
+    # validate input before any work is sent to the pool
+    validate_segment_length(segment_length)
+    if engine not in ENGINES:
+        raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+    if output_format not in FORMATS:
+        raise ValueError("Format must be one of " + ", ".join(FORMATS))
+
+    partitions, malformed_lines = _get_partitions(
+        expand_paths(paths), partition_pattern, partition_field, processes, clean)
+
+    # name the output file of each partition, checking the names already taken in a set so naming stays linear
+    output_paths, taken_output_paths = {}, set()
+    for key in partitions:
+        output_path = get_output_path(output_dir, key, output_format)
+        if output_path in taken_output_paths:
+            raise ValueError("Partitions map to the same output file: " + output_path)
+        output_paths[key] = output_path
+        taken_output_paths.add(output_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # quarantine the lines which could not be assigned to a partition
+    if malformed_lines:
+        with PingCleaner(quarantine_path=os.path.join(output_dir, UNPARTITIONED_QUARANTINE_NAME)) as cleaner:
+            for file_path, line_number, line, reason in malformed_lines:
+                cleaner.quarantine(line_number, line, reason, file_path)
+
+    tasks = [
+        (sources, output_paths[key], segment_length, output_format, engine, clean)
+        for key, sources in partitions.items()]
+    errors = {key: error for key, error in zip(partitions, _map(_write_partition, tasks, processes)) if error}
+
+    if errors:
+        raise PartitionError(errors, {key: path for key, path in output_paths.items() if key not in errors})
+    return output_paths
+
+
+def _get_partitions(
+        file_paths: List[str],
+        partition_pattern: Optional[str],
+        partition_field: Optional[str],
+        processes: Optional[int],
+        skip_malformed: bool = False) -> Tuple[Dict[str, list], List[tuple]]:
+    """
+    Groups the sources of the pings of each partition, which are file paths when partitioning by path, and ping
+    arrays parsed in the process pool when partitioning by field
+
+    Returns:
+        Tuple[Dict[str, list], List[tuple]]: the sources of each partition, by sorted partition key, and the file path,
+            line number, line and reason of each malformed line skipped when partitioning by field
+    """
+    partitions, malformed_lines = {}, []
+
+    if partition_field is None:
+        for file_path in file_paths:
+            partitions.setdefault(get_path_partition(file_path, partition_pattern), []).append(file_path)
+    else:
+        tasks = [(file_path, partition_field, skip_malformed) for file_path in file_paths]
+        for file_partitions, file_malformed_lines in _map(_read_field_partitions, tasks, processes):
+            for key, ping_array in file_partitions.items():
+                partitions.setdefault(key, []).append(ping_array)
+            malformed_lines.extend(file_malformed_lines)
+
+    return dict(sorted(partitions.items())), malformed_lines
+
+
+def _map(function: Callable, tasks: Sequence, processes: Optional[int]) -> List:
+    """
+    Applies a function to every task, either serially or in a process pool, and gets the results in task order
+    """
+    processes = processes if processes is not None else os.cpu_count() or 1
+    if processes < 1:
+        raise ValueError("Processes must be at least 1")
+
+    if processes == 1 or len(tasks) <= 1:
+        return [function(task) for task in tasks]
+
+    # batch several tasks per worker call so that small files do not pay the inter process overhead one by one
+    chunksize = max(1, len(tasks) // (processes * 4))
+    with ProcessPoolExecutor(max_workers=min(processes, len(tasks))) as executor:
+        return list(executor.map(function, tasks, chunksize=chunksize))
+
+
+def _read_field_partitions(task) -> Tuple[Dict[str, PingArray], List[tuple]]:
+    """
+    Parses a ping file in a worker process, grouping its pings by the value of a json field, and skipping the
+    malformed lines when asked to
+    """
+    file_path, partition_field, skip_malformed = task
+    ping_arrays, malformed_lines = {}, []
+
+    for line_number, line in enumerate(iter_lines(file_path), 1):
+        try:
+            input_dict = loads(line)
+            ping = Ping.from_dict(input_dict)
+            key = str(input_dict[partition_field])
+
+            # append before the partition is created, so a line with e.g. an unknown ping type leaves no partition
+            ping_array = ping_arrays.get(key)
+            if ping_array is None:
+                ping_array = PingArray()
+            ping_array.append(ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop)
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            if skip_malformed:
+                malformed_lines.append((file_path, line_number, line, "unparsable line: " + repr(error)))
+                continue
+            raise PingFormatError(line_number, line, str(error) + " in " + file_path)
+
+        ping_arrays[key] = ping_array
+
+    return ping_arrays, malformed_lines
+
+
+def _join_partition(sources: list, cleaner: Optional[PingCleaner] = None) -> PingArray:
+    """
+    Joins the pings of a partition from its ping files or ping arrays, sorted by timestamp. With a cleaner, the
+    malformed lines of the files are quarantined
+    """
+    read_ping_array = cleaner.read_ping_array if cleaner is not None else PingArray.from_file
+    ping_arrays = [read_ping_array(source) if isinstance(source, str) else source for source in sources]
+    ping_array = ping_arrays[0] if len(ping_arrays) == 1 else PingArray.concatenate(ping_arrays)
+    return ping_array.sort_by_timestamp()
+
+
+def _write_partition(task) -> Optional[str]:
+    """
+    Computes the speed map of a partition and writes it to its output file in a worker process
+
+    Returns:
+        Optional[str]: the error of a cleaned partition which failed, or None when it was written
+    """
+    sources, output_path, segment_length, output_format, engine, clean = task
+
+    if not clean:
+        _write_segments(BusOnRoute(_join_partition(sources)).get_speed_map(segment_length, engine=engine),
+                        output_path, output_format)
+        return None
+
+    # quarantine the malformed lines next to the output, and report a failure instead of stopping the batch
+    try:
+        quarantine_path = os.path.splitext(output_path)[0] + QUARANTINE_EXTENSION
+        with PingCleaner(quarantine_path=quarantine_path) as cleaner:
+            ping_array = PingArray.from_pings(cleaner.clean(_join_partition(sources, cleaner)))
+        _write_segments(BusOnRoute(ping_array).get_speed_map(segment_length, engine=engine), output_path,
+                        output_format)
+    except Exception as error:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return repr(error)
+
+    return None
+
+
+def _write_segments(segments, output_path: str, output_format: str):
+    """
+    Writes the segments of a partition to its output file
+    """
+    with open(output_path, "wb") as file, get_segment_writer(output_format, file) as writer:
+        writer.write_all(segments)
@@ -0,0 +1,454 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+from speedmap.batch_ingest import QUARANTINE_EXTENSION, get_output_path, get_path_partition
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.cleaning import PingCleaner
+from speedmap.mesh import ENGINES, validate_segment_length
+from speedmap.segment_writers import FORMATS, get_segment_writer
+
+# the name of the checkpoint journal in the output directory, unless another location is given
+DEFAULT_JOURNAL_NAME = '_batch_journal.jsonl'
+
+# the number of files queued per worker process, so that workers never wait for the next file
+_QUEUED_FILES_PER_PROCESS = 4
+
+
+class BatchProgress:
+    """
+    Represents the progress of a batch run, reported while it runs and returned when it ends
+
+    Attributes:
+        total (int): the number of files of the manifest
+        skipped (int): the number of files already written by a previous run, according to the journal
+        completed (int): the number of files written by this run
+        failed (int): the number of files which could not be written by this run
+        segments (int): the number of segments written by this run
+        elapsed (float): the wall time of this run so far, in seconds
+        errors (Dict[str, str]): the error of each failed file, by file path
+    """
+
+    def __init__(self, total: int, skipped: int = 0):
+        self.total = total
+        self.skipped = skipped
+        self.completed = 0
+        self.failed = 0
+        self.segments = 0
+        self.elapsed = 0.0
+        self.errors: Dict[str, str] = {}
+
+    @property
+    def files_per_second(self) -> float:
+        """
+        Gets the throughput of this run in files, either written or failed, per second
+        """
+        return (self.completed + self.failed) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def segments_per_second(self) -> float:
+        """
+        Gets the throughput of this run in segments written per second
+        """
+        return self.segments / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def remaining(self) -> int:
+        """
+        Gets the number of files left to process
+        """
+        return self.total - self.skipped - self.completed - self.failed
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """
+        Gets the estimated time to process the remaining files at the throughput so far, in seconds, or None before
+        the first file is processed
+        """
+        files_per_second = self.files_per_second
+        return self.remaining / files_per_second if files_per_second else None
+
+    def format_report(self) -> str:
+        """
+        Gets a human readable line of the progress
+
+        Returns:
+            str: the progress line
+        """
+        eta_seconds = self.eta_seconds
+        return 'batch: %d/%d files (%d failed, %d skipped), %.1f files/s, %.0f segments/s, %.1fs elapsed, eta %s' % (
+            self.skipped + self.completed + self.failed, self.total, self.failed, self.skipped,
+            self.files_per_second, self.segments_per_second, self.elapsed,
+            '%.0fs' % eta_seconds if eta_seconds is not None else '-')
+
+
+class BatchJournal:
+    """
+    Represents the checkpoint journal of a batch run, an append-only json lines file with the settings of the run on
+    its first line and then a line per processed file, which is flushed as soon as the file's output is in place
+
+    A run which crashed or was killed loses at most the files in flight, a partially written last line is ignored.
+
+    Attributes:
+        file_path (str): the location of the journal
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, settings: Dict, restart: bool = False) -> Dict[str, Dict]:
+        """
+        Opens the journal for appending, reading the files already written by previous runs with the same settings
+
+        Args:
+            settings (Dict): the settings of the run, which must match the settings of the journal when resuming
+            restart (bool): when True, the journal is emptied and every file is processed again
+
+        Returns:
+            Dict[str, Dict]: the last record of each file written without error, by file path
+
+        Raises:
+            ValueError: raised when the journal was written by a run with other settings
+        """
+        records = {}
+        if not restart and os.path.exists(self.file_path) and os.path.getsize(self.file_path):
+            with open(self.file_path, "r", encoding="utf-8") as file:
+                lines = file.readlines()
+            for line_number, line in enumerate(lines):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if line_number == 0:
+                    if record.get('settings') != settings:
+                        raise ValueError(
+                            "Journal " + self.file_path + " was written with other settings " +
+                            json.dumps(record.get('settings')) + ", restart the batch to discard it")
+                elif record.get('error') is None:
+                    records[record['file']] = record
+                else:
+                    records.pop(record['file'], None)
+
+            # terminate a partially written last line before appending
+            self._file = open(self.file_path, "a", encoding="utf-8")
+            if lines and not lines[-1].endswith('\n'):
+                self._file.write('\n')
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+            self._file = open(self.file_path, "w", encoding="utf-8")
+            self._write({'settings': settings})
+
+        return records
+
+    def record(self, file_path: str, output_path: str, segments: int, seconds: float, error: Optional[str] = None):
+        """
+        Appends the outcome of a file to the journal and flushes it
+
+        Args:
+            file_path (str): the location of the ping file
+            output_path (str): the location of its speed map file
+            segments (int): the number of segments written
+            seconds (float): the wall time of the file in its worker, in seconds
+            error (Optional[str]): the error of a file which could not be written
+        """
+        self._write({'file': file_path, 'output': output_path, 'segments': segments, 'seconds': round(seconds, 6),
+                     'error': error})
+
+    def close(self):
+        """
+        Closes the journal
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: Dict):
+        """
+        Writes a line to the journal, flushed to the operating system so that it survives the process
+        """
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+
+def read_manifest(manifest_path: str) -> List[str]:
+    """
+    Reads the ping file paths of a manifest, one per line, where blank lines and lines starting with '#' are ignored
+    and relative paths are relative to the directory of the manifest
+
+    Args:
+        manifest_path (str): the location of the manifest
+
+    Returns:
+        List[str]: the ping file paths, in manifest order and without duplicates
+    """
+    directory = os.path.dirname(os.path.abspath(manifest_path))
+    file_paths = {}
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                file_paths[os.path.normpath(os.path.join(directory, line))] = None
+    return list(file_paths)
+
+
+def run_batch(
+        manifest_path: str,
+        output_dir: str,
+        segment_length: float,
+        output_format: str = 'jsonl',
+        processes: Optional[int] = None,
+        engine: str = 'python',
+        merge_tolerance: Optional[float] = None,
+        clean: bool = False,
+        partition_pattern: Optional[str] = None,
+        journal_path: Optional[str] = None,
+        restart: bool = False,
+        progress: Optional[Callable[[BatchProgress], None]] = None,
+        progress_interval: float = 10.0) -> BatchProgress:
+    """
+    Computes the speed map of every ping file of a manifest in a pool of worker processes, which live for the whole
+    run so that the interpreter and module start up once per worker rather than once per file, and writes each speed
+    map to its own file
+
+    Each worker reads, sorts, meshes and writes whole files, so only file paths and counts pass between the processes.
+    A speed map file is written under a temporary name and renamed into place before its file is recorded in the
+    checkpoint journal. A run started again with the same journal and settings skips the files already written, so a
+    crashed or killed run resumes where it stopped. A file which fails is recorded with its error and does not stop
+    the others, and it is retried by the next run.
+
+    Args:
+        manifest_path (str): the location of the manifest of ping files, see `read_manifest`
+        output_dir (str): the directory of the speed map files, created when missing
+        segment_length (float): a user defined length for a speed map segment, in meters
+        output_format (str): the output format of the speed map segments, 'jsonl', 'csv' or 'binary'
+        processes (Optional[int]): the number of worker processes, defaults to the number of CPUs. When 1, the files
+            are processed in the current process
+        engine (str): the meshing engine, either 'python' or 'numpy'
+        merge_tolerance (Optional[float]): when given, speed graph edges are merged within this relative tolerance,
+            see `speedmap.compressed_speed_graph`
+        clean (bool): when True, the pings of each file go through a PingCleaner, which writes the malformed lines to
+            a quarantine file next to the speed map file
+        partition_pattern (Optional[str]): the regular expression of the output file name in the file paths, see
+            `speedmap.batch_ingest.get_path_partition`, defaults to the file name
+        journal_path (Optional[str]): the location of the checkpoint journal, defaults to _batch_journal.jsonl in the
+            output directory
+        restart (bool): when True, the journal is discarded and every file is processed again
+        progress (Optional[Callable[[BatchProgress], None]]): a function called with the progress at most every
+            progress_interval seconds while files complete, and once at the end
+        progress_interval (float): the shortest time between two progress calls, in seconds
+
+    Returns:
+        BatchProgress: the final progress, with the error of each failed file
+
+    Raises:
+        FileNotFoundError: raised when the manifest does not exist
+        ValueError: raised when an argument is invalid, two files map to the same output file or the journal was
+            written with other settings
+    """
+
+    # validate input before any work is sent to the pool
+    validate_segment_length(segment_length)
+    if engine not in ENGINES:
+        raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+    if output_format not in FORMATS:
+        raise ValueError("Format must be one of " + ", ".join(FORMATS))
+    processes = processes if processes is not None else os.cpu_count() or 1
+    if processes < 1:
+        raise ValueError("Processes must be at least 1")
+
+    # name the output file of each ping file, checking the names already taken in a set rather than the dictionary
+    # values, so naming stays linear in the number of files
+    output_paths, taken_output_paths = {}, set()
+    for file_path in read_manifest(manifest_path):
+        output_path = get_output_path(output_dir, get_path_partition(file_path, partition_pattern), output_format)
+        if output_path in taken_output_paths:
+            raise ValueError("Files map to the same output file: " + output_path)
+        output_paths[file_path] = output_path
+        taken_output_paths.add(output_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    settings = {'segment_length': segment_length, 'format': output_format, 'engine': engine,
+                'merge_tolerance': merge_tolerance, 'clean': clean}
+    journal_path = journal_path if journal_path is not None else os.path.join(output_dir, DEFAULT_JOURNAL_NAME)
+
+    with BatchJournal(journal_path) as journal:
+
+        # skip the files whose speed map was written by a previous run and is still there
+        records = journal.open(settings, restart)
+        tasks = [
+            (file_path, output_path, segment_length, output_format, engine, merge_tolerance, clean)
+            for file_path, output_path in output_paths.items()
+            if not (file_path in records and records[file_path]['output'] == output_path and
+                    os.path.exists(output_path))]
+        batch_progress = BatchProgress(len(output_paths), len(output_paths) - len(tasks))
+
+        start = time.perf_counter()
+        last_report = start
+
+        for task, (segments, error, seconds) in _iter_results(tasks, processes):
+            file_path, output_path = task[0], task[1]
+            journal.record(file_path, output_path, segments, seconds, error)
+
+            # update the progress and report it when due
+            if error is None:
+                batch_progress.completed += 1
+                batch_progress.segments += segments
+            else:
+                batch_progress.failed += 1
+                batch_progress.errors[file_path] = error
+            now = time.perf_counter()
+            batch_progress.elapsed = now - start
+            if progress is not None and now - last_report >= progress_interval:
+                progress(batch_progress)
+                last_report = now
+
+        batch_progress.elapsed = time.perf_counter() - start
+
+    if progress is not None:
+        progress(batch_progress)
+    return batch_progress
+
+
+def _iter_results(tasks: List[tuple], processes: int):
+    """
+    Yields each task with its result in completion order, either serially or from a process pool which is kept
+    a few tasks ahead of its workers
+    """
+    if processes == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield task, _write_file(task)
+        return
+
+    pending_tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=min(processes, len(tasks))) as executor:
+        futures = {}
+        for task in pending_tasks:
+            futures[executor.submit(_write_file, task)] = task
+            if len(futures) >= processes * _QUEUED_FILES_PER_PROCESS:
+                break
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = futures.pop(future)
+                yield task, future.result()
+
+                # queue the next file in place of the completed one
+                next_task = next(pending_tasks, None)
+                if next_task is not None:
+                    futures[executor.submit(_write_file, next_task)] = next_task
+
+
+def _write_file(task) -> Tuple[int, Optional[str], float]:
+    """
+    Computes the speed map of a ping file and writes it to its output file in a worker process
+
+    Returns:
+        Tuple[int, Optional[str], float]: the number of segments written, the error when the file could not be
+            written, and the wall time of the file in seconds
+    """
+    file_path, output_path, segment_length, output_format, engine, merge_tolerance, clean = task
+    start = time.perf_counter()
+    temporary_path = output_path + '.tmp'
+
+    try:
+        cleaner = None
+        if clean:
+            cleaner = PingCleaner(quarantine_path=os.path.splitext(output_path)[0] + QUARANTINE_EXTENSION)
+        try:
+            bus_on_route = BusOnRoute.from_file(file_path, bulk=True, cleaner=cleaner)
+        finally:
+            if cleaner is not None:
+                cleaner.close()
+        segments = bus_on_route.get_speed_map(segment_length, engine=engine, merge_tolerance=merge_tolerance)
+
+        # write under a temporary name so that a killed worker never leaves a partial speed map file in place
+        with open(temporary_path, "wb") as file, get_segment_writer(output_format, file) as writer:
+            writer.write_all(segments)
+        os.replace(temporary_path, output_path)
+    except Exception as error:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return 0, repr(error), time.perf_counter() - start
+
+    return writer.count, None, time.perf_counter() - start
+
+
+def get_argument_parser() -> argparse.ArgumentParser:
+    """
+    Gets the parser of the speedmap batch command line arguments
+
+    Returns:
+        argparse.ArgumentParser: the argument parser
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m speedmap batch",
+        description="Compute the speed map of every ping file of a manifest in a pool of worker processes, resuming "
+                    "from the checkpoint journal of a previous run")
+    parser.add_argument(
+        "manifest", help="the location of the manifest, one ping file path per line, relative to the manifest")
+    parser.add_argument("segment_length", type=float, help="the length of a speed map segment, in meters")
+    parser.add_argument("--output-dir", required=True, help="the directory of the speed map files")
+    parser.add_argument(
+        "--format", choices=FORMATS, default="jsonl", dest="output_format",
+        help="the output format of the speed map segments (default: jsonl)")
+    parser.add_argument(
+        "--processes", type=int, help="the number of worker processes (default: the number of CPUs)")
+    parser.add_argument("--engine", choices=ENGINES, default='python', help="the meshing engine (default: python)")
+    parser.add_argument(
+        "--merge-tolerance", type=float,
+        help="merge runs of speed graph edges whose speeds are within this relative tolerance before meshing "
+             "(default: no merging)")
+    parser.add_argument(
+        "--clean", action="store_true",
+        help="quarantine malformed lines next to each speed map file and clean duplicate timestamps and distance "
+             "regressions")
+    parser.add_argument(
+        "--partition-pattern",
+        help="a regular expression whose groups in each file path name its speed map file (default: the file name)")
+    parser.add_argument(
+        "--journal", help="the location of the checkpoint journal (default: _batch_journal.jsonl in the output "
+                          "directory)")
+    parser.add_argument(
+        "--restart", action="store_true", help="discard the checkpoint journal and process every file again")
+    parser.add_argument(
+        "--progress-interval", type=float, default=10.0,
+        help="the number of seconds between two progress lines on standard error (default: 10)")
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs a batch from the command line interface, printing the progress to standard error, and exits with status 1
+    when some files failed
+
+    Args:
+        argv (List[str]): the command line arguments, defaults to sys.argv
+    """
+    args = get_argument_parser().parse_args(argv)
+
+    result = run_batch(
+        args.manifest, args.output_dir, args.segment_length, output_format=args.output_format,
+        processes=args.processes, engine=args.engine, merge_tolerance=args.merge_tolerance, clean=args.clean,
+        partition_pattern=args.partition_pattern, journal_path=args.journal, restart=args.restart,
+        progress=lambda batch_progress: sys.stderr.write(batch_progress.format_report() + "\n"),
+        progress_interval=args.progress_interval)
+
+    if result.errors:
+        for file_path, message in result.errors.items():
+            sys.stderr.write("file " + file_path + " failed: " + message + "\n")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+from speedmap.compressed_input import iter_lines
+from speedmap.mesh import mesh_speed_graph
+from speedmap.ping import Ping
+from speedmap.ping_array import PingArray
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.synthetic import write_synthetic_files
+
+# the benchmark phases, in the order they are run
+PHASES = ('parse', 'sort', 'graph', 'mesh')
+
+# the result file layout version
+RESULTS_VERSION = 1
+
+
+def run_benchmark(
+        sizes: Sequence[Tuple[int, int]],
+        segment_lengths: Sequence[float],
+        buses: int = 1,
+        jitter: float = 0.2,
+        out_of_order_fraction: float = 0.01,
+        engine: str = 'python',
+        bulk: bool = False,
+        repeat: int = 3,
+        seed: int = 0) -> Dict:
+    """
+    Times the parse, sort, graph-build and meshing phases of the speed map over synthetic ping files
+
+    Every phase is run `repeat` times and the fastest run is kept, which is the least noisy estimate of its cost. With
+    several buses, the time of a phase is the total over the ping files of every bus.
+
+    Args:
+        sizes (Sequence[Tuple[int, int]]): the (stops, pings per stop) of each trip size to measure
+        segment_lengths (Sequence[float]): the segment lengths to measure the meshing phase with
+        buses (int): the number of buses, each with its own ping file
+        jitter (float): the relative variation of the ping interval and of the distance between pings
+        out_of_order_fraction (float): the fraction of pings received out of order
+        engine (str): the meshing engine, either 'python' or 'numpy'
+        bulk (bool): when True, the files are parsed into a PingArray, as with `BusOnRoute.from_file(bulk=True)`
+        repeat (int): the number of runs of each phase
+        seed (int): the seed of the synthetic ping generator
+
+    Returns:
+        Dict: the machine-readable results, with a record per size, phase and segment length
+    """
+
+    results = []
+
+    for stops, pings_per_stop in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            file_paths = write_synthetic_files(
+                directory, buses, stops=stops, pings_per_stop=pings_per_stop, jitter=jitter,
+                out_of_order_fraction=out_of_order_fraction, seed=seed)
+
+            def add_result(phase, seconds, segment_length=None, segments=None):
+                results.append({
+                    'stops': stops, 'pings_per_stop': pings_per_stop, 'buses': buses,
+                    'pings': stops * pings_per_stop * buses, 'phase': phase,
+                    'segment_length': segment_length, 'segments': segments, 'seconds': seconds})
+
+            # parse each file in file order
+            parse = PingArray.from_file if bulk else _parse_ping_file
+            seconds, ping_lists = _time_phase(lambda: [parse(file_path) for file_path in file_paths], repeat)
+            add_result('parse', seconds)
+
+            # sort each ping list by timestamp, starting each run from the unsorted pings
+            seconds, ping_lists = _time_phase(
+                lambda: [_sort_pings(ping_list) for ping_list in ping_lists], repeat)
+            add_result('sort', seconds)
+
+            # build the stop lengths and speed graph of each bus
+            bus_on_routes = [BusOnRoute(ping_list) for ping_list in ping_lists]
+            seconds, speed_graphs = _time_phase(
+                lambda: [(bus._get_stop_lengths(), bus._get_speed_graph()) for bus in bus_on_routes], repeat)
+            add_result('graph', seconds)
+
+            # mesh the speed graphs at every segment length
+            for segment_length in segment_lengths:
+                seconds, speed_maps = _time_phase(
+                    lambda: [mesh_speed_graph(stop_lengths, speed_graph, segment_length, engine=engine)
+                             for stop_lengths, speed_graph in speed_graphs], repeat)
+                add_result('mesh', seconds, segment_length, sum(len(speed_map) for speed_map in speed_maps))
+
+    return {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'engine': engine,
+        'bulk': bulk,
+        'jitter': jitter,
+        'out_of_order_fraction': out_of_order_fraction,
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def compare_results(results: Dict, baseline: Dict, tolerance: float = 0.2) -> List[Dict]:
+    """
+    Compares the results of a benchmark run with the results of a baseline run
+
+    Args:
+        results (Dict): the results of the current run, see `run_benchmark`
+        baseline (Dict): the results of the baseline run
+        tolerance (float): the relative slowdown allowed before a phase is reported as a regression
+
+    Returns:
+        List[Dict]: a record for every phase measured in both runs which is slower than the baseline by more than the
+            tolerance, with the baseline and current seconds and their ratio
+    """
+
+    def get_key(result):
+        return result['stops'], result['pings_per_stop'], result['buses'], result['phase'], result['segment_length']
+
+    baseline_seconds = {get_key(result): result['seconds'] for result in baseline['results']}
+    regressions = []
+
+    for result in results['results']:
+        previous = baseline_seconds.get(get_key(result))
+        if previous and result['seconds'] > previous * (1 + tolerance):
+            regressions.append(dict(result, baseline_seconds=previous, ratio=result['seconds'] / previous))
+
+    return regressions
+
+
+def _parse_ping_file(file_path: str) -> List[Ping]:
+    """
+    Parses a ping file into a list of Ping class objects in file order, as `BusOnRoute.from_file` does before sorting
+    """
+    return [Ping.from_json(line) for line in iter_lines(file_path)]
+
+
+def _sort_pings(ping_list):
+    """
+    Sorts a copy of the pings by ascending timestamp, as `BusOnRoute.from_file` does after parsing
+    """
+    if isinstance(ping_list, PingArray):
+        return ping_list[:].sort_by_timestamp()
+    return sorted(ping_list, key=lambda x: x.timestamp)
+
+
+def _time_phase(phase: Callable, repeat: int):
+    """
+    Runs a phase several times and gets the fastest run time, in seconds, and the value of the last run
+    """
+    best = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        value = phase()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, value
+
+
+def _parse_sizes(value: str) -> List[Tuple[int, int]]:
+    """
+    Parses a comma separated list of <stops>x<pings per stop> sizes
+    """
+    try:
+        return [tuple(int(part) for part in size.split('x', 1)) for size in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Sizes must be a comma separated list of <stops>x<pings per stop>")
+
+
+def _parse_segment_lengths(value: str) -> List[float]:
+    """
+    Parses a comma separated list of segment lengths
+    """
+    try:
+        return [float(segment_length) for segment_length in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Segment lengths must be a comma separated list of numbers")
+
+
+def main(argv=None) -> int:
+    """
+    Runs the benchmark suite from the command line interface, writes the results as json and reports the phases which
+    regressed against a baseline result file
+
+    Args:
+        argv (List[str]): the command line arguments, defaults to sys.argv
+
+    Returns:
+        int: the exit status, 1 when a phase regressed against the baseline and 0 otherwise
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m speedmap.benchmark", description="Time the speed map phases over synthetic ping files")
+    parser.add_argument(
+        "--sizes", type=_parse_sizes, default=[(10, 100), (10, 1000), (100, 1000)],
+        help="comma separated <stops>x<pings per stop> trip sizes (default: 10x100,10x1000,100x1000)")
+    parser.add_argument(
+        "--segment-lengths", type=_parse_segment_lengths, default=[5.0, 50.0, 500.0],
+        help="comma separated segment lengths, in meters (default: 5,50,500)")
+    parser.add_argument("--buses", type=int, default=1, help="the number of buses (default: 1)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="the relative ping jitter (default: 0.2)")
+    parser.add_argument(
+        "--out-of-order", type=float, default=0.01, dest="out_of_order_fraction",
+        help="the fraction of pings received out of order (default: 0.01)")
+    parser.add_argument("--engine", choices=('python', 'numpy'), default='python', help="the meshing engine")
+    parser.add_argument("--bulk", action="store_true", help="parse the files into a columnar PingArray")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of runs of each phase (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the synthetic ping generator")
+    parser.add_argument("--output", help="the location of the json results file (default: standard output)")
+    parser.add_argument("--baseline", help="the location of a json results file to compare the results with")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="the relative slowdown reported as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(
+        args.sizes, args.segment_lengths, buses=args.buses, jitter=args.jitter,
+        out_of_order_fraction=args.out_of_order_fraction, engine=args.engine, bulk=args.bulk, repeat=args.repeat,
+        seed=args.seed)
+
+    # write the results
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    # report the regressions against the baseline
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare_results(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            sys.stderr.write("regression: %dx%d x%d buses %s%s %.6fs -> %.6fs (%.2fx)\n" % (
+                regression['stops'], regression['pings_per_stop'], regression['buses'], regression['phase'],
+                '' if regression['segment_length'] is None else ' @ %gm' % regression['segment_length'],
+                regression['baseline_seconds'], regression['seconds'], regression['ratio']))
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
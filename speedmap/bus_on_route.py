@@ -1,7 +1,17 @@
-from typing import Iterable, Dict
+from typing import Iterable, Dict, List, Optional, Sequence, Tuple
 from collections import namedtuple
+from speedmap.compressed_input import iter_lines
+from speedmap.compressed_speed_graph import get_compressed_speed_graph
+from speedmap.mesh import mesh_speed_graph, validate_segment_length
+from speedmap.metrics import NULL_METRICS
+from speedmap.parallel_mesh import mesh_speed_graph_parallel
 from speedmap.ping import Ping
+from speedmap.ping_array import PingArray
+from speedmap.ping_binary import read_ping_binary
+from speedmap.pyramid import mesh_speed_graph_pyramid
 from speedmap.segment import Segment
+from speedmap.speed_index import SpeedIndex
+from speedmap.speed_graph_edge import get_speed_graph_edge
 
 
 class BusOnRoute:
@@ -10,138 +20,337 @@ class BusOnRoute:
 
     Attributes:
         ping_list (Iterable(Ping): The list of data points sent from a bus indicating time, operation mode and
-        relative position to bus stops
+        relative position to bus stops, or a PingArray holding the same data as typed columns
+        metrics (PhaseMetrics): the metrics recording the wall time, item counts and peak memory of the 'graph' and
+            'mesh' phases, see `speedmap.metrics.PhaseMetrics`. Nothing is recorded by default.
     """
 
-    def __init__(self, ping_list: Iterable[Ping]):
+    def __init__(self, ping_list: Iterable[Ping], metrics=None):
 
         self.ping_list = ping_list
+        self.metrics = NULL_METRICS if metrics is None else metrics
+
+        self._speed_graph_cache = None
+        self._speed_index_cache = None
 
     @classmethod
-    def from_file(cls, file_path: str):
+    def from_file(cls, file_path: str, bulk: bool = False, metrics=None, cleaner=None):
         """
         Given an input file, reads and transforms each line into an array of Ping class objects that are sorted by time
 
         Args:
-            file_path (str): the location of the raw input file containing a series of Pings
+            file_path (str): the location of the raw input file containing a series of Pings, optionally gzip, bz2 or
+                xz compressed
+            bulk (bool): when True, the file is read in large chunks directly into a columnar PingArray instead of a
+                Ping class object per line, which is much faster for large files
+            metrics (PhaseMetrics): the metrics recording the 'parse', 'sort' and 'clean' phases, which are also used by
+                the returned object
+            cleaner (PingCleaner): when given, malformed lines are quarantined instead of raising, and the sorted pings
+                are cleaned of duplicate timestamps and distance regressions, see `speedmap.cleaning.PingCleaner`
 
         Returns:
             a BusOnRoute class object
+
+        Raises:
+            PingFormatError: raised when bulk is True, a line is malformed and there is no cleaner, with its line
+                number
         """
 
+        if metrics is None:
+            metrics = NULL_METRICS
+
+        # parse the file into typed columns and sort them by ascending timestamp
+        if bulk:
+            with metrics.phase('parse') as phase:
+                ping_array = cleaner.read_ping_array(file_path) if cleaner else PingArray.from_file(file_path)
+                phase.items = len(ping_array)
+            with metrics.phase('sort') as phase:
+                ping_array = ping_array.sort_by_timestamp()
+                phase.items = len(ping_array)
+            if cleaner:
+                with metrics.phase('clean') as phase:
+                    ping_array = PingArray.from_pings(cleaner.clean(ping_array))
+                    phase.items = len(ping_array)
+            return BusOnRoute(ping_array, metrics)
+
         ping_list = []
 
-        # open a read connection
-        with open(file_path, "r") as file:
-            for line in file:
+        # read the lines of the file, decompressed on a reader thread
+        with metrics.phase('parse') as phase:
+            if cleaner:
+
+                # deserialize the valid lines, quarantining the malformed ones
+                ping_list.extend(cleaner.parse_lines(iter_lines(file_path)))
+
+            else:
+                for line in iter_lines(file_path):
+
+                    # deserialize each line into a Ping object
+                    ping = Ping.from_json(line)
 
-                # deserialize each line into a Ping object
-                ping = Ping.from_json(line)
+                    # append it to the ping array
+                    ping_list.append(ping)
 
-                # append it to the ping array
-                ping_list.append(ping)
+            phase.items = len(ping_list)
 
         # sort the ping list by ascending timestamp so data is time-series
-        ping_list.sort(key=lambda x: x.timestamp, reverse=False)
+        with metrics.phase('sort') as phase:
+            ping_list.sort(key=lambda x: x.timestamp, reverse=False)
+            phase.items = len(ping_list)
+
+        # remove duplicate timestamps and distance regressions before the speed graph is built
+        if cleaner:
+            with metrics.phase('clean') as phase:
+                ping_list = list(cleaner.clean(ping_list))
+                phase.items = len(ping_list)
 
         # instantiate a new instance of the class
-        return BusOnRoute(ping_list)
+        return BusOnRoute(ping_list, metrics)
+
+    @classmethod
+    def from_binary(cls, file_path: str, metrics=None):
+        """
+        Given a binary ping file, memory-maps its columns without copying or parsing them
+
+        Args:
+            file_path (str): the location of a binary ping file, see `speedmap.ping_binary.write_ping_binary`
+            metrics (PhaseMetrics): the metrics recording the 'parse' and 'sort' phases, which are also used by the
+                returned object
 
-    def get_speed_map(self, segment_length: float) -> Iterable[Segment]:
+        Returns:
+            a BusOnRoute class object
+
+        Raises:
+            ValueError: raised when the file is not a binary ping file
+        """
+
+        if metrics is None:
+            metrics = NULL_METRICS
+
+        with metrics.phase('parse') as phase:
+            ping_array = read_ping_binary(file_path)
+            phase.items = len(ping_array)
+
+        # the columns are only copied when the file was written without sorting
+        with metrics.phase('sort') as phase:
+            ping_array = ping_array.sort_by_timestamp()
+            phase.items = len(ping_array)
+
+        return BusOnRoute(ping_array, metrics)
+
+    def get_speed_map(
+            self,
+            segment_length: float,
+            engine: str = 'python',
+            compact: bool = False,
+            workers: Optional[int] = None,
+            merge_tolerance: Optional[float] = None) -> Iterable[Segment]:
         """
         Computes the speed at uniform user defined segment lengths based on ping data for a bus on a route
 
         Args:
             segment_length (float): a user defined length for a speed map segment, in meters
+            engine (str): the meshing engine, either 'python' to walk the speed graph edge by edge or 'numpy' to
+                interpolate all segment boundaries of a stop in one batched pass. The 'numpy' engine falls back to
+                'python' when NumPy is not installed
+            compact (bool): when True, the segments are returned in a SegmentArray of typed columns, which is
+                iterable and indexable like the list but without a Segment object per segment
+            workers (Optional[int]): when greater than 1, the stops are meshed in chunks across this many worker
+                processes which share the speed graph columns, for routes with many stops. The segments are the same,
+                in the same order
+            merge_tolerance (Optional[float]): when given, runs of consecutive edges whose speeds are within this
+                relative tolerance of each other are merged before meshing, which makes meshing faster on dense feeds.
+                Each unrounded segment speed is then within this relative error, see
+                `speedmap.compressed_speed_graph.get_compressed_speed_graph`
 
         Returns:
             Iterable[Segment]: an Iterable containing Segment class objects
 
         Raises:
-            ValueError: if the segment length is invalid (less than 0)
+            ValueError: if the segment length or the number of workers is invalid (less than 0), the engine is
+                unknown or the merge tolerance is negative
             TypeError: if the segment length cannot be parsed to a value
         """
 
         # validate input
-        if segment_length <= 0:
-            raise ValueError("Segment length must be greater than 0")
-        try:
-            float(segment_length)
-        except TypeError:
-            raise TypeError("Segment length must be numeric")
-
-        # compute total lengths of each stop
-        stop_lengths = self._get_stop_lengths()
-
-        # compute the speed graph, or the speed between each pair of data pings
-        speed_graph = self._get_speed_graph()
-
-        # initialize results set
-        speed_map_segments = []
-
-        # iterate over each stop_id
-        for stop_id in stop_lengths.keys():
-
-            # initialize target data for while loop and indexes
-            segment_time_start, segment_time_end = None, None
-            speed_graph_of_stop_index, segment_index = 0, 0
-            stop_length = stop_lengths[stop_id]
-            speed_graph_for_stop = speed_graph[stop_id]
-
-            # iterate over segments within a stop_id
-            while segment_index * segment_length < stop_length:
-
-                # get the next edge on the speed graph
-                speed_graph_edge = speed_graph_for_stop[speed_graph_of_stop_index]
-
-                # determine the start and end distances of the current segment
-                segment_distance_start = segment_index * segment_length
-                segment_distance_end = segment_distance_start + segment_length if\
-                    segment_distance_start + segment_length <= stop_length else stop_length
-
-                # figure out if the current segment start is before the end of the current speed graph edge
-                if speed_graph_edge.distance_end > segment_distance_start and segment_time_start is None:
-
-                    # linearly interpolate the time at the start of the segment using
-                    # dx/dt = (d2-d1)/(t2-t1) = v, rearranged to find t1: t1 = t2 - (d2 - d1)/v
-                    # and include conversion from milliseconds to seconds
-                    segment_time_start = speed_graph_edge.time_end / 1000 \
-                        - (speed_graph_edge.distance_end - segment_distance_start) / speed_graph_edge.speed
-
-                # figure out if the current segment end is at or before the end of the current speed graph edge.
-                if speed_graph_edge.distance_end >= segment_distance_end and segment_time_end is None:
-
-                    # linearly interpolate the time at the end of the segment
-                    segment_time_end = speed_graph_edge.time_end / 1000 \
-                        - (speed_graph_edge.distance_end - segment_distance_end) / speed_graph_edge.speed
-
-                # check if we have both segment start and end times computed
-                if segment_time_start is not None and segment_time_end is not None:
-                    
-                    # great! now we can use dx/dt = v to calculate the speed of this segment 
-                    speed = (segment_distance_end - segment_distance_start) / (segment_time_end - segment_time_start)
-
-                    # format the speed result to 1 decimal place
-                    speed = float('%.1f' % round(speed, 1))
-
-                    # convert result to a speed map segment object
-                    speed_map_segment = Segment(
-                        stop_id=stop_id,
-                        segment_index=segment_index,
-                        segment_length=segment_distance_end - segment_distance_start,
-                        speed=speed)
-
-                    # add to results set
-                    speed_map_segments.append(speed_map_segment)
-
-                    # reinitialize the segment times, increment the segment index
-                    segment_time_start, segment_time_end = None, None
-                    segment_index += 1
-                else:
-                    # if we haven't found both segment start and end times, increment to the next speed graph edge
-                    speed_graph_of_stop_index += 1
-
-        return speed_map_segments
+        validate_segment_length(segment_length)
+
+        # get the total lengths of each stop and the speed graph, or the speed between each pair of data pings
+        stop_lengths, speed_graph = self._get_cached_speed_graph(merge_tolerance)
+
+        # apply the segment mesh to the speed graph of each stop_id
+        with self.metrics.phase('mesh') as phase:
+            if workers is not None and workers != 1:
+                segments = mesh_speed_graph_parallel(
+                    stop_lengths, speed_graph, segment_length, workers, engine=engine, compact=compact)
+            else:
+                segments = mesh_speed_graph(stop_lengths, speed_graph, segment_length, engine=engine, compact=compact)
+            phase.items = len(segments)
+
+        return segments
+
+    def get_speed_maps(self, segment_lengths: Iterable[float], engine: str = 'python') -> Dict[float, List[Segment]]:
+        """
+        Computes the speed maps of several segment lengths from a single speed graph pass. Where a segment length is a
+        whole multiple of another, its map is built by merging the segments of the finer map rather than interpolating
+        the speed graph again. The results match independent `get_speed_map` calls.
+
+        Args:
+            segment_lengths (Iterable[float]): user defined lengths for a speed map segment, in meters
+            engine (str): the meshing engine, either 'python' or 'numpy'
+
+        Returns:
+            Dict[float, List[Segment]]: a dictionary where the keys are the segment lengths and the values are the
+                speed map segments of the segment length
+
+        Raises:
+            ValueError: if a segment length is invalid (less than 0) or the engine is unknown
+            TypeError: if a segment length cannot be parsed to a value
+        """
+
+        stop_lengths, speed_graph = self._get_cached_speed_graph()
+
+        with self.metrics.phase('mesh') as phase:
+            speed_maps = mesh_speed_graph_pyramid(stop_lengths, speed_graph, segment_lengths, engine=engine)
+            if self.metrics.enabled:
+                phase.items = sum(len(segments) for segments in speed_maps.values())
+
+        return speed_maps
+
+    def speed_at(self, stop_id: str, distance: float) -> Optional[float]:
+        """
+        Gets the speed of the bus at a distance from a stop, in O(log n) time from the speed index
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            distance (float): the distance from the bus stop, in meters
+
+        Returns:
+            Optional[float]: the unrounded speed in meters/second, or None when the bus was not seen at the distance
+        """
+        return self.get_speed_index().speed_at(stop_id, distance)
+
+    def time_at(self, stop_id: str, distance: float) -> Optional[float]:
+        """
+        Gets the time the bus passed a distance from a stop, interpolated as when meshing, in O(log n) time from the
+        speed index
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            distance (float): the distance from the bus stop, in meters
+
+        Returns:
+            Optional[float]: the time in epoch time (milliseconds), or None when the bus was not seen at the distance
+        """
+        return self.get_speed_index().time_at(stop_id, distance)
+
+    def position_at(self, timestamp: float) -> Optional[Tuple[str, float]]:
+        """
+        Gets the position of the bus at a time, in O(log n) time from the speed index
+
+        Args:
+            timestamp (float): the time in epoch time (milliseconds)
+
+        Returns:
+            Optional[Tuple[str, float]]: the stop_id and the distance from the bus stop in meters, or None when the
+                bus was not travelling between two pings at the time
+        """
+        return self.get_speed_index().position_at(timestamp)
+
+    def speed_at_many(self, stop_id: str, distances: Sequence[float], engine: str = 'python') -> List[Optional[float]]:
+        """
+        Gets the speed of the bus at many distances from a stop, see `speed_at`
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            distances (Sequence[float]): the distances from the bus stop, in meters
+            engine (str): 'python' to bisect each distance, or 'numpy' to search them in one batched pass
+
+        Returns:
+            List[Optional[float]]: the speed at each distance in meters/second, or None
+        """
+        return self.get_speed_index().speed_at_many(stop_id, distances, engine)
+
+    def time_at_many(self, stop_id: str, distances: Sequence[float], engine: str = 'python') -> List[Optional[float]]:
+        """
+        Gets the time the bus passed many distances from a stop, see `time_at`
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            distances (Sequence[float]): the distances from the bus stop, in meters
+            engine (str): 'python' to bisect each distance, or 'numpy' to search them in one batched pass
+
+        Returns:
+            List[Optional[float]]: the time at each distance in epoch time (milliseconds), or None
+        """
+        return self.get_speed_index().time_at_many(stop_id, distances, engine)
+
+    def position_at_many(
+            self,
+            timestamps: Sequence[float],
+            engine: str = 'python') -> List[Optional[Tuple[str, float]]]:
+        """
+        Gets the position of the bus at many times, see `position_at`
+
+        Args:
+            timestamps (Sequence[float]): the times in epoch time (milliseconds)
+            engine (str): 'python' to bisect each time, or 'numpy' to search them in one batched pass
+
+        Returns:
+            List[Optional[Tuple[str, float]]]: the stop_id and distance at each time, or None
+        """
+        return self.get_speed_index().position_at_many(timestamps, engine)
+
+    def get_speed_index(self) -> SpeedIndex:
+        """
+        Gets the sorted index of the speed graph and pings behind the point queries, building it on first use and
+        caching it on the instance like the speed graph
+
+        Returns:
+            SpeedIndex: the speed index
+        """
+
+        key = (id(self.ping_list), len(self.ping_list))
+        if self._speed_index_cache is None or self._speed_index_cache[0] != key:
+            _, speed_graph = self._get_cached_speed_graph()
+            self._speed_index_cache = (key, SpeedIndex(speed_graph, self.ping_list))
+
+        return self._speed_index_cache[1]
+
+    def clear_cache(self):
+        """
+        Clears the cached stop lengths, speed graph and speed index, which must be done after the pings are modified
+        in place
+        """
+        self._speed_graph_cache = None
+        self._speed_index_cache = None
+
+    def _get_cached_speed_graph(
+            self,
+            merge_tolerance: Optional[float] = None) -> Tuple[Dict[str, float], Dict[str, Iterable[namedtuple]]]:
+        """
+        Gets the stop lengths and speed graph, computing them on first use and caching them on the instance. The
+        cache is also rebuilt when the ping list is replaced or changes length, or for another merge tolerance.
+
+        Args:
+            merge_tolerance (Optional[float]): when given, the speed graph is compressed with this tolerance, see
+                `speedmap.compressed_speed_graph.get_compressed_speed_graph`
+
+        Returns:
+            Tuple[Dict[str, float], Dict[str, Iterable[namedtuple]]]: the stop lengths and the speed graph
+        """
+
+        key = (id(self.ping_list), len(self.ping_list), merge_tolerance)
+        if self._speed_graph_cache is None or self._speed_graph_cache[0] != key:
+            with self.metrics.phase('graph') as phase:
+                stop_lengths = self._get_stop_lengths()
+                speed_graph = self._get_speed_graph() if merge_tolerance is None \
+                    else get_compressed_speed_graph(self.ping_list, merge_tolerance)
+                if self.metrics.enabled:
+                    phase.items = sum(len(edges) for edges in speed_graph.values())
+            self._speed_graph_cache = (key, stop_lengths, speed_graph)
+
+        return self._speed_graph_cache[1], self._speed_graph_cache[2]
 
     def _get_stop_lengths(self) -> Dict[str, float]:
         """
@@ -152,6 +361,10 @@ class BusOnRoute:
                 in meters
         """
 
+        # read the columns directly when the pings are held in a PingArray
+        if isinstance(self.ping_list, PingArray):
+            return self.ping_list.get_stop_lengths()
+
         stop_id_lengths = {}
 
         for ping in self.ping_list:
@@ -168,6 +381,10 @@ class BusOnRoute:
             Dict[str, Iterable[namedtuple]: A dictionary where the keys are stop_id, and the values are arrays of
                 speed graph edges for the relevant stop_id key
         """
+        # read the columns directly when the pings are held in a PingArray
+        if isinstance(self.ping_list, PingArray):
+            return self.ping_list.get_speed_graph()
+
         speed_graph = {}
         pings_count = len(self.ping_list)
 
@@ -182,24 +399,11 @@ class BusOnRoute:
             if ping.stop_id not in speed_graph:
                 speed_graph[ping.stop_id] = []
 
-            # ignore any pair of pings where the first ping is an 'ARRIVAL' type
-            if ping.ping_type in ('DEPARTURE', 'MIDPATH'):
-
-                # compute velocity where v = dx/dt = (distance traveled/time elapsed) and
-                # convert from meters/millisecond to meters/second
-                speed = (next_ping.distance_from_stop - ping.distance_from_stop) / (
-                            next_ping.timestamp - ping.timestamp) * 1000
-
-                # define a speed graph edge, which defines speed, time, and distance between each data ping pair
-                SpeedGraphEdge = namedtuple('SpeedGraphEdge', ['stop_id', 'speed', 'distance_end', 'time_end'])
-                speed_graph_edge = SpeedGraphEdge(
-                    stop_id=ping.stop_id,
-                    speed=speed,
-                    distance_end=next_ping.distance_from_stop,
-                    time_end=next_ping.timestamp
-                )
+            # compute the speed graph edge between the pings, which is None when the first ping is an 'ARRIVAL' type
+            speed_graph_edge = get_speed_graph_edge(ping, next_ping)
 
-                # add edge to speed graph, grouping data by stop_ids
+            # add edge to speed graph, grouping data by stop_ids
+            if speed_graph_edge is not None:
                 speed_graph[ping.stop_id].append(speed_graph_edge)
 
         return speed_graph
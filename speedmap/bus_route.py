@@ -0,0 +1,215 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.mesh import ENGINES, validate_segment_length
+from speedmap.ping import Ping
+from speedmap.segment import Segment
+
+
+class SegmentStatistics:
+    """
+    Represents the aggregated speeds of a single speed map segment over many buses
+
+    Attributes:
+        stop_id (str): surrogate identifier of the related bus stop
+        segment_index (int): the relative order of a segment within all segments for a stop_id
+        count (int): the number of buses with a speed for the segment
+        total (float): the sum of the speeds, in meters/second
+        min (float): the lowest speed, in meters/second
+        max (float): the highest speed, in meters/second
+    """
+
+    def __init__(self, stop_id: str, segment_index: int):
+
+        self.stop_id = stop_id
+        self.segment_index = segment_index
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @property
+    def mean(self) -> Optional[float]:
+        """
+        Gets the mean speed of the segment
+
+        Returns:
+            Optional[float]: the mean speed in meters/second, or None when no speeds were added
+        """
+        return self.total / self.count if self.count else None
+
+    def add(self, speed: float):
+        """
+        Adds the speed of one bus to the statistics
+
+        Args:
+            speed (float): the speed of the bus on the segment, in meters/second
+        """
+        self.count += 1
+        self.total += speed
+        self.min = speed if self.min is None or speed < self.min else self.min
+        self.max = speed if self.max is None or speed > self.max else self.max
+
+
+class BusRoute:
+    """
+    Represents the data for many buses traversing a single route, where the speed map of each bus is computed in a
+    process pool
+
+    Attributes:
+        bus_sources (List[Union[str, os.PathLike, BusOnRoute, Iterable[Ping]]]): the ping data of each bus, given as
+            a ping file path, a BusOnRoute object or a stream of Ping objects
+    """
+
+    def __init__(self, bus_sources: Iterable[Union[str, os.PathLike, BusOnRoute, Iterable[Ping]]]):
+
+        # materialize ping streams so that they can be sent to the worker processes
+        self.bus_sources = [
+            source if isinstance(source, (str, os.PathLike, BusOnRoute)) else _get_bus_on_route(source)
+            for source in bus_sources
+        ]
+
+    @classmethod
+    def from_files(cls, file_paths: Iterable[Union[str, os.PathLike]]):
+        """
+        Instantiates a BusRoute from ping files, which are each read in the worker processes
+
+        Args:
+            file_paths (Iterable[Union[str, os.PathLike]]): the locations of the raw input files, one per bus
+
+        Returns:
+            a BusRoute class object
+        """
+        return BusRoute(list(file_paths))
+
+    def get_speed_maps(
+            self,
+            segment_length: float,
+            processes: Optional[int] = None,
+            engine: str = 'python') -> List[List[Segment]]:
+        """
+        Computes the speed map of every bus on the route
+
+        Args:
+            segment_length (float): a user defined length for a speed map segment, in meters
+            processes (Optional[int]): the number of worker processes, defaults to the number of CPUs.
+                When 1, the speed maps are computed in the current process
+            engine (str): the meshing engine, either 'python' or 'numpy'
+
+        Returns:
+            List[List[Segment]]: the speed map segments of each bus, in the order of the bus sources
+        """
+        return list(self._map(_get_speed_map, segment_length, processes, engine))
+
+    def get_segment_statistics(
+            self,
+            segment_length: float,
+            processes: Optional[int] = None,
+            engine: str = 'python') -> Dict[Tuple[str, int], SegmentStatistics]:
+        """
+        Computes the speed map of every bus on the route and merges the speeds of each segment
+
+        Args:
+            segment_length (float): a user defined length for a speed map segment, in meters
+            processes (Optional[int]): the number of worker processes, defaults to the number of CPUs.
+                When 1, the speed maps are computed in the current process
+            engine (str): the meshing engine, either 'python' or 'numpy'
+
+        Returns:
+            Dict[Tuple[str, int], SegmentStatistics]: a dictionary where the keys are (stop_id, segment_index) and
+                the values are the speed statistics of the segment, in order of first appearance
+        """
+
+        segment_statistics = {}
+
+        # merge the compact speed records of each bus as they are received, in the order of the bus sources, while
+        # the workers compute the speed maps of the next buses
+        for speed_records in self._map(_get_speed_records, segment_length, processes, engine):
+            for stop_id, segment_index, speed in speed_records:
+                key = (stop_id, segment_index)
+                if key not in segment_statistics:
+                    segment_statistics[key] = SegmentStatistics(stop_id, segment_index)
+                segment_statistics[key].add(speed)
+
+        return segment_statistics
+
+    def _map(self, function, segment_length: float, processes: Optional[int], engine: str) -> Iterable:
+        """
+        Applies a per bus function to every bus source, either serially or in a process pool, yielding each result as
+        soon as it and the results before it are complete
+
+        Args:
+            function: a module level function taking a bus source, segment length and engine
+            segment_length (float): a user defined length for a speed map segment, in meters
+            processes (Optional[int]): the number of worker processes, defaults to the number of CPUs
+            engine (str): the meshing engine, either 'python' or 'numpy'
+
+        Returns:
+            Iterable: an iterator over the results of the function, in the order of the bus sources
+
+        Raises:
+            ValueError: if the number of processes or the engine is invalid
+        """
+
+        # validate input before any work is sent to the pool
+        validate_segment_length(segment_length)
+        if engine not in ENGINES:
+            raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+        processes = processes if processes is not None else os.cpu_count() or 1
+        if processes < 1:
+            raise ValueError("Processes must be at least 1")
+
+        if processes == 1 or len(self.bus_sources) <= 1:
+            return (function(source, segment_length, engine) for source in self.bus_sources)
+        return self._map_in_pool(function, segment_length, processes, engine)
+
+    def _map_in_pool(self, function, segment_length: float, processes: int, engine: str) -> Iterator:
+        """
+        Applies a per bus function to every bus source in a process pool, yielding the results as the pool returns
+        them, in the order of the bus sources
+        """
+        count = len(self.bus_sources)
+
+        # batch several buses per task so that short trips do not pay the inter process overhead one by one
+        chunksize = max(1, count // (processes * 4))
+        with ProcessPoolExecutor(max_workers=min(processes, count)) as executor:
+            yield from executor.map(
+                function, self.bus_sources, [segment_length] * count, [engine] * count, chunksize=chunksize)
+
+
+def _get_bus_on_route(source: Union[str, os.PathLike, BusOnRoute, Iterable[Ping]]) -> BusOnRoute:
+    """
+    Gets a BusOnRoute object from a bus source
+
+    Args:
+        source (Union[str, os.PathLike, BusOnRoute, Iterable[Ping]]): a ping file path, a BusOnRoute object or a
+            stream of Ping objects
+
+    Returns:
+        a BusOnRoute class object
+    """
+    if isinstance(source, BusOnRoute):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        return BusOnRoute.from_file(source)
+
+    # sort the ping stream by ascending timestamp so data is time-series
+    return BusOnRoute(sorted(source, key=lambda x: x.timestamp))
+
+
+def _get_speed_map(source, segment_length: float, engine: str) -> List[Segment]:
+    """
+    Computes the speed map of a single bus source in a worker process
+    """
+    return _get_bus_on_route(source).get_speed_map(segment_length, engine=engine)
+
+
+def _get_speed_records(source, segment_length: float, engine: str) -> List[Tuple[str, int, float]]:
+    """
+    Computes the speed map of a single bus source in a worker process as compact (stop_id, segment_index, speed) tuples
+    """
+    return [
+        (segment.stop_id, segment.segment_index, segment.speed)
+        for segment in _get_speed_map(source, segment_length, engine)
+    ]
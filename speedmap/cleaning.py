@@ -0,0 +1,327 @@
+import json
+import math
+from typing import Iterable, Iterator, Optional
+from speedmap.ping import Ping
+from speedmap.ping_array import PingArray
+from speedmap.speed_graph_edge import DATA_PING_TYPES
+
+# how a ping sharing the timestamp of a data ping is handled: dropped, or averaged into it
+DUPLICATE_POLICIES = ('drop', 'merge')
+
+# how a ping closer to the stop than the previous ping of the same stop is handled: moved to the previous distance, or
+# dropped
+REGRESSION_POLICIES = ('clamp', 'drop')
+
+# the ping types of a valid ping
+_PING_TYPES = ('DEPARTURE', 'MIDPATH', 'ARRIVAL')
+
+
+class CleaningCounters:
+    """
+    Represents the counts of the records changed by a PingCleaner
+
+    Attributes:
+        lines (int): the number of non blank lines parsed
+        malformed (int): the number of lines quarantined as malformed
+        pings (int): the number of pings checked by the cleaning stage
+        kept (int): the number of pings passed on by the cleaning stage
+        duplicates_dropped (int): the number of pings dropped because they share the timestamp of a data ping
+        duplicates_merged (int): the number of pings averaged into a data ping with the same timestamp
+        regressions_clamped (int): the number of pings moved forward to the distance of the previous ping
+        regressions_dropped (int): the number of pings dropped because they are behind the previous ping
+        unmeshable_dropped (int): the number of pings dropped because their stop could not be meshed with them
+    """
+
+    __slots__ = ('lines', 'malformed', 'pings', 'kept', 'duplicates_dropped', 'duplicates_merged',
+                 'regressions_clamped', 'regressions_dropped', 'unmeshable_dropped')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def to_dict(self) -> dict:
+        """
+        Gets the counters as a dictionary
+
+        Returns:
+            dict: a dictionary where the keys are the counter names
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class PingCleaner:
+    """
+    Validates and cleans pings in a single streaming pass before the speed graph is built, so that one bad ping does
+    not stop a whole batch
+
+    Malformed lines, and invalid pings such as negative distances, are written to a quarantine file as json lines with
+    the line number, the reason and the original line, instead of raising. The time ordered pings are then cleaned
+    with a single ping of lookahead:
+
+    - duplicate timestamps: a ping sharing the timestamp of a 'DEPARTURE' or 'MIDPATH' ping would form an edge of zero
+      duration, which divides by zero. An 'ARRIVAL' ping or a ping of another stop_id replaces the earlier ping, as it
+      carries the stop transition. Otherwise the later ping is dropped, or with the 'merge' policy the distances of
+      'MIDPATH' pings are averaged. A 'DEPARTURE' distance is never averaged.
+    - distance regressions: a ping closer to its stop than the previous ping of the same stop, e.g. a GPS back-step
+      from 60 to 59 meters, forms an edge of negative speed. It is clamped to the previous distance, which gives an edge
+      of zero speed, or dropped with the 'drop' policy. 'ARRIVAL' pings define the stop lengths, so they are always
+      clamped rather than dropped.
+    - unmeshable stops: a ping at the distance of the first ping of its stop, when that distance is above 0, would form
+      the first edge of the stop with a speed of 0, which a segment boundary lands on. An 'ARRIVAL' without a data ping
+      of its stop just before it would give the stop a length but no edge reaching it, and the pings of a stop left
+      for another stop before its 'ARRIVAL' would continue its edges from elsewhere. These pings are dropped.
+
+    After cleaning, every stop with an 'ARRIVAL' can be meshed: its edges up to its first 'ARRIVAL' have a positive
+    duration, run from one ping of the stop to the next without moving backwards, and an edge of zero speed only
+    follows an edge which already reaches its distance.
+
+    Attributes:
+        duplicates (str): the duplicate timestamp policy, 'drop' or 'merge'
+        regressions (str): the distance regression policy, 'clamp' or 'drop'
+        quarantine_path (Optional[str]): the location of the quarantine file, created on the first malformed line. When
+            None, malformed lines are only counted
+        counters (CleaningCounters): the counts of the records changed so far
+    """
+
+    def __init__(self, duplicates: str = 'drop', regressions: str = 'clamp', quarantine_path: Optional[str] = None):
+
+        # validate input
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError("Duplicates policy must be one of " + ", ".join(DUPLICATE_POLICIES))
+        if regressions not in REGRESSION_POLICIES:
+            raise ValueError("Regressions policy must be one of " + ", ".join(REGRESSION_POLICIES))
+
+        self.duplicates = duplicates
+        self.regressions = regressions
+        self.quarantine_path = quarantine_path
+        self.counters = CleaningCounters()
+
+        self._quarantine_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Closes the quarantine file
+        """
+        if self._quarantine_file is not None:
+            self._quarantine_file.close()
+            self._quarantine_file = None
+
+    def parse_lines(self, lines: Iterable[str]) -> Iterator[Ping]:
+        """
+        Parses json ping lines, quarantining the malformed ones and skipping blank lines
+
+        Args:
+            lines (Iterable[str]): the lines of a ping file
+
+        Returns:
+            Iterator[Ping]: the valid pings, in line order
+        """
+        for line_number, line in enumerate(lines, 1):
+            ping = self.parse_line(line, line_number)
+            if ping is not None:
+                yield ping
+
+    def parse_line(self, line: str, line_number: int) -> Optional[Ping]:
+        """
+        Parses a json ping line, quarantining it when it is malformed
+
+        Args:
+            line (str): the json line
+            line_number (int): the 1-based line number, for the quarantine file
+
+        Returns:
+            Optional[Ping]: the ping, or None when the line is blank or malformed
+        """
+        if not line.strip():
+            return None
+        self.counters.lines += 1
+
+        try:
+            ping = Ping.from_json(line)
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            self.quarantine(line_number, line, "unparsable line: " + repr(error))
+            return None
+
+        reason = get_invalid_reason(ping)
+        if reason is not None:
+            self.quarantine(line_number, line, reason)
+            return None
+
+        ping.distance_from_stop = float(ping.distance_from_stop)
+        return ping
+
+    def read_ping_array(self, file_path: str) -> PingArray:
+        """
+        Reads a ping file into a PingArray with the bulk parser, quarantining the malformed lines
+
+        Args:
+            file_path (str): the location of the ping file, optionally gzip, bz2 or xz compressed
+
+        Returns:
+            PingArray: the pings of the valid lines, in file order
+        """
+        ping_array = PingArray.from_file(file_path, errors='skip')
+        self.counters.lines += len(ping_array) + len(ping_array.malformed_lines)
+        for line_number, line in ping_array.malformed_lines:
+            self.quarantine(line_number, line, "malformed ping line", str(file_path))
+        return ping_array
+
+    def quarantine(self, line_number: Optional[int], line: str, reason: str, file_path: Optional[str] = None):
+        """
+        Counts a malformed record and writes it to the quarantine file
+
+        Args:
+            line_number (Optional[int]): the 1-based line number of the record, or None when it was not read from a
+                file
+            line (str): the malformed record
+            reason (str): why the record was rejected
+            file_path (Optional[str]): the location of the file of the record, when several files are read
+        """
+        self.counters.malformed += 1
+        if self.quarantine_path is None:
+            return
+        if self._quarantine_file is None:
+            self._quarantine_file = open(self.quarantine_path, "w")
+        record = {'lineNumber': line_number, 'reason': reason, 'line': line.rstrip('\r\n')}
+        if file_path is not None:
+            record['file'] = file_path
+        self._quarantine_file.write(json.dumps(record) + "\n")
+
+    def clean(self, pings: Iterable[Ping]) -> Iterator[Ping]:
+        """
+        Removes the duplicate timestamps and distance regressions of a time ordered series of pings, see the class
+        description. The pings given are not modified, changed pings are new Ping class objects.
+
+        Args:
+            pings (Iterable[Ping]): the pings in ascending timestamp order
+
+        Returns:
+            Iterator[Ping]: the cleaned pings in ascending timestamp order
+        """
+        counters = self.counters
+        pending, pending_count = None, 1
+        previous, previous_starts_run = None, True
+        arrived_stop_ids, left_stop_ids = set(), set()
+
+        for ping in pings:
+            counters.pings += 1
+
+            # quarantine the invalid pings of sources other than parse_lines
+            reason = get_invalid_reason(ping)
+            if reason is not None:
+                self.quarantine(None, json.dumps(
+                    [ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop], default=str), reason)
+                continue
+
+            # resolve a ping which would form an edge of zero duration with the pending data ping
+            if pending is not None and ping.timestamp == pending.timestamp and pending.ping_type in DATA_PING_TYPES:
+                if ping.ping_type != 'ARRIVAL' and ping.stop_id == pending.stop_id:
+                    distance = None
+                    if self.duplicates == 'merge' and pending.ping_type == ping.ping_type == 'MIDPATH':
+
+                        # average the distances, without moving behind the previous ping of the stop
+                        distance = (pending.distance_from_stop * pending_count + ping.distance_from_stop) / (
+                            pending_count + 1)
+                        if _is_same_run(previous, ping):
+                            distance = max(distance, previous.distance_from_stop)
+                            if _is_stalled(previous, previous_starts_run, distance):
+                                distance = None
+
+                    if distance is None:
+                        counters.duplicates_dropped += 1
+                    else:
+                        pending = Ping(pending.timestamp, pending.stop_id, pending.ping_type, distance)
+                        pending_count += 1
+                        counters.duplicates_merged += 1
+                    continue
+
+                # the later ping carries the stop transition, so it replaces the pending ping
+                counters.duplicates_dropped += 1
+                pending = None
+
+            if pending is not None:
+                counters.kept += 1
+                yield pending
+
+                # a stop left for another stop before its 'ARRIVAL' is not continued
+                if previous is not None and previous.stop_id != pending.stop_id and \
+                        previous.stop_id not in arrived_stop_ids:
+                    left_stop_ids.add(previous.stop_id)
+                if pending.ping_type == 'ARRIVAL':
+                    arrived_stop_ids.add(pending.stop_id)
+                previous, previous_starts_run, pending = pending, not _is_same_run(previous, pending), None
+
+            # drop a ping of a stop left before its 'ARRIVAL', or an 'ARRIVAL' without a data ping of its stop before it
+            same_run = _is_same_run(previous, ping)
+            if ping.stop_id in left_stop_ids or (
+                    ping.ping_type == 'ARRIVAL' and not same_run and ping.stop_id not in arrived_stop_ids):
+                counters.unmeshable_dropped += 1
+                continue
+
+            # clamp or drop a ping behind the previous ping of the same stop
+            if same_run:
+                distance = ping.distance_from_stop
+                if distance < previous.distance_from_stop:
+                    if self.regressions == 'drop' and ping.ping_type != 'ARRIVAL':
+                        counters.regressions_dropped += 1
+                        continue
+                    distance = previous.distance_from_stop
+
+                # drop a ping which would form the first edge of its stop with a speed of 0
+                if _is_stalled(previous, previous_starts_run, distance):
+                    counters.unmeshable_dropped += 1
+                    continue
+
+                if distance != ping.distance_from_stop:
+                    ping = Ping(ping.timestamp, ping.stop_id, ping.ping_type, distance)
+                    counters.regressions_clamped += 1
+
+            pending, pending_count = ping, 1
+
+        if pending is not None:
+            counters.kept += 1
+            yield pending
+
+
+def _is_same_run(previous: Optional[Ping], ping: Ping) -> bool:
+    """
+    Checks whether a ping continues the run of pings towards the same stop as the previous ping
+    """
+    return previous is not None and previous.stop_id == ping.stop_id and previous.ping_type != 'ARRIVAL'
+
+
+def _is_stalled(previous: Ping, previous_starts_run: bool, distance: float) -> bool:
+    """
+    Checks whether a ping at a distance would form the first edge of the run of the previous ping with a speed of 0,
+    away from the stop, so that the first segment boundary would be interpolated on it
+    """
+    return previous_starts_run and distance == previous.distance_from_stop > 0
+
+
+def get_invalid_reason(ping: Ping) -> Optional[str]:
+    """
+    Checks the field values of a ping
+
+    Args:
+        ping (Ping): the ping
+
+    Returns:
+        Optional[str]: why the ping is invalid, or None when it is valid
+    """
+    if not isinstance(ping.timestamp, int) or isinstance(ping.timestamp, bool):
+        return "timestamp must be an integer"
+    if not isinstance(ping.stop_id, str):
+        return "stopId must be a string"
+    if ping.ping_type not in _PING_TYPES:
+        return "pingType must be one of " + ", ".join(_PING_TYPES)
+    distance = ping.distance_from_stop
+    if not isinstance(distance, (int, float)) or isinstance(distance, bool) or not math.isfinite(distance) or \
+            distance < 0:
+        return "distanceFromStop must be a finite number at or above 0"
+    return None
@@ -0,0 +1,167 @@
+import bz2
+import gzip
+import lzma
+import os
+import queue
+import threading
+from typing import BinaryIO, Iterator, Optional
+
+# the compressions of ping files, by file extension
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.lzma': 'xz'}
+
+# the leading bytes of each compressed file format
+MAGIC_NUMBERS = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'))
+
+# the openers of each compression, in binary read mode
+_OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+# the number of decompressed bytes read by the reader thread at a time
+READ_SIZE = 1 << 20
+
+# the number of blocks of lines buffered between the reader thread and the parser
+QUEUE_SIZE = 8
+
+# the marker of the end of the file on the queue
+_END = object()
+
+
+def detect_compression(file_path: str) -> Optional[str]:
+    """
+    Detects the compression of a ping file from its leading bytes, or from its extension when they are inconclusive,
+    e.g. for an empty file
+
+    Args:
+        file_path (str): the location of the ping file
+
+    Returns:
+        Optional[str]: 'gzip', 'bz2' or 'xz', or None when the file is not compressed
+    """
+    with open(file_path, "rb") as file:
+        header = file.read(6)
+    for magic_number, compression in MAGIC_NUMBERS:
+        if header.startswith(magic_number):
+            return compression
+    if header:
+        return None
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(os.fspath(file_path))[1].lower())
+
+
+def strip_compression_extension(file_path: str) -> str:
+    """
+    Removes the compression extension of a file path, e.g. bus_1.jsonl.gz becomes bus_1.jsonl
+
+    Args:
+        file_path (str): the location of the ping file
+
+    Returns:
+        str: the file path without its compression extension
+    """
+    root, extension = os.path.splitext(os.fspath(file_path))
+    return root if extension.lower() in COMPRESSION_EXTENSIONS else os.fspath(file_path)
+
+
+def open_ping_file(file_path: str) -> BinaryIO:
+    """
+    Opens a ping file in binary read mode, decompressing it transparently when it is gzip, bz2 or xz compressed
+
+    Args:
+        file_path (str): the location of the ping file
+
+    Returns:
+        BinaryIO: the decompressed stream of the file
+    """
+    compression = detect_compression(file_path)
+    return _OPENERS[compression](file_path, "rb") if compression else open(file_path, "rb")
+
+
+def iter_line_blocks(file_path: str, read_size: int = READ_SIZE, queue_size: int = QUEUE_SIZE) -> Iterator[bytes]:
+    """
+    Yields the decompressed ping lines of a file in blocks of whole lines, read ahead by a background thread
+
+    The reader thread decompresses the file and splits it at line ends while the caller parses the previous blocks.
+    The blocks are handed over through a bounded queue, so the thread stops reading when the parser falls behind. The
+    zlib, bz2 and lzma decompressors release the GIL, so decompression overlaps with the parsing. Errors of the reader
+    thread, such as a missing or corrupted file, are raised by the iterator. The thread stops when the iterator is
+    exhausted or closed.
+
+    Args:
+        file_path (str): the location of the ping file, optionally gzip, bz2 or xz compressed
+        read_size (int): the number of decompressed bytes read at a time
+        queue_size (int): the number of blocks buffered ahead of the caller
+
+    Returns:
+        Iterator[bytes]: the blocks of newline separated lines, in file order. The last block does not end with a
+            newline when the file does not
+    """
+    blocks = queue.Queue(queue_size)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+
+        # wait for room in the queue, giving up when the iterator is closed
+        while not stopped.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            pending = b''
+            with open_ping_file(file_path) as file:
+                while True:
+                    block = file.read(read_size)
+                    if not block:
+                        break
+
+                    # hand over the whole lines, keeping the partial last line for the next block
+                    block = pending + block
+                    cut = block.rfind(b'\n') + 1
+                    pending = block[cut:]
+                    if cut and not put(block[:cut]):
+                        return
+            if pending and not put(pending):
+                return
+            put(_END)
+        except BaseException as error:
+            put(error)
+
+    reader = threading.Thread(target=read, name="speedmap-reader", daemon=True)
+    reader.start()
+    try:
+        while True:
+            block = blocks.get()
+            if block is _END:
+                return
+            if isinstance(block, BaseException):
+                raise block
+            yield block
+    finally:
+        stopped.set()
+        reader.join()
+
+
+def iter_lines(file_path: str, read_size: int = READ_SIZE, queue_size: int = QUEUE_SIZE) -> Iterator[str]:
+    """
+    Yields the decoded lines of a ping file, without their line ends, read ahead by a background thread, see
+    `iter_line_blocks`. Lines end at '\\n' only, with a trailing '\\r' removed, so characters such as '\\u2028' or
+    '\\x85' within a json string do not split its line
+
+    Args:
+        file_path (str): the location of the ping file, optionally gzip, bz2 or xz compressed
+        read_size (int): the number of decompressed bytes read at a time
+        queue_size (int): the number of blocks buffered ahead of the caller
+
+    Returns:
+        Iterator[str]: the lines of the file, in file order
+    """
+    for block in iter_line_blocks(file_path, read_size, queue_size):
+        lines = block.decode().split('\n')
+
+        # a block ends with a line end, except the last line of a file without a final line end
+        if not lines[-1]:
+            lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith('\r') else line
@@ -0,0 +1,111 @@
+from array import array
+from typing import Iterable, Union
+from speedmap.ping import Ping
+from speedmap.ping_array import ARRIVAL, PingArray
+from speedmap.speed_graph import SpeedGraph
+from speedmap.speed_graph_edge import DATA_PING_TYPES
+
+
+def get_compressed_speed_graph(ping_list: Union[Iterable[Ping], PingArray], tolerance: float = 0.0) -> SpeedGraph:
+    """
+    Gets a speed graph representation of the pings, as `BusOnRoute._get_speed_graph`, where each run of consecutive
+    edges with nearly the same speed is merged into a single edge
+
+    Dense feeds, such as one ping per second on a steady stretch of road, give long runs of edges with the same speed,
+    which are stored and walked one by one when meshing. Consecutive edges of the same stop_id, where each edge starts
+    at the ping the previous edge ends at, are merged while their speeds are above 0 and the highest speed of the run is
+    at most (1 + tolerance) times the lowest. The merged edge ends at the last ping of the run, and its speed is the
+    distance over the time of the whole run, so the graph still passes through the time and distance of every ping at
+    the ends of the runs. Edges with a speed at or below 0 are never merged.
+
+    With a tolerance of 0, only runs of exactly equal speeds are merged and the merged edge keeps that speed, so the
+    unrounded segment speeds are the same as from the uncompressed graph up to floating point rounding. The rounding
+    differs because the times of the segment boundaries within a run are interpolated back from the last ping of the
+    run instead of from the ping ending their own edge, so a segment speed on a tie of the rounding to 0.1
+    meters/second, e.g. 3.45, may round the other way. With a tolerance above 0, the time to travel any part of a run
+    uses the run speed instead of the speeds of its edges, which are all within a factor of (1 + tolerance) of each
+    other and of the run speed. The time of every segment, which is a sum of such parts, is therefore within that
+    factor too, so for a stop whose distances only increase, every unrounded segment speed is within a relative error
+    of the tolerance, i.e. `|compressed - exact| <= tolerance * exact`, before the rounding to 0.1 meters/second.
+
+    Args:
+        ping_list (Union[Iterable[Ping], PingArray]): the pings in ascending timestamp order
+        tolerance (float): the largest relative difference between the speeds of the edges of a run, where 0 merges
+            only equal speeds
+
+    Returns:
+        SpeedGraph: A mapping where the keys are stop_id, and the values are the merged speed graph edges for the
+            relevant stop_id key
+
+    Raises:
+        ValueError: raised when the tolerance is negative
+        ZeroDivisionError: raised when a data ping and the next ping have the same timestamp
+    """
+
+    # validate input
+    if not tolerance >= 0:
+        raise ValueError("Tolerance must not be negative")
+    ratio = 1 + tolerance
+
+    # read the timestamp, stop_id, whether the ping starts an edge, and the distance of each ping
+    if isinstance(ping_list, PingArray):
+        stop_ids = ping_list.stop_ids
+        rows = zip(
+            ping_list.timestamps,
+            (stop_ids[code] for code in ping_list.stop_id_codes),
+            (code != ARRIVAL for code in ping_list.ping_type_codes),
+            ping_list.distances)
+    else:
+        rows = ((ping.timestamp, ping.stop_id, ping.ping_type in DATA_PING_TYPES, ping.distance_from_stop)
+                for ping in ping_list)
+
+    # the edge columns of each stop_id, in order of first appearance
+    columns_by_stop_id = {}
+
+    # the stop_id, start distance, start time, lowest and highest edge speed of the run ending at the previous ping
+    run = None
+    previous = next(rows, None)
+
+    for row in rows:
+        timestamp, _, _, distance = row
+        previous_timestamp, stop_id, is_data, previous_distance = previous
+        previous = row
+
+        # add the stop_id to the graph if not already there
+        columns = columns_by_stop_id.get(stop_id)
+        if columns is None:
+            columns = columns_by_stop_id[stop_id] = (array('d'), array('d'), array('q'))
+
+        # ignore any pair of pings where the first ping is an 'ARRIVAL' type
+        if not is_data:
+            run = None
+            continue
+
+        speed = (distance - previous_distance) / (timestamp - previous_timestamp) * 1000
+
+        # extend the run ending at the previous ping while the speeds stay within the tolerance
+        if run is not None and run[0] == stop_id and speed > 0 and \
+                max(run[4], speed) <= min(run[3], speed) * ratio:
+            run = (stop_id, run[1], run[2], min(run[3], speed), max(run[4], speed))
+            # the speed of a run of equal speeds is kept as is, rather than recomputed from the ends of the run
+            if tolerance:
+                columns[0][-1] = (distance - run[1]) / (timestamp - run[2]) * 1000
+            columns[1][-1] = distance
+            columns[2][-1] = timestamp
+            continue
+
+        # otherwise start a new edge, which may start a run
+        columns[0].append(speed)
+        columns[1].append(distance)
+        columns[2].append(timestamp)
+        run = (stop_id, previous_distance, previous_timestamp, speed, speed) if speed > 0 else None
+
+    # concatenate the columns of each stop_id
+    offsets, speeds, distance_ends, time_ends = array('q', [0]), array('d'), array('d'), array('q')
+    for stop_speeds, stop_distance_ends, stop_time_ends in columns_by_stop_id.values():
+        speeds.extend(stop_speeds)
+        distance_ends.extend(stop_distance_ends)
+        time_ends.extend(stop_time_ends)
+        offsets.append(len(speeds))
+
+    return SpeedGraph(columns_by_stop_id.keys(), offsets, speeds, distance_ends, time_ends)
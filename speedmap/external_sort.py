@@ -0,0 +1,193 @@
+import heapq
+import os
+import pickle
+import re
+import tempfile
+from json import loads
+from typing import Iterator, List, Optional
+from speedmap.compressed_input import iter_lines, open_ping_file
+from speedmap.ping import Ping
+
+# the default memory budget of a sort, in bytes
+DEFAULT_MEMORY_BUDGET = 256 << 20
+
+# the estimated memory of a parsed ping while it is sorted, in bytes, including its Ping object, values and references
+BYTES_PER_PING = 256
+
+# the largest number of spill files merged at once, larger sorts merge their spill files in several passes
+MAX_MERGE_FAN_IN = 64
+
+# the timestamp of a ping line in the canonical field order, which is read without json.loads
+_TIMESTAMP_PATTERN = re.compile(rb'^\{ *"timestamp": *(-?\d+) *,')
+
+
+def get_timestamp(line: bytes) -> int:
+    """
+    Gets the timestamp of a json ping line, without parsing the other fields when the line is in the canonical order
+
+    Args:
+        line (bytes): a json ping line
+
+    Returns:
+        int: the timestamp of the ping, in epoch time (milliseconds)
+
+    Raises:
+        KeyError: raised when the line has no timestamp
+    """
+    match = _TIMESTAMP_PATTERN.match(line)
+    if match is not None:
+        return int(match.group(1))
+    return loads(line)["timestamp"]
+
+
+def is_sorted_file(file_path: str, skip_malformed: bool = False) -> bool:
+    """
+    Checks whether the pings of a json lines ping file are in ascending timestamp order, reading one line at a time
+
+    Args:
+        file_path (str): the location of the ping file
+        skip_malformed (bool): when True, lines without a readable timestamp are ignored instead of raising
+
+    Returns:
+        bool: True when every ping is at or after the previous ping
+    """
+    previous_timestamp = None
+    with open_ping_file(file_path) as file:
+        for line in file:
+            try:
+                timestamp = get_timestamp(line)
+            except (ValueError, KeyError, TypeError):
+                if skip_malformed:
+                    continue
+                raise
+            if previous_timestamp is not None and timestamp < previous_timestamp:
+                return False
+            previous_timestamp = timestamp
+    return True
+
+
+def iter_sorted_pings(
+        file_path: str,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        temp_dir: Optional[str] = None,
+        cleaner=None) -> Iterator[Ping]:
+    """
+    Yields the pings of a json lines ping file of any size in ascending timestamp order, with the memory bounded by a
+    budget rather than by the size of the file
+
+    A file which is already sorted is streamed as is. Otherwise the file is read in runs of as many pings as fit in
+    the budget, each run is sorted in memory and spilled to a temporary file, and the spill files are merged. Pings with
+    equal timestamps keep their file order, as with the in-memory sort of `BusOnRoute.from_file`. The spill files are
+    removed when the iterator is exhausted or closed.
+
+    Args:
+        file_path (str): the location of the ping file
+        memory_budget (int): the approximate memory available to the sort, in bytes
+        temp_dir (str): the directory of the spill files, defaults to the system temporary directory
+        cleaner (PingCleaner): when given, the lines are parsed by the cleaner, which quarantines the malformed ones,
+            see `speedmap.cleaning.PingCleaner.parse_lines`
+
+    Returns:
+        Iterator[Ping]: the pings in ascending timestamp order
+
+    Raises:
+        ValueError: raised when the memory budget is not positive
+        KeyError: raised when a line is missing fields of the Ping class
+    """
+
+    # validate input
+    if memory_budget <= 0:
+        raise ValueError("Memory budget must be greater than 0")
+
+    def parse_pings() -> Iterator[Ping]:
+        if cleaner is not None:
+            return cleaner.parse_lines(iter_lines(file_path))
+        return (Ping.from_json(line) for line in iter_lines(file_path))
+
+    # stream a sorted file without sorting it
+    if is_sorted_file(file_path, skip_malformed=cleaner is not None):
+        yield from parse_pings()
+        return
+
+    run_size = max(1, memory_budget // BYTES_PER_PING)
+
+    # write the spill files in batches which fit in the budget while the largest number of them are merged at once
+    batch_size = max(1, run_size // MAX_MERGE_FAN_IN)
+
+    with tempfile.TemporaryDirectory(prefix="speedmap-sort-", dir=temp_dir) as directory:
+        run_paths = []
+
+        # sort each run of pings in memory and spill it
+        run = []
+        for ping in parse_pings():
+            run.append(ping)
+            if len(run) >= run_size:
+                run_paths.append(_spill_run(run, directory, len(run_paths), batch_size))
+                run = []
+        if run or not run_paths:
+            run_paths.append(_spill_run(run, directory, len(run_paths), batch_size))
+            run = []
+
+        # merge consecutive spill files until they can be merged at once, which keeps equal timestamps in file order
+        merge_pass = 0
+        while len(run_paths) > MAX_MERGE_FAN_IN:
+            merge_pass += 1
+            merged_paths = []
+            for start in range(0, len(run_paths), MAX_MERGE_FAN_IN):
+                group = run_paths[start:start + MAX_MERGE_FAN_IN]
+                merged_path = os.path.join(directory, "merge-%d-%d" % (merge_pass, len(merged_paths)))
+                with open(merged_path, "wb") as file:
+                    _write_batches(_merge_runs(group), file, batch_size)
+                for run_path in group:
+                    os.remove(run_path)
+                merged_paths.append(merged_path)
+            run_paths = merged_paths
+
+        for timestamp, stop_id, ping_type, distance_from_stop in _merge_runs(run_paths):
+            yield Ping(timestamp, stop_id, ping_type, distance_from_stop)
+
+
+def _spill_run(run: List[Ping], directory: str, index: int, batch_size: int) -> str:
+    """
+    Sorts a run of pings by timestamp and writes it to a spill file as pickled batches of ping tuples
+    """
+    run.sort(key=lambda x: x.timestamp)
+    run_path = os.path.join(directory, "run-%d" % index)
+    with open(run_path, "wb") as file:
+        _write_batches(
+            ((ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop) for ping in run), file, batch_size)
+    return run_path
+
+
+def _write_batches(rows, file, batch_size: int):
+    """
+    Writes ping tuples to a spill file as pickled lists of at most batch_size tuples
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+            batch = []
+    if batch:
+        pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+
+
+def _read_batches(run_path: str):
+    """
+    Yields the ping tuples of a spill file, holding a single batch in memory
+    """
+    with open(run_path, "rb") as file:
+        while True:
+            try:
+                batch = pickle.load(file)
+            except EOFError:
+                return
+            yield from batch
+
+
+def _merge_runs(run_paths: List[str]):
+    """
+    Merges the ping tuples of sorted spill files by timestamp, taking equal timestamps from the earlier file first
+    """
+    return heapq.merge(*[_read_batches(run_path) for run_path in run_paths], key=lambda row: row[0])
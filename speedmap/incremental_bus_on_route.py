@@ -0,0 +1,382 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from speedmap.mesh import mesh_stop_python, validate_segment_length
+from speedmap.ping import Ping
+from speedmap.segment import Segment
+from speedmap.speed_graph_edge import SpeedGraphEdge, get_speed_graph_edge
+
+# the changes of a speed map after pings are inserted: the new or changed segments, and the (stop_id, segment_index)
+# of the segments which no longer exist
+SpeedMapDiff = namedtuple('SpeedMapDiff', ['updated', 'removed'])
+
+# the number of pings of a block of the timeline, which is split in two once it holds twice as many
+BLOCK_SIZE = 512
+
+
+class PingTimeline:
+    """
+    Keeps pings sorted by their (timestamp, insertion sequence) keys in a list of sorted blocks of bounded size
+
+    A ping is found by bisecting the last keys of the blocks and then the keys of its block, in O(log n). Inserting or
+    removing a ping moves the rest of its block only, O(log n + BLOCK_SIZE) instead of the O(n) splice of a single
+    sorted list, and the list of blocks, which is BLOCK_SIZE times shorter, is spliced only when a block is split or
+    emptied.
+    """
+
+    def __init__(self):
+        self._keys: List[List[Tuple[int, int]]] = []
+        self._pings: List[List[Ping]] = []
+        self._maxes: List[Tuple[int, int]] = []
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Ping]:
+        for pings in self._pings:
+            yield from pings
+
+    def insert(self, key: Tuple[int, int], ping: Ping) -> Tuple[Optional[Tuple[int, int]], Optional[Ping]]:
+        """
+        Inserts a ping after every ping of a lower key
+
+        Args:
+            key (Tuple[int, int]): the sort key of the ping, which must not be in the timeline
+            ping (Ping): the ping
+
+        Returns:
+            Tuple[Optional[Tuple[int, int]], Optional[Ping]]: the key and ping just before the inserted ping, or None
+                and None when it is the first ping
+        """
+        if not self._maxes:
+            self._keys.append([key])
+            self._pings.append([ping])
+            self._maxes.append(key)
+            self._length = 1
+            return None, None
+
+        # the first block ending after the key, or the last block for a key after every ping
+        block = min(bisect_right(self._maxes, key), len(self._maxes) - 1)
+        keys, pings = self._keys[block], self._pings[block]
+        position = bisect_right(keys, key)
+        keys.insert(position, key)
+        pings.insert(position, ping)
+        self._maxes[block] = keys[-1]
+        self._length += 1
+
+        if position:
+            previous = keys[position - 1], pings[position - 1]
+        elif block:
+            previous = self._keys[block - 1][-1], self._pings[block - 1][-1]
+        else:
+            previous = None, None
+
+        # split a full block in two
+        if len(keys) >= 2 * BLOCK_SIZE:
+            self._keys[block:block + 1] = [keys[:BLOCK_SIZE], keys[BLOCK_SIZE:]]
+            self._pings[block:block + 1] = [pings[:BLOCK_SIZE], pings[BLOCK_SIZE:]]
+            self._maxes[block:block + 1] = [keys[BLOCK_SIZE - 1], keys[-1]]
+
+        return previous
+
+    def remove(self, key: Tuple[int, int]) -> Ping:
+        """
+        Removes the ping of a key
+
+        Args:
+            key (Tuple[int, int]): the sort key of a ping of the timeline
+
+        Returns:
+            Ping: the removed ping
+        """
+        block, position = self._locate(key)
+        keys, pings = self._keys[block], self._pings[block]
+        del keys[position]
+        ping = pings.pop(position)
+        self._length -= 1
+
+        if keys:
+            self._maxes[block] = keys[-1]
+        else:
+            del self._keys[block], self._pings[block], self._maxes[block]
+        return ping
+
+    def get_with_next(self, key: Tuple[int, int]) -> Tuple[Ping, Optional[Ping]]:
+        """
+        Gets the ping of a key and the ping following it
+
+        Args:
+            key (Tuple[int, int]): the sort key of a ping of the timeline
+
+        Returns:
+            Tuple[Ping, Optional[Ping]]: the ping, and the next ping or None when it is the last ping
+        """
+        block, position = self._locate(key)
+        pings = self._pings[block]
+        if position + 1 < len(pings):
+            return pings[position], pings[position + 1]
+        if block + 1 < len(self._pings):
+            return pings[position], self._pings[block + 1][0]
+        return pings[position], None
+
+    def _locate(self, key: Tuple[int, int]) -> Tuple[int, int]:
+        """
+        Finds the block of the ping of a key and its position within the block
+        """
+        block = bisect_left(self._maxes, key)
+        return block, bisect_left(self._keys[block], key)
+
+
+class IncrementalBusOnRoute:
+    """
+    Represents a single bus on a single route whose pings may arrive late or out of order, keeping its speed map up to
+    date as each ping is inserted
+
+    The pings are kept sorted by timestamp, with pings of equal timestamps in insertion order, as the stable sort of
+    `BusOnRoute.from_file` keeps them in file order. Inserting a ping finds its position by bisection and only marks
+    the stop_ids whose edges it changes as dirty: its own stop_id and the stop_id of the ping before it. The edges of a
+    dirty stop_id are kept up to its first changed ping and rebuilt from there, and its segments are meshed again only
+    from the first segment whose boundaries depend on a changed edge. When every stop is complete, the speed map is the
+    same as that of `BusOnRoute.get_speed_map` over the sorted pings.
+
+    Inserting a ping into the PingTimeline is O(log n + BLOCK_SIZE) for n pings. Updating a dirty stop_id of k pings,
+    whose first changed ping is followed by m pings of the stop_id, takes O(k) to copy its unchanged edges and keys,
+    O(m log n) to rebuild the edges after it, and the meshing of its remaining segments. A late ping near the end of
+    its stop_id, the usual case, therefore rebuilds few edges, while a ping at the start of a long stop_id rebuilds
+    all of them.
+
+    A stop_id is meshed once its first 'ARRIVAL' ping is known. Until its edges reach its length, e.g. while some of
+    its pings are still missing, it is incomplete and has no segments.
+
+    Attributes:
+        segment_length (float): a user defined length for a speed map segment, in meters
+    """
+
+    def __init__(self, segment_length: float, pings: Iterable[Ping] = ()):
+
+        # validate input
+        validate_segment_length(segment_length)
+
+        self.segment_length = segment_length
+
+        # the pings in time order, by (timestamp, insertion sequence) sort keys
+        self._timeline = PingTimeline()
+        self._sequence = 0
+
+        # the sort keys of the pings of each stop_id, and the derived state of each stop_id, where the edge keys are
+        # the sort keys of the pings starting each edge
+        self._stop_keys: Dict[str, List[Tuple[int, int]]] = {}
+        self._edges: Dict[str, List[SpeedGraphEdge]] = {}
+        self._edge_keys: Dict[str, List[Tuple[int, int]]] = {}
+        self._reach: Dict[str, List[float]] = {}
+        self._arrival_keys: Dict[str, Tuple[int, int]] = {}
+        self._stop_lengths: Dict[str, float] = {}
+        self._segments: Dict[str, List[Segment]] = {}
+        self._incomplete_stop_ids: Set[str] = set()
+
+        self.add_pings(pings)
+
+    @property
+    def ping_list(self) -> List[Ping]:
+        """
+        Gets the pings sorted by ascending timestamp
+
+        Returns:
+            List[Ping]: a copy of the sorted pings
+        """
+        return list(self._timeline)
+
+    @property
+    def incomplete_stop_ids(self) -> List[str]:
+        """
+        Gets the stop_ids with an 'ARRIVAL' ping whose edges do not reach their length yet
+
+        Returns:
+            List[str]: the incomplete stop_ids
+        """
+        return sorted(self._incomplete_stop_ids)
+
+    def add_ping(self, ping: Ping) -> SpeedMapDiff:
+        """
+        Inserts a ping at its place in time and updates the segments of the stop_ids it affects
+
+        Args:
+            ping (Ping): the ping, at any timestamp
+
+        Returns:
+            SpeedMapDiff: the new or changed segments and the keys of the removed segments
+
+        Raises:
+            ValueError: if the ping forms an edge of zero duration with a neighbouring ping, in which case it is not
+                inserted
+        """
+        return self.add_pings([ping])
+
+    def add_pings(self, pings: Iterable[Ping]) -> SpeedMapDiff:
+        """
+        Inserts a batch of pings at their places in time, then updates the segments of every stop_id they affect once
+
+        Args:
+            pings (Iterable[Ping]): the pings, in any order
+
+        Returns:
+            SpeedMapDiff: the new or changed segments and the keys of the removed segments
+
+        Raises:
+            ValueError: if a ping forms an edge of zero duration with a neighbouring ping, in which case none of the
+                batch is inserted
+        """
+
+        # splice each ping into the time series and mark the stop_ids whose edges change, from the sort key of their
+        # first ping whose edge changes: the inserted ping, and the ping before it whose next ping is now the inserted
+        inserted_keys, first_changed_keys = [], {}
+        for ping in pings:
+            key = (ping.timestamp, self._sequence)
+            self._sequence += 1
+            previous_key, previous_ping = self._timeline.insert(key, ping)
+            insort(self._stop_keys.setdefault(ping.stop_id, []), key)
+            inserted_keys.append(key)
+
+            for stop_id, changed_key in ((ping.stop_id, key), (getattr(previous_ping, 'stop_id', None), previous_key)):
+                if changed_key is not None and (
+                        stop_id not in first_changed_keys or changed_key < first_changed_keys[stop_id]):
+                    first_changed_keys[stop_id] = changed_key
+
+        # rebuild the edges of the dirty stop_ids before changing any state, so a rejected batch can be removed
+        try:
+            stop_states = {
+                stop_id: self._get_stop_state(stop_id, first_changed_key)
+                for stop_id, first_changed_key in first_changed_keys.items()}
+        except ZeroDivisionError:
+            for key in inserted_keys:
+                stop_keys = self._stop_keys[self._timeline.remove(key).stop_id]
+                del stop_keys[bisect_left(stop_keys, key)]
+            raise ValueError("Pings must not share a timestamp with a neighbouring ping of a speed graph edge")
+
+        updated, removed = [], []
+        for stop_id in sorted(first_changed_keys):
+            stop_updated, stop_removed = self._update_stop(stop_id, *stop_states[stop_id])
+            updated.extend(stop_updated)
+            removed.extend(stop_removed)
+
+        return SpeedMapDiff(updated, removed)
+
+    def get_speed_map(self) -> List[Segment]:
+        """
+        Gets the segments of every complete stop_id, in order of their first 'ARRIVAL' pings
+
+        Returns:
+            List[Segment]: a list containing Segment class objects
+        """
+        stop_ids = sorted(self._segments.keys(), key=self._arrival_keys.__getitem__)
+        return [segment for stop_id in stop_ids for segment in self._segments[stop_id]]
+
+    def _get_stop_state(self, stop_id: str, first_changed_key: Tuple[int, int]) -> tuple:
+        """
+        Rebuilds the speed graph edges of a stop_id from its first changed ping, from its pings and the ping following
+        each of them, keeping the edges of the pings before it
+
+        Returns:
+            tuple: the edges, the running maximum of their end distances, the sort keys of the pings starting them,
+                the length and sort key of the first 'ARRIVAL' ping, and the number of edges kept
+
+        Raises:
+            ZeroDivisionError: raised when an edge has zero duration
+        """
+
+        # keep the edges starting before the first changed ping
+        old_edge_keys = self._edge_keys.get(stop_id, [])
+        unchanged = bisect_left(old_edge_keys, first_changed_key)
+        edges = self._edges.get(stop_id, [])[:unchanged]
+        reach = self._reach.get(stop_id, [])[:unchanged]
+        edge_keys = old_edge_keys[:unchanged]
+        furthest = reach[-1] if reach else float('-inf')
+
+        # keep the first 'ARRIVAL' ping when it is before the first changed ping, as no earlier one was inserted
+        stop_length, arrival_key = None, self._arrival_keys.get(stop_id)
+        if arrival_key is not None and arrival_key < first_changed_key:
+            stop_length = self._stop_lengths[stop_id]
+        else:
+            arrival_key = None
+
+        stop_keys = self._stop_keys[stop_id]
+        for key in stop_keys[bisect_left(stop_keys, first_changed_key):]:
+            ping, next_ping = self._timeline.get_with_next(key)
+
+            # only the first 'ARRIVAL' of a stop_id defines its length, as in BusOnRoute
+            if ping.ping_type == 'ARRIVAL' and arrival_key is None:
+                stop_length, arrival_key = ping.distance_from_stop, key
+
+            if next_ping is not None:
+                edge = get_speed_graph_edge(ping, next_ping)
+                if edge is not None:
+                    edges.append(edge)
+                    furthest = max(furthest, edge.distance_end)
+                    reach.append(furthest)
+                    edge_keys.append(key)
+
+        return edges, reach, edge_keys, stop_length, arrival_key, unchanged
+
+    def _update_stop(
+            self,
+            stop_id: str,
+            edges: List[SpeedGraphEdge],
+            reach: List[float],
+            edge_keys: List[Tuple[int, int]],
+            stop_length: Optional[float],
+            arrival_key: Optional[Tuple[int, int]],
+            unchanged: int) -> Tuple[List[Segment], List[Tuple[str, int]]]:
+        """
+        Stores the rebuilt edges of a stop_id and meshes its segments again from the first segment which depends on a
+        changed edge
+
+        Returns:
+            Tuple[List[Segment], List[Tuple[str, int]]]: the new or changed segments and the keys of the removed
+                segments of the stop_id
+        """
+        old_edges = self._edges.get(stop_id, [])
+        old_segments = self._segments.get(stop_id, [])
+        old_stop_length = self._stop_lengths.get(stop_id)
+
+        self._edges[stop_id], self._reach[stop_id], self._edge_keys[stop_id] = edges, reach, edge_keys
+        if arrival_key is None:
+            self._stop_lengths.pop(stop_id, None)
+            self._arrival_keys.pop(stop_id, None)
+        else:
+            self._stop_lengths[stop_id], self._arrival_keys[stop_id] = stop_length, arrival_key
+
+        # the segments which end within the edges before the first changed edge are kept as they are
+        first_segment_index = 0
+        if stop_length is not None and stop_length == old_stop_length:
+            changed = unchanged
+            while changed < min(len(edges), len(old_edges)) and edges[changed] == old_edges[changed]:
+                changed += 1
+            if changed:
+                # one segment less, so a segment end rounded differently from the division is never kept
+                first_segment_index = max(0, min(len(old_segments), int(reach[changed - 1] // self.segment_length) - 1))
+
+        # mesh the remaining segments, resuming from the first edge reaching past the start of the first segment
+        segments = old_segments[:first_segment_index]
+        self._incomplete_stop_ids.discard(stop_id)
+        if stop_length is not None:
+            try:
+                segments.extend(mesh_stop_python(
+                    stop_id, stop_length, edges, self.segment_length, first_segment_index,
+                    bisect_right(reach, first_segment_index * self.segment_length)))
+            except (IndexError, ZeroDivisionError):
+                segments = []
+                self._incomplete_stop_ids.add(stop_id)
+
+        if stop_length is None or stop_id in self._incomplete_stop_ids:
+            self._segments.pop(stop_id, None)
+        else:
+            self._segments[stop_id] = segments
+
+        # compare the new segments with the old ones
+        updated = [
+            segment for segment in segments[first_segment_index:]
+            if segment.segment_index >= len(old_segments) or old_segments[segment.segment_index] != segment]
+        removed = [(stop_id, segment_index) for segment_index in range(len(segments), len(old_segments))]
+
+        return updated, removed
@@ -0,0 +1,227 @@
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+from collections import namedtuple
+from speedmap import vectorized
+from speedmap.segment import Segment, round_speed
+from speedmap.segment_array import SegmentArray
+
+# the meshing engines which may be selected when computing a speed map
+ENGINES = ('python', 'numpy')
+
+
+def mesh_speed_graph(
+        stop_lengths: Dict[str, float],
+        speed_graph: Dict[str, Iterable[namedtuple]],
+        segment_length: float,
+        engine: str = 'python',
+        compact: bool = False) -> Union[List[Segment], SegmentArray]:
+    """
+    Applies a uniform segment mesh to the speed graph of every stop_id, in the order of the stop lengths
+
+    Args:
+        stop_lengths (Dict[str, float]): the total distance of each stop_id, in meters
+        speed_graph (Dict[str, Iterable[namedtuple]]): the speed graph edges of each stop_id
+        segment_length (float): a user defined length for a speed map segment, in meters
+        engine (str): the meshing engine, either 'python' or 'numpy'. The 'numpy' engine falls back to 'python'
+            when NumPy is not installed
+        compact (bool): when True, the segments are returned in a SegmentArray of typed columns
+
+    Returns:
+        Union[List[Segment], SegmentArray]: a list containing Segment class objects, or a SegmentArray when compact
+
+    Raises:
+        ValueError: if the engine is not a known meshing engine
+    """
+
+    # validate the engine and resolve the per stop meshing function
+    if engine not in ENGINES:
+        raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+    vectorize = engine == 'numpy' and vectorized.HAS_NUMPY
+    mesh_stop = vectorized.mesh_stop if vectorize else mesh_stop_python
+
+    # write the segments of each stop straight into typed columns
+    if compact:
+        segment_array = SegmentArray()
+        for stop_id in stop_lengths.keys():
+            if vectorize:
+                segment_lengths, segment_speeds = vectorized.mesh_stop_columns(
+                    stop_lengths[stop_id], speed_graph[stop_id], segment_length)
+                segment_array.extend_stop(
+                    stop_id, segment_lengths.tolist(), [round_speed(speed) for speed in segment_speeds.tolist()])
+            else:
+                segment_array.extend(
+                    mesh_stop_python(stop_id, stop_lengths[stop_id], speed_graph[stop_id], segment_length))
+        return segment_array
+
+    # initialize results set
+    speed_map_segments = []
+
+    # iterate over each stop_id
+    for stop_id in stop_lengths.keys():
+        speed_map_segments.extend(
+            mesh_stop(stop_id, stop_lengths[stop_id], speed_graph[stop_id], segment_length))
+
+    return speed_map_segments
+
+
+def mesh_stop_python(
+        stop_id: str,
+        stop_length: float,
+        speed_graph_for_stop: Iterable[namedtuple],
+        segment_length: float,
+        first_segment_index: int = 0,
+        first_edge_index: int = 0) -> List[Segment]:
+    """
+    Applies a uniform segment mesh to the speed graph edges of a single stop_id by walking the edges one by one
+
+    Args:
+        stop_id (str): surrogate identifier of the bus stop
+        stop_length (float): the total distance of the stop_id, in meters
+        speed_graph_for_stop (Iterable[namedtuple]): the speed graph edges of the stop_id
+        segment_length (float): a user defined length for a speed map segment, in meters
+        first_segment_index (int): the index of the first segment to mesh, to resume a mesh part way
+        first_edge_index (int): the index of the edge to start walking from, see `walk_segment_boundaries`
+
+    Returns:
+        List[Segment]: a list containing the Segment class objects of the stop_id, from the first segment index
+    """
+
+    speed_map_segments = []
+
+    for segment_index, segment_distance_start, segment_distance_end, segment_time_start, segment_time_end in \
+            walk_segment_boundaries(
+                stop_length, speed_graph_for_stop, segment_length, first_segment_index, first_edge_index):
+
+        # great! now we can use dx/dt = v to calculate the speed of this segment
+        speed = (segment_distance_end - segment_distance_start) / (segment_time_end - segment_time_start)
+
+        # convert result to a speed map segment object
+        speed_map_segment = Segment(
+            stop_id=stop_id,
+            segment_index=segment_index,
+            segment_length=segment_distance_end - segment_distance_start,
+            speed=round_speed(speed))
+
+        # add to results set
+        speed_map_segments.append(speed_map_segment)
+
+    return speed_map_segments
+
+
+def walk_segment_boundaries(
+        stop_length: float,
+        speed_graph_for_stop: Iterable[namedtuple],
+        segment_length: float,
+        first_segment_index: int = 0,
+        first_edge_index: int = 0) -> Iterator[Tuple[int, float, float, float, float]]:
+    """
+    Walks the speed graph edges of a single stop_id one by one, interpolating the time at the start and end of each
+    segment of a uniform mesh
+
+    Args:
+        stop_length (float): the total distance of the stop_id, in meters
+        speed_graph_for_stop (Iterable[namedtuple]): the speed graph edges of the stop_id
+        segment_length (float): a user defined length for a speed map segment, in meters
+        first_segment_index (int): the index of the first segment to walk, to resume a mesh part way
+        first_edge_index (int): the index of the edge to start walking from. Every edge before it must end at or
+            before the start of the first segment, so the walk finds the same edges as from the first edge
+
+    Returns:
+        Iterator[Tuple[int, float, float, float, float]]: the segment index, start and end distances in meters, and
+            start and end times in seconds of each segment
+    """
+
+    # initialize target data for while loop and indexes
+    segment_time_start, segment_time_end = None, None
+    speed_graph_of_stop_index, segment_index = first_edge_index, first_segment_index
+    speed_graph_edge = None
+
+    # iterate over segments within a stop_id
+    while segment_index * segment_length < stop_length:
+
+        # get the next edge on the speed graph, once per edge as a long edge may span many segments
+        if speed_graph_edge is None:
+            speed_graph_edge = speed_graph_for_stop[speed_graph_of_stop_index]
+
+        # determine the start and end distances of the current segment
+        segment_distance_start = segment_index * segment_length
+        segment_distance_end = segment_distance_start + segment_length if\
+            segment_distance_start + segment_length <= stop_length else stop_length
+
+        # figure out if the current segment start is before the end of the current speed graph edge
+        if speed_graph_edge.distance_end > segment_distance_start and segment_time_start is None:
+
+            # linearly interpolate the time at the start of the segment using
+            # dx/dt = (d2-d1)/(t2-t1) = v, rearranged to find t1: t1 = t2 - (d2 - d1)/v
+            # and include conversion from milliseconds to seconds
+            segment_time_start = speed_graph_edge.time_end / 1000 \
+                - (speed_graph_edge.distance_end - segment_distance_start) / speed_graph_edge.speed
+
+        # figure out if the current segment end is at or before the end of the current speed graph edge.
+        if speed_graph_edge.distance_end >= segment_distance_end and segment_time_end is None:
+
+            # linearly interpolate the time at the end of the segment
+            segment_time_end = speed_graph_edge.time_end / 1000 \
+                - (speed_graph_edge.distance_end - segment_distance_end) / speed_graph_edge.speed
+
+        # check if we have both segment start and end times computed
+        if segment_time_start is not None and segment_time_end is not None:
+
+            yield segment_index, segment_distance_start, segment_distance_end, segment_time_start, segment_time_end
+
+            # reinitialize the segment times, increment the segment index
+            segment_time_start, segment_time_end = None, None
+            segment_index += 1
+        else:
+            # if we haven't found both segment start and end times, increment to the next speed graph edge
+            speed_graph_of_stop_index += 1
+            speed_graph_edge = None
+
+
+def get_segment_boundaries(
+        stop_length: float,
+        speed_graph_for_stop: Iterable[namedtuple],
+        segment_length: float,
+        engine: str = 'python') -> Tuple[List[float], List[float], List[float], List[float]]:
+    """
+    Gets the start and end distances and the unrounded start and end times of every segment of a single stop_id
+
+    Args:
+        stop_length (float): the total distance of the stop_id, in meters
+        speed_graph_for_stop (Iterable[namedtuple]): the speed graph edges of the stop_id
+        segment_length (float): a user defined length for a speed map segment, in meters
+        engine (str): the meshing engine, either 'python' or 'numpy'
+
+    Returns:
+        Tuple[List[float], List[float], List[float], List[float]]: the start distances, end distances, start times
+            and end times of the segments, in meters and seconds
+    """
+
+    if engine == 'numpy' and vectorized.HAS_NUMPY:
+        return tuple(column.tolist() for column in vectorized.mesh_stop_boundaries(
+            stop_length, speed_graph_for_stop, segment_length))
+
+    boundaries = ([], [], [], [])
+    for _, *values in walk_segment_boundaries(stop_length, speed_graph_for_stop, segment_length):
+        for column, value in zip(boundaries, values):
+            column.append(value)
+
+    return boundaries
+
+
+def validate_segment_length(segment_length: float):
+    """
+    Validates a user defined segment length
+
+    Args:
+        segment_length (float): a user defined length for a speed map segment, in meters
+
+    Raises:
+        ValueError: if the segment length is invalid (less than 0)
+        TypeError: if the segment length cannot be parsed to a value
+    """
+    if segment_length <= 0:
+        raise ValueError("Segment length must be greater than 0")
+    try:
+        float(segment_length)
+    except TypeError:
+        raise TypeError("Segment length must be numeric")
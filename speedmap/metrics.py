@@ -0,0 +1,203 @@
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional
+
+
+class PhaseRecord:
+    """
+    Represents the measurements of a processing phase, accumulated over every time the phase ran
+
+    Attributes:
+        name (str): the name of the phase, e.g. 'parse', 'sort', 'graph' or 'mesh'
+        calls (int): the number of times the phase ran
+        seconds (float): the total wall time of the phase, in seconds
+        items (int): the total number of items the phase produced, e.g. pings, edges or segments
+        peak_memory (int): the largest memory allocated by python during a run of the phase on top of the memory
+            allocated when it started, in bytes, or None when memory is not traced
+    """
+
+    __slots__ = ('name', 'calls', 'seconds', 'items', 'peak_memory')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.items = 0
+        self.peak_memory = None
+
+    def to_dict(self) -> Dict:
+        """
+        Gets a dictionary of the attributes of the record
+        """
+        return {attribute: getattr(self, attribute) for attribute in self.__slots__}
+
+
+class Phase:
+    """
+    Measures a single run of a phase as a context manager, the items it produced are set on its items attribute
+    """
+
+    __slots__ = ('metrics', 'name', 'items', '_start', '_start_memory')
+
+    def __init__(self, metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+        self.items = 0
+
+    def __enter__(self):
+        if self.metrics.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.metrics._started_tracing = True
+            tracemalloc.reset_peak()
+            self._start_memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self._start
+        peak_memory = None
+        if self.metrics.trace_memory:
+            peak_memory = max(0, tracemalloc.get_traced_memory()[1] - self._start_memory)
+        self.metrics.record(self.name, seconds, self.items, peak_memory)
+
+
+class PhaseMetrics:
+    """
+    Records the wall time, item counts and optionally the peak memory of each processing phase
+
+    Attributes:
+        records (Dict[str, PhaseRecord]): the records of the phases, in the order they first ran
+        trace_memory (bool): when True, the peak memory of each phase is traced with tracemalloc, which slows down
+            every allocation while tracing
+        callback (Callable[[PhaseRecord, float], None]): an optional function called after each run of a phase with
+            its record and the wall time of the run, e.g. to forward the measurements to a monitoring system
+    """
+
+    enabled = True
+
+    def __init__(self, trace_memory: bool = False, callback: Optional[Callable[[PhaseRecord, float], None]] = None):
+
+        self.records = {}
+        self.trace_memory = trace_memory
+        self.callback = callback
+
+        self._started_tracing = False
+
+    def phase(self, name: str) -> Phase:
+        """
+        Gets a context manager measuring a run of a phase
+
+        Args:
+            name (str): the name of the phase
+
+        Returns:
+            Phase: the context manager, on which the number of items produced by the phase can be set
+        """
+        return Phase(self, name)
+
+    def record(self, name: str, seconds: float, items: int = 0, peak_memory: Optional[int] = None):
+        """
+        Adds the measurements of a run of a phase to its record
+
+        Args:
+            name (str): the name of the phase
+            seconds (float): the wall time of the run, in seconds
+            items (int): the number of items produced by the run
+            peak_memory (int): the peak memory of the run, in bytes, or None when memory is not traced
+        """
+        record = self.records.get(name)
+        if record is None:
+            record = self.records[name] = PhaseRecord(name)
+
+        record.calls += 1
+        record.seconds += seconds
+        record.items += items
+        if peak_memory is not None:
+            record.peak_memory = peak_memory if record.peak_memory is None else max(record.peak_memory, peak_memory)
+
+        if self.callback is not None:
+            self.callback(record, seconds)
+
+    def close(self):
+        """
+        Stops tracing memory allocations if the tracing was started by these metrics
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def format_report(self) -> str:
+        """
+        Gets a human readable table of the phase records with their share of the total wall time
+
+        Returns:
+            str: the table, one line per phase followed by the total
+        """
+        total = sum(record.seconds for record in self.records.values())
+        lines = ['%-10s %6s %12s %7s %12s %14s' % ('phase', 'calls', 'seconds', 'share', 'items', 'peak memory')]
+
+        for record in self.records.values():
+            lines.append('%-10s %6d %12.6f %6.1f%% %12d %14s' % (
+                record.name, record.calls, record.seconds, 100 * record.seconds / total if total else 0.0,
+                record.items, '-' if record.peak_memory is None else _format_bytes(record.peak_memory)))
+
+        lines.append('%-10s %6s %12.6f' % ('total', '', total))
+        return '\n'.join(lines)
+
+
+class NullPhase:
+    """
+    A phase context manager which measures nothing
+    """
+
+    __slots__ = ('items',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class NullMetrics:
+    """
+    Metrics which record nothing, used when instrumentation is disabled. Every phase shares a single context manager,
+    so a disabled phase costs a method call and an empty with statement.
+    """
+
+    enabled = False
+    records = {}
+
+    _phase = NullPhase()
+
+    def phase(self, name: str) -> NullPhase:
+        """
+        Gets the shared context manager which measures nothing
+        """
+        return self._phase
+
+    def record(self, name: str, seconds: float, items: int = 0, peak_memory: Optional[int] = None):
+        """
+        Discards the measurements of a run of a phase
+        """
+
+    def close(self):
+        """
+        Does nothing, as no memory is traced
+        """
+
+
+# the shared metrics of objects created without metrics
+NULL_METRICS = NullMetrics()
+
+
+def _format_bytes(size: int) -> str:
+    """
+    Formats a number of bytes with a binary unit
+    """
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return '%.1f %s' % (size, unit) if unit != 'B' else '%d B' % size
+        size /= 1024
+    return '%.1f GiB' % size
@@ -0,0 +1,189 @@
+import os
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from speedmap import vectorized
+from speedmap.mesh import ENGINES, mesh_speed_graph, mesh_stop_python
+from speedmap.segment import Segment, round_speed
+from speedmap.segment_array import SegmentArray
+from speedmap.speed_graph import SpeedGraph, SpeedGraphEdges
+
+# the number of stop chunks given to each worker, so that stops with many segments are balanced between workers
+CHUNKS_PER_WORKER = 4
+
+# the state of a worker process, set by _initialize_worker
+_worker = {}
+
+
+def mesh_speed_graph_parallel(
+        stop_lengths: Dict[str, float],
+        speed_graph: Dict[str, Iterable[namedtuple]],
+        segment_length: float,
+        workers: Optional[int] = None,
+        engine: str = 'python',
+        compact: bool = False,
+        chunk_size: Optional[int] = None) -> Union[List[Segment], SegmentArray]:
+    """
+    Applies a uniform segment mesh to the speed graph of every stop_id in a pool of worker processes, in the order of
+    the stop lengths
+
+    The speed graph columns are copied once into a shared memory block which every worker maps, so only the stop
+    indexes of each chunk are sent to the workers and only the segment lengths and speeds are sent back. The chunks
+    are collected in order, so the segments are the same, in the same order and with the same segment length types,
+    as those of `mesh_speed_graph`.
+
+    Args:
+        stop_lengths (Dict[str, float]): the total distance of each stop_id, in meters
+        speed_graph (Dict[str, Iterable[namedtuple]]): the speed graph edges of each stop_id, or a SpeedGraph
+        segment_length (float): a user defined length for a speed map segment, in meters
+        workers (Optional[int]): the number of worker processes, defaults to the number of CPUs. A single worker
+            meshes the stops serially in the calling process
+        engine (str): the meshing engine of each worker, either 'python' or 'numpy'
+        compact (bool): when True, the segments are returned in a SegmentArray of typed columns
+        chunk_size (Optional[int]): the number of stops meshed per task, defaults to an even split of the stops over
+            CHUNKS_PER_WORKER tasks per worker
+
+    Returns:
+        Union[List[Segment], SegmentArray]: a list containing Segment class objects, or a SegmentArray when compact
+
+    Raises:
+        ValueError: if the number of workers or the engine is invalid
+        KeyError: if a stop_id of the stop lengths has no speed graph edges
+    """
+
+    # validate input
+    if engine not in ENGINES:
+        raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+    workers = workers if workers is not None else os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("Workers must be at least 1")
+
+    stop_ids = list(stop_lengths.keys())
+    if workers == 1 or len(stop_ids) <= 1:
+        return mesh_speed_graph(stop_lengths, speed_graph, segment_length, engine=engine, compact=compact)
+
+    # pack the speed graph into columns and locate the edges of each stop, in the order of the stop lengths
+    if not isinstance(speed_graph, SpeedGraph):
+        speed_graph = SpeedGraph.from_edges(speed_graph)
+    edge_ranges = array('q')
+    for stop_id in stop_ids:
+        edge_ranges.extend(speed_graph.get_edge_range(stop_id))
+
+    # split the stops in contiguous chunks
+    if chunk_size is None:
+        chunk_size = -(-len(stop_ids) // (workers * CHUNKS_PER_WORKER))
+    chunks = [(start, min(start + chunk_size, len(stop_ids))) for start in range(0, len(stop_ids), chunk_size)]
+
+    shared_memory, layout = _share_columns(
+        edge_ranges, speed_graph.time_ends, speed_graph.speeds, speed_graph.distance_ends)
+    try:
+        with ProcessPoolExecutor(
+                max_workers=min(workers, len(chunks)),
+                initializer=_initialize_worker,
+                initargs=(shared_memory.name, layout, [stop_lengths[stop_id] for stop_id in stop_ids], segment_length,
+                          engine)) as executor:
+
+            # collect the segments of each chunk in order, keeping the segment lengths as meshed, e.g. int lengths
+            # of an int segment length, rather than reading them back from a float column
+            segments = SegmentArray() if compact else []
+            for (start, end), (counts, segment_lengths, speeds) in zip(
+                    chunks, executor.map(_mesh_chunk, chunks)):
+                offset = 0
+                for stop_id, count in zip(stop_ids[start:end], counts):
+                    stop_segment_lengths = segment_lengths[offset:offset + count]
+                    stop_speeds = speeds[offset:offset + count]
+                    if compact:
+                        segments.extend_stop(stop_id, stop_segment_lengths, stop_speeds)
+                    else:
+                        segments.extend(
+                            Segment(stop_id=stop_id, segment_index=segment_index, segment_length=length, speed=speed)
+                            for segment_index, (length, speed) in enumerate(zip(stop_segment_lengths, stop_speeds)))
+                    offset += count
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+    return segments
+
+
+def _share_columns(*columns) -> Tuple[SharedMemory, List[Tuple[str, int, int]]]:
+    """
+    Copies 8 byte typed columns one after the other into a new shared memory block
+
+    Returns:
+        Tuple[SharedMemory, List[Tuple[str, int, int]]]: the shared memory block and the type code, byte offset and
+            length of each column
+    """
+    layout, offset = [], 0
+    for column in columns:
+        view = memoryview(column)
+        layout.append((view.format, offset, len(view)))
+        offset += view.nbytes
+
+    shared_memory = SharedMemory(create=True, size=max(1, offset))
+    for column, (_, offset, length) in zip(columns, layout):
+        data = memoryview(column).cast('B')
+        shared_memory.buf[offset:offset + len(data)] = data
+
+    return shared_memory, layout
+
+
+def _initialize_worker(
+        shared_memory_name: str,
+        layout: List[Tuple[str, int, int]],
+        stop_lengths: List[float],
+        segment_length: float,
+        engine: str):
+    """
+    Attaches a worker process to the shared speed graph columns
+    """
+    _worker['shared_memory'] = SharedMemory(name=shared_memory_name)
+    _worker['layout'] = layout
+    _worker['stop_lengths'] = stop_lengths
+    _worker['segment_length'] = segment_length
+    _worker['engine'] = engine
+
+
+def _mesh_chunk(chunk: Tuple[int, int]) -> Tuple[List[int], List[float], array]:
+    """
+    Meshes a contiguous chunk of stops in a worker process
+
+    Returns:
+        Tuple[List[int], List[float], array]: the number of segments of each stop, and the lengths and rounded
+            speeds of the segments of every stop one after the other, where the lengths keep their type
+    """
+    start, end = chunk
+    stop_lengths, segment_length = _worker['stop_lengths'], _worker['segment_length']
+    vectorize = _worker['engine'] == 'numpy' and vectorized.HAS_NUMPY
+
+    counts, segment_lengths, speeds = [], [], array('d')
+
+    # map the columns for the duration of the chunk only, so that the shared memory can be closed at exit
+    buffer = _worker['shared_memory'].buf
+    edge_ranges, time_ends, edge_speeds, distance_ends = [
+        buffer[offset:offset + length * 8].cast(type_code) for type_code, offset, length in _worker['layout']]
+
+    for index in range(start, end):
+        edge_start, edge_end = edge_ranges[2 * index], edge_ranges[2 * index + 1]
+        edges = SpeedGraphEdges(
+            None, edge_speeds[edge_start:edge_end], distance_ends[edge_start:edge_end],
+            time_ends[edge_start:edge_end])
+
+        if vectorize:
+            stop_segment_lengths, stop_speeds = vectorized.mesh_stop_columns(
+                stop_lengths[index], edges, segment_length)
+            segment_lengths.extend(stop_segment_lengths.tolist())
+            speeds.extend(round_speed(speed) for speed in stop_speeds.tolist())
+            counts.append(len(stop_speeds))
+        else:
+            segments = mesh_stop_python(None, stop_lengths[index], edges, segment_length)
+            segment_lengths.extend(segment.segment_length for segment in segments)
+            speeds.extend(segment.speed for segment in segments)
+            counts.append(len(segments))
+
+        del edges
+
+    del edge_ranges, time_ends, edge_speeds, distance_ends, buffer
+    return counts, segment_lengths, speeds
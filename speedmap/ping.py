@@ -36,7 +36,22 @@ class Ping:
         """
 
         # convert json string to dictionary
-        input_dict = loads(json_input_string)
+        return cls.from_dict(loads(json_input_string))
+
+    @classmethod
+    def from_dict(cls, input_dict: dict):
+        """
+        Instantiates a new Ping class object from a deserialized json object
+
+        Args:
+            input_dict (dict): a dictionary with the json field names of the Ping class
+
+        Returns:
+             a Ping class object
+
+        Raises:
+            KeyError: raised when the dictionary is missing fields in Ping class object definition
+        """
 
         # assign each key a value
         timestamp = input_dict["timestamp"]
@@ -45,4 +60,25 @@ class Ping:
         distance_from_stop = input_dict["distanceFromStop"]
 
         # instantiate ping object
-        return Ping(timestamp, stop_id, ping_type, distance_from_stop)
+        return cls(timestamp, stop_id, ping_type, distance_from_stop)
+
+
+class SlottedPing:
+    """
+    Represents a single data ping like Ping, with `__slots__` instead of an instance dictionary, for code which keeps
+    many pings as objects rather than in a PingArray
+
+    Attributes:
+        timestamp (int): time the data was recorded, in epoch time (milliseconds)
+        stop_id (str): surrogate identifier of the related bus stop
+        ping_type (str): a human readable operating mode of bus operation during the ping:
+            values include 'DEPARTURE', 'MIDPATH', 'ARRIVAL'
+        distance_from_stop (float): distance from the bus stop when the ping was recorded, in meters
+    """
+
+    __slots__ = ('timestamp', 'stop_id', 'ping_type', 'distance_from_stop')
+
+    # the methods of Ping only set and create instances of their class, so they are shared
+    __init__ = Ping.__init__
+    from_json = vars(Ping)['from_json']
+    from_dict = vars(Ping)['from_dict']
@@ -0,0 +1,374 @@
+import re
+import sys
+from array import array
+from json import loads
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from speedmap.compressed_input import iter_line_blocks
+from speedmap.ping import Ping
+from speedmap.speed_graph import SpeedGraph
+
+# the ping types and their small integer codes
+PING_TYPES = ('DEPARTURE', 'MIDPATH', 'ARRIVAL')
+DEPARTURE, MIDPATH, ARRIVAL = range(len(PING_TYPES))
+_PING_TYPE_CODES = {ping_type.encode(): code for code, ping_type in enumerate(PING_TYPES)}
+
+# a ping line in the canonical field order written by the ping feed, which is parsed without json.loads
+_PING_LINE_PATTERN = re.compile(
+    rb'^\{ *"timestamp": *(-?\d+), *"stopId": *"([^"\\\n]*)", *"pingType": *"(DEPARTURE|MIDPATH|ARRIVAL)",'
+    rb' *"distanceFromStop": *(-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?) *\}\r?$',
+    re.MULTILINE)
+
+# the column types which are used as is, without copying
+_COLUMN_TYPES = (array, memoryview)
+
+
+class PingFormatError(ValueError):
+    """
+    Raised when a line of a ping file cannot be parsed into a ping
+
+    Attributes:
+        line_number (int): the 1-based number of the malformed line in the file
+        line (str): the malformed line
+    """
+
+    def __init__(self, line_number: int, line: str, reason: str):
+        super().__init__("Malformed ping on line " + str(line_number) + ": " + reason)
+        self.line_number = line_number
+        self.line = line
+
+
+class PingArray:
+    """
+    Represents a series of pings as contiguous typed columns rather than Ping class objects
+
+    Attributes:
+        timestamps (array): time each ping was recorded, in epoch time (milliseconds), as int64
+        stop_id_codes (array): index of the stop_id of each ping in `stop_ids`, as int32
+        ping_type_codes (array): index of the ping type of each ping in `PING_TYPES`, as int8
+        distances (array): distance from the bus stop of each ping, in meters, as float64
+        stop_ids (List[str]): the interned stop_ids referenced by `stop_id_codes`
+        is_sorted (Optional[bool]): whether the pings are known to be in ascending timestamp order, or None when unknown
+        malformed_lines (List[Tuple[int, str]]): the line number and content of each skipped malformed line
+    """
+
+    def __init__(
+            self,
+            timestamps: Iterable[int] = (),
+            stop_id_codes: Iterable[int] = (),
+            ping_type_codes: Iterable[int] = (),
+            distances: Iterable[float] = (),
+            stop_ids: Iterable[str] = (),
+            is_sorted: Optional[bool] = None):
+
+        # typed arrays and memory views, such as memory-mapped columns, are kept without a copy
+        self.timestamps = timestamps if isinstance(timestamps, _COLUMN_TYPES) else array('q', timestamps)
+        self.stop_id_codes = stop_id_codes if isinstance(stop_id_codes, _COLUMN_TYPES) else array('i', stop_id_codes)
+        self.ping_type_codes = ping_type_codes if isinstance(ping_type_codes, _COLUMN_TYPES) \
+            else array('b', ping_type_codes)
+        self.distances = distances if isinstance(distances, _COLUMN_TYPES) else array('d', distances)
+        self.stop_ids = list(stop_ids)
+        self.malformed_lines: List[Tuple[int, str]] = []
+
+        self._is_sorted = is_sorted
+        self._stop_id_codes_by_value: Dict[bytes, int] = {
+            stop_id.encode(): code for code, stop_id in enumerate(self.stop_ids)}
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PingArray(
+                self.timestamps[index],
+                self.stop_id_codes[index],
+                self.ping_type_codes[index],
+                self.distances[index],
+                self.stop_ids)
+        return Ping(
+            self.timestamps[index],
+            self.stop_ids[self.stop_id_codes[index]],
+            PING_TYPES[self.ping_type_codes[index]],
+            self.distances[index])
+
+    def __iter__(self) -> Iterator[Ping]:
+        stop_ids = self.stop_ids
+        for timestamp, stop_id_code, ping_type_code, distance in zip(
+                self.timestamps, self.stop_id_codes, self.ping_type_codes, self.distances):
+            yield Ping(timestamp, stop_ids[stop_id_code], PING_TYPES[ping_type_code], distance)
+
+    @classmethod
+    def from_pings(cls, pings: Iterable[Ping]):
+        """
+        Packs Ping class objects into typed columns
+
+        Args:
+            pings (Iterable[Ping]): the pings to pack
+
+        Returns:
+            a PingArray class object, in the order of the pings
+
+        Raises:
+            ValueError: raised when a ping type is unknown
+        """
+        ping_array = PingArray()
+        for ping in pings:
+            ping_array.append(ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop)
+        return ping_array
+
+    @classmethod
+    def from_file(cls, file_path: str, chunk_size: int = 1 << 22, errors: str = 'raise'):
+        """
+        Reads a ping file in large chunks directly into typed columns, without a json.loads or Ping object per line
+
+        Lines in the canonical field order are parsed with a single regular expression pass over each chunk, other
+        lines fall back to json.loads. Compressed files are decompressed on a reader thread while the previous chunks
+        are parsed, see `speedmap.compressed_input.iter_line_blocks`.
+
+        Args:
+            file_path (str): the location of the raw input file containing a series of Pings, optionally gzip, bz2 or
+                xz compressed
+            chunk_size (int): the number of decompressed bytes read from the file at a time
+            errors (str): 'raise' to raise on the first malformed line, or 'skip' to record malformed lines in
+                `malformed_lines` and continue
+
+        Returns:
+            a PingArray class object, in file order
+
+        Raises:
+            PingFormatError: raised when a line is malformed and errors is 'raise'
+            ValueError: raised when errors is not 'raise' or 'skip'
+        """
+
+        if errors not in ('raise', 'skip'):
+            raise ValueError("Errors must be one of raise, skip")
+
+        ping_array = PingArray()
+        line_number = 1
+
+        # parse the chunks of whole lines handed over by the reader thread
+        for chunk in iter_line_blocks(file_path, chunk_size):
+            line_number = ping_array._extend_from_lines(chunk, line_number, errors)
+
+        return ping_array
+
+    @classmethod
+    def concatenate(cls, ping_arrays: Iterable['PingArray']):
+        """
+        Joins the columns of several ping arrays, such as the ping files of one bus over several days
+
+        Args:
+            ping_arrays (Iterable[PingArray]): the ping arrays to join, in order
+
+        Returns:
+            a PingArray class object with the pings of every ping array, in order
+        """
+        ping_array = PingArray()
+        for other in ping_arrays:
+
+            # translate the stop_id codes of each array to the codes of the joined array
+            codes = [ping_array._get_stop_id_code(stop_id.encode()) for stop_id in other.stop_ids]
+            ping_array.timestamps.extend(other.timestamps)
+            ping_array.stop_id_codes.extend([codes[code] for code in other.stop_id_codes])
+            ping_array.ping_type_codes.extend(other.ping_type_codes)
+            ping_array.distances.extend(other.distances)
+            ping_array.malformed_lines.extend(other.malformed_lines)
+
+        return ping_array
+
+    def sort_by_timestamp(self):
+        """
+        Gets the pings sorted by ascending timestamp, keeping the file order of equal timestamps
+
+        Returns:
+            a PingArray class object, which is this object when the pings are already sorted
+        """
+
+        if self.is_sorted():
+            return self
+
+        timestamps = self.timestamps
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        sorted_array = PingArray(
+            array('q', [timestamps[i] for i in order]),
+            array('i', [self.stop_id_codes[i] for i in order]),
+            array('b', [self.ping_type_codes[i] for i in order]),
+            array('d', [self.distances[i] for i in order]),
+            self.stop_ids,
+            is_sorted=True)
+        sorted_array.malformed_lines = self.malformed_lines
+
+        return sorted_array
+
+    def is_sorted(self) -> bool:
+        """
+        Gets whether the pings are in ascending timestamp order
+
+        Returns:
+            bool: True when every timestamp is at or after the previous timestamp
+        """
+        if self._is_sorted is None:
+            timestamps = self.timestamps
+            self._is_sorted = all(timestamps[i] <= timestamps[i + 1] for i in range(len(timestamps) - 1))
+        return self._is_sorted
+
+    def get_stop_lengths(self) -> Dict[str, float]:
+        """
+        Gets a dictionary containing the total distance between each stop, as `BusOnRoute._get_stop_lengths`
+
+        Returns:
+            Dict[str, float]: A dictionary where keys are stop_id and values are the total distance to the next stop_id,
+                in meters
+        """
+
+        stop_lengths_by_code = {}
+
+        for stop_id_code, ping_type_code, distance in zip(self.stop_id_codes, self.ping_type_codes, self.distances):
+            if ping_type_code == ARRIVAL and stop_id_code not in stop_lengths_by_code:
+                stop_lengths_by_code[stop_id_code] = distance
+
+        return {self.stop_ids[code]: length for code, length in stop_lengths_by_code.items()}
+
+    def get_speed_graph(self) -> SpeedGraph:
+        """
+        Gets a speed graph representation of the pings, as `BusOnRoute._get_speed_graph`, with the edges held in
+        contiguous typed columns
+
+        Returns:
+            SpeedGraph: A mapping where the keys are stop_id, and the values are the speed graph edges for the relevant
+                stop_id key
+        """
+
+        # the edge columns of each stop_id code, in order of first appearance
+        columns_by_code = {}
+        timestamps, distances, stop_id_codes, ping_type_codes = \
+            self.timestamps, self.distances, self.stop_id_codes, self.ping_type_codes
+
+        for i in range(len(timestamps) - 1):
+
+            # add the stop_id to the graph if not already there
+            columns = columns_by_code.get(stop_id_codes[i])
+            if columns is None:
+                columns = columns_by_code[stop_id_codes[i]] = (array('d'), array('d'), array('q'))
+
+            # ignore any pair of pings where the first ping is an 'ARRIVAL' type
+            if ping_type_codes[i] != ARRIVAL:
+                columns[0].append((distances[i + 1] - distances[i]) / (timestamps[i + 1] - timestamps[i]) * 1000)
+                columns[1].append(distances[i + 1])
+                columns[2].append(timestamps[i + 1])
+
+        # concatenate the columns of each stop_id
+        offsets, speeds, distance_ends, time_ends = array('q', [0]), array('d'), array('d'), array('q')
+        for stop_speeds, stop_distance_ends, stop_time_ends in columns_by_code.values():
+            speeds.extend(stop_speeds)
+            distance_ends.extend(stop_distance_ends)
+            time_ends.extend(stop_time_ends)
+            offsets.append(len(speeds))
+
+        return SpeedGraph(
+            [self.stop_ids[code] for code in columns_by_code], offsets, speeds, distance_ends, time_ends)
+
+    def append(self, timestamp: int, stop_id: str, ping_type: str, distance_from_stop: float):
+        """
+        Appends a single ping to the columns
+
+        Args:
+            timestamp (int): time the data was recorded, in epoch time (milliseconds)
+            stop_id (str): surrogate identifier of the related bus stop
+            ping_type (str): one of 'DEPARTURE', 'MIDPATH', 'ARRIVAL'
+            distance_from_stop (float): distance from the bus stop when the ping was recorded, in meters
+
+        Raises:
+            ValueError: raised when the ping type is unknown
+        """
+        if ping_type not in PING_TYPES:
+            raise ValueError("Ping type must be one of " + ", ".join(PING_TYPES))
+
+        self._is_sorted = None
+        self.timestamps.append(timestamp)
+        self.stop_id_codes.append(self._get_stop_id_code(stop_id.encode()))
+        self.ping_type_codes.append(PING_TYPES.index(ping_type))
+        self.distances.append(distance_from_stop)
+
+    def _get_stop_id_code(self, stop_id: bytes) -> int:
+        """
+        Gets the code of a stop_id, interning it on first use
+        """
+        code = self._stop_id_codes_by_value.get(stop_id)
+        if code is None:
+            code = self._stop_id_codes_by_value[stop_id] = len(self.stop_ids)
+            self.stop_ids.append(sys.intern(stop_id.decode()))
+        return code
+
+    def _extend_from_lines(self, block: bytes, line_number: int, errors: str) -> int:
+        """
+        Parses a block of whole lines into the columns
+
+        Args:
+            block (bytes): one or more newline separated ping lines
+            line_number (int): the 1-based line number of the first line of the block
+            errors (str): 'raise' or 'skip'
+
+        Returns:
+            int: the line number following the block
+        """
+
+        lines_count = block.count(b'\n') + (0 if block.endswith(b'\n') else 1)
+        matches = _PING_LINE_PATTERN.findall(block)
+
+        # fast path, every line of the block is in the canonical field order
+        if len(matches) == lines_count:
+            self._is_sorted = None
+            get_stop_id_code = self._get_stop_id_code
+            self.timestamps.extend([int(match[0]) for match in matches])
+            self.stop_id_codes.extend([get_stop_id_code(match[1]) for match in matches])
+            self.ping_type_codes.extend([_PING_TYPE_CODES[match[2]] for match in matches])
+            self.distances.extend([float(match[3]) for match in matches])
+            return line_number + lines_count
+
+        # slow path, parse line by line so that malformed lines can be reported
+        for offset, line in enumerate(block.split(b"\n")):
+            if not line.strip():
+                continue
+            try:
+                self._append_line(line)
+            except (ValueError, KeyError, TypeError) as error:
+                text = line.decode(errors='replace')
+                if errors == 'raise':
+                    raise PingFormatError(line_number + offset, text, repr(error)) from error
+                self.malformed_lines.append((line_number + offset, text))
+
+        return line_number + lines_count
+
+    def _append_line(self, line: bytes):
+        """
+        Parses a single ping line into the columns
+
+        Raises:
+            ValueError, KeyError, TypeError: raised when the line is malformed
+        """
+
+        match = _PING_LINE_PATTERN.match(line)
+        if match is not None:
+            timestamp, stop_id, ping_type, distance_from_stop = match.groups()
+            self._is_sorted = None
+            self.timestamps.append(int(timestamp))
+            self.stop_id_codes.append(self._get_stop_id_code(stop_id))
+            self.ping_type_codes.append(_PING_TYPE_CODES[ping_type])
+            self.distances.append(float(distance_from_stop))
+            return
+
+        # fall back to a full json parse for other field orders and escaped strings
+        input_dict = loads(line)
+        timestamp = input_dict["timestamp"]
+        stop_id = input_dict["stopId"]
+        ping_type = input_dict["pingType"]
+        distance_from_stop = input_dict["distanceFromStop"]
+
+        # validate the field types against the schema before appending anything
+        if isinstance(timestamp, float) and timestamp.is_integer():
+            timestamp = int(timestamp)
+        if type(timestamp) is not int or not isinstance(stop_id, str) or ping_type not in PING_TYPES \
+                or type(distance_from_stop) not in (int, float):
+            raise TypeError("fields do not match the ping schema")
+
+        self.append(timestamp, stop_id, ping_type, float(distance_from_stop))
@@ -0,0 +1,166 @@
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from speedmap.ping_array import PingArray
+
+# the file signature and layout version of the binary ping format
+MAGIC = b'SPMP'
+VERSION = 1
+
+# header flags
+FLAG_SORTED = 1
+
+# magic, version, flags, row count, stop_id count, stop_id dictionary size in bytes
+_HEADER = struct.Struct('<4sHHQQQ')
+_STOP_ID_LENGTH = struct.Struct('<I')
+
+
+def write_ping_binary(ping_array: PingArray, file_path: str):
+    """
+    Writes pings to the binary ping format, which holds fixed-width little-endian columns that can be memory-mapped:
+
+        header          magic 'SPMP', version (uint16), flags (uint16), row count (uint64),
+                        stop_id count (uint64), stop_id dictionary size in bytes (uint64)
+        timestamps      int64[row count]
+        distances       float64[row count]
+        stop_id codes   int32[row count]
+        ping types      int8[row count], zero padded to a multiple of 8 bytes
+        stop_ids        per stop_id, a uint32 byte length followed by the utf-8 bytes
+
+    Args:
+        ping_array (PingArray): the pings to write
+        file_path (str): the location of the binary file to write
+    """
+
+    rows_count = len(ping_array)
+    flags = FLAG_SORTED if ping_array.is_sorted() else 0
+
+    # serialize the stop_id dictionary
+    stop_ids = b''.join(
+        _STOP_ID_LENGTH.pack(len(encoded)) + encoded
+        for encoded in (stop_id.encode() for stop_id in ping_array.stop_ids))
+
+    with open(file_path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, flags, rows_count, len(ping_array.stop_ids), len(stop_ids)))
+        for typecode, column in (
+                ('q', ping_array.timestamps),
+                ('d', ping_array.distances),
+                ('i', ping_array.stop_id_codes),
+                ('b', ping_array.ping_type_codes)):
+            file.write(_to_little_endian(typecode, column))
+        file.write(b'\0' * (-rows_count % 8))
+        file.write(stop_ids)
+
+
+def read_ping_binary(file_path: str) -> PingArray:
+    """
+    Memory-maps a binary ping file, where the columns of the returned PingArray are read-only views of the file
+
+    Args:
+        file_path (str): the location of the binary file
+
+    Returns:
+        a PingArray class object, which is known to be sorted when the sorted flag of the file header is set
+
+    Raises:
+        ValueError: raised when the file is not a binary ping file or is truncated
+    """
+
+    with open(file_path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # validate the header
+    if len(mapped) < _HEADER.size:
+        raise ValueError("File is not a binary ping file: " + str(file_path))
+    magic, version, flags, rows_count, stop_ids_count, stop_ids_size = _HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("File is not a binary ping file: " + str(file_path))
+    stop_ids_offset = _HEADER.size + rows_count * 21 + (-rows_count % 8)
+    if len(mapped) < stop_ids_offset + stop_ids_size:
+        raise ValueError("Binary ping file is truncated: " + str(file_path))
+
+    # slice each column out of the mapping without copying
+    view = memoryview(mapped)
+    columns, offset = [], _HEADER.size
+    for typecode, item_size in (('q', 8), ('d', 8), ('i', 4), ('b', 1)):
+        columns.append(_from_little_endian(typecode, view[offset:offset + rows_count * item_size]))
+        offset += rows_count * item_size
+
+    # read the stop_id dictionary
+    stop_ids, offset = [], stop_ids_offset
+    for _ in range(stop_ids_count):
+        length, = _STOP_ID_LENGTH.unpack_from(mapped, offset)
+        offset += _STOP_ID_LENGTH.size
+        stop_ids.append(sys.intern(str(mapped[offset:offset + length], 'utf-8')))
+        offset += length
+
+    timestamps, distances, stop_id_codes, ping_type_codes = columns
+    return PingArray(
+        timestamps, stop_id_codes, ping_type_codes, distances, stop_ids, is_sorted=bool(flags & FLAG_SORTED))
+
+
+def convert_jsonl_to_binary(jsonl_file_path: str, binary_file_path: str, sort: bool = True) -> int:
+    """
+    Converts a ping file in the json lines format to the binary ping format
+
+    Args:
+        jsonl_file_path (str): the location of the raw input file containing a series of Pings
+        binary_file_path (str): the location of the binary file to write
+        sort (bool): when True, the pings are sorted by ascending timestamp before they are written
+
+    Returns:
+        int: the number of pings written
+
+    Raises:
+        PingFormatError: raised when a line of the input file is malformed, with its line number
+    """
+
+    ping_array = PingArray.from_file(jsonl_file_path)
+    if sort:
+        ping_array = ping_array.sort_by_timestamp()
+
+    write_ping_binary(ping_array, binary_file_path)
+
+    return len(ping_array)
+
+
+def _to_little_endian(typecode: str, column) -> bytes:
+    """
+    Gets the little-endian bytes of a typed column
+    """
+    if sys.byteorder == 'little':
+        return bytes(column) if isinstance(column, memoryview) else column.tobytes()
+    swapped = array(typecode, column)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _from_little_endian(typecode: str, view: memoryview):
+    """
+    Gets a typed column from little-endian bytes, zero-copy on little-endian machines
+    """
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    swapped = array(typecode, bytes(view))
+    swapped.byteswap()
+    return swapped
+
+
+def main():
+    """
+    Converts a ping file in the json lines format to the binary ping format from the command line interface
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m speedmap.ping_binary", description="Convert a json lines ping file to the binary ping format")
+    parser.add_argument("input", help="the location of the json lines ping file")
+    parser.add_argument("output", help="the location of the binary ping file to write")
+    parser.add_argument("--keep-order", action="store_true", help="write the pings in file order instead of sorting")
+    args = parser.parse_args()
+
+    convert_jsonl_to_binary(args.input, args.output, sort=not args.keep_order)
+
+
+if __name__ == "__main__":
+    main()
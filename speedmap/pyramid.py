@@ -0,0 +1,142 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from collections import namedtuple
+from speedmap.mesh import ENGINES, get_segment_boundaries, validate_segment_length
+from speedmap.segment import Segment, round_speed
+from speedmap.vectorized import get_segment_count
+
+# the start distances, end distances, start times and end times of the segments of a stop
+Boundaries = Tuple[List[float], List[float], List[float], List[float]]
+
+
+def mesh_speed_graph_pyramid(
+        stop_lengths: Dict[str, float],
+        speed_graph: Dict[str, Iterable[namedtuple]],
+        segment_lengths: Iterable[float],
+        engine: str = 'python') -> Dict[float, List[Segment]]:
+    """
+    Applies uniform segment meshes of several segment lengths to the speed graph of every stop_id in a single pass
+
+    The lengths are meshed from finest to coarsest. When a segment length is a whole multiple of a finer one and every
+    coarse segment boundary falls exactly on a fine segment boundary, the coarse segments are built by merging the
+    fine segments they cover: the coarse speed is the covered distance over the time elapsed between the start of the
+    first and the end of the last fine segment, which is the time-weighted mean of the fine speeds. The boundary
+    times are the same ones the coarse mesh would interpolate, so the results match independent meshing. Other
+    lengths are interpolated from the speed graph.
+
+    Args:
+        stop_lengths (Dict[str, float]): the total distance of each stop_id, in meters
+        speed_graph (Dict[str, Iterable[namedtuple]]): the speed graph edges of each stop_id
+        segment_lengths (Iterable[float]): user defined lengths for a speed map segment, in meters
+        engine (str): the meshing engine used for interpolation, either 'python' or 'numpy'
+
+    Returns:
+        Dict[float, List[Segment]]: a dictionary where the keys are the segment lengths, in the given order, and the
+            values are the speed map segments of the segment length
+
+    Raises:
+        ValueError: if a segment length is invalid (less than 0) or the engine is unknown
+        TypeError: if a segment length cannot be parsed to a value
+    """
+
+    # validate input
+    segment_lengths = list(dict.fromkeys(segment_lengths))
+    for segment_length in segment_lengths:
+        validate_segment_length(segment_length)
+    if engine not in ENGINES:
+        raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+
+    speed_maps = {segment_length: [] for segment_length in segment_lengths}
+
+    # iterate over each stop_id
+    for stop_id in stop_lengths.keys():
+        stop_length = stop_lengths[stop_id]
+        speed_graph_for_stop = speed_graph[stop_id]
+        boundaries_by_length = {}
+
+        # mesh from the finest to the coarsest segment length
+        for segment_length in sorted(segment_lengths):
+            boundaries = None
+            for finer_length in sorted(boundaries_by_length, reverse=True):
+                boundaries = merge_boundaries(
+                    stop_length, segment_length, finer_length, boundaries_by_length[finer_length])
+                if boundaries is not None:
+                    break
+            if boundaries is None:
+                boundaries = get_segment_boundaries(stop_length, speed_graph_for_stop, segment_length, engine)
+            boundaries_by_length[segment_length] = boundaries
+
+            speed_maps[segment_length].extend(get_segments(stop_id, boundaries))
+
+    return speed_maps
+
+
+def merge_boundaries(
+        stop_length: float,
+        segment_length: float,
+        finer_length: float,
+        finer_boundaries: Boundaries) -> Optional[Boundaries]:
+    """
+    Gets the segment boundaries of a coarse mesh from the boundaries of a finer mesh of the same stop_id
+
+    Args:
+        stop_length (float): the total distance of the stop_id, in meters
+        segment_length (float): the coarse segment length, in meters
+        finer_length (float): the fine segment length, in meters
+        finer_boundaries (Boundaries): the segment boundaries of the fine mesh
+
+    Returns:
+        Optional[Boundaries]: the segment boundaries of the coarse mesh, or None when the coarse segment length is not
+            a whole multiple of the fine one or its boundaries do not fall exactly on fine boundaries
+    """
+
+    multiple = round(segment_length / finer_length)
+    if multiple < 2:
+        return None
+
+    finer_starts, finer_ends, finer_time_starts, finer_time_ends = finer_boundaries
+    finer_count = len(finer_starts)
+    boundaries = ([], [], [], [])
+
+    for segment_index in range(get_segment_count(stop_length, segment_length)):
+
+        # determine the start and end distances of the coarse segment exactly as the meshing loop does
+        segment_distance_start = segment_index * segment_length
+        segment_distance_end = segment_distance_start + segment_length if\
+            segment_distance_start + segment_length <= stop_length else stop_length
+
+        # find the fine segments covered by the coarse segment, which must share its start and end distances
+        first = segment_index * multiple
+        last = min(first + multiple, finer_count) - 1
+        if first >= finer_count or finer_starts[first] != segment_distance_start \
+                or finer_ends[last] != segment_distance_end:
+            return None
+
+        boundaries[0].append(segment_distance_start)
+        boundaries[1].append(segment_distance_end)
+        boundaries[2].append(finer_time_starts[first])
+        boundaries[3].append(finer_time_ends[last])
+
+    return boundaries
+
+
+def get_segments(stop_id: str, boundaries: Boundaries) -> List[Segment]:
+    """
+    Gets the speed map segments of a stop_id from its segment boundaries
+
+    Args:
+        stop_id (str): surrogate identifier of the bus stop
+        boundaries (Boundaries): the start distances, end distances, start times and end times of the segments
+
+    Returns:
+        List[Segment]: a list containing the Segment class objects of the stop_id
+    """
+    return [
+        Segment(
+            stop_id=stop_id,
+            segment_index=segment_index,
+            segment_length=segment_distance_end - segment_distance_start,
+            speed=round_speed(
+                (segment_distance_end - segment_distance_start) / (segment_time_end - segment_time_start)))
+        for segment_index, (segment_distance_start, segment_distance_end, segment_time_start, segment_time_end)
+        in enumerate(zip(*boundaries))
+    ]
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Iterable, Optional
+import speedmap
+from speedmap.segment import Segment
+from speedmap.segment_array import SegmentArray
+from speedmap.segment_writers import VERSION as SEGMENT_FORMAT_VERSION, BinarySegmentWriter, read_segment_binary
+
+# the default location of the cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "speedmap")
+
+# the default size limit of the cache, in bytes
+DEFAULT_MAX_SIZE = 1 << 30
+
+# how the input file is identified in a cache key: by its path, size and modification time, or by a hash of its bytes
+KEY_MODES = ('stat', 'content')
+
+# the extension of the cached speed maps, which are binary segment files
+CACHE_EXTENSION = '.spms'
+
+# the number of bytes hashed at a time
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+class ResultCache:
+    """
+    Represents an on-disk cache of speed maps, keyed by the input ping file, the segment length and the library
+    version, so that a hit skips parsing and meshing entirely
+
+    Each speed map is stored as a binary segment file named after its key. Reading a speed map refreshes its
+    modification time, and the least recently used files are removed when the cache grows over its size limit.
+
+    Attributes:
+        directory (str): the location of the cache files, created when missing
+        max_size (int): the size limit of the cache, in bytes
+        key_mode (str): 'stat' to identify an input file by its path, size and modification time, which is free, or
+            'content' to hash its bytes, which survives copies and touches of the file but reads it once per run
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_size: int = DEFAULT_MAX_SIZE, key_mode: str = 'stat'):
+
+        # validate input
+        if max_size < 0:
+            raise ValueError("Cache size must not be negative")
+        if key_mode not in KEY_MODES:
+            raise ValueError("Key mode must be one of " + ", ".join(KEY_MODES))
+
+        self.directory = directory
+        self.max_size = max_size
+        self.key_mode = key_mode
+
+    def get_key(self, file_path: str, segment_length: float, options: Optional[dict] = None) -> str:
+        """
+        Gets the cache key of the speed map of a ping file
+
+        Args:
+            file_path (str): the location of the ping file
+            segment_length (float): a user defined length for a speed map segment, in meters
+            options (Optional[dict]): other json serializable settings which change the speed map, e.g. the merge
+                tolerance
+
+        Returns:
+            str: the hexadecimal sha256 digest of the file identity, the segment length, the library version, the
+                cache format version and the options
+
+        Raises:
+            FileNotFoundError: raised when the ping file does not exist
+        """
+        if self.key_mode == 'content':
+            digest = hashlib.sha256()
+            with open(file_path, "rb") as file:
+                for block in iter(lambda: file.read(_HASH_BLOCK_SIZE), b''):
+                    digest.update(block)
+            identity = ['content', digest.hexdigest()]
+        else:
+            status = os.stat(file_path)
+            identity = ['stat', os.path.realpath(file_path), status.st_size, status.st_mtime_ns]
+
+        key = identity + [repr(float(segment_length)), speedmap.__version__, SEGMENT_FORMAT_VERSION]
+        if options:
+            key.append(sorted(options.items()))
+        return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[SegmentArray]:
+        """
+        Gets a cached speed map and marks it as recently used
+
+        Args:
+            key (str): the cache key, see `get_key`
+
+        Returns:
+            Optional[SegmentArray]: the segments, or None when the key is not cached or its file is unreadable
+        """
+        file_path = self._get_path(key)
+        try:
+            segments = read_segment_binary(file_path)
+            os.utime(file_path)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+
+            # drop a truncated or foreign file so that it is written again
+            self._remove(file_path)
+            return None
+
+        return segments
+
+    def put(self, key: str, segments: Iterable[Segment]) -> bool:
+        """
+        Caches a speed map, then evicts the least recently used speed maps over the size limit
+
+        The file is written under a temporary name and renamed into place, so concurrent runs never read a partial
+        speed map.
+
+        Args:
+            key (str): the cache key, see `get_key`
+            segments (Iterable[Segment]): the segments of the speed map
+
+        Returns:
+            bool: True when the speed map was cached, False when it cannot be stored in the binary segment format,
+                e.g. when a stop_id is too long
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file, BinarySegmentWriter(file) as writer:
+                writer.write_all(segments)
+            os.replace(temporary_path, self._get_path(key))
+        except ValueError:
+            self._remove(temporary_path)
+            return False
+        except BaseException:
+            self._remove(temporary_path)
+            raise
+
+        self.evict()
+        return True
+
+    def evict(self) -> int:
+        """
+        Removes the least recently used speed maps until the cache fits in its size limit
+
+        Returns:
+            int: the number of speed maps removed
+        """
+        entries = []
+        for entry in self._scan():
+            status = entry.stat()
+            entries.append((status.st_mtime_ns, status.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, file_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self._remove(file_path)
+            total_size -= size
+            evicted += 1
+
+        return evicted
+
+    def clear(self) -> int:
+        """
+        Removes every cached speed map
+
+        Returns:
+            int: the number of speed maps removed
+        """
+        entries = list(self._scan())
+        for entry in entries:
+            self._remove(entry.path)
+        return len(entries)
+
+    def get_size(self) -> int:
+        """
+        Gets the total size of the cached speed maps
+
+        Returns:
+            int: the size of the cache files, in bytes
+        """
+        return sum(entry.stat().st_size for entry in self._scan())
+
+    def _get_path(self, key: str) -> str:
+        """
+        Gets the location of the file of a cache key
+        """
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def _scan(self) -> Iterable[os.DirEntry]:
+        """
+        Lists the cached speed map files, ignoring the temporary files of writes in progress
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(CACHE_EXTENSION)]
+
+    @staticmethod
+    def _remove(file_path: str):
+        """
+        Removes a file, which may have been removed by a concurrent run already
+        """
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
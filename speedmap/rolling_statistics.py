@@ -0,0 +1,328 @@
+import math
+from collections import OrderedDict
+from datetime import datetime, timezone, tzinfo
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+from speedmap.segment import Segment
+
+# the default quantiles of a query, the median and the 85th and 95th percentiles
+DEFAULT_QUANTILES = (0.5, 0.85, 0.95)
+
+
+class SpeedHistogram:
+    """
+    Represents the distribution of the speeds of a segment as a histogram of fixed-width bins. The number of bins is
+    bounded by the speed range, so its memory does not grow with the number of speeds added. Segment speeds are
+    rounded to 0.1 m/s, so with the default bin width every speed within the range has its own bin and the quantiles
+    are exact. Speeds outside of the range are counted in the lowest or highest bin.
+
+    Attributes:
+        bin_width (float): the width of a bin, in meters/second
+        max_speed (float): the speed of the highest bin, in meters/second
+        count (int): the number of speeds added
+        total (float): the sum of the speeds, in meters/second
+        min (float): the lowest speed, in meters/second
+        max (float): the highest speed, in meters/second
+        bins (Dict[int, int]): the number of speeds of each non-empty bin, by bin index
+    """
+
+    __slots__ = ('bin_width', 'max_speed', 'count', 'total', 'min', 'max', 'bins')
+
+    def __init__(self, bin_width: float = 0.1, max_speed: float = 60.0):
+
+        self.bin_width = bin_width
+        self.max_speed = max_speed
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.bins: Dict[int, int] = {}
+
+    @property
+    def mean(self) -> Optional[float]:
+        """
+        Gets the mean speed
+
+        Returns:
+            Optional[float]: the mean speed in meters/second, or None when no speeds were added
+        """
+        return self.total / self.count if self.count else None
+
+    def add(self, speed: float, count: int = 1):
+        """
+        Adds a speed to the histogram
+
+        Args:
+            speed (float): the speed of a bus on the segment, in meters/second
+            count (int): the number of times the speed is added
+        """
+        index = min(max(int(round(speed / self.bin_width)), 0), int(round(self.max_speed / self.bin_width)))
+        self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.total += speed * count
+        self.min = speed if self.min is None or speed < self.min else self.min
+        self.max = speed if self.max is None or speed > self.max else self.max
+
+    def merge(self, other):
+        """
+        Adds the speeds of another histogram with the same bins
+
+        Args:
+            other (SpeedHistogram): the histogram to merge
+
+        Raises:
+            ValueError: raised when the histograms have different bins
+        """
+        if other.bin_width != self.bin_width or other.max_speed != self.max_speed:
+            raise ValueError("Histograms must have the same bin width and maximum speed")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None or other.min < self.min else self.min
+            self.max = other.max if self.max is None or other.max > self.max else self.max
+
+    def get_quantile(self, quantile: float) -> Optional[float]:
+        """
+        Gets the speed at a quantile of the distribution, by nearest rank
+
+        Args:
+            quantile (float): the quantile, in [0, 1]
+
+        Returns:
+            Optional[float]: the speed of the bin holding the quantile, within the lowest and highest speeds, in
+                meters/second, or None when no speeds were added
+
+        Raises:
+            ValueError: raised when the quantile is not in [0, 1]
+        """
+        if not 0 <= quantile <= 1:
+            raise ValueError("Quantile must be in [0, 1]")
+        if not self.count:
+            return None
+
+        rank = max(1, math.ceil(quantile * self.count))
+        cumulative = 0
+        for index in sorted(self.bins):
+            cumulative += self.bins[index]
+            if cumulative >= rank:
+                return min(max(round(index * self.bin_width, 10), self.min), self.max)
+
+
+class RollingSpeedStatistics:
+    """
+    Folds speed maps into per segment speed histograms grouped in time buckets, and answers quantile queries over
+    rolling windows such as the last hour, or the same weekday and hour over the retention period. Buckets older than
+    the retention period are evicted, so the memory is bounded by the number of segments times the number of buckets
+    in the retention period, however many trips are folded in.
+
+    The keys of the statistics are (stop_id, segment_index), which only identify the same stretch of road for speed
+    maps of the same segment length, so a store should be fed with a single segment length.
+
+    Attributes:
+        bucket_seconds (int): the duration of a time bucket, in seconds, which must divide an hour for weekday and
+            hour queries
+        retention_seconds (int): how long the buckets are kept after the latest folded timestamp, in seconds
+        bin_width (float): the width of a histogram bin, in meters/second
+        max_speed (float): the speed of the highest histogram bin, in meters/second
+        tz (tzinfo): the time zone of weekday and hour queries
+        buckets (OrderedDict[int, Dict[Tuple[str, int], SpeedHistogram]]): the histograms of each segment, by the
+            start of the time bucket in epoch time (milliseconds), in ascending order
+        latest_timestamp (int): the latest folded timestamp, in epoch time (milliseconds)
+    """
+
+    def __init__(
+            self,
+            bucket_seconds: int = 3600,
+            retention_seconds: int = 31 * 24 * 3600,
+            bin_width: float = 0.1,
+            max_speed: float = 60.0,
+            tz: tzinfo = timezone.utc):
+
+        # validate input
+        if bucket_seconds <= 0 or retention_seconds <= 0:
+            raise ValueError("Bucket and retention durations must be greater than 0")
+        if bin_width <= 0 or max_speed <= 0:
+            raise ValueError("Bin width and maximum speed must be greater than 0")
+
+        self.bucket_seconds = bucket_seconds
+        self.retention_seconds = retention_seconds
+        self.bin_width = bin_width
+        self.max_speed = max_speed
+        self.tz = tz
+        self.buckets: 'OrderedDict[int, Dict[Tuple[str, int], SpeedHistogram]]' = OrderedDict()
+        self.latest_timestamp = None
+
+    def add_speed_map(self, segments: Iterable[Segment], timestamp: int):
+        """
+        Folds the segments of the speed map of a trip into the time bucket of the trip, then evicts expired buckets
+
+        Args:
+            segments (Iterable[Segment]): the speed map segments of the trip
+            timestamp (int): the time of the trip, e.g. of its first ping, in epoch time (milliseconds)
+        """
+
+        # fold the speeds into the histograms of their bucket, unless it has already expired
+        if self.latest_timestamp is None or timestamp >= self._get_expiry(self.latest_timestamp):
+            bucket_start = timestamp - timestamp % (self.bucket_seconds * 1000)
+            bucket = self.buckets.get(bucket_start)
+            if bucket is None:
+
+                # keep the buckets in ascending order when a late trip opens an older bucket
+                is_late = bool(self.buckets) and bucket_start < next(reversed(self.buckets))
+                bucket = self.buckets[bucket_start] = {}
+                if is_late:
+                    self.buckets = OrderedDict(sorted(self.buckets.items()))
+
+            for segment in segments:
+                key = (segment.stop_id, segment.segment_index)
+                histogram = bucket.get(key)
+                if histogram is None:
+                    histogram = bucket[key] = SpeedHistogram(self.bin_width, self.max_speed)
+                histogram.add(segment.speed)
+
+        if self.latest_timestamp is None or timestamp > self.latest_timestamp:
+            self.latest_timestamp = timestamp
+        self.evict()
+
+    def evict(self, now: Optional[int] = None) -> int:
+        """
+        Removes the buckets which ended before the retention period
+
+        Args:
+            now (Optional[int]): the current time in epoch time (milliseconds), defaults to the latest folded timestamp
+
+        Returns:
+            int: the number of buckets removed
+        """
+        now = self.latest_timestamp if now is None else now
+        if now is None:
+            return 0
+
+        expiry = self._get_expiry(now)
+        evicted = 0
+        while self.buckets:
+            bucket_start = next(iter(self.buckets))
+            if bucket_start + self.bucket_seconds * 1000 > expiry:
+                break
+            del self.buckets[bucket_start]
+            evicted += 1
+        return evicted
+
+    def get_histogram(
+            self,
+            stop_id: str,
+            segment_index: int,
+            start: Optional[int] = None,
+            end: Optional[int] = None,
+            weekday: Optional[int] = None,
+            hour: Optional[int] = None) -> SpeedHistogram:
+        """
+        Merges the histograms of a segment over the buckets which start within a time range and, optionally, on a
+        weekday and hour
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            segment_index (int): the relative order of the segment within all segments for the stop_id
+            start (Optional[int]): the start of the range in epoch time (milliseconds), inclusive
+            end (Optional[int]): the end of the range in epoch time (milliseconds), exclusive
+            weekday (Optional[int]): the day of the week of the buckets, from 0 for Monday to 6 for Sunday
+            hour (Optional[int]): the hour of the day of the buckets, from 0 to 23
+
+        Returns:
+            SpeedHistogram: the merged histogram, which is empty when the segment has no speeds in the range
+        """
+        histogram = SpeedHistogram(self.bin_width, self.max_speed)
+        key = (stop_id, segment_index)
+
+        for bucket_start, bucket in self.buckets.items():
+            if (start is not None and bucket_start < start) or (end is not None and bucket_start >= end):
+                continue
+            if key not in bucket:
+                continue
+            if weekday is not None or hour is not None:
+                bucket_time = datetime.fromtimestamp(bucket_start / 1000, self.tz)
+                if (weekday is not None and bucket_time.weekday() != weekday) or \
+                        (hour is not None and bucket_time.hour != hour):
+                    continue
+            histogram.merge(bucket[key])
+
+        return histogram
+
+    def get_quantiles(
+            self,
+            stop_id: str,
+            segment_index: int,
+            quantiles: Sequence[float] = DEFAULT_QUANTILES,
+            **kwargs) -> Dict[float, Optional[float]]:
+        """
+        Gets the speeds at quantiles of the distribution of a segment, see `get_histogram` for the time filters
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            segment_index (int): the relative order of the segment within all segments for the stop_id
+            quantiles (Sequence[float]): the quantiles, in [0, 1]
+            **kwargs: the start, end, weekday and hour filters of the buckets
+
+        Returns:
+            Dict[float, Optional[float]]: the speed at each quantile in meters/second, None when there are no speeds
+        """
+        histogram = self.get_histogram(stop_id, segment_index, **kwargs)
+        return {quantile: histogram.get_quantile(quantile) for quantile in quantiles}
+
+    def get_window_quantiles(
+            self,
+            stop_id: str,
+            segment_index: int,
+            window_seconds: int,
+            quantiles: Sequence[float] = DEFAULT_QUANTILES,
+            now: Optional[int] = None) -> Dict[float, Optional[float]]:
+        """
+        Gets the speed quantiles of a segment over the buckets which start within a window before now, e.g. the last
+        hour
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            segment_index (int): the relative order of the segment within all segments for the stop_id
+            window_seconds (int): the duration of the window, in seconds
+            quantiles (Sequence[float]): the quantiles, in [0, 1]
+            now (Optional[int]): the end of the window in epoch time (milliseconds), defaults to the latest folded
+                timestamp
+
+        Returns:
+            Dict[float, Optional[float]]: the speed at each quantile in meters/second, None when there are no speeds
+        """
+        now = self.latest_timestamp if now is None else now
+        if now is None:
+            return {quantile: None for quantile in quantiles}
+        start = now - window_seconds * 1000
+        return self.get_quantiles(stop_id, segment_index, quantiles, start=start - start % (self.bucket_seconds * 1000))
+
+    def get_weekday_hour_quantiles(
+            self,
+            stop_id: str,
+            segment_index: int,
+            weekday: int,
+            hour: int,
+            quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[float, Optional[float]]:
+        """
+        Gets the speed quantiles of a segment on the same weekday and hour over the retention period, e.g. Mondays
+        from 8 to 9 over the last month
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            segment_index (int): the relative order of the segment within all segments for the stop_id
+            weekday (int): the day of the week, from 0 for Monday to 6 for Sunday
+            hour (int): the hour of the day, from 0 to 23
+            quantiles (Sequence[float]): the quantiles, in [0, 1]
+
+        Returns:
+            Dict[float, Optional[float]]: the speed at each quantile in meters/second, None when there are no speeds
+        """
+        return self.get_quantiles(stop_id, segment_index, quantiles, weekday=weekday, hour=hour)
+
+    def _get_expiry(self, now: int) -> int:
+        """
+        Gets the time before which buckets are expired, in epoch time (milliseconds)
+        """
+        return now - self.retention_seconds * 1000
@@ -15,3 +15,60 @@ class Segment:
         self.segment_index = segment_index
         self.segment_length = segment_length
         self.speed = speed
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (Segment, SlottedSegment)):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return type(self).__name__ + "(" \
+            + ", ".join(key + "=" + repr(value) for key, value in self.to_dict().items()) + ")"
+
+    def to_dict(self) -> dict:
+        """
+        Gets the fields of the segment as a dictionary
+
+        Returns:
+            dict: a dictionary where the keys are the attribute names of the segment
+        """
+        return {
+            'stop_id': self.stop_id,
+            'segment_index': self.segment_index,
+            'segment_length': self.segment_length,
+            'speed': self.speed}
+
+
+class SlottedSegment:
+    """
+    Represents a segment of the speed map output like Segment, with `__slots__` instead of an instance dictionary, for
+    code which keeps many segments as objects rather than in a SegmentArray. It is equal to a Segment of the same
+    fields.
+
+    Attributes:
+        stop_id (str): surrogate identifier of the related bus stop
+        segment_index (int): the relative order of a segment within all segments for a stop_id
+        segment_length (float): the length of the segment, in meters
+        speed (float): the speed of the bus during travel on this segment, in meters/second
+    """
+
+    __slots__ = ('stop_id', 'segment_index', 'segment_length', 'speed')
+
+    # the methods of Segment only read and set the attributes, so they are shared
+    __init__ = Segment.__init__
+    __eq__ = Segment.__eq__
+    __repr__ = Segment.__repr__
+    to_dict = Segment.to_dict
+
+
+def round_speed(speed: float) -> float:
+    """
+    Formats a segment speed to 1 decimal place
+
+    Args:
+        speed (float): the unrounded speed of a segment, in meters/second
+
+    Returns:
+        float: the speed rounded to 1 decimal place
+    """
+    return float('%.1f' % round(speed, 1))
@@ -0,0 +1,136 @@
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List
+from speedmap.segment import Segment
+
+
+class SegmentArray(Sequence):
+    """
+    Represents the segments of a speed map as contiguous typed columns rather than Segment class objects. Indexing
+    and iteration return Segment objects, which are created on access.
+
+    Attributes:
+        stop_id_codes (array): index of the stop_id of each segment in `stop_ids`, as int32
+        segment_indexes (array): the relative order of each segment within all segments for a stop_id, as int64
+        segment_lengths (array): the length of each segment, in meters, as float64
+        speeds (array): the speed of the bus during travel on each segment, in meters/second, as float64
+        stop_ids (List[str]): the stop_ids referenced by `stop_id_codes`
+    """
+
+    def __init__(
+            self,
+            stop_id_codes: Iterable[int] = (),
+            segment_indexes: Iterable[int] = (),
+            segment_lengths: Iterable[float] = (),
+            speeds: Iterable[float] = (),
+            stop_ids: Iterable[str] = ()):
+
+        self.stop_id_codes = array('i', stop_id_codes)
+        self.segment_indexes = array('q', segment_indexes)
+        self.segment_lengths = array('d', segment_lengths)
+        self.speeds = array('d', speeds)
+        self.stop_ids = list(stop_ids)
+
+        self._stop_id_codes_by_value: Dict[str, int] = {
+            stop_id: code for code, stop_id in enumerate(self.stop_ids)}
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Segment]):
+        """
+        Packs Segment class objects into typed columns
+
+        Args:
+            segments (Iterable[Segment]): the segments to pack
+
+        Returns:
+            a SegmentArray class object, in the order of the segments
+        """
+        segment_array = SegmentArray()
+        segment_array.extend(segments)
+        return segment_array
+
+    def __len__(self) -> int:
+        return len(self.speeds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SegmentArray(
+                self.stop_id_codes[index],
+                self.segment_indexes[index],
+                self.segment_lengths[index],
+                self.speeds[index],
+                self.stop_ids)
+        return Segment(
+            stop_id=self.stop_ids[self.stop_id_codes[index]],
+            segment_index=self.segment_indexes[index],
+            segment_length=self.segment_lengths[index],
+            speed=self.speeds[index])
+
+    def __iter__(self) -> Iterator[Segment]:
+        stop_ids = self.stop_ids
+        for stop_id_code, segment_index, segment_length, speed in zip(
+                self.stop_id_codes, self.segment_indexes, self.segment_lengths, self.speeds):
+            yield Segment(stop_ids[stop_id_code], segment_index, segment_length, speed)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def append(self, segment: Segment):
+        """
+        Appends a single segment to the columns
+
+        Args:
+            segment (Segment): the segment to append
+        """
+        self.stop_id_codes.append(self._get_stop_id_code(segment.stop_id))
+        self.segment_indexes.append(segment.segment_index)
+        self.segment_lengths.append(segment.segment_length)
+        self.speeds.append(segment.speed)
+
+    def extend(self, segments: Iterable[Segment]):
+        """
+        Appends segments to the columns
+
+        Args:
+            segments (Iterable[Segment]): the segments to append
+        """
+        for segment in segments:
+            self.append(segment)
+
+    def extend_stop(self, stop_id: str, segment_lengths: Iterable[float], speeds: Iterable[float]):
+        """
+        Appends all segments of a single stop_id from its columns, without creating Segment objects
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            segment_lengths (Iterable[float]): the length of each segment of the stop, in meters
+            speeds (Iterable[float]): the rounded speed of each segment of the stop, in meters/second
+        """
+        start = len(self.speeds)
+        self.segment_lengths.extend(segment_lengths)
+        self.speeds.extend(speeds)
+        count = len(self.speeds) - start
+
+        self.stop_id_codes.extend([self._get_stop_id_code(stop_id)] * count)
+        self.segment_indexes.extend(range(count))
+
+    def to_list(self) -> List[Segment]:
+        """
+        Gets the segments as a list of Segment class objects
+
+        Returns:
+            List[Segment]: a list containing Segment class objects
+        """
+        return list(self)
+
+    def _get_stop_id_code(self, stop_id: str) -> int:
+        """
+        Gets the code of a stop_id, adding it to the stop_ids on first use
+        """
+        code = self._stop_id_codes_by_value.get(stop_id)
+        if code is None:
+            code = self._stop_id_codes_by_value[stop_id] = len(self.stop_ids)
+            self.stop_ids.append(stop_id)
+        return code
@@ -0,0 +1,226 @@
+import abc
+import csv
+import io
+import json
+import struct
+from typing import BinaryIO, Iterable
+from speedmap.segment import Segment
+from speedmap.segment_array import SegmentArray
+
+# the output formats of the segment writers
+FORMATS = ('jsonl', 'csv', 'binary')
+
+# the file signature and layout version of the binary segment format
+MAGIC = b'SPMS'
+VERSION = 1
+
+# the fixed width of the utf-8 stop_id field of a binary segment record, in bytes
+STOP_ID_WIDTH = 16
+
+# magic, version, record size, stop_id width, padding to 16 bytes
+SEGMENT_HEADER = struct.Struct('<4sHHH6x')
+
+# stop_id (NUL padded utf-8), segment_index (int64), segment_length (float64), speed (float64)
+SEGMENT_RECORD = struct.Struct('<' + str(STOP_ID_WIDTH) + 'sqdd')
+
+# the CSV columns, which are the Segment attribute names
+CSV_COLUMNS = ('stop_id', 'segment_index', 'segment_length', 'speed')
+
+
+class SegmentWriter(abc.ABC):
+    """
+    Writes speed map segments to a binary stream, encoding them in batches and writing each batch with a single call
+
+    Attributes:
+        stream (BinaryIO): the binary stream the segments are written to
+        batch_size (int): the number of segments encoded before a batch is written to the stream
+        count (int): the number of segments written so far
+    """
+
+    def __init__(self, stream: BinaryIO, batch_size: int = 8192):
+
+        self.stream = stream
+        self.batch_size = batch_size
+        self.count = 0
+
+        self._batch = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def write(self, segment: Segment):
+        """
+        Adds a segment to the current batch, writing the batch when it is full
+
+        Args:
+            segment (Segment): the segment to write
+        """
+        self._batch.append(segment)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_all(self, segments: Iterable[Segment]):
+        """
+        Writes segments as they are produced by an iterable
+
+        Args:
+            segments (Iterable[Segment]): the segments to write
+        """
+        for segment in segments:
+            self.write(segment)
+
+    def flush(self):
+        """
+        Encodes and writes the current batch to the stream
+        """
+        if self._batch:
+            self.stream.write(self._encode(self._batch))
+            self.count += len(self._batch)
+            self._batch = []
+        self.stream.flush()
+
+    @abc.abstractmethod
+    def _encode(self, segments) -> bytes:
+        """
+        Encodes a batch of segments, implemented by each output format
+        """
+
+
+class JsonlSegmentWriter(SegmentWriter):
+    """
+    Writes speed map segments as json lines, one json object per segment keyed by the Segment attribute names
+    """
+
+    def __init__(self, stream: BinaryIO, batch_size: int = 8192):
+        super().__init__(stream, batch_size)
+        self._encoded_stop_ids = {}
+
+    def _encode(self, segments) -> bytes:
+        lines = []
+        for segment in segments:
+
+            # json encode each stop_id once
+            stop_id = self._encoded_stop_ids.get(segment.stop_id)
+            if stop_id is None:
+                stop_id = self._encoded_stop_ids[segment.stop_id] = json.dumps(segment.stop_id)
+
+            lines.append('{"stop_id": %s, "segment_index": %d, "segment_length": %s, "speed": %s}\n' % (
+                stop_id, segment.segment_index, json.dumps(segment.segment_length), json.dumps(segment.speed)))
+
+        return ''.join(lines).encode()
+
+
+class CsvSegmentWriter(SegmentWriter):
+    """
+    Writes speed map segments as CSV with a header row of the Segment attribute names
+    """
+
+    def __init__(self, stream: BinaryIO, batch_size: int = 8192):
+        super().__init__(stream, batch_size)
+        self.stream.write((','.join(CSV_COLUMNS) + '\r\n').encode())
+
+    def _encode(self, segments) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            (segment.stop_id, segment.segment_index, segment.segment_length, segment.speed) for segment in segments)
+        return buffer.getvalue().encode()
+
+
+class BinarySegmentWriter(SegmentWriter):
+    """
+    Writes speed map segments as fixed-width little-endian records after a 16 byte header, so that loaders can
+    memory-map the records directly, e.g. with NumPy:
+
+        numpy.memmap(path, offset=16, dtype=[('stop_id', 'S16'), ('segment_index', '<i8'),
+                                             ('segment_length', '<f8'), ('speed', '<f8')])
+    """
+
+    def __init__(self, stream: BinaryIO, batch_size: int = 8192):
+        super().__init__(stream, batch_size)
+        self.stream.write(SEGMENT_HEADER.pack(MAGIC, VERSION, SEGMENT_RECORD.size, STOP_ID_WIDTH))
+        self._encoded_stop_ids = {}
+
+    def _encode(self, segments) -> bytes:
+        buffer = bytearray(SEGMENT_RECORD.size * len(segments))
+        for i, segment in enumerate(segments):
+            SEGMENT_RECORD.pack_into(
+                buffer,
+                i * SEGMENT_RECORD.size,
+                self._encode_stop_id(segment.stop_id),
+                segment.segment_index,
+                segment.segment_length,
+                segment.speed)
+        return bytes(buffer)
+
+    def _encode_stop_id(self, stop_id: str) -> bytes:
+        """
+        Gets the utf-8 bytes of a stop_id, validating that it fits the fixed-width field
+
+        Raises:
+            ValueError: raised when the stop_id is longer than STOP_ID_WIDTH bytes
+        """
+        encoded = self._encoded_stop_ids.get(stop_id)
+        if encoded is None:
+            encoded = stop_id.encode()
+            if len(encoded) > STOP_ID_WIDTH:
+                raise ValueError("Stop id is longer than " + str(STOP_ID_WIDTH) + " bytes: " + stop_id)
+            self._encoded_stop_ids[stop_id] = encoded
+        return encoded
+
+
+def get_segment_writer(output_format: str, stream: BinaryIO, batch_size: int = 8192) -> SegmentWriter:
+    """
+    Gets the segment writer of an output format
+
+    Args:
+        output_format (str): one of 'jsonl', 'csv' or 'binary'
+        stream (BinaryIO): the binary stream the segments are written to
+        batch_size (int): the number of segments encoded before a batch is written to the stream
+
+    Returns:
+        SegmentWriter: the segment writer
+
+    Raises:
+        ValueError: raised when the output format is unknown
+    """
+    writers = {'jsonl': JsonlSegmentWriter, 'csv': CsvSegmentWriter, 'binary': BinarySegmentWriter}
+    if output_format not in writers:
+        raise ValueError("Format must be one of " + ", ".join(FORMATS))
+    return writers[output_format](stream, batch_size)
+
+
+def read_segment_binary(file_path: str) -> SegmentArray:
+    """
+    Reads a binary segment file written by BinarySegmentWriter
+
+    Args:
+        file_path (str): the location of the binary segment file
+
+    Returns:
+        SegmentArray: the segments of the file
+
+    Raises:
+        ValueError: raised when the file is not a binary segment file
+    """
+
+    with open(file_path, "rb") as file:
+        data = file.read()
+
+    # validate the header
+    if len(data) < SEGMENT_HEADER.size:
+        raise ValueError("File is not a binary segment file: " + str(file_path))
+    magic, version, record_size, stop_id_width = SEGMENT_HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != SEGMENT_RECORD.size:
+        raise ValueError("File is not a binary segment file: " + str(file_path))
+
+    # unpack the whole records following the header
+    records_size = (len(data) - SEGMENT_HEADER.size) // SEGMENT_RECORD.size * SEGMENT_RECORD.size
+    records = memoryview(data)[SEGMENT_HEADER.size:SEGMENT_HEADER.size + records_size]
+    segment_array = SegmentArray()
+    for stop_id, segment_index, segment_length, speed in SEGMENT_RECORD.iter_unpack(records):
+        segment_array.append(Segment(stop_id.rstrip(b'\0').decode(), segment_index, segment_length, speed))
+
+    return segment_array
@@ -0,0 +1,418 @@
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from speedmap.cleaning import get_invalid_reason
+from speedmap.mesh import ENGINES, validate_segment_length
+from speedmap.ping import Ping
+from speedmap.segment import Segment
+from speedmap.streaming_bus_on_route import StreamingBusOnRoute
+from speedmap.trip_splitter import DEFAULT_MAX_GAP
+
+# the json field which identifies the bus of a ping
+BUS_ID_FIELD = 'busId'
+
+# the size of the blocks read from a connection, in bytes
+READ_SIZE = 1 << 16
+
+# the default longest line accepted from a connection, in bytes
+DEFAULT_MAX_LINE_LENGTH = 1 << 20
+
+# the default number of buses whose speed maps are kept
+DEFAULT_MAX_BUSES = 10000
+
+
+class SpeedMapService:
+    """
+    Maintains the speed maps of many buses from a live stream of pings, served over TCP or a Unix socket
+
+    Clients send newline-delimited json. Every line is either a ping, in the schema accepted by `Ping.from_json` with
+    an additional busId field, or a query object with a "query" field:
+
+        {"query": "bus", "busId": "..."}   the segments and open stop_ids of a bus
+        {"query": "stop", "stopId": "..."} the segments of a stop_id for every bus which completed it
+        {"query": "buses"}                 the busIds seen so far
+        {"query": "stats"}                 the ingestion counters
+
+    Each query is answered with a single json line on the same connection, as soon as it is read, from the speed maps
+    of the pings processed so far. Pings are not answered, except with an {"error": ...} line when they are malformed.
+
+    The pings of each bus are routed to a StreamingBusOnRoute, so a stop is meshed when its 'ARRIVAL' ping is seen
+    and only the edges of open stops are kept. A bus running its route again starts a new trip on the same rules as
+    `speedmap.trip_splitter.TripSplitter`: a 'DEPARTURE' or 'MIDPATH' ping for a stop_id already closed in the current
+    trip, or a ping more than `max_gap` milliseconds after the previous one. The segments of each stop_id are then
+    replaced as the new trip completes it. Only the `max_buses` most recently updated buses are kept, and a line longer
+    than `max_line_length` bytes is answered with an error and skipped, so neither grows without limit.
+
+    Pings are handed from the connections to a single ingestion task through a bounded queue of batches: when the queue
+    is full, connections stop reading from their sockets until it drains, which pushes back on the senders instead of
+    buffering without limit.
+
+    Attributes:
+        segment_length (float): a user defined length for a speed map segment, in meters
+        engine (str): the meshing engine, either 'python' or 'numpy'
+        default_bus_id (str): the bus of pings without a busId field
+        pings_received (int): the number of pings read from the connections
+        pings_processed (int): the number of pings added to the speed graph of their bus
+        pings_rejected (int): the number of pings which could not be added, e.g. out of timestamp order or with an
+            invalid field value
+        max_gap (Optional[int]): the longest time between two pings of the same trip, in milliseconds. When None, trips
+            are only split on stop_id sequence resets
+        max_buses (int): the number of buses kept, the least recently updated bus is forgotten beyond it
+        max_line_length (int): the longest line accepted from a connection, in bytes
+        trips_started (int): the number of trips started after the first trip of a bus
+        buses_evicted (int): the number of buses forgotten to stay within max_buses
+    """
+
+    def __init__(
+            self,
+            segment_length: float,
+            engine: str = 'python',
+            queue_size: int = 64,
+            default_bus_id: str = 'default',
+            max_gap: Optional[int] = DEFAULT_MAX_GAP,
+            max_buses: int = DEFAULT_MAX_BUSES,
+            max_line_length: int = DEFAULT_MAX_LINE_LENGTH):
+
+        # validate input
+        validate_segment_length(segment_length)
+        if engine not in ENGINES:
+            raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+        if queue_size < 1:
+            raise ValueError("Queue size must be at least 1")
+        if max_gap is not None and max_gap < 0:
+            raise ValueError("Max gap must not be negative")
+        if max_buses < 1:
+            raise ValueError("Max buses must be at least 1")
+        if max_line_length < 1:
+            raise ValueError("Max line length must be at least 1")
+
+        self.segment_length = segment_length
+        self.engine = engine
+        self.default_bus_id = default_bus_id
+        self.pings_received = 0
+        self.pings_processed = 0
+        self.pings_rejected = 0
+        self.max_gap = max_gap
+        self.max_buses = max_buses
+        self.max_line_length = max_line_length
+        self.trips_started = 0
+        self.buses_evicted = 0
+
+        self._queue_size = queue_size
+        self._queue = None
+        self._ingestion_task = None
+        self._buses: Dict[str, StreamingBusOnRoute] = OrderedDict()
+        self._speed_maps: Dict[str, Dict[str, List[Segment]]] = {}
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        """
+        Starts the ingestion task and a TCP server
+
+        Args:
+            host (str): the interface to listen on
+            port (int): the port to listen on, 0 picks a free port
+
+        Returns:
+            asyncio.AbstractServer: the started server
+        """
+        self._start_ingestion()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        """
+        Starts the ingestion task and a Unix socket server
+
+        Args:
+            path (str): the location of the socket
+
+        Returns:
+            asyncio.AbstractServer: the started server
+        """
+        self._start_ingestion()
+        return await asyncio.start_unix_server(self.handle_connection, path)
+
+    async def join(self):
+        """
+        Waits until every ping read so far is processed
+        """
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self):
+        """
+        Processes the pings read so far and stops the ingestion task
+        """
+        if self._ingestion_task is not None:
+            await self.join()
+            self._ingestion_task.cancel()
+            try:
+                await self._ingestion_task
+            except asyncio.CancelledError:
+                pass
+            self._ingestion_task = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Reads the lines of a connection until it is closed, queueing the pings and answering the queries
+
+        Args:
+            reader (asyncio.StreamReader): the stream of the connection
+            writer (asyncio.StreamWriter): the writer of the connection, for the query answers
+        """
+        remainder, skipping = b'', False
+        try:
+            while True:
+                block = await reader.read(READ_SIZE)
+                if not block:
+                    break
+
+                # split the block into whole lines, keeping a trailing partial line for the next block
+                lines = (remainder + block).split(b'\n')
+                remainder = lines.pop()
+
+                # drop the rest of a line which was too long, up to its newline
+                if skipping:
+                    if lines:
+                        lines.pop(0)
+                        skipping = False
+                    else:
+                        remainder = b''
+
+                # stop buffering a partial line which is too long, and skip it
+                if len(remainder) > self.max_line_length:
+                    remainder, skipping = b'', True
+                    writer.write((json.dumps(
+                        {'error': 'Line longer than ' + str(self.max_line_length) + ' bytes'}) + '\n').encode())
+                    await writer.drain()
+
+                await self._handle_lines(lines, writer)
+
+            if remainder.strip():
+                await self._handle_lines([remainder], writer)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def get_bus_speed_map(self, bus_id: str) -> List[Segment]:
+        """
+        Gets the segments of the completed stops of a bus, in order of their 'ARRIVAL' pings
+
+        Args:
+            bus_id (str): the identifier of the bus
+
+        Returns:
+            List[Segment]: the segments of the bus, empty when the bus is unknown
+        """
+        return [segment for segments in self._speed_maps.get(bus_id, {}).values() for segment in segments]
+
+    def get_stop_speed_maps(self, stop_id: str) -> Dict[str, List[Segment]]:
+        """
+        Gets the segments of a stop_id for every bus which completed it
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+
+        Returns:
+            Dict[str, List[Segment]]: a dictionary where the keys are bus identifiers and the values are the segments
+        """
+        return {
+            bus_id: speed_map[stop_id] for bus_id, speed_map in self._speed_maps.items() if stop_id in speed_map}
+
+    def add_pings(self, pings: List[tuple]):
+        """
+        Adds a batch of pings to the speed graphs of their buses, meshing each stop completed by the batch
+
+        Args:
+            pings (List[tuple]): the bus identifier and Ping class object of each ping, in arrival order
+        """
+        for bus_id, ping in pings:
+            bus = self._buses.get(bus_id)
+            if bus is None:
+                bus = self._buses[bus_id] = StreamingBusOnRoute(self.segment_length, self.engine)
+                self._speed_maps[bus_id] = {}
+
+                # forget the least recently updated bus beyond the limit
+                if len(self._buses) > self.max_buses:
+                    evicted_bus_id, _ = self._buses.popitem(last=False)
+                    del self._speed_maps[evicted_bus_id]
+                    self.buses_evicted += 1
+            else:
+                self._buses.move_to_end(bus_id)
+
+            # a ping which cannot be added, e.g. with a field of the wrong type, is rejected without stopping the batch
+            try:
+
+                # start a new trip of the bus, keeping the segments of its previous trips until they are replaced
+                if self._starts_new_trip(bus, ping):
+                    bus = self._buses[bus_id] = StreamingBusOnRoute(self.segment_length, self.engine)
+                    self.trips_started += 1
+
+                segments = bus.add_ping(ping)
+            except (TypeError, ValueError, IndexError, ZeroDivisionError):
+                self.pings_rejected += 1
+                continue
+
+            self.pings_processed += 1
+            if segments:
+                self._speed_maps[bus_id][ping.stop_id] = segments
+
+    def _starts_new_trip(self, bus: StreamingBusOnRoute, ping: Ping) -> bool:
+        """
+        Gets whether a ping starts a new trip of a bus, on the same rules as TripSplitter. A ping older than the
+        previous ping does not, so that it is still rejected
+        """
+        last_timestamp = bus.last_timestamp
+        if last_timestamp is None or ping.timestamp < last_timestamp:
+            return False
+        if ping.ping_type != 'ARRIVAL' and bus.is_stop_closed(ping.stop_id):
+            return True
+        return self.max_gap is not None and ping.timestamp - last_timestamp > self.max_gap
+
+    def _start_ingestion(self):
+        """
+        Creates the bounded queue and the ingestion task on the running event loop, once
+        """
+        if self._ingestion_task is None:
+            self._queue = asyncio.Queue(self._queue_size)
+            self._ingestion_task = asyncio.get_running_loop().create_task(self._ingest())
+
+    async def _ingest(self):
+        """
+        Adds the queued batches of pings, yielding to the connections between batches so queries are answered
+        """
+        while True:
+            batch = await self._queue.get()
+            try:
+                self.add_pings(batch)
+            finally:
+                self._queue.task_done()
+            await asyncio.sleep(0)
+
+    async def _handle_lines(self, lines: List[bytes], writer: asyncio.StreamWriter):
+        """
+        Parses the lines of a block, answering queries and errors and queueing the valid pings as a single batch
+        """
+        batch, answers = [], []
+
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+                if 'query' in message:
+                    answers.append(self._answer(message))
+                    continue
+                ping = Ping.from_dict(message)
+            except (ValueError, KeyError, TypeError, AttributeError) as error:
+                answers.append({'error': 'Malformed line: ' + str(error)})
+                continue
+
+            # reject a ping with an invalid field value, e.g. a null distanceFromStop, before it reaches a speed graph
+            reason = get_invalid_reason(ping)
+            if reason is not None:
+                self.pings_received += 1
+                self.pings_rejected += 1
+                answers.append({'error': 'Invalid ping: ' + reason})
+                continue
+            batch.append((str(message.get(BUS_ID_FIELD, self.default_bus_id)), ping))
+
+        if answers:
+            writer.write(''.join(json.dumps(answer) + '\n' for answer in answers).encode())
+            await writer.drain()
+
+        # waits while the queue is full, so the connection is not read any further
+        if batch:
+            self.pings_received += len(batch)
+            await self._queue.put(batch)
+
+    def _answer(self, query: dict) -> dict:
+        """
+        Answers a query object from the current speed maps
+        """
+        kind = query['query']
+        if kind == 'bus':
+            bus_id = str(query[BUS_ID_FIELD])
+            bus = self._buses.get(bus_id)
+            return {
+                'busId': bus_id,
+                'segments': [segment.to_dict() for segment in self.get_bus_speed_map(bus_id)],
+                'openStopIds': bus.open_stop_ids if bus is not None else []}
+        if kind == 'stop':
+            stop_id = query['stopId']
+            return {
+                'stopId': stop_id,
+                'buses': {
+                    bus_id: [segment.to_dict() for segment in segments]
+                    for bus_id, segments in self.get_stop_speed_maps(stop_id).items()}}
+        if kind == 'buses':
+            return {'busIds': list(self._buses.keys())}
+        if kind == 'stats':
+            return {
+                'pingsReceived': self.pings_received,
+                'pingsProcessed': self.pings_processed,
+                'pingsRejected': self.pings_rejected,
+                'queuedBatches': self._queue.qsize() if self._queue is not None else 0,
+                'buses': len(self._buses),
+                'tripsStarted': self.trips_started,
+                'busesEvicted': self.buses_evicted}
+        return {'error': 'Unknown query: ' + str(kind)}
+
+
+async def serve(service: SpeedMapService, host: str, port: int, unix_path: Optional[str] = None):
+    """
+    Runs a speed map service until it is cancelled
+
+    Args:
+        service (SpeedMapService): the service
+        host (str): the interface of the TCP server
+        port (int): the port of the TCP server
+        unix_path (Optional[str]): the location of a Unix socket, used instead of TCP when given
+    """
+    server = await (service.start_unix(unix_path) if unix_path else service.start(host, port))
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    """
+    Runs the speed map service from the command line interface
+
+    Args:
+        argv (List[str]): the command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m speedmap.service",
+        description="Serve live speed maps from a newline-delimited json ping stream")
+    parser.add_argument("segment_length", type=float, help="the length of a speed map segment, in meters")
+    parser.add_argument("--host", default="127.0.0.1", help="the interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="the port to listen on (default: 8765)")
+    parser.add_argument("--unix", dest="unix_path", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--engine", choices=ENGINES, default='python', help="the meshing engine")
+    parser.add_argument(
+        "--queue-size", type=int, default=64,
+        help="the number of ping batches buffered before connections stop being read (default: 64)")
+    parser.add_argument(
+        "--max-gap", type=float, default=DEFAULT_MAX_GAP / 1000,
+        help="start a new trip of a bus after this many seconds without pings (default: 1800)")
+    parser.add_argument(
+        "--max-buses", type=int, default=DEFAULT_MAX_BUSES,
+        help="the number of buses kept, the least recently updated bus is forgotten beyond it (default: 10000)")
+    parser.add_argument(
+        "--max-line-length", type=int, default=DEFAULT_MAX_LINE_LENGTH,
+        help="the longest line accepted from a connection, in bytes (default: 1048576)")
+    args = parser.parse_args(argv)
+
+    service = SpeedMapService(
+        args.segment_length, args.engine, args.queue_size, max_gap=int(args.max_gap * 1000),
+        max_buses=args.max_buses, max_line_length=args.max_line_length)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_path))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
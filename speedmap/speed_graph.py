@@ -0,0 +1,146 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Tuple
+from speedmap.speed_graph_edge import SpeedGraphEdge
+
+
+class SpeedGraphEdges(Sequence):
+    """
+    Represents the speed graph edges of a single stop_id as read-only views of the columns of a SpeedGraph. Indexing
+    returns SpeedGraphEdge objects, which are created on access.
+
+    Attributes:
+        stop_id (str): surrogate identifier of the bus stop
+        speeds (memoryview): the speed of each edge, in meters/second, as float64
+        distance_ends (memoryview): the distance from the bus stop at the end of each edge, in meters, as float64
+        time_ends (memoryview): the time at the end of each edge, in epoch time (milliseconds), as int64
+    """
+
+    __slots__ = ('stop_id', 'speeds', 'distance_ends', 'time_ends')
+
+    def __init__(self, stop_id: str, speeds: memoryview, distance_ends: memoryview, time_ends: memoryview):
+
+        self.stop_id = stop_id
+        self.speeds = speeds
+        self.distance_ends = distance_ends
+        self.time_ends = time_ends
+
+    def __len__(self) -> int:
+        return len(self.speeds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return SpeedGraphEdge(self.stop_id, self.speeds[index], self.distance_ends[index], self.time_ends[index])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+
+class SpeedGraph(Mapping):
+    """
+    Represents a speed graph as contiguous typed columns, with the edges of each stop_id stored next to each other. It
+    is a read-only mapping from stop_id to the SpeedGraphEdges of the stop, like the dictionary of edge lists returned
+    by `BusOnRoute._get_speed_graph`.
+
+    Attributes:
+        stop_ids (List[str]): the stop_ids of the graph, in order of first appearance
+        offsets (array): the index of the first edge of each stop_id, followed by the total number of edges, as int64
+        speeds (array): the speed of each edge, in meters/second, as float64
+        distance_ends (array): the distance from the bus stop at the end of each edge, in meters, as float64
+        time_ends (array): the time at the end of each edge, in epoch time (milliseconds), as int64
+    """
+
+    def __init__(
+            self,
+            stop_ids: Iterable[str],
+            offsets: array,
+            speeds: array,
+            distance_ends: array,
+            time_ends: array):
+
+        self.stop_ids = list(stop_ids)
+        self.offsets = offsets
+        self.speeds = speeds
+        self.distance_ends = distance_ends
+        self.time_ends = time_ends
+
+        self._stop_indexes = {stop_id: index for index, stop_id in enumerate(self.stop_ids)}
+
+    @classmethod
+    def from_edges(cls, speed_graph: Dict[str, Iterable[SpeedGraphEdge]]):
+        """
+        Packs a dictionary of speed graph edge lists into contiguous columns
+
+        Args:
+            speed_graph (Dict[str, Iterable[SpeedGraphEdge]]): A dictionary where the keys are stop_id, and the
+                values are arrays of speed graph edges for the relevant stop_id key
+
+        Returns:
+            a SpeedGraph class object
+        """
+
+        offsets, speeds, distance_ends, time_ends = array('q', [0]), array('d'), array('d'), array('q')
+
+        for edges in speed_graph.values():
+            for edge in edges:
+                speeds.append(edge.speed)
+                distance_ends.append(edge.distance_end)
+                time_ends.append(edge.time_end)
+            offsets.append(len(speeds))
+
+        return SpeedGraph(speed_graph.keys(), offsets, speeds, distance_ends, time_ends)
+
+    def __len__(self) -> int:
+        return len(self.stop_ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.stop_ids)
+
+    def __contains__(self, stop_id) -> bool:
+        return stop_id in self._stop_indexes
+
+    def __getitem__(self, stop_id: str) -> SpeedGraphEdges:
+        start, end = self.get_edge_range(stop_id)
+        return SpeedGraphEdges(
+            stop_id,
+            memoryview(self.speeds)[start:end],
+            memoryview(self.distance_ends)[start:end],
+            memoryview(self.time_ends)[start:end])
+
+    def get_edge_range(self, stop_id: str) -> Tuple[int, int]:
+        """
+        Gets the position of the edges of a stop_id in the columns
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+
+        Returns:
+            Tuple[int, int]: the index of the first edge of the stop_id and the index after its last edge
+
+        Raises:
+            KeyError: raised when the stop_id is not in the graph
+        """
+        index = self._stop_indexes[stop_id]
+        return self.offsets[index], self.offsets[index + 1]
+
+    def get_edges_count(self) -> int:
+        """
+        Gets the total number of edges of the graph
+
+        Returns:
+            int: the number of edges over all stop_ids
+        """
+        return self.offsets[-1]
+
+    def to_dict(self) -> Dict[str, List[SpeedGraphEdge]]:
+        """
+        Gets the speed graph as a dictionary of SpeedGraphEdge lists
+
+        Returns:
+            Dict[str, List[SpeedGraphEdge]]: A dictionary where the keys are stop_id, and the values are arrays of
+                speed graph edges for the relevant stop_id key
+        """
+        return {stop_id: list(self[stop_id]) for stop_id in self.stop_ids}
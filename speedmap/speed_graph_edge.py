@@ -0,0 +1,38 @@
+from typing import Optional
+from collections import namedtuple
+from speedmap.ping import Ping
+
+# a speed graph edge, which defines speed, time, and distance between each data ping pair
+SpeedGraphEdge = namedtuple('SpeedGraphEdge', ['stop_id', 'speed', 'distance_end', 'time_end'])
+
+# the ping types which start a speed graph edge
+DATA_PING_TYPES = ('DEPARTURE', 'MIDPATH')
+
+
+def get_speed_graph_edge(ping: Ping, next_ping: Ping) -> Optional[SpeedGraphEdge]:
+    """
+    Gets the speed graph edge between a ping and the next ping in the time series
+
+    Args:
+        ping (Ping): the ping at the start of the edge
+        next_ping (Ping): the ping following it in ascending timestamp order
+
+    Returns:
+        Optional[SpeedGraphEdge]: the speed graph edge, or None when the first ping is an 'ARRIVAL' type
+    """
+
+    # ignore any pair of pings where the first ping is an 'ARRIVAL' type
+    if ping.ping_type not in DATA_PING_TYPES:
+        return None
+
+    # compute velocity where v = dx/dt = (distance traveled/time elapsed) and
+    # convert from meters/millisecond to meters/second
+    speed = (next_ping.distance_from_stop - ping.distance_from_stop) / (
+                next_ping.timestamp - ping.timestamp) * 1000
+
+    return SpeedGraphEdge(
+        stop_id=ping.stop_id,
+        speed=speed,
+        distance_end=next_ping.distance_from_stop,
+        time_end=next_ping.timestamp
+    )
@@ -0,0 +1,294 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from speedmap import vectorized
+from speedmap.mesh import ENGINES
+from speedmap.ping import Ping
+from speedmap.speed_graph_edge import DATA_PING_TYPES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class StopIndex:
+    """
+    Represents the speed graph edges of a single stop_id sorted for distance lookups. The edge covering a distance is
+    the first edge whose end reaches it, as when meshing, which is found by bisecting the running maximum of the edge
+    end distances.
+
+    Attributes:
+        reach (array): the running maximum of the edge end distances, in meters, as float64
+        speeds (array): the speed of each edge, in meters/second, as float64
+        distance_ends (array): the distance from the bus stop at the end of each edge, in meters, as float64
+        time_ends (array): the time at the end of each edge, in epoch time (milliseconds), as float64
+    """
+
+    __slots__ = ('reach', 'speeds', 'distance_ends', 'time_ends')
+
+    def __init__(self, speed_graph_for_stop: Iterable[namedtuple]):
+
+        self.reach, self.speeds, self.distance_ends, self.time_ends = array('d'), array('d'), array('d'), array('d')
+
+        reach = float('-inf')
+        for edge in speed_graph_for_stop:
+            reach = max(reach, edge.distance_end)
+            self.reach.append(reach)
+            self.speeds.append(edge.speed)
+            self.distance_ends.append(edge.distance_end)
+            self.time_ends.append(edge.time_end)
+
+    def find_edge(self, distance: float) -> Optional[int]:
+        """
+        Gets the index of the edge covering a distance
+
+        Args:
+            distance (float): the distance from the bus stop, in meters
+
+        Returns:
+            Optional[int]: the index of the first edge whose end is at or after the distance, or None when no edge
+                reaches the distance
+        """
+        index = bisect_left(self.reach, distance)
+        return index if index < len(self.reach) else None
+
+    def get_time(self, index: int, distance: float) -> float:
+        """
+        Interpolates the time at a distance on an edge, as `walk_segment_boundaries` does for segment boundaries. On
+        an edge where the bus stood still, the time at the end of the edge is used.
+
+        Args:
+            index (int): the index of the edge
+            distance (float): the distance from the bus stop, in meters
+
+        Returns:
+            float: the time at the distance, in epoch time (milliseconds)
+        """
+        speed = self.speeds[index]
+        if speed == 0:
+            return self.time_ends[index]
+        return self.time_ends[index] - (self.distance_ends[index] - distance) / speed * 1000
+
+
+class SpeedIndex:
+    """
+    Represents a sorted index of the speed graph and of the pings of a bus on a route, which answers point queries in
+    O(log n) time without meshing: the speed and time at a distance from a stop, and the position at a time
+
+    Attributes:
+        stops (Dict[str, StopIndex]): the distance index of each stop_id
+        stop_ids (List[str]): the stop_ids referenced by `stop_id_codes`
+        time_starts (array): the time at the start of each pair of consecutive pings which forms a speed graph edge,
+            in epoch time (milliseconds), in ascending order, as float64
+        time_ends (array): the time at the end of each pair, as float64
+        distance_starts (array): the distance from the bus stop at the start of each pair, in meters, as float64
+        distance_ends (array): the distance from the bus stop at the end of each pair, in meters, as float64
+        stop_id_codes (array): the index in `stop_ids` of the stop_id of each pair, as int32
+    """
+
+    def __init__(self, speed_graph: Dict[str, Iterable[namedtuple]], ping_list: Sequence[Ping]):
+
+        self.stops = {stop_id: StopIndex(edges) for stop_id, edges in speed_graph.items()}
+
+        # index the time intervals of consecutive pings which are speed graph edges
+        self.stop_ids: List[str] = []
+        self.time_starts, self.time_ends = array('d'), array('d')
+        self.distance_starts, self.distance_ends = array('d'), array('d')
+        self.stop_id_codes = array('i')
+
+        stop_id_codes = {}
+        previous_ping = None
+        for ping in ping_list:
+            if previous_ping is not None and previous_ping.ping_type in DATA_PING_TYPES:
+                code = stop_id_codes.get(previous_ping.stop_id)
+                if code is None:
+                    code = stop_id_codes[previous_ping.stop_id] = len(self.stop_ids)
+                    self.stop_ids.append(previous_ping.stop_id)
+                self.time_starts.append(previous_ping.timestamp)
+                self.time_ends.append(ping.timestamp)
+                self.distance_starts.append(previous_ping.distance_from_stop)
+                self.distance_ends.append(ping.distance_from_stop)
+                self.stop_id_codes.append(code)
+            previous_ping = ping
+
+    def speed_at(self, stop_id: str, distance: float) -> Optional[float]:
+        """
+        Gets the speed of the bus at a distance from a stop
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            distance (float): the distance from the bus stop, in meters
+
+        Returns:
+            Optional[float]: the unrounded speed of the edge covering the distance, in meters/second, or None when the
+                stop_id is unknown or the bus was not seen reaching the distance
+        """
+        stop = self.stops.get(stop_id)
+        index = stop.find_edge(distance) if stop is not None else None
+        return stop.speeds[index] if index is not None else None
+
+    def time_at(self, stop_id: str, distance: float) -> Optional[float]:
+        """
+        Gets the time the bus passed a distance from a stop, interpolated as when meshing
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            distance (float): the distance from the bus stop, in meters
+
+        Returns:
+            Optional[float]: the time at the distance in epoch time (milliseconds), or None when the stop_id is
+                unknown or the bus was not seen reaching the distance
+        """
+        stop = self.stops.get(stop_id)
+        index = stop.find_edge(distance) if stop is not None else None
+        return stop.get_time(index, distance) if index is not None else None
+
+    def position_at(self, timestamp: float) -> Optional[Tuple[str, float]]:
+        """
+        Gets the position of the bus at a time, interpolated linearly between the pings around the time
+
+        Args:
+            timestamp (float): the time in epoch time (milliseconds)
+
+        Returns:
+            Optional[Tuple[str, float]]: the stop_id and the distance from the bus stop, in meters, or None when the
+                time is not between two pings of a speed graph edge, e.g. while the bus is at a stop
+        """
+        index = self._find_interval(timestamp)
+        if index is None:
+            return None
+        return self.stop_ids[self.stop_id_codes[index]], self._get_distance(index, timestamp)
+
+    def speed_at_many(self, stop_id: str, distances: Sequence[float], engine: str = 'python') -> List[Optional[float]]:
+        """
+        Gets the speed of the bus at many distances from a stop, see `speed_at`
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            distances (Sequence[float]): the distances from the bus stop, in meters
+            engine (str): 'python' to bisect each distance, or 'numpy' to search all distances in one batched pass
+
+        Returns:
+            List[Optional[float]]: the speed at each distance in meters/second, or None
+        """
+        stop = self.stops.get(stop_id)
+        if stop is None:
+            return [None] * len(distances)
+        if not self._vectorize(engine, stop.reach):
+            return [self.speed_at(stop_id, distance) for distance in distances]
+
+        indexes, found = self._search_edges(stop, distances)
+        speeds = np.frombuffer(stop.speeds)[indexes]
+        return _to_list(speeds, found)
+
+    def time_at_many(self, stop_id: str, distances: Sequence[float], engine: str = 'python') -> List[Optional[float]]:
+        """
+        Gets the time the bus passed many distances from a stop, see `time_at`
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            distances (Sequence[float]): the distances from the bus stop, in meters
+            engine (str): 'python' to bisect each distance, or 'numpy' to search all distances in one batched pass
+
+        Returns:
+            List[Optional[float]]: the time at each distance in epoch time (milliseconds), or None
+        """
+        stop = self.stops.get(stop_id)
+        if stop is None:
+            return [None] * len(distances)
+        if not self._vectorize(engine, stop.reach):
+            return [self.time_at(stop_id, distance) for distance in distances]
+
+        indexes, found = self._search_edges(stop, distances)
+        speeds = np.frombuffer(stop.speeds)[indexes]
+        time_ends = np.frombuffer(stop.time_ends)[indexes]
+        moving = speeds != 0
+        times = time_ends.copy()
+        times[moving] -= (np.frombuffer(stop.distance_ends)[indexes][moving]
+                          - np.asarray(distances, dtype=np.float64)[moving]) / speeds[moving] * 1000
+        return _to_list(times, found)
+
+    def position_at_many(
+            self,
+            timestamps: Sequence[float],
+            engine: str = 'python') -> List[Optional[Tuple[str, float]]]:
+        """
+        Gets the position of the bus at many times, see `position_at`
+
+        Args:
+            timestamps (Sequence[float]): the times in epoch time (milliseconds)
+            engine (str): 'python' to bisect each time, or 'numpy' to search all times in one batched pass
+
+        Returns:
+            List[Optional[Tuple[str, float]]]: the stop_id and distance at each time, or None
+        """
+        if not self._vectorize(engine, self.time_starts):
+            return [self.position_at(timestamp) for timestamp in timestamps]
+
+        time_starts, time_ends = np.frombuffer(self.time_starts), np.frombuffer(self.time_ends)
+        distance_starts, distance_ends = np.frombuffer(self.distance_starts), np.frombuffer(self.distance_ends)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+
+        # the last pair starting at or before each time, which must also end at or after it
+        indexes = np.searchsorted(time_starts, timestamps, 'right') - 1
+        found = indexes >= 0
+        indexes = np.maximum(indexes, 0)
+        found &= timestamps <= time_ends[indexes]
+
+        durations = time_ends[indexes] - time_starts[indexes]
+        fractions = np.divide(
+            timestamps - time_starts[indexes], durations, out=np.ones_like(durations), where=durations != 0)
+        distances = distance_starts[indexes] + (distance_ends[indexes] - distance_starts[indexes]) * fractions
+
+        stop_ids = self.stop_ids
+        codes = np.frombuffer(self.stop_id_codes, dtype=np.int32)[indexes].tolist()
+        return [
+            (stop_ids[code], distance) if is_found else None
+            for code, distance, is_found in zip(codes, distances.tolist(), found.tolist())]
+
+    def _find_interval(self, timestamp: float) -> Optional[int]:
+        """
+        Gets the index of the last pair of pings starting at or before a time, when it ends at or after the time
+        """
+        index = bisect_right(self.time_starts, timestamp) - 1
+        if index < 0 or timestamp > self.time_ends[index]:
+            return None
+        return index
+
+    def _get_distance(self, index: int, timestamp: float) -> float:
+        """
+        Interpolates the distance at a time within a pair of pings
+        """
+        time_start, time_end = self.time_starts[index], self.time_ends[index]
+        distance_start, distance_end = self.distance_starts[index], self.distance_ends[index]
+        if time_end == time_start:
+            return distance_end
+        return distance_start + (distance_end - distance_start) * (timestamp - time_start) / (time_end - time_start)
+
+    @staticmethod
+    def _vectorize(engine: str, column: array) -> bool:
+        """
+        Checks whether a batched query is run with NumPy, which needs a non-empty column
+        """
+        if engine not in ENGINES:
+            raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+        return engine == 'numpy' and vectorized.HAS_NUMPY and len(column) > 0
+
+    @staticmethod
+    def _search_edges(stop: StopIndex, distances: Sequence[float]):
+        """
+        Gets the index of the edge covering each distance, clipped to the last edge, and whether an edge reaches it
+        """
+        reach = np.frombuffer(stop.reach)
+        indexes = np.searchsorted(reach, np.asarray(distances, dtype=np.float64), 'left')
+        found = indexes < len(reach)
+        return np.minimum(indexes, len(reach) - 1), found
+
+
+def _to_list(values, found) -> List[Optional[float]]:
+    """
+    Converts a NumPy column to a list, with None where no value was found
+    """
+    return [value if is_found else None for value, is_found in zip(values.tolist(), found.tolist())]
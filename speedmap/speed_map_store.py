@@ -0,0 +1,322 @@
+import bisect
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from typing import Iterable, List, Optional, Tuple
+from speedmap.ping_binary import _from_little_endian, _to_little_endian
+from speedmap.segment import Segment
+
+# the file signature and layout version of the speed map store format
+MAGIC = b'SPMX'
+VERSION = 1
+
+# magic, version, padding, generation, stop_id count, segment count, stop_id dictionary size in bytes
+_HEADER = struct.Struct('<4sH2xQQQQ')
+
+
+def write_speed_map_store(segments: Iterable[Segment], file_path: str, mode: Optional[int] = None) -> int:
+    """
+    Publishes a speed map to a store file which any number of processes can memory-map read-only, see SpeedMapStore
+
+    The store holds fixed-width little-endian columns, with the segments grouped by stop_id in the order of the utf-8
+    bytes of the stop_ids, and by segment_index within each stop_id:
+
+        header              magic 'SPMX', version (uint16), 2 padding bytes, generation (uint64),
+                            stop_id count (uint64), segment count (uint64), stop_id dictionary size in bytes (uint64)
+        stop offsets        int64[stop_id count + 1], the first segment of each stop_id and the segment count
+        stop_id offsets     int64[stop_id count + 1], the first byte of each stop_id in the dictionary and its size
+        segment indexes     int64[segment count]
+        segment lengths     float64[segment count]
+        speeds              float64[segment count]
+        stop_ids            the utf-8 bytes of the sorted stop_ids, back to back
+
+    The store is written to a temporary file in the same directory, which then atomically replaces the previous
+    version. Readers never see a partial store: a reader which mapped the previous version keeps reading it, and picks
+    up the new version on `SpeedMapStore.refresh`. A store has a single writer.
+
+    Args:
+        segments (Iterable[Segment]): the speed map segments
+        file_path (str): the location of the store file
+        mode (Optional[int]): the permission bits of the store file, defaults to those of a new file under the umask,
+            e.g. 0o644, so that readers running as other users can open it
+
+    Returns:
+        int: the generation of the published store, one more than the generation of the version it replaced
+    """
+
+    # group the segments by stop_id, in the order of the utf-8 bytes of the stop_ids and then of the segment indexes
+    segments_by_stop_id = {}
+    for segment in segments:
+        segments_by_stop_id.setdefault(segment.stop_id.encode(), []).append(segment)
+    stop_ids = sorted(segments_by_stop_id)
+
+    # build the columns
+    stop_offsets, stop_id_offsets = array('q', [0]), array('q', [0])
+    segment_indexes, segment_lengths, speeds = array('q'), array('d'), array('d')
+    for stop_id in stop_ids:
+        for segment in sorted(segments_by_stop_id[stop_id], key=lambda item: item.segment_index):
+            segment_indexes.append(segment.segment_index)
+            segment_lengths.append(segment.segment_length)
+            speeds.append(segment.speed)
+        stop_offsets.append(len(speeds))
+        stop_id_offsets.append(stop_id_offsets[-1] + len(stop_id))
+    stop_ids_data = b''.join(stop_ids)
+
+    # write the next generation next to the store and swap it into place
+    directory = os.path.dirname(os.path.abspath(file_path))
+    generation = _get_generation(file_path) + 1
+    descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+
+            # the temporary file is only readable by its owner until its mode is set
+            if hasattr(os, 'fchmod'):
+                os.fchmod(file.fileno(), mode if mode is not None else _get_default_mode())
+            file.write(_HEADER.pack(MAGIC, VERSION, generation, len(stop_ids), len(speeds), len(stop_ids_data)))
+            for column in (stop_offsets, stop_id_offsets, segment_indexes, segment_lengths, speeds):
+                file.write(_to_little_endian(column.typecode, column))
+            file.write(stop_ids_data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+    return generation
+
+
+class SpeedMapStore:
+    """
+    Represents a read-only view of a speed map store file published by `write_speed_map_store`
+
+    The file is memory-mapped and the columns are views of the mapping, so the segments are looked up without copying
+    or deserializing them, and every process mapping the store shares the same pages of the operating system cache.
+    A stop_id is found by a binary search of the sorted stop_ids in the mapping, and a segment by its position within
+    the stop_id, so opening a store does not read the segments.
+
+    Attributes:
+        file_path (str): the location of the store file
+        generation (int): the generation of the mapped version of the store
+    """
+
+    def __init__(self, file_path: str):
+
+        self.file_path = file_path
+        self.generation = 0
+
+        self._mapped = None
+        self._views: List[memoryview] = []
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._speeds)
+
+    def __contains__(self, stop_id) -> bool:
+        return self._find_stop(stop_id) is not None
+
+    @property
+    def stops_count(self) -> int:
+        """
+        Gets the number of stop_ids of the store
+
+        Returns:
+            int: the number of stop_ids
+        """
+        return len(self._stop_offsets) - 1
+
+    def get_stop_ids(self) -> List[str]:
+        """
+        Gets the stop_ids of the store, decoding each one
+
+        Returns:
+            List[str]: the stop_ids, in the order of their utf-8 bytes
+        """
+        return [self._get_stop_id_bytes(stop).decode() for stop in range(self.stops_count)]
+
+    def get_speed(self, stop_id: str, segment_index: int) -> Optional[float]:
+        """
+        Gets the speed of a segment
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            segment_index (int): the relative order of the segment within all segments for the stop_id
+
+        Returns:
+            Optional[float]: the speed of the segment in meters/second, or None when it is not in the store
+        """
+        row = self._find_segment(stop_id, segment_index)
+        return None if row is None else self._speeds[row]
+
+    def get_segment(self, stop_id: str, segment_index: int) -> Optional[Segment]:
+        """
+        Gets a segment
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+            segment_index (int): the relative order of the segment within all segments for the stop_id
+
+        Returns:
+            Optional[Segment]: the segment, or None when it is not in the store
+        """
+        row = self._find_segment(stop_id, segment_index)
+        if row is None:
+            return None
+        return Segment(stop_id, segment_index, self._segment_lengths[row], self._speeds[row])
+
+    def get_stop_columns(self, stop_id: str) -> Optional[Tuple[memoryview, memoryview, memoryview]]:
+        """
+        Gets the segments of a stop_id as views of the mapped columns, without copying them
+
+        The views keep the mapping open, so they must be released before `close`.
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+
+        Returns:
+            Optional[Tuple[memoryview, memoryview, memoryview]]: the segment indexes (int64), segment lengths
+                (float64) and speeds (float64) of the stop_id, or None when it is not in the store
+        """
+        stop = self._find_stop(stop_id)
+        if stop is None:
+            return None
+        start, end = self._stop_offsets[stop], self._stop_offsets[stop + 1]
+        return self._segment_indexes[start:end], self._segment_lengths[start:end], self._speeds[start:end]
+
+    def refresh(self) -> bool:
+        """
+        Maps the latest published version of the store, when it was replaced since it was mapped. Views returned
+        before stay valid and keep reading the previous version.
+
+        Returns:
+            bool: True when a new version was mapped
+        """
+        status = os.stat(self.file_path)
+        if (status.st_dev, status.st_ino) == self._file_identity:
+            return False
+
+        self._mapped, self._views = None, []
+        self._open()
+        return True
+
+    def close(self):
+        """
+        Unmaps the store
+
+        Raises:
+            BufferError: raised when views returned by `get_stop_columns` are still held
+        """
+        for view in self._views:
+            view.release()
+        self._views = []
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def _open(self):
+        """
+        Maps the store file and slices its columns out of the mapping
+        """
+        with open(self.file_path, "rb") as file:
+            status = os.fstat(file.fileno())
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # validate the header
+        if len(mapped) < _HEADER.size:
+            raise ValueError("File is not a speed map store: " + str(self.file_path))
+        magic, version, generation, stops_count, segments_count, stop_ids_size = _HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("File is not a speed map store: " + str(self.file_path))
+        if len(mapped) < _HEADER.size + 16 * (stops_count + 1) + 24 * segments_count + stop_ids_size:
+            raise ValueError("Speed map store is truncated: " + str(self.file_path))
+
+        # slice each column out of the mapping without copying
+        view = memoryview(mapped)
+        columns, offset = [], _HEADER.size
+        for typecode, count in (
+                ('q', stops_count + 1),
+                ('q', stops_count + 1),
+                ('q', segments_count),
+                ('d', segments_count),
+                ('d', segments_count)):
+            columns.append(_from_little_endian(typecode, view[offset:offset + 8 * count]))
+            offset += 8 * count
+        self._stop_ids_data = view[offset:offset + stop_ids_size]
+
+        self._stop_offsets, self._stop_id_offsets, self._segment_indexes, self._segment_lengths, self._speeds = \
+            columns
+        self._views = [view, self._stop_ids_data] + [column for column in columns if isinstance(column, memoryview)]
+        self._mapped = mapped
+        self._file_identity = (status.st_dev, status.st_ino)
+        self.generation = generation
+
+    def _get_stop_id_bytes(self, stop: int) -> bytes:
+        """
+        Gets the utf-8 bytes of the stop_id at a position of the sorted stop_ids
+        """
+        return self._stop_ids_data[self._stop_id_offsets[stop]:self._stop_id_offsets[stop + 1]].tobytes()
+
+    def _find_stop(self, stop_id: str) -> Optional[int]:
+        """
+        Finds the position of a stop_id in the sorted stop_ids with a binary search
+        """
+        encoded = stop_id.encode()
+        low, high = 0, self.stops_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_stop_id_bytes(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.stops_count and self._get_stop_id_bytes(low) == encoded:
+            return low
+        return None
+
+    def _find_segment(self, stop_id: str, segment_index: int) -> Optional[int]:
+        """
+        Finds the row of a segment, which is at its segment index within the stop_id unless segments are missing
+        """
+        stop = self._find_stop(stop_id)
+        if stop is None:
+            return None
+        start, end = self._stop_offsets[stop], self._stop_offsets[stop + 1]
+
+        # segment indexes usually count up from 0, otherwise fall back to a binary search
+        row = start + segment_index
+        if not start <= row < end or self._segment_indexes[row] != segment_index:
+            row = bisect.bisect_left(self._segment_indexes, segment_index, start, end)
+        if row < end and self._segment_indexes[row] == segment_index:
+            return row
+        return None
+
+
+def _get_default_mode() -> int:
+    """
+    Gets the permission bits of a new file under the umask of the process
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _get_generation(file_path: str) -> int:
+    """
+    Gets the generation of a published store, or 0 when there is none
+    """
+    try:
+        with open(file_path, "rb") as file:
+            header = file.read(_HEADER.size)
+    except FileNotFoundError:
+        return 0
+    if len(header) < _HEADER.size:
+        return 0
+    magic, version, generation, _, _, _ = _HEADER.unpack(header)
+    return generation if magic == MAGIC and version == VERSION else 0
@@ -0,0 +1,148 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from speedmap.external_sort import DEFAULT_MEMORY_BUDGET, iter_sorted_pings
+from speedmap.mesh import ENGINES, mesh_speed_graph, validate_segment_length
+from speedmap.ping import Ping
+from speedmap.segment import Segment
+from speedmap.speed_graph_edge import SpeedGraphEdge, get_speed_graph_edge
+
+
+class StreamingBusOnRoute:
+    """
+    Represents a single bus on a single route whose pings are pushed one at a time, in ascending timestamp order.
+    The speed map segments of a stop_id are computed as soon as its first 'ARRIVAL' ping is seen, and only the speed
+    graph edges of stops that are still open are kept in memory.
+
+    For a time ordered feed where each 'ARRIVAL' ping follows the pings of its own stop_id, the emitted segments are
+    the same as those of `BusOnRoute.get_speed_map` over the whole feed.
+
+    Attributes:
+        segment_length (float): a user defined length for a speed map segment, in meters
+        engine (str): the meshing engine, either 'python' or 'numpy'
+    """
+
+    def __init__(self, segment_length: float, engine: str = 'python'):
+
+        # validate input
+        validate_segment_length(segment_length)
+        if engine not in ENGINES:
+            raise ValueError("Engine must be one of " + ", ".join(ENGINES))
+
+        self.segment_length = segment_length
+        self.engine = engine
+
+        self._previous_ping = None
+        self._open_edges: Dict[str, List[SpeedGraphEdge]] = {}
+        self._closed_stop_ids: Set[str] = set()
+
+    @property
+    def open_stop_ids(self) -> List[str]:
+        """
+        Gets the stop_ids that have speed graph edges but whose 'ARRIVAL' ping has not been seen yet
+
+        Returns:
+            List[str]: the open stop_ids
+        """
+        return list(self._open_edges.keys())
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        """
+        Gets the timestamp of the last ping added
+
+        Returns:
+            Optional[int]: the timestamp, or None before the first ping
+        """
+        return self._previous_ping.timestamp if self._previous_ping is not None else None
+
+    def is_stop_closed(self, stop_id: str) -> bool:
+        """
+        Gets whether the 'ARRIVAL' ping of a stop_id was seen, after which its further pings are ignored
+
+        Args:
+            stop_id (str): surrogate identifier of the bus stop
+
+        Returns:
+            bool: True when the stop_id is closed
+        """
+        return stop_id in self._closed_stop_ids
+
+    def add_ping(self, ping: Ping) -> List[Segment]:
+        """
+        Adds the next ping of the time series, closing its stop_id if it is the first 'ARRIVAL' ping of the stop
+
+        Args:
+            ping (Ping): the next ping, with a timestamp at or after the previous ping
+
+        Returns:
+            List[Segment]: the speed map segments of the stop_id closed by this ping, or an empty list
+
+        Raises:
+            ValueError: if the ping is older than the previous ping
+        """
+
+        previous_ping = self._previous_ping
+
+        if previous_ping is not None:
+
+            # the speed graph can only be extended forward in time
+            if ping.timestamp < previous_ping.timestamp:
+                raise ValueError("Pings must be added in ascending timestamp order")
+
+            # add the edge between the previous ping and this ping to the still open stop_id of the previous ping
+            speed_graph_edge = get_speed_graph_edge(previous_ping, ping)
+            if speed_graph_edge is not None and previous_ping.stop_id not in self._closed_stop_ids:
+                self._open_edges.setdefault(previous_ping.stop_id, []).append(speed_graph_edge)
+
+        self._previous_ping = ping
+
+        # only the first 'ARRIVAL' of a stop_id defines its length, as in BusOnRoute
+        if ping.ping_type != 'ARRIVAL' or ping.stop_id in self._closed_stop_ids:
+            return []
+
+        # close the stop_id, releasing its edges once its segments are computed
+        self._closed_stop_ids.add(ping.stop_id)
+        speed_graph_for_stop = self._open_edges.pop(ping.stop_id, [])
+
+        return mesh_speed_graph(
+            {ping.stop_id: ping.distance_from_stop},
+            {ping.stop_id: speed_graph_for_stop},
+            self.segment_length,
+            engine=self.engine)
+
+    def iter_speed_map(self, pings: Iterable[Ping]) -> Iterator[Segment]:
+        """
+        Adds each ping of a time ordered series and yields the speed map segments as each stop_id is closed
+
+        Args:
+            pings (Iterable[Ping]): the pings in ascending timestamp order
+
+        Returns:
+            Iterator[Segment]: the speed map segments, grouped by stop_id in order of their 'ARRIVAL' pings
+        """
+        for ping in pings:
+            yield from self.add_ping(ping)
+
+    def iter_speed_map_from_file(
+            self,
+            file_path: str,
+            memory_budget: int = DEFAULT_MEMORY_BUDGET,
+            temp_dir: Optional[str] = None,
+            cleaner=None) -> Iterator[Segment]:
+        """
+        Sorts the pings of a json lines ping file of any size with an external sort and yields the speed map segments
+        as each stop_id is closed, so the memory is bounded by the budget rather than by the size of the file
+
+        Args:
+            file_path (str): the location of the ping file, in any order
+            memory_budget (int): the approximate memory available to the sort, in bytes
+            temp_dir (str): the directory of the sort spill files, defaults to the system temporary directory
+            cleaner (PingCleaner): when given, malformed lines are quarantined and the sorted pings are cleaned as they
+                stream, see `speedmap.cleaning.PingCleaner`
+
+        Returns:
+            Iterator[Segment]: the speed map segments, grouped by stop_id in order of their 'ARRIVAL' pings
+        """
+        pings = iter_sorted_pings(file_path, memory_budget, temp_dir, cleaner)
+        if cleaner is not None:
+            pings = cleaner.clean(pings)
+        return self.iter_speed_map(pings)
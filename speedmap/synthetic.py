@@ -0,0 +1,147 @@
+import json
+import os
+import random
+from typing import Iterable, List
+from speedmap.ping import Ping
+
+
+def generate_trip(
+        stops: int = 10,
+        pings_per_stop: int = 100,
+        jitter: float = 0.2,
+        out_of_order_fraction: float = 0.0,
+        seed: int = 0,
+        start_timestamp: int = 0) -> List[Ping]:
+    """
+    Generates the pings of a synthetic trip of a single bus, deterministically for a given seed
+
+    Each stop_id starts with a 'DEPARTURE' ping at distance 0, followed by 'MIDPATH' pings at increasing distances and
+    ends with an 'ARRIVAL' ping at the stop length. The time between pings and the distance travelled between pings
+    vary randomly by up to the jitter fraction of their nominal values, so every speed is positive and every timestamp
+    is unique.
+
+    Args:
+        stops (int): the number of stop_ids on the trip
+        pings_per_stop (int): the number of pings of each stop_id, including the 'DEPARTURE' and 'ARRIVAL' pings
+        jitter (float): the relative variation of the ping interval and of the distance between pings, in [0, 1)
+        out_of_order_fraction (float): the fraction of pings swapped with the following ping, in [0, 1], to mimic
+            pings which are received out of order
+        seed (int): the seed of the random number generator
+        start_timestamp (int): the timestamp of the first ping, in epoch time (milliseconds)
+
+    Returns:
+        List[Ping]: the pings of the trip, in the order they are received
+
+    Raises:
+        ValueError: raised when a parameter is out of range
+    """
+
+    # validate input
+    if stops < 1:
+        raise ValueError("Stops must be at least 1")
+    if pings_per_stop < 2:
+        raise ValueError("Pings per stop must be at least 2")
+    if not 0 <= jitter < 1:
+        raise ValueError("Jitter must be in [0, 1)")
+    if not 0 <= out_of_order_fraction <= 1:
+        raise ValueError("Out of order fraction must be in [0, 1]")
+
+    generator = random.Random(seed)
+    pings = []
+    timestamp = start_timestamp
+
+    for stop in range(stops):
+        stop_id = str(1000 + stop)
+        stop_length = round(generator.uniform(200.0, 1000.0), 1)
+
+        # spread the stop length over jittered steps between consecutive pings
+        steps = [1 + generator.uniform(-jitter, jitter) for _ in range(pings_per_stop - 1)]
+        scale = stop_length / sum(steps)
+        distance = 0.0
+
+        for i in range(pings_per_stop):
+            if i == 0:
+                ping_type = 'DEPARTURE'
+            elif i == pings_per_stop - 1:
+                ping_type = 'ARRIVAL'
+                distance = stop_length
+            else:
+                ping_type = 'MIDPATH'
+                distance += steps[i - 1] * scale
+
+            pings.append(Ping(timestamp, stop_id, ping_type, distance))
+
+            # advance the clock by a jittered interval of about one second
+            timestamp += max(1, round(1000 * (1 + generator.uniform(-jitter, jitter))))
+
+        # dwell at the stop before departing to the next one
+        timestamp += 30000
+
+    # swap a fraction of the pings with their successor
+    for _ in range(round(out_of_order_fraction * (len(pings) - 1))):
+        i = generator.randrange(len(pings) - 1)
+        pings[i], pings[i + 1] = pings[i + 1], pings[i]
+
+    return pings
+
+
+def generate_buses(
+        buses: int = 1,
+        stops: int = 10,
+        pings_per_stop: int = 100,
+        jitter: float = 0.2,
+        out_of_order_fraction: float = 0.0,
+        seed: int = 0) -> List[List[Ping]]:
+    """
+    Generates the synthetic trips of several buses on the same route, see `generate_trip`
+
+    Args:
+        buses (int): the number of buses
+        stops (int): the number of stop_ids on each trip
+        pings_per_stop (int): the number of pings of each stop_id
+        jitter (float): the relative variation of the ping interval and of the distance between pings, in [0, 1)
+        out_of_order_fraction (float): the fraction of pings swapped with the following ping, in [0, 1]
+        seed (int): the seed of the first bus, incremented for each following bus
+
+    Returns:
+        List[List[Ping]]: the pings of each bus, in the order they are received
+    """
+    return [
+        generate_trip(stops, pings_per_stop, jitter, out_of_order_fraction, seed + bus, start_timestamp=bus * 60000)
+        for bus in range(buses)
+    ]
+
+
+def write_ping_file(pings: Iterable[Ping], file_path: str):
+    """
+    Writes pings to a json lines ping file in the format read by `BusOnRoute.from_file`
+
+    Args:
+        pings (Iterable[Ping]): the pings to write, in file order
+        file_path (str): the location of the ping file to write
+    """
+    with open(file_path, "w") as file:
+        file.writelines(
+            '{"timestamp": %d, "stopId": %s, "pingType": "%s", "distanceFromStop": %s}\n' % (
+                ping.timestamp, json.dumps(ping.stop_id), ping.ping_type, json.dumps(float(ping.distance_from_stop)))
+            for ping in pings)
+
+
+def write_synthetic_files(directory: str, buses: int = 1, **kwargs) -> List[str]:
+    """
+    Generates the synthetic trips of several buses and writes each one to a ping file named bus_<n>.jsonl
+
+    Args:
+        directory (str): the directory of the ping files, which must exist
+        buses (int): the number of buses
+        **kwargs: the trip parameters, see `generate_buses`
+
+    Returns:
+        List[str]: the locations of the ping files, one per bus
+    """
+    file_paths = []
+    for bus, pings in enumerate(generate_buses(buses, **kwargs)):
+        file_path = os.path.join(directory, "bus_" + str(bus) + ".jsonl")
+        write_ping_file(pings, file_path)
+        file_paths.append(file_path)
+    return file_paths
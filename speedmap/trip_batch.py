@@ -0,0 +1,389 @@
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from speedmap import vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.mesh import validate_segment_length
+from speedmap.ping import Ping
+from speedmap.ping_array import ARRIVAL, PingArray
+from speedmap.segment_array import SegmentArray
+
+np = vectorized.np
+
+# the exceptions raised by `BusOnRoute.get_speed_map` for a trip whose speed map cannot be computed, by error code.
+# Code 0 is a trip without error
+TRIP_ERRORS = (None, KeyError, IndexError, ZeroDivisionError)
+_KEY_ERROR, _INDEX_ERROR, _ZERO_DIVISION_ERROR = range(1, len(TRIP_ERRORS))
+
+# the messages of the exceptions raised for each error code
+_TRIP_ERROR_MESSAGES = (None, "stop_id has no speed graph", "list index out of range", "float division by zero")
+
+
+class SegmentTable(SegmentArray):
+    """
+    Represents the speed maps of many trips packed into the typed columns of a single SegmentArray, with the segments
+    of each trip stored next to each other in trip order
+
+    Attributes:
+        trip_indexes (array): the index of the trip of each segment in `trip_ids`, as int64
+        trip_ids (List[Any]): the identifiers of the trips
+        trip_offsets (array): the index of the first segment of each trip, followed by the total number of segments,
+            as int64
+        trip_errors (Dict[Any, Exception]): the exception of each trip whose speed map could not be computed, by trip
+            id. These trips have no segments
+    """
+
+    def __init__(
+            self,
+            trip_indexes: Iterable[int] = (),
+            stop_id_codes: Iterable[int] = (),
+            segment_indexes: Iterable[int] = (),
+            segment_lengths: Iterable[float] = (),
+            speeds: Iterable[float] = (),
+            stop_ids: Iterable[str] = (),
+            trip_ids: Iterable[Any] = (),
+            trip_offsets: Iterable[int] = (0,),
+            trip_errors: Optional[Dict[Any, Exception]] = None):
+
+        super().__init__(stop_id_codes, segment_indexes, segment_lengths, speeds, stop_ids)
+        self.trip_indexes = array('q', trip_indexes)
+        self.trip_ids = list(trip_ids)
+        self.trip_offsets = array('q', trip_offsets)
+        self.trip_errors = {} if trip_errors is None else trip_errors
+
+    def get_trip(self, trip_index: int) -> SegmentArray:
+        """
+        Gets the segments of a single trip
+
+        Args:
+            trip_index (int): the index of the trip in `trip_ids`
+
+        Returns:
+            SegmentArray: the speed map segments of the trip, as `BusOnRoute.get_speed_map` would return them
+        """
+        return SegmentArray.__getitem__(self, slice(self.trip_offsets[trip_index], self.trip_offsets[trip_index + 1]))
+
+
+class TripBatch:
+    """
+    Represents the pings of many trips packed as ragged arrays: the ping columns of every trip concatenated into a
+    single PingArray, and the offset of the first ping of each trip. Each trip is the ping list of one BusOnRoute, in
+    ascending timestamp order.
+
+    Attributes:
+        pings (PingArray): the pings of every trip, in trip order
+        trip_offsets (array): the index of the first ping of each trip, followed by the total number of pings, as int64
+        trip_ids (List[Any]): the identifiers of the trips, which default to the trip indexes
+    """
+
+    def __init__(self, pings: PingArray, trip_offsets: Iterable[int], trip_ids: Optional[Iterable[Any]] = None):
+
+        self.pings = pings
+        self.trip_offsets = array('q', trip_offsets)
+        self.trip_ids = list(range(len(self.trip_offsets) - 1)) if trip_ids is None else list(trip_ids)
+
+        # validate input
+        if not self.trip_offsets or self.trip_offsets[0] != 0 or self.trip_offsets[-1] != len(pings):
+            raise ValueError("Trip offsets must start at 0 and end at the number of pings")
+        if any(self.trip_offsets[i] > self.trip_offsets[i + 1] for i in range(len(self.trip_offsets) - 1)):
+            raise ValueError("Trip offsets must be in ascending order")
+        if len(self.trip_ids) != len(self.trip_offsets) - 1:
+            raise ValueError("There must be one trip id per trip")
+
+    @classmethod
+    def from_trips(cls, trips: Iterable[Iterable[Ping]], trip_ids: Optional[Iterable[Any]] = None):
+        """
+        Packs the pings of many trips into ragged arrays
+
+        Args:
+            trips (Iterable[Iterable[Ping]]): the pings of each trip, in ascending timestamp order
+            trip_ids (Optional[Iterable[Any]]): the identifiers of the trips, which default to the trip indexes
+
+        Returns:
+            a TripBatch class object
+        """
+        pings, trip_offsets = PingArray(), array('q', [0])
+        for trip in trips:
+            for ping in trip:
+                pings.append(ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop)
+            trip_offsets.append(len(pings))
+        return TripBatch(pings, trip_offsets, trip_ids)
+
+    @classmethod
+    def from_ping_arrays(cls, ping_arrays: Sequence[PingArray], trip_ids: Optional[Iterable[Any]] = None):
+        """
+        Joins the ping arrays of many trips into ragged arrays without a Ping object per ping
+
+        Args:
+            ping_arrays (Sequence[PingArray]): the pings of each trip, in ascending timestamp order
+            trip_ids (Optional[Iterable[Any]]): the identifiers of the trips, which default to the trip indexes
+
+        Returns:
+            a TripBatch class object
+        """
+        trip_offsets = array('q', [0])
+        for ping_array in ping_arrays:
+            trip_offsets.append(trip_offsets[-1] + len(ping_array))
+        return TripBatch(PingArray.concatenate(ping_arrays), trip_offsets, trip_ids)
+
+    def __len__(self) -> int:
+        return len(self.trip_ids)
+
+    def get_trip(self, trip_index: int) -> PingArray:
+        """
+        Gets the pings of a single trip
+
+        Args:
+            trip_index (int): the index of the trip in `trip_ids`
+
+        Returns:
+            PingArray: the pings of the trip
+        """
+        return self.pings[self.trip_offsets[trip_index]:self.trip_offsets[trip_index + 1]]
+
+    def get_speed_maps(self, segment_length: float, errors: str = 'raise') -> SegmentTable:
+        """
+        Computes the speed map of every trip, as `BusOnRoute.get_speed_map` on the pings of each trip
+
+        With NumPy, all speed graphs are built and all segment boundaries are interpolated in a few vectorized passes
+        over the packed columns, so there is no Python call per trip or per stop. The segments are identical to the
+        per trip speed maps. Without NumPy, the speed map of each trip is computed in turn.
+
+        Args:
+            segment_length (float): a user defined length for a speed map segment, in meters
+            errors (str): 'raise' to raise the exception of the first trip whose speed map cannot be computed, or
+                'skip' to leave the trip without segments and record its exception in `SegmentTable.trip_errors`
+
+        Returns:
+            SegmentTable: the speed map segments of every trip, in trip order
+
+        Raises:
+            ValueError: if the segment length is invalid (less than 0) or errors is not 'raise' or 'skip'
+            TypeError: if the segment length cannot be parsed to a value
+            KeyError: if a stop_id of a trip has no speed graph and errors is 'raise'
+            IndexError: if the speed graph edges of a trip end before a stop length is reached and errors is 'raise'
+            ZeroDivisionError: if two pings of a trip form an edge of zero duration, or a boundary is interpolated on
+                an edge with zero speed, and errors is 'raise'
+        """
+
+        # validate input
+        validate_segment_length(segment_length)
+        if errors not in ('raise', 'skip'):
+            raise ValueError("Errors must be one of raise, skip")
+
+        if vectorized.HAS_NUMPY:
+            return _mesh_trips_numpy(self, segment_length, errors)
+        return _mesh_trips_python(self, segment_length, errors)
+
+
+def _mesh_trips_python(batch: TripBatch, segment_length: float, errors: str) -> SegmentTable:
+    """
+    Computes the speed map of each trip in turn with a BusOnRoute
+    """
+    segment_table = SegmentTable(stop_ids=batch.pings.stop_ids, trip_ids=batch.trip_ids)
+
+    for trip_index, trip_id in enumerate(batch.trip_ids):
+        try:
+            segments = BusOnRoute(batch.get_trip(trip_index)).get_speed_map(segment_length)
+        except TRIP_ERRORS[1:] as error:
+            if errors == 'raise':
+                raise type(error)("Trip " + repr(trip_id) + ": " + str(error)) from error
+            segment_table.trip_errors[trip_id] = error
+            segments = []
+
+        segment_table.extend(segments)
+        segment_table.trip_indexes.extend([trip_index] * len(segments))
+        segment_table.trip_offsets.append(len(segment_table))
+
+    return segment_table
+
+
+def _mesh_trips_numpy(batch: TripBatch, segment_length: float, errors: str) -> SegmentTable:
+    """
+    Computes the speed map of every trip in a few vectorized passes over the packed ping columns
+
+    The per stop algorithm of `speedmap.vectorized.mesh_stop_boundaries` is applied to every stop of every trip at
+    once. Its running maximums are made segmented by offsetting each value with the index of its group times a bound
+    on the values: the edge end distances are replaced by their integer ranks, so the offset keys compare exactly, and
+    a single `maximum.accumulate` and `searchsorted` then never cross from one group into the next.
+    """
+
+    # read the packed columns without copying
+    pings = batch.pings
+    timestamps = np.frombuffer(pings.timestamps, dtype=np.int64)
+    stop_id_codes = np.frombuffer(pings.stop_id_codes, dtype=np.int32).astype(np.int64)
+    ping_type_codes = np.frombuffer(pings.ping_type_codes, dtype=np.int8)
+    distances = np.frombuffer(pings.distances, dtype=np.float64)
+    trip_offsets = np.frombuffer(batch.trip_offsets, dtype=np.int64)
+    trips_count = len(trip_offsets) - 1
+
+    # key every ping by its trip and stop_id, which orders the keys by trip
+    ping_trip_indexes = np.repeat(np.arange(trips_count, dtype=np.int64), np.diff(trip_offsets))
+    ping_keys = ping_trip_indexes * max(len(pings.stop_ids), 1) + stop_id_codes
+    trip_errors = np.zeros(trips_count, dtype=np.int8)
+
+    # build the speed graph edges between each data ping and the next ping of the same trip
+    is_pair = ping_trip_indexes[:-1] == ping_trip_indexes[1:]
+    is_edge = is_pair & (ping_type_codes[:-1] != ARRIVAL)
+    durations = np.diff(timestamps)[is_edge]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        edge_speeds = np.diff(distances)[is_edge] / durations * 1000
+    trip_errors[ping_trip_indexes[:-1][is_edge][durations == 0]] = _ZERO_DIVISION_ERROR
+
+    # group the edges by trip and stop_id, keeping the ping order of the edges of each stop_id
+    edge_keys = ping_keys[:-1][is_edge]
+    order = np.argsort(edge_keys, kind='stable')
+    edge_keys, edge_speeds = edge_keys[order], edge_speeds[order]
+    edge_distance_ends = distances[1:][is_edge][order]
+    edge_time_ends = timestamps[1:][is_edge][order].astype(np.float64)
+    group_keys, group_starts = np.unique(edge_keys, return_index=True)
+    group_ends = np.append(group_starts[1:], len(edge_keys)).astype(np.int64)
+
+    # get the stop length of each stop_id from its first 'ARRIVAL' ping, in the order of the first 'ARRIVAL' pings
+    arrival_indexes = np.flatnonzero(ping_type_codes == ARRIVAL)
+    stop_keys, first_arrivals = np.unique(ping_keys[arrival_indexes], return_index=True)
+    first_arrivals = arrival_indexes[first_arrivals]
+    stop_order = np.argsort(first_arrivals, kind='stable')
+    stop_keys, first_arrivals = stop_keys[stop_order], first_arrivals[stop_order]
+    stop_lengths = distances[first_arrivals]
+    stop_trip_indexes = ping_trip_indexes[first_arrivals]
+    stops_count = len(stop_keys)
+
+    # a stop_id is in the speed graph of its trip when one of its pings is followed by another ping of the trip
+    graph_keys = np.unique(ping_keys[:-1][is_pair])
+    stop_errors = np.where(np.isin(stop_keys, graph_keys), 0, _KEY_ERROR).astype(np.int8)
+
+    # find the edge group of each stop_id, which is empty when it has no edges
+    stop_groups = np.searchsorted(group_keys, stop_keys)
+    has_group = np.append(group_keys, -1)[stop_groups] == stop_keys
+    stop_edge_starts = np.where(has_group, np.append(group_starts, 0)[stop_groups], 0)
+    stop_edges_counts = np.where(has_group, np.append(group_ends, 0)[stop_groups] - stop_edge_starts, 0)
+
+    # count the segments of each stop_id, matching `speedmap.vectorized.get_segment_count`
+    segment_counts = _get_segment_counts(stop_lengths, segment_length)
+    segment_counts[stop_errors != 0] = 0
+    segment_offsets = np.concatenate(([0], np.cumsum(segment_counts)))
+    segments_count = int(segment_offsets[-1])
+
+    # determine the start and end distances of every segment
+    segment_stops = np.repeat(np.arange(stops_count, dtype=np.int64), segment_counts)
+    segment_indexes = np.arange(segments_count, dtype=np.int64) - segment_offsets[segment_stops]
+    segment_stop_lengths = stop_lengths[segment_stops]
+    segment_distance_starts = segment_indexes * segment_length
+    segment_distance_ends = segment_distance_starts + segment_length
+    segment_distance_ends = np.where(
+        segment_distance_ends <= segment_stop_lengths, segment_distance_ends, segment_stop_lengths)
+
+    # rank the edge end distances and the segment boundaries together, so that offset keys compare exactly
+    values = np.unique(np.concatenate((edge_distance_ends, segment_distance_starts, segment_distance_ends)))
+    ranks_count = len(values) + 1
+    edge_groups = np.repeat(np.arange(len(group_keys), dtype=np.int64), group_ends - group_starts)
+
+    # take the segmented running maximum of the edge end distances, as a sorted key over all groups
+    edge_ranks = np.searchsorted(values, edge_distance_ends)
+    edge_rank_keys = np.maximum.accumulate(edge_groups * ranks_count + edge_ranks)
+
+    # find the first edge ending past each segment start and the first edge ending at or past each segment end
+    segment_groups = np.where(has_group, stop_groups, 0)[segment_stops]
+    segment_edge_starts = stop_edge_starts[segment_stops]
+    edge_indexes = np.empty(2 * segments_count, dtype=np.int64)
+    edge_indexes[0::2] = np.searchsorted(
+        edge_rank_keys, segment_groups * ranks_count + np.searchsorted(values, segment_distance_starts), side='right')
+    edge_indexes[1::2] = np.searchsorted(
+        edge_rank_keys, segment_groups * ranks_count + np.searchsorted(values, segment_distance_ends), side='left')
+    edge_indexes -= np.repeat(segment_edge_starts, 2)
+    edge_indexes = np.minimum(np.maximum(edge_indexes, 0), np.repeat(stop_edges_counts[segment_stops], 2))
+
+    # the edge index can only move forward within a stop_id, as in the pure python loop
+    index_bound = len(edge_keys) + 1
+    boundary_stop_offsets = np.repeat(segment_stops, 2) * index_bound
+    edge_indexes = np.maximum.accumulate(boundary_stop_offsets + edge_indexes) - boundary_stop_offsets
+    start_indexes, end_indexes = edge_indexes[0::2], edge_indexes[1::2]
+
+    # flag the boundaries past the last edge of their stop_id, which read a placeholder edge after the last edge
+    segment_edges_counts = stop_edges_counts[segment_stops]
+    start_out_of_range, end_out_of_range = start_indexes >= segment_edges_counts, end_indexes >= segment_edges_counts
+    start_edges = np.where(start_out_of_range, len(edge_keys), segment_edge_starts + start_indexes)
+    end_edges = np.where(end_out_of_range, len(edge_keys), segment_edge_starts + end_indexes)
+    edge_speeds = np.append(edge_speeds, 1.0)
+    edge_distance_ends, edge_time_ends = np.append(edge_distance_ends, 0.0), np.append(edge_time_ends, 0.0)
+    start_speeds, end_speeds = edge_speeds[start_edges], edge_speeds[end_edges]
+
+    # linearly interpolate the time at the start and end of every segment: t1 = t2 - (d2 - d1)/v
+    with np.errstate(divide='ignore', invalid='ignore'):
+        segment_time_starts = edge_time_ends[start_edges] / 1000 \
+            - (edge_distance_ends[start_edges] - segment_distance_starts) / start_speeds
+        segment_time_ends = edge_time_ends[end_edges] / 1000 \
+            - (edge_distance_ends[end_edges] - segment_distance_ends) / end_speeds
+
+        # use dx/dt = v to calculate the speed of every segment
+        segment_lengths = segment_distance_ends - segment_distance_starts
+        segment_times = segment_time_ends - segment_time_starts
+        segment_speeds = segment_lengths / segment_times
+
+    # find the error of each segment, in the order the pure python loop would meet them
+    segment_errors = np.select(
+        [start_out_of_range, start_speeds == 0, end_out_of_range, end_speeds == 0, segment_times == 0],
+        [_INDEX_ERROR, _ZERO_DIVISION_ERROR, _INDEX_ERROR, _ZERO_DIVISION_ERROR, _ZERO_DIVISION_ERROR], 0)
+
+    # the error of a stop_id is its first error, and the error of a trip is the first error of its stops
+    failed_segments = np.flatnonzero(segment_errors)
+    failed_stops, first_failures = np.unique(segment_stops[failed_segments], return_index=True)
+    stop_errors[failed_stops] = segment_errors[failed_segments[first_failures]]
+    failed_stops = np.flatnonzero(stop_errors)
+    failed_trips, first_failures = np.unique(stop_trip_indexes[failed_stops], return_index=True)
+    trip_errors[failed_trips] = np.where(
+        trip_errors[failed_trips] != 0, trip_errors[failed_trips], stop_errors[failed_stops[first_failures]])
+
+    # report the first failed trip, or leave the failed trips without segments
+    trip_exceptions = {}
+    for trip_index in np.flatnonzero(trip_errors).tolist():
+        trip_id = batch.trip_ids[trip_index]
+        message = _TRIP_ERROR_MESSAGES[trip_errors[trip_index]]
+        if errors == 'raise':
+            raise TRIP_ERRORS[trip_errors[trip_index]]("Trip " + repr(trip_id) + ": " + message)
+        trip_exceptions[trip_id] = TRIP_ERRORS[trip_errors[trip_index]](message)
+
+    # pack the segments of the trips without error into the table
+    segment_trip_indexes = stop_trip_indexes[segment_stops]
+    is_kept = trip_errors[segment_trip_indexes] == 0
+    segment_trip_indexes = segment_trip_indexes[is_kept]
+    return SegmentTable(
+        _to_array('q', segment_trip_indexes, np.int64),
+        _to_array('i', (stop_keys % max(len(pings.stop_ids), 1))[segment_stops[is_kept]], np.int32),
+        _to_array('q', segment_indexes[is_kept], np.int64),
+        _to_array('d', segment_lengths[is_kept], np.float64),
+        _to_array('d', vectorized.round_speeds(segment_speeds[is_kept]), np.float64),
+        pings.stop_ids,
+        batch.trip_ids,
+        _to_array('q', np.searchsorted(segment_trip_indexes, np.arange(trips_count + 1)), np.int64),
+        trip_exceptions)
+
+
+def _get_segment_counts(stop_lengths: "np.ndarray", segment_length: float) -> "np.ndarray":
+    """
+    Counts the segments of each stop, as `speedmap.vectorized.get_segment_count` for every stop length at once
+    """
+
+    # estimate the counts, then correct them against the floating point loop condition
+    is_finite = (stop_lengths > 0) & (stop_lengths < np.inf)
+    segment_counts = np.where(is_finite, np.ceil(np.where(is_finite, stop_lengths, 0) / segment_length), 0) \
+        .astype(np.int64)
+    while True:
+        too_many = (segment_counts > 0) & ((segment_counts - 1) * segment_length >= stop_lengths)
+        if not too_many.any():
+            break
+        segment_counts -= too_many
+    while True:
+        too_few = is_finite & (segment_counts * segment_length < stop_lengths)
+        if not too_few.any():
+            break
+        segment_counts += too_few
+
+    return segment_counts
+
+
+def _to_array(typecode: str, column: "np.ndarray", dtype) -> array:
+    """
+    Copies a NumPy column into a typed array in one pass
+    """
+    return array(typecode, np.ascontiguousarray(column, dtype=dtype).tobytes())
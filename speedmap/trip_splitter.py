@@ -0,0 +1,179 @@
+from typing import Iterable, Iterator, List, Optional, Set
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.compressed_input import iter_lines
+from speedmap.mesh import validate_segment_length
+from speedmap.ping import Ping
+from speedmap.ping_array import PingArray
+from speedmap.segment import Segment
+
+# the default longest time between two pings of the same trip, in milliseconds
+DEFAULT_MAX_GAP = 30 * 60 * 1000
+
+# why a trip was ended: the bus came back to a stop_id it already arrived at, the feed went quiet, or the feed ended
+SPLIT_REASONS = ('stop_reset', 'time_gap', 'end')
+
+
+class TripSplitter:
+    """
+    Represents a continuous ping feed of a single bus running the same route several times, which is split into trips
+    in a single pass as the pings are added
+
+    BusOnRoute keeps only the first 'ARRIVAL' ping of each stop_id and groups the speed graph edges by stop_id, so the
+    trips of a feed have to be meshed separately. A new trip starts when:
+
+    - stop_id sequence reset: a 'DEPARTURE' or 'MIDPATH' ping is for a stop_id whose 'ARRIVAL' ping was already seen in
+      the current trip, i.e. the bus is travelling towards that stop again. Repeated 'ARRIVAL' pings of a stop, as
+      sent while the bus waits at the stop, stay in the current trip.
+    - time gap: the ping is more than `max_gap` milliseconds after the previous ping.
+
+    A trip is complete when the first ping of the next trip is added, or when the feed ends, and only the pings of the
+    current trip are kept in memory.
+
+    Attributes:
+        max_gap (Optional[int]): the longest time between two pings of the same trip, in milliseconds. When None, trips
+            are only split on stop_id sequence resets
+        trips_count (int): the number of trips completed so far
+        split_reason (Optional[str]): why the last completed trip was ended, one of `SPLIT_REASONS`
+    """
+
+    def __init__(self, max_gap: Optional[int] = DEFAULT_MAX_GAP):
+
+        # validate input
+        if max_gap is not None and max_gap < 0:
+            raise ValueError("Max gap must not be negative")
+
+        self.max_gap = max_gap
+        self.trips_count = 0
+        self.split_reason = None
+
+        self._pings = PingArray()
+        self._arrived_stop_ids: Set[str] = set()
+        self._previous_timestamp = None
+
+    @property
+    def pending_pings_count(self) -> int:
+        """
+        Gets the number of pings of the current, not yet completed, trip
+
+        Returns:
+            int: the number of pings held in memory
+        """
+        return len(self._pings)
+
+    def add_ping(self, ping: Ping) -> Optional[BusOnRoute]:
+        """
+        Adds the next ping of the feed, completing the current trip when the ping starts a new one
+
+        Args:
+            ping (Ping): the next ping of the feed
+
+        Returns:
+            Optional[BusOnRoute]: the completed trip when this ping is the first ping of the next trip, otherwise None
+
+        Raises:
+            ValueError: raised when the ping type is unknown
+        """
+
+        # find whether the ping starts a new trip
+        split_reason = None
+        if ping.ping_type != 'ARRIVAL' and ping.stop_id in self._arrived_stop_ids:
+            split_reason = 'stop_reset'
+        elif self.max_gap is not None and self._previous_timestamp is not None and \
+                ping.timestamp - self._previous_timestamp > self.max_gap:
+            split_reason = 'time_gap'
+        completed_trip = self._complete_trip(split_reason) if split_reason is not None else None
+
+        # add the ping to the current trip
+        self._pings.append(ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop)
+        self._previous_timestamp = ping.timestamp
+        if ping.ping_type == 'ARRIVAL':
+            self._arrived_stop_ids.add(ping.stop_id)
+
+        return completed_trip
+
+    def flush(self) -> Optional[BusOnRoute]:
+        """
+        Completes the current trip at the end of the feed
+
+        Returns:
+            Optional[BusOnRoute]: the completed trip, or None when no pings were added since the last trip
+        """
+        self._previous_timestamp = None
+        return self._complete_trip('end')
+
+    def iter_trips(self, pings: Iterable[Ping]) -> Iterator[BusOnRoute]:
+        """
+        Adds each ping of a feed and yields each trip as soon as it is complete, then the last trip
+
+        Args:
+            pings (Iterable[Ping]): the pings of the feed, in ascending timestamp order
+
+        Returns:
+            Iterator[BusOnRoute]: the BusOnRoute of each trip, with its pings held in a PingArray, in feed order
+        """
+        for ping in pings:
+            completed_trip = self.add_ping(ping)
+            if completed_trip is not None:
+                yield completed_trip
+
+        last_trip = self.flush()
+        if last_trip is not None:
+            yield last_trip
+
+    def iter_trips_from_file(self, file_path: str, cleaner=None) -> Iterator[BusOnRoute]:
+        """
+        Reads a ping feed file line by line and yields each trip as soon as it is complete, so the memory is bounded by
+        a single trip rather than by the size of the file
+
+        Args:
+            file_path (str): the location of the ping file, in ascending timestamp order and optionally gzip, bz2 or
+                xz compressed
+            cleaner (PingCleaner): when given, malformed lines are quarantined and the pings are cleaned as they
+                stream, see `speedmap.cleaning.PingCleaner`
+
+        Returns:
+            Iterator[BusOnRoute]: the BusOnRoute of each trip, in feed order
+        """
+        if cleaner is not None:
+            pings = cleaner.clean(cleaner.parse_lines(iter_lines(file_path)))
+        else:
+            pings = (Ping.from_json(line) for line in iter_lines(file_path) if line.strip())
+        return self.iter_trips(pings)
+
+    def iter_speed_maps(
+            self,
+            pings: Iterable[Ping],
+            segment_length: float,
+            engine: str = 'python') -> Iterator[List[Segment]]:
+        """
+        Adds each ping of a feed and yields the speed map of each trip as soon as it is complete, see `iter_trips`
+
+        Args:
+            pings (Iterable[Ping]): the pings of the feed, in ascending timestamp order
+            segment_length (float): a user defined length for a speed map segment, in meters
+            engine (str): the meshing engine, either 'python' or 'numpy'
+
+        Returns:
+            Iterator[List[Segment]]: the speed map segments of each trip, in feed order
+
+        Raises:
+            ValueError: if the segment length is invalid (less than 0)
+        """
+        validate_segment_length(segment_length)
+        for trip in self.iter_trips(pings):
+            yield trip.get_speed_map(segment_length, engine=engine)
+
+    def _complete_trip(self, split_reason: str) -> Optional[BusOnRoute]:
+        """
+        Releases the pings of the current trip as a BusOnRoute, in ascending timestamp order, and starts a new trip
+        """
+        if not len(self._pings):
+            return None
+
+        trip = BusOnRoute(self._pings.sort_by_timestamp())
+        self._pings = PingArray()
+        self._arrived_stop_ids = set()
+        self.trips_count += 1
+        self.split_reason = split_reason
+
+        return trip
@@ -0,0 +1,208 @@
+import math
+from typing import Iterable, List, Tuple
+from collections import namedtuple
+from speedmap.segment import Segment, round_speed
+from speedmap.speed_graph import SpeedGraphEdges
+
+# NumPy is optional, the pure python meshing loop is used when it is not installed
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+
+
+def get_segment_count(stop_length: float, segment_length: float) -> int:
+    """
+    Gets the number of segments in the mesh of a stop, matching the `segment_index * segment_length < stop_length`
+    loop condition of the pure python engine exactly
+
+    Args:
+        stop_length (float): the total distance of the stop_id, in meters
+        segment_length (float): a user defined length for a speed map segment, in meters
+
+    Returns:
+        int: the number of segments of the stop_id
+    """
+
+    if not 0 < stop_length < math.inf:
+        return 0
+
+    # estimate the count, then correct it against the floating point loop condition
+    segment_count = max(int(math.ceil(stop_length / segment_length)), 0)
+    while segment_count > 0 and (segment_count - 1) * segment_length >= stop_length:
+        segment_count -= 1
+    while segment_count * segment_length < stop_length:
+        segment_count += 1
+
+    return segment_count
+
+
+def mesh_stop(
+        stop_id: str,
+        stop_length: float,
+        speed_graph_for_stop: Iterable[namedtuple],
+        segment_length: float) -> List[Segment]:
+    """
+    Applies a uniform segment mesh to the speed graph edges of a single stop_id, interpolating every segment boundary
+    time in one batched pass over the edge arrays
+
+    Args:
+        stop_id (str): surrogate identifier of the bus stop
+        stop_length (float): the total distance of the stop_id, in meters
+        speed_graph_for_stop (Iterable[namedtuple]): the speed graph edges of the stop_id
+        segment_length (float): a user defined length for a speed map segment, in meters
+
+    Returns:
+        List[Segment]: a list containing the Segment class objects of the stop_id
+
+    Raises:
+        IndexError: if the speed graph edges end before the stop length is reached
+        ZeroDivisionError: if a boundary is interpolated on an edge with zero speed or a segment takes no time
+    """
+
+    segment_lengths, segment_speeds = mesh_stop_columns(stop_length, speed_graph_for_stop, segment_length)
+
+    return [
+        Segment(stop_id=stop_id, segment_index=segment_index, segment_length=length, speed=round_speed(speed))
+        for segment_index, (length, speed) in enumerate(zip(segment_lengths.tolist(), segment_speeds.tolist()))
+    ]
+
+
+def round_speeds(speeds: "np.ndarray") -> "np.ndarray":
+    """
+    Formats segment speeds to 1 decimal place, matching `speedmap.segment.round_speed` exactly
+
+    Away from a rounding tie, `rint(speed * 10) / 10` rounds to the same tenth as the correctly rounded python `round`,
+    and dividing the exact integer by 10 gives the nearest float to that tenth, as the python formatting does. Speeds
+    close to a tie, which the multiplication may push to either side, and speeds which are not finite or too large
+    for the multiplication to be exact are rounded by `round_speed`.
+
+    Args:
+        speeds (np.ndarray): the unrounded speeds, in meters/second
+
+    Returns:
+        np.ndarray: the speeds rounded to 1 decimal place
+    """
+
+    with np.errstate(invalid='ignore', over='ignore'):
+        tenths = speeds * 10
+        rounded = np.rint(tenths) / 10
+        is_exact = (np.abs(tenths) < 2 ** 50) & (
+            np.abs(tenths - np.floor(tenths) - 0.5) > 1e-9 * np.maximum(np.abs(tenths), 1))
+
+    # round the speeds close to a tie one by one
+    for index in np.flatnonzero(~is_exact).tolist():
+        rounded[index] = round_speed(float(speeds[index]))
+
+    return rounded
+
+
+def mesh_stop_columns(
+        stop_length: float,
+        speed_graph_for_stop: Iterable[namedtuple],
+        segment_length: float) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Computes the length and unrounded speed of every segment of a single stop_id as arrays
+
+    Args:
+        stop_length (float): the total distance of the stop_id, in meters
+        speed_graph_for_stop (Iterable[namedtuple]): the speed graph edges of the stop_id, either SpeedGraphEdge
+            objects or the column views of a SpeedGraph
+        segment_length (float): a user defined length for a speed map segment, in meters
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the length of each segment, in meters, and the unrounded speed of each segment,
+            in meters/second
+
+    Raises:
+        IndexError: if the speed graph edges end before the stop length is reached
+        ZeroDivisionError: if a boundary is interpolated on an edge with zero speed or a segment takes no time
+    """
+
+    segment_distance_starts, segment_distance_ends, segment_time_starts, segment_time_ends = \
+        mesh_stop_boundaries(stop_length, speed_graph_for_stop, segment_length)
+
+    # use dx/dt = v to calculate the speed of every segment
+    segment_lengths = segment_distance_ends - segment_distance_starts
+    segment_times = segment_time_ends - segment_time_starts
+    if not segment_times.all():
+        raise ZeroDivisionError("float division by zero")
+
+    return segment_lengths, segment_lengths / segment_times
+
+
+def mesh_stop_boundaries(
+        stop_length: float,
+        speed_graph_for_stop: Iterable[namedtuple],
+        segment_length: float) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Computes the start and end distances and the interpolated start and end times of every segment of a single stop_id
+    as arrays
+
+    The pure python engine walks the edges with a single forward-only index, taking the first edge whose end distance
+    is past the segment start and then the first edge whose end distance is at or past the segment end. Since the
+    boundaries only increase, the edge it lands on for each boundary is the running maximum of the sorted-search
+    positions of all boundaries so far, which is computed here with `searchsorted` over the running maximum of the
+    edge end distances. The same floating point expressions are used so the results are identical.
+
+    Args:
+        stop_length (float): the total distance of the stop_id, in meters
+        speed_graph_for_stop (Iterable[namedtuple]): the speed graph edges of the stop_id, either SpeedGraphEdge
+            objects or the column views of a SpeedGraph
+        segment_length (float): a user defined length for a speed map segment, in meters
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: the start distances, end distances, start times and
+            end times of the segments, in meters and seconds
+
+    Raises:
+        IndexError: if the speed graph edges end before the stop length is reached
+        ZeroDivisionError: if a boundary is interpolated on an edge with zero speed
+    """
+
+    segment_count = get_segment_count(stop_length, segment_length)
+    if segment_count == 0:
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+
+    # read the edge columns of a SpeedGraph without copying, or unpack the speed graph edges into contiguous arrays
+    if isinstance(speed_graph_for_stop, SpeedGraphEdges):
+        speeds = np.frombuffer(speed_graph_for_stop.speeds, dtype=np.float64)
+        distance_ends = np.frombuffer(speed_graph_for_stop.distance_ends, dtype=np.float64)
+        time_ends = np.frombuffer(speed_graph_for_stop.time_ends, dtype=np.int64).astype(np.float64)
+    else:
+        edges_count = len(speed_graph_for_stop)
+        speeds = np.fromiter((edge.speed for edge in speed_graph_for_stop), dtype=np.float64, count=edges_count)
+        distance_ends = np.fromiter(
+            (edge.distance_end for edge in speed_graph_for_stop), dtype=np.float64, count=edges_count)
+        time_ends = np.fromiter(
+            (edge.time_end for edge in speed_graph_for_stop), dtype=np.float64, count=edges_count)
+    edges_count = len(speeds)
+
+    # determine the start and end distances of every segment
+    segment_distance_starts = np.arange(segment_count, dtype=np.float64) * segment_length
+    segment_distance_ends = segment_distance_starts + segment_length
+    segment_distance_ends = np.where(segment_distance_ends <= stop_length, segment_distance_ends, stop_length)
+
+    # find the first edge ending past each segment start and the first edge ending at or past each segment end
+    distance_ends_max = np.maximum.accumulate(distance_ends)
+    edge_indexes = np.empty(2 * segment_count, dtype=np.int64)
+    edge_indexes[0::2] = np.searchsorted(distance_ends_max, segment_distance_starts, side='right')
+    edge_indexes[1::2] = np.searchsorted(distance_ends_max, segment_distance_ends, side='left')
+
+    # the edge index can only move forward, as in the pure python loop
+    edge_indexes = np.maximum.accumulate(edge_indexes)
+    if edge_indexes[-1] >= edges_count:
+        raise IndexError("list index out of range")
+    start_indexes, end_indexes = edge_indexes[0::2], edge_indexes[1::2]
+
+    # linearly interpolate the time at the start and end of every segment: t1 = t2 - (d2 - d1)/v
+    if not speeds[start_indexes].all() or not speeds[end_indexes].all():
+        raise ZeroDivisionError("float division by zero")
+    segment_time_starts = time_ends[start_indexes] / 1000 \
+        - (distance_ends[start_indexes] - segment_distance_starts) / speeds[start_indexes]
+    segment_time_ends = time_ends[end_indexes] / 1000 \
+        - (distance_ends[end_indexes] - segment_distance_ends) / speeds[end_indexes]
+
+    return segment_distance_starts, segment_distance_ends, segment_time_starts, segment_time_ends
@@ -0,0 +1,171 @@
+import unittest
+import json
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.__main__ import main
+from speedmap.batch_ingest import (
+    UNPARTITIONED_QUARANTINE_NAME, expand_paths, get_path_partition, ingest_files, write_speed_maps)
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping_array import PingArray
+from speedmap.synthetic import generate_trip, write_ping_file
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+
+class TestBatchIngest(unittest.TestCase):
+
+    def setUp(self):
+
+        # two buses, each with a trip split over two daily files
+        self.directory = tempfile.TemporaryDirectory()
+        self.trips = {}
+        for bus in (1, 2):
+            pings = generate_trip(stops=4, pings_per_stop=10, seed=bus)
+            self.trips['bus_' + str(bus)] = pings
+            for day, day_pings in enumerate((pings[:20], pings[20:])):
+                directory = os.path.join(self.directory.name, 'bus_' + str(bus))
+                os.makedirs(directory, exist_ok=True)
+                write_ping_file(day_pings, os.path.join(directory, 'day_' + str(day) + '.jsonl'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_expand_paths_when_directory_and_glob_finds_files(self):
+
+        # Act
+        from_directory = expand_paths([self.directory.name])
+        from_glob = expand_paths([os.path.join(self.directory.name, '**', 'day_0.jsonl')])
+
+        # Assert
+        self.assertEqual(4, len(from_directory))
+        self.assertEqual(sorted(from_directory), from_directory)
+        self.assertEqual(2, len(from_glob))
+        self.assertTrue(all(path.endswith('day_0.jsonl') for path in from_glob))
+
+    def test_expand_paths_when_nothing_matches_raises(self):
+
+        # Act and Assert
+        with self.assertRaises(FileNotFoundError):
+            expand_paths([os.path.join(self.directory.name, '*.txt')])
+
+    def test_get_path_partition_when_pattern_gets_groups(self):
+
+        # Act and Assert
+        self.assertEqual('day_0', get_path_partition('data/bus_1/day_0.jsonl'))
+        self.assertEqual('bus_1', get_path_partition('data/bus_1/day_0.jsonl', r'(bus_\d+)/'))
+        self.assertEqual('bus_1/0', get_path_partition('data/bus_1/day_0.jsonl', r'(bus_\d+)/day_(\d+)'))
+        with self.assertRaises(ValueError):
+            get_path_partition('data/day_0.jsonl', r'(bus_\d+)/')
+
+    def test_ingest_files_when_partitioned_by_path_joins_files_of_a_bus(self):
+
+        # Act
+        buses = ingest_files([self.directory.name], partition_pattern=r'(bus_\d+)/', processes=2)
+
+        # Assert
+        self.assertEqual(['bus_1', 'bus_2'], list(buses.keys()))
+        for key, bus_on_route in buses.items():
+            self.assertEqual(
+                BusOnRoute(self.trips[key]).get_speed_map(25), bus_on_route.get_speed_map(25))
+
+    def test_ingest_files_when_partitioned_by_field_groups_pings(self):
+
+        # Arrange
+        file_path = os.path.join(self.directory.name, 'mixed.jsonl')
+        with open(file_path, 'w') as file:
+            for key, pings in self.trips.items():
+                for ping in pings:
+                    file.write(json.dumps({
+                        'timestamp': ping.timestamp, 'stopId': ping.stop_id, 'pingType': ping.ping_type,
+                        'distanceFromStop': ping.distance_from_stop, 'busId': key}) + '\n')
+
+        # Act
+        buses = ingest_files([file_path], partition_field='busId', processes=1)
+
+        # Assert
+        self.assertEqual(['bus_1', 'bus_2'], list(buses.keys()))
+        for key, bus_on_route in buses.items():
+            self.assertEqual(
+                BusOnRoute(self.trips[key]).get_speed_map(25), bus_on_route.get_speed_map(25))
+
+    def test_main_when_partitioned_by_field_and_clean_quarantines_unknown_ping_type(self):
+
+        # Arrange
+        file_path = os.path.join(self.directory.name, 'mixed.jsonl')
+        output_dir = os.path.join(self.directory.name, 'maps')
+        bad_line = json.dumps({
+            'timestamp': 0, 'stopId': '1', 'pingType': 'STOPPED', 'distanceFromStop': 0.0, 'busId': 'bus_3'})
+        with open(file_path, 'w') as file:
+            for key, pings in self.trips.items():
+                for ping in pings:
+                    file.write(json.dumps({
+                        'timestamp': ping.timestamp, 'stopId': ping.stop_id, 'pingType': ping.ping_type,
+                        'distanceFromStop': ping.distance_from_stop, 'busId': key}) + '\n')
+            file.write(bad_line + '\n')
+
+        # Act
+        main([file_path, '25', '--output-dir', output_dir, '--partition-field', 'busId', '--clean',
+              '--processes', '1'])
+        with open(os.path.join(output_dir, UNPARTITIONED_QUARANTINE_NAME)) as file:
+            quarantined = [json.loads(line) for line in file]
+
+        # Assert
+        self.assertEqual(['bus_1.jsonl', 'bus_2.jsonl'], sorted(
+            name for name in os.listdir(output_dir) if name != UNPARTITIONED_QUARANTINE_NAME))
+        self.assertEqual([bad_line], [record['line'] for record in quarantined])
+        with open(os.path.join(output_dir, 'bus_2.jsonl')) as file:
+            self.assertEqual([segment.to_dict() for segment in BusOnRoute(self.trips['bus_2']).get_speed_map(25)],
+                             [json.loads(line) for line in file])
+
+    def test_write_speed_maps_when_partitioned_writes_a_file_per_bus(self):
+
+        # Arrange
+        output_dir = os.path.join(self.directory.name, 'maps')
+
+        # Act
+        output_paths = write_speed_maps(
+            [os.path.join(self.directory.name, 'bus_*', '*.jsonl')], output_dir, 25,
+            partition_pattern=r'(bus_\d+)/', processes=2)
+
+        # Assert
+        self.assertEqual(['bus_1', 'bus_2'], list(output_paths.keys()))
+        for key, output_path in output_paths.items():
+            with open(output_path) as file:
+                written = [json.loads(line) for line in file]
+            expected = [segment.to_dict() for segment in BusOnRoute(self.trips[key]).get_speed_map(25)]
+            self.assertEqual(expected, written)
+
+    def test_main_when_output_dir_writes_a_file_per_partition(self):
+
+        # Arrange
+        output_dir = os.path.join(self.directory.name, 'maps')
+
+        # Act
+        main([os.path.join(self.directory.name, 'bus_1'), '25', '--output-dir', output_dir, '--format', 'csv',
+              '--processes', '1'])
+
+        # Assert
+        self.assertEqual(['day_0.csv', 'day_1.csv'], sorted(os.listdir(output_dir)))
+
+    def test_concatenate_when_stop_ids_differ_remaps_codes(self):
+
+        # Arrange
+        first = PingArray.from_file(mock_data_dir / "../data/mock_input.txt")
+        second = PingArray.from_file(mock_data_dir / "../data/mock_input2.txt")
+
+        # Act
+        test_object = PingArray.concatenate([first, second])
+
+        # Assert
+        def as_tuples(pings):
+            return [(ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop) for ping in pings]
+        self.assertEqual(as_tuples(first) + as_tuples(second), as_tuples(test_object))
+        self.assertEqual(len(set(first.stop_ids + second.stop_ids)), len(test_object.stop_ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
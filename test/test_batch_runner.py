@@ -0,0 +1,159 @@
+import unittest
+import json
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.__main__ import main
+from speedmap.batch_runner import DEFAULT_JOURNAL_NAME, BatchProgress, read_manifest, run_batch
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.segment_writers import read_segment_binary
+from speedmap.synthetic import generate_trip, write_ping_file
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+
+class TestBatchRunner(unittest.TestCase):
+
+    def setUp(self):
+
+        # four buses, each with a trip in its own file, listed in a manifest with a comment and a blank line
+        self.directory = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.directory.name, 'maps')
+        self.manifest_path = os.path.join(self.directory.name, 'manifest.txt')
+        self.trips = {}
+        for bus in range(1, 5):
+            pings = self.trips['bus_' + str(bus)] = generate_trip(stops=3, pings_per_stop=10, seed=bus)
+            write_ping_file(pings, os.path.join(self.directory.name, 'bus_' + str(bus) + '.jsonl'))
+        self.write_manifest(['bus_' + str(bus) + '.jsonl' for bus in range(1, 5)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_manifest(self, lines):
+        with open(self.manifest_path, "w") as file:
+            file.write("# nightly ping files\n\n" + "\n".join(lines) + "\n")
+
+    def read_journal(self):
+        with open(os.path.join(self.output_dir, DEFAULT_JOURNAL_NAME)) as file:
+            return [json.loads(line) for line in file]
+
+    def test_read_manifest_resolves_paths_relative_to_manifest(self):
+
+        # Arrange
+        self.write_manifest(['bus_1.jsonl', 'bus_1.jsonl', 'sub/../bus_2.jsonl'])
+
+        # Act
+        result = read_manifest(self.manifest_path)
+
+        # Assert
+        self.assertEqual([os.path.join(self.directory.name, 'bus_1.jsonl'),
+                          os.path.join(self.directory.name, 'bus_2.jsonl')], result)
+
+    def test_run_batch_writes_speed_map_per_file_and_journal(self):
+
+        # Arrange
+        reports = []
+
+        # Act
+        result = run_batch(self.manifest_path, self.output_dir, 10, output_format='binary', processes=1,
+                           progress=reports.append, progress_interval=0)
+
+        # Assert
+        self.assertEqual((4, 4, 0, 0, 0), (result.total, result.completed, result.failed, result.skipped,
+                                           result.remaining))
+        for key, pings in self.trips.items():
+            self.assertEqual(BusOnRoute(pings).get_speed_map(10),
+                             list(read_segment_binary(os.path.join(self.output_dir, key + '.spms'))))
+        journal = self.read_journal()
+        self.assertEqual(10, journal[0]['settings']['segment_length'])
+        self.assertEqual(4, len(journal) - 1)
+        self.assertEqual(result.segments, sum(record['segments'] for record in journal[1:]))
+        self.assertEqual(5, len(reports))
+        self.assertIn('4/4 files', result.format_report())
+
+    def test_run_batch_when_interrupted_resumes_from_journal(self):
+
+        # Arrange, as if killed after the second file, in the middle of the journal line of the third file
+        run_batch(self.manifest_path, self.output_dir, 10, processes=1)
+        journal_path = os.path.join(self.output_dir, DEFAULT_JOURNAL_NAME)
+        with open(journal_path) as file:
+            lines = file.readlines()
+        with open(journal_path, "w") as file:
+            file.write("".join(lines[:3]) + lines[3][:20])
+        os.remove(os.path.join(self.output_dir, 'bus_4.jsonl'))
+
+        # Act
+        result = run_batch(self.manifest_path, self.output_dir, 10, processes=1)
+
+        # Assert
+        self.assertEqual((2, 2), (result.skipped, result.completed))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'bus_4.jsonl')))
+        with open(os.path.join(self.output_dir, DEFAULT_JOURNAL_NAME)) as file:
+            self.assertEqual([lines[3][:20] + '\n'], [line for line in file if not line.endswith('}\n')])
+
+    def test_run_batch_when_file_fails_continues_and_retries_it_next_run(self):
+
+        # Arrange
+        self.write_manifest(['bus_1.jsonl', 'missing.jsonl', 'bus_2.jsonl'])
+
+        # Act
+        result = run_batch(self.manifest_path, self.output_dir, 10, processes=1)
+        second_result = run_batch(self.manifest_path, self.output_dir, 10, processes=1)
+
+        # Assert
+        self.assertEqual((2, 1), (result.completed, result.failed))
+        self.assertIn(os.path.join(self.directory.name, 'missing.jsonl'), result.errors)
+        self.assertIn('FileNotFoundError', list(result.errors.values())[0])
+        self.assertEqual((2, 0, 1), (second_result.skipped, second_result.completed, second_result.failed))
+
+    def test_run_batch_when_settings_change_throws_unless_restarted(self):
+
+        # Arrange
+        run_batch(self.manifest_path, self.output_dir, 10, processes=1)
+
+        # Act and Assert
+        with self.assertRaises(ValueError):
+            run_batch(self.manifest_path, self.output_dir, 20, processes=1)
+        result = run_batch(self.manifest_path, self.output_dir, 20, processes=1, restart=True)
+        self.assertEqual((0, 4), (result.skipped, result.completed))
+
+    def test_run_batch_when_files_map_to_same_output_throws(self):
+
+        # Arrange
+        self.write_manifest(['bus_1.jsonl', 'bus_2.jsonl', 'other/bus_1.jsonl'])
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            run_batch(self.manifest_path, self.output_dir, 10, processes=1)
+        self.assertFalse(os.path.exists(self.output_dir))
+
+    def test_main_when_batch_runs_in_worker_pool(self):
+
+        # Act
+        main(['batch', self.manifest_path, '25', '--output-dir', self.output_dir, '--format', 'csv',
+              '--processes', '2'])
+
+        # Assert
+        self.assertEqual(['_batch_journal.jsonl', 'bus_1.csv', 'bus_2.csv', 'bus_3.csv', 'bus_4.csv'],
+                         sorted(os.listdir(self.output_dir)))
+        with open(os.path.join(self.output_dir, 'bus_3.csv')) as file:
+            self.assertEqual(len(BusOnRoute(self.trips['bus_3']).get_speed_map(25)) + 1, len(file.readlines()))
+
+    def test_batch_progress_estimates_remaining_time(self):
+
+        # Arrange
+        test_object = BatchProgress(10, skipped=2)
+        test_object.completed, test_object.failed, test_object.elapsed = 3, 1, 2.0
+
+        # Act and Assert
+        self.assertEqual(2.0, test_object.files_per_second)
+        self.assertEqual(4, test_object.remaining)
+        self.assertEqual(2.0, test_object.eta_seconds)
+        self.assertIsNone(BatchProgress(10).eta_seconds)
+
+
+if __name__ == '__main__':
+    unittest.main()
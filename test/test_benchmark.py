@@ -0,0 +1,62 @@
+import unittest
+import json
+import os
+import tempfile
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.benchmark import PHASES, compare_results, main, run_benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run_benchmark_times_each_phase(self):
+
+        # Act
+        result = run_benchmark([(2, 20), (3, 10)], [5, 50], buses=2, repeat=1)
+
+        # Assert
+        records = result['results']
+        self.assertEqual(2 * (len(PHASES) - 1 + 2), len(records))
+        self.assertEqual(['parse', 'sort', 'graph', 'mesh', 'mesh'], [record['phase'] for record in records[:5]])
+        self.assertEqual([None, None, None, 5, 50], [record['segment_length'] for record in records[:5]])
+        self.assertEqual(80, records[0]['pings'])
+        self.assertTrue(all(record['seconds'] >= 0 for record in records))
+        self.assertTrue(records[3]['segments'] > records[4]['segments'])
+
+    def test_compare_results_reports_slower_phases(self):
+
+        # Arrange
+        record = {'stops': 1, 'pings_per_stop': 2, 'buses': 1, 'phase': 'parse', 'segment_length': None}
+        baseline = {'results': [dict(record, seconds=1.0), dict(record, phase='sort', seconds=1.0)]}
+        results = {'results': [dict(record, seconds=1.5), dict(record, phase='sort', seconds=1.1)]}
+
+        # Act
+        regressions = compare_results(results, baseline, tolerance=0.2)
+
+        # Assert
+        self.assertEqual(['parse'], [regression['phase'] for regression in regressions])
+        self.assertEqual(1.5, regressions[0]['ratio'])
+
+    def test_main_writes_results_and_compares_with_baseline(self):
+
+        # Arrange
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output_path = os.path.join(directory.name, "results.json")
+        arguments = ["--sizes", "2x10", "--segment-lengths", "10", "--repeat", "1", "--output", output_path]
+
+        # Act
+        status = main(arguments)
+        with open(output_path) as file:
+            result = json.load(file)
+        status_with_baseline = main(arguments + ["--baseline", output_path, "--tolerance", "1000000"])
+
+        # Assert
+        self.assertEqual(0, status)
+        self.assertEqual(0, status_with_baseline)
+        self.assertEqual(4, len(result['results']))
+
+
+if __name__ == '__main__':
+    unittest.main()
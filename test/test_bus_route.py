@@ -0,0 +1,77 @@
+import unittest
+import os
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.bus_route import BusRoute
+from speedmap.ping import Ping
+
+
+class TestBusRoute(unittest.TestCase):
+
+    def test_get_segment_statistics_merges_buses(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        test_file_path = mock_data_dir / "../data/mock_input.txt"
+        slow_bus = [
+            Ping(10000, '1234', 'DEPARTURE', 0.0),
+            Ping(85000, '1234', 'ARRIVAL', 75.0)]
+
+        target = BusRoute([test_file_path, BusOnRoute.from_file(test_file_path), iter(slow_bus)])
+
+        # Act
+        result = target.get_segment_statistics(segment_length=50, processes=1)
+
+        # Assert
+        self.assertEqual([('1234', 0), ('1234', 1), ('5678', 0), ('5678', 1)], list(result.keys()))
+        self.assertEqual(3, result[('1234', 0)].count)
+        self.assertAlmostEqual(7 / 3, result[('1234', 0)].mean)
+        self.assertEqual(1.0, result[('1234', 0)].min)
+        self.assertEqual(3.0, result[('1234', 0)].max)
+        self.assertEqual(2, result[('5678', 1)].count)
+        self.assertEqual(1.5, result[('5678', 1)].mean)
+
+    def test_get_segment_statistics_in_process_pool_matches_serial(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        file_paths = [mock_data_dir / "../data/mock_input.txt", mock_data_dir / "../data/mock_input2.txt"] * 3
+        target = BusRoute.from_files(file_paths)
+
+        # Act
+        expected = target.get_segment_statistics(segment_length=10, processes=1)
+        result = target.get_segment_statistics(segment_length=10, processes=2)
+
+        # Assert
+        self.assertEqual(
+            [(key, s.count, s.mean, s.min, s.max) for key, s in expected.items()],
+            [(key, s.count, s.mean, s.min, s.max) for key, s in result.items()])
+
+    def test_get_speed_maps_keeps_source_order(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        file_paths = [mock_data_dir / "../data/mock_input2.txt", mock_data_dir / "../data/mock_input.txt"]
+        target = BusRoute.from_files(file_paths)
+
+        # Act
+        result = target.get_speed_maps(segment_length=1000, processes=2)
+
+        # Assert
+        self.assertEqual([['1'], ['1234', '5678']], [[s.stop_id for s in speed_map] for speed_map in result])
+
+    def test_get_speed_maps_when_processes_invalid_throws(self):
+
+        # Arrange
+        target = BusRoute([])
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            target.get_speed_maps(segment_length=10, processes=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
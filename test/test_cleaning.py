@@ -0,0 +1,232 @@
+import unittest
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.batch_ingest import PartitionError, write_speed_maps
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.cleaning import PingCleaner
+from speedmap.ping import Ping
+from speedmap.streaming_bus_on_route import StreamingBusOnRoute
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+# a stop with a malformed line, a duplicate timestamp and a distance regression
+DIRTY_LINES = [
+    '{"timestamp": 10000, "stopId": "1", "pingType": "DEPARTURE", "distanceFromStop": 0.0}',
+    '{"timestamp": 12000, "stopId": "1", "pingType": "MIDPATH", "distanceFromStop": 20.0}',
+    '{"timestamp": 12000, "stopId": "1", "pingType": "MIDPATH", "distanceFromStop": 24.0}',
+    '{"timestamp": 13000, "stopId": "1", "pingType": "MIDPATH", "distanceFromStop": 19.0}',
+    '{"timestamp": 14000, "stopId": "1", "pingType": ',
+    '{"timestamp": 15000, "stopId": "1", "pingType": "MIDPATH", "distanceFromStop": -5.0}',
+    '{"timestamp": 16000, "stopId": "1", "pingType": "ARRIVAL", "distanceFromStop": 50.0}',
+]
+
+
+class TestCleaning(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'dirty.jsonl')
+        with open(self.file_path, "w") as file:
+            file.write("\n".join(DIRTY_LINES) + "\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_from_file_when_dirty_without_cleaner_raises(self):
+
+        # Act and Assert
+        with self.assertRaises(ValueError):
+            BusOnRoute.from_file(self.file_path).get_speed_map(10)
+
+    def test_from_file_when_cleaner_quarantines_and_cleans(self):
+
+        # Arrange
+        quarantine_path = os.path.join(self.directory.name, 'quarantine.jsonl')
+
+        # Act
+        with PingCleaner(quarantine_path=quarantine_path) as cleaner:
+            target = BusOnRoute.from_file(self.file_path, cleaner=cleaner)
+        with open(quarantine_path) as file:
+            quarantined = [json.loads(line) for line in file]
+
+        # Assert
+        self.assertEqual(
+            [(10000, 0.0), (12000, 20.0), (13000, 20.0), (16000, 50.0)],
+            [(ping.timestamp, ping.distance_from_stop) for ping in target.ping_list])
+        self.assertEqual([5, 6], [record['lineNumber'] for record in quarantined])
+        self.assertEqual(DIRTY_LINES[4], quarantined[0]['line'])
+        self.assertEqual({
+            'lines': 7, 'malformed': 2, 'pings': 5, 'kept': 4, 'duplicates_dropped': 1, 'duplicates_merged': 0,
+            'regressions_clamped': 1, 'regressions_dropped': 0, 'unmeshable_dropped': 0}, cleaner.counters.to_dict())
+        self.assertEqual(5, len(target.get_speed_map(10)))
+
+    def test_from_file_when_bulk_equals_line_by_line(self):
+
+        # Arrange
+        cleaner, bulk_cleaner = PingCleaner(), PingCleaner()
+
+        # Act
+        target = BusOnRoute.from_file(self.file_path, cleaner=cleaner)
+        bulk_target = BusOnRoute.from_file(self.file_path, bulk=True, cleaner=bulk_cleaner)
+
+        # Assert
+        self.assertEqual(target.get_speed_map(10), bulk_target.get_speed_map(10))
+        for name in ('lines', 'malformed', 'kept', 'duplicates_dropped', 'regressions_clamped'):
+            self.assertEqual(getattr(cleaner.counters, name), getattr(bulk_cleaner.counters, name))
+
+    def test_clean_when_merge_and_drop_policies(self):
+
+        # Arrange
+        pings = [Ping.from_json(line) for line in DIRTY_LINES[:4]]
+        test_object = PingCleaner(duplicates='merge', regressions='drop')
+
+        # Act
+        cleaned = list(test_object.clean(pings))
+
+        # Assert
+        self.assertEqual([(10000, 0.0), (12000, 22.0)], [(ping.timestamp, ping.distance_from_stop) for ping in cleaned])
+        self.assertEqual(1, test_object.counters.duplicates_merged)
+        self.assertEqual(1, test_object.counters.regressions_dropped)
+        self.assertEqual(20.0, pings[1].distance_from_stop)
+
+    def test_clean_when_arrival_shares_timestamp_replaces_data_ping(self):
+
+        # Arrange
+        pings = [Ping(10000, '1', 'DEPARTURE', 0.0), Ping(20000, '1', 'MIDPATH', 40.0),
+                 Ping(20000, '1', 'ARRIVAL', 50.0), Ping(20000, '2', 'DEPARTURE', 0.0),
+                 Ping(30000, '2', 'ARRIVAL', 30.0)]
+
+        # Act
+        cleaned = list(PingCleaner().clean(pings))
+
+        # Assert
+        self.assertEqual(['DEPARTURE', 'ARRIVAL', 'DEPARTURE', 'ARRIVAL'], [ping.ping_type for ping in cleaned])
+        self.assertEqual(5, len(BusOnRoute(cleaned).get_speed_map(20)))
+
+    def test_clean_when_first_edge_would_stall_drops_ping(self):
+
+        # Arrange, where clamping the back-step would form a first edge of zero speed at 2 meters
+        pings = [Ping(0, 'a', 'DEPARTURE', 2.0), Ping(1000, 'a', 'MIDPATH', 1.5), Ping(2000, 'a', 'MIDPATH', 6.0),
+                 Ping(3000, 'a', 'ARRIVAL', 10.0)]
+        test_object = PingCleaner()
+
+        # Act
+        cleaned = list(test_object.clean(pings))
+
+        # Assert
+        self.assertEqual([0, 2000, 3000], [ping.timestamp for ping in cleaned])
+        self.assertEqual(1, test_object.counters.unmeshable_dropped)
+        self.assertEqual([2.0, 3.3], [segment.speed for segment in BusOnRoute(cleaned).get_speed_map(5)])
+
+    def test_clean_when_merge_policy_keeps_departure_distance(self):
+
+        # Arrange
+        pings = [Ping(0, 'a', 'DEPARTURE', 0.0), Ping(0, 'a', 'MIDPATH', 4.0), Ping(1000, 'a', 'MIDPATH', 5.0),
+                 Ping(1000, 'a', 'MIDPATH', 7.0), Ping(2000, 'a', 'ARRIVAL', 10.0)]
+        test_object = PingCleaner(duplicates='merge')
+
+        # Act
+        cleaned = list(test_object.clean(pings))
+
+        # Assert
+        self.assertEqual([0.0, 6.0, 10.0], [ping.distance_from_stop for ping in cleaned])
+        self.assertEqual((1, 1), (test_object.counters.duplicates_dropped, test_object.counters.duplicates_merged))
+
+    def test_clean_when_stop_cannot_be_meshed_drops_its_pings(self):
+
+        # Arrange, an 'ARRIVAL' without a data ping of its stop, and a stop left before its 'ARRIVAL'
+        pings = [Ping(0, 'a', 'ARRIVAL', 5.0), Ping(1000, 'b', 'DEPARTURE', 0.0), Ping(2000, 'c', 'DEPARTURE', 0.0),
+                 Ping(3000, 'b', 'ARRIVAL', 20.0), Ping(4000, 'c', 'ARRIVAL', 10.0)]
+        test_object = PingCleaner()
+
+        # Act
+        cleaned = list(test_object.clean(pings))
+
+        # Assert
+        self.assertEqual([('b', 'DEPARTURE'), ('c', 'DEPARTURE'), ('c', 'ARRIVAL')],
+                         [(ping.stop_id, ping.ping_type) for ping in cleaned])
+        self.assertEqual(2, test_object.counters.unmeshable_dropped)
+        self.assertEqual(['c', 'c'], [segment.stop_id for segment in BusOnRoute(cleaned).get_speed_map(5)])
+
+    def test_clean_when_pings_are_random_output_can_be_meshed(self):
+
+        # Arrange
+        policies = [(duplicates, regressions) for duplicates in ('drop', 'merge') for regressions in ('clamp', 'drop')]
+
+        for seed in range(300):
+            generator = random.Random(seed)
+            pings, timestamp = [], 0
+            for _ in range(generator.randint(1, 20)):
+                timestamp += generator.choice([0, 1000, 2000])
+                pings.append(Ping(
+                    timestamp, generator.choice('ab'), generator.choice(['DEPARTURE', 'MIDPATH', 'ARRIVAL']),
+                    generator.choice([0.0, 1.5, 2.0, 5.0, 6.0, 10.0, generator.uniform(0, 30)])))
+
+            for duplicates, regressions in policies:
+
+                # Act
+                cleaned = list(PingCleaner(duplicates, regressions).clean(pings))
+
+                # Assert, that meshing raises no exception
+                for segment_length in (1, 2.5, 5):
+                    BusOnRoute(cleaned).get_speed_map(segment_length)
+                    BusOnRoute(cleaned).get_speed_map(segment_length, engine='numpy')
+
+    def test_clean_when_mock_input_is_clean_keeps_every_ping(self):
+
+        # Arrange
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+        cleaner = PingCleaner()
+
+        # Act
+        cleaned = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt", cleaner=cleaner)
+
+        # Assert
+        self.assertEqual(target.get_speed_map(10), cleaned.get_speed_map(10))
+        self.assertEqual(0, cleaner.counters.malformed + cleaner.counters.regressions_clamped)
+
+    def test_iter_speed_map_from_file_when_cleaner_equals_in_memory(self):
+
+        # Arrange
+        expected = BusOnRoute.from_file(self.file_path, cleaner=PingCleaner()).get_speed_map(10)
+
+        # Act
+        segments = list(StreamingBusOnRoute(10).iter_speed_map_from_file(
+            self.file_path, memory_budget=512, cleaner=PingCleaner()))
+
+        # Assert
+        self.assertEqual(expected, segments)
+
+    def test_write_speed_maps_when_clean_isolates_failed_partitions(self):
+
+        # Arrange
+        input_dir = os.path.join(self.directory.name, 'input')
+        output_dir = os.path.join(self.directory.name, 'output')
+        os.makedirs(input_dir)
+        shutil.copy(self.file_path, os.path.join(input_dir, 'dirty.jsonl'))
+        shutil.copy(mock_data_dir / "../data/mock_input.txt", os.path.join(input_dir, 'good.jsonl'))
+        with open(os.path.join(input_dir, 'bad.jsonl.gz'), "wb") as file:
+            file.write(gzip.compress(
+                b'{"timestamp": 10000, "stopId": "1", "pingType": "ARRIVAL", "distanceFromStop": 50.0}\n')[:-12])
+
+        # Act
+        with self.assertRaises(PartitionError) as context:
+            write_speed_maps([input_dir], output_dir, 10, processes=1, clean=True)
+
+        # Assert
+        self.assertEqual(['bad'], list(context.exception.errors))
+        self.assertEqual(['dirty', 'good'], list(context.exception.output_paths))
+        self.assertEqual(
+            ['dirty.jsonl', 'dirty.quarantine.jsonl', 'good.jsonl'], sorted(os.listdir(output_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
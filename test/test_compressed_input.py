@@ -0,0 +1,118 @@
+import unittest
+import bz2
+import gzip
+import lzma
+import os
+import tempfile
+import threading
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.compressed_input import detect_compression, iter_line_blocks, iter_lines
+from speedmap.external_sort import iter_sorted_pings
+from speedmap.ping_array import PingArray
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+test_file_path = mock_data_dir / "../data/mock_input.txt"
+
+
+class TestCompressedInput(unittest.TestCase):
+
+    def setUp(self):
+
+        # write the mock input with each compression, under a misleading extension for the magic number detection
+        self.directory = tempfile.TemporaryDirectory()
+        with open(test_file_path, "rb") as file:
+            self.data = file.read()
+        self.file_paths = {}
+        for compression, opener in (('gzip', gzip.open), ('bz2', bz2.open), ('xz', lzma.open)):
+            file_path = os.path.join(self.directory.name, compression + '.txt')
+            with opener(file_path, "wb") as file:
+                file.write(self.data)
+            self.file_paths[compression] = file_path
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_detect_compression_when_magic_number_or_extension(self):
+
+        # Arrange
+        empty_path = os.path.join(self.directory.name, 'empty.jsonl.gz')
+        open(empty_path, "wb").close()
+
+        # Act and Assert
+        for compression, file_path in self.file_paths.items():
+            self.assertEqual(compression, detect_compression(file_path))
+        self.assertIsNone(detect_compression(test_file_path))
+        self.assertEqual('gzip', detect_compression(empty_path))
+
+    def test_iter_line_blocks_when_small_reads_yields_whole_lines(self):
+
+        # Act
+        blocks = list(iter_line_blocks(self.file_paths['gzip'], read_size=7, queue_size=1))
+
+        # Assert
+        self.assertEqual(self.data, b''.join(blocks))
+        self.assertTrue(all(block.endswith(b'\n') for block in blocks[:-1]))
+
+    def test_iter_line_blocks_when_closed_early_stops_reader(self):
+
+        # Act
+        blocks = iter_line_blocks(self.file_paths['xz'], read_size=7, queue_size=1)
+        next(blocks)
+        blocks.close()
+
+        # Assert
+        self.assertTrue(all(thread.name != "speedmap-reader" for thread in threading.enumerate()))
+
+    def test_iter_lines_splits_on_line_feeds_only(self):
+
+        # Arrange
+        file_path = os.path.join(self.directory.name, 'separators.jsonl')
+        with open(file_path, "wb") as file:
+            file.write('{"a": "x\u2028y\x85z\x1c"}\r\nb\rc\n\nlast'.encode())
+
+        # Act
+        result = list(iter_lines(file_path, read_size=4))
+
+        # Assert
+        self.assertEqual(['{"a": "x\u2028y\x85z\x1c"}', 'b\rc', '', 'last'], result)
+
+    def test_iter_lines_when_file_is_missing_raises(self):
+
+        # Act and Assert
+        with self.assertRaises(FileNotFoundError):
+            list(iter_lines(os.path.join(self.directory.name, 'missing.jsonl')))
+
+    def test_iter_lines_when_file_is_corrupted_raises(self):
+
+        # Arrange
+        file_path = os.path.join(self.directory.name, 'corrupted.gz')
+        with open(file_path, "wb") as file:
+            file.write(gzip.compress(self.data)[:-12])
+
+        # Act and Assert
+        with self.assertRaises(EOFError):
+            list(iter_lines(file_path))
+
+    def test_from_file_when_compressed_equals_plain(self):
+
+        # Arrange
+        expected = BusOnRoute.from_file(test_file_path).get_speed_map(10)
+
+        # Act and Assert
+        for file_path in self.file_paths.values():
+            self.assertEqual(expected, BusOnRoute.from_file(file_path).get_speed_map(10))
+            self.assertEqual(expected, BusOnRoute.from_file(file_path, bulk=True).get_speed_map(10))
+            self.assertEqual(
+                list(PingArray.from_file(test_file_path).timestamps),
+                list(PingArray.from_file(file_path, chunk_size=16).timestamps))
+            self.assertEqual(
+                [ping.timestamp for ping in iter_sorted_pings(test_file_path, memory_budget=512)],
+                [ping.timestamp for ping in iter_sorted_pings(file_path, memory_budget=512)])
+
+
+if __name__ == '__main__':
+    unittest.main()
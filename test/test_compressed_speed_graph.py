@@ -0,0 +1,149 @@
+import unittest
+import os
+import random
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.compressed_speed_graph import get_compressed_speed_graph
+from speedmap.ping import Ping
+from speedmap.ping_array import PingArray
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+
+def generate_dense_trip(generator: random.Random, stops: int = 3, seconds: int = 300):
+    """
+    Generates a trip with one ping per second at piecewise constant speeds, with some noise, stops and regressions
+    """
+    pings, timestamp = [], 0
+    for stop_index in range(stops):
+        stop_id, distance, speed = str(stop_index), 0.0, 10.0
+        pings.append(Ping(timestamp, stop_id, 'DEPARTURE', distance))
+        for _ in range(seconds):
+            if generator.random() < 0.02:
+                speed = generator.choice([-1.0, 0.0, 5.0, 10.0, 12.5, 20.0])
+            timestamp += 1000
+            distance += speed * generator.uniform(0.99, 1.01) if generator.random() < 0.3 else speed
+            pings.append(Ping(timestamp, stop_id, 'MIDPATH', distance))
+        timestamp += 1000
+        pings.append(Ping(timestamp, stop_id, 'ARRIVAL', max(distance, 0.0) + 1))
+        timestamp += 1000
+    return pings
+
+
+class TestCompressedSpeedGraph(unittest.TestCase):
+
+    def test_get_compressed_speed_graph_when_speeds_equal_merges_runs(self):
+
+        # Arrange
+        pings = [Ping(0, '1', 'DEPARTURE', 0.0), Ping(1000, '1', 'MIDPATH', 10.0), Ping(2000, '1', 'MIDPATH', 20.0),
+                 Ping(3000, '1', 'MIDPATH', 20.0), Ping(4000, '1', 'MIDPATH', 30.0), Ping(5000, '1', 'ARRIVAL', 40.0),
+                 Ping(6000, '2', 'DEPARTURE', 0.0), Ping(7000, '2', 'ARRIVAL', 10.0)]
+
+        # Act
+        result = get_compressed_speed_graph(pings)
+
+        # Assert
+        self.assertEqual(['1', '2'], list(result.keys()))
+        self.assertEqual([(10.0, 20.0, 2000), (0.0, 20.0, 3000), (10.0, 40.0, 5000)],
+                         [(edge.speed, edge.distance_end, edge.time_end) for edge in result['1']])
+        self.assertEqual(1, len(result['2']))
+
+    def test_get_compressed_speed_graph_when_ping_array_equals_ping_list(self):
+
+        # Arrange
+        pings = generate_dense_trip(random.Random(1))
+
+        # Act
+        result = get_compressed_speed_graph(PingArray.from_pings(pings), 0.01)
+
+        # Assert
+        self.assertEqual(get_compressed_speed_graph(pings, 0.01), result)
+        self.assertLess(result.get_edges_count(), len(pings) // 3)
+
+    def test_get_speed_map_when_tolerance_is_zero_equals_uncompressed(self):
+
+        # Arrange
+        generator = random.Random(2)
+        engines = ('python', 'numpy') if vectorized.HAS_NUMPY else ('python',)
+
+        for file_name in ("mock_input.txt", "mock_input2.txt"):
+            target = BusOnRoute.from_file(mock_data_dir / "../data" / file_name)
+
+            # Act and Assert
+            self.assertEqual(target.get_speed_map(5), target.get_speed_map(5, merge_tolerance=0))
+
+        for _ in range(10):
+            target = BusOnRoute(generate_dense_trip(generator))
+            for engine in engines:
+                for segment_length in (7, 50, 200):
+                    try:
+                        expected = target.get_speed_map(segment_length, engine=engine)
+                    except ZeroDivisionError:
+                        with self.assertRaises(ZeroDivisionError):
+                            target.get_speed_map(segment_length, engine=engine, merge_tolerance=0)
+                        continue
+
+                    # Act
+                    result = target.get_speed_map(segment_length, engine=engine, merge_tolerance=0)
+
+                    # Assert, up to the rounding of a segment speed on a tie
+                    self.assertEqual(len(expected), len(result))
+                    for expected_segment, segment in zip(expected, result):
+                        self.assertEqual(expected_segment.segment_length, segment.segment_length)
+                        self.assertLessEqual(abs(segment.speed - expected_segment.speed), 0.1 + 1e-9)
+
+    def test_get_speed_map_when_tolerance_is_zero_and_speed_on_rounding_tie_differs_by_rounding(self):
+
+        # Arrange
+        pings = [Ping(0, '1', 'DEPARTURE', 0.0), Ping(1000, '1', 'MIDPATH', 3.45), Ping(2000, '1', 'MIDPATH', 6.9),
+                 Ping(3000, '1', 'MIDPATH', 10.35), Ping(4000, '1', 'ARRIVAL', 13.8)]
+        target = BusOnRoute(pings)
+
+        # Act
+        expected = target.get_speed_map(1)
+        result = target.get_speed_map(1, merge_tolerance=0)
+
+        # Assert, the run of equal speeds keeps its speed and only segment 2 rounds the other way
+        self.assertEqual(3.45, get_compressed_speed_graph(pings)['1'][0].speed)
+        self.assertEqual(
+            [2], [index for index, (a, b) in enumerate(zip(expected, result)) if a != b])
+        self.assertAlmostEqual(0.1, abs(result[2].speed - expected[2].speed))
+
+    def test_get_speed_map_when_tolerance_is_positive_is_within_error_bound(self):
+
+        # Arrange
+        generator = random.Random(3)
+
+        for _ in range(10):
+            target = BusOnRoute(generate_dense_trip(generator))
+            for tolerance in (0.01, 0.05):
+                for segment_length in (7, 50, 200):
+                    try:
+                        expected = target.get_speed_map(segment_length)
+                    except ZeroDivisionError:
+                        continue
+
+                    # Act
+                    result = target.get_speed_map(segment_length, merge_tolerance=tolerance)
+
+                    # Assert
+                    self.assertEqual(len(expected), len(result))
+                    for expected_segment, segment in zip(expected, result):
+                        self.assertEqual(expected_segment.segment_length, segment.segment_length)
+                        self.assertLessEqual(
+                            abs(segment.speed - expected_segment.speed),
+                            tolerance * abs(expected_segment.speed) + 0.1 + 1e-9)
+
+    def test_get_compressed_speed_graph_when_tolerance_negative_throws(self):
+
+        # Act and Assert
+        with self.assertRaises(ValueError):
+            get_compressed_speed_graph([], -0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
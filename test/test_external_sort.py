@@ -0,0 +1,114 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import external_sort
+from speedmap.__main__ import main
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.external_sort import BYTES_PER_PING, is_sorted_file, iter_sorted_pings
+from speedmap.ping import Ping
+from speedmap.segment_writers import read_segment_binary
+from speedmap.streaming_bus_on_route import StreamingBusOnRoute
+from speedmap.synthetic import generate_trip, write_ping_file
+
+
+class TestExternalSort(unittest.TestCase):
+
+    def test_iter_sorted_pings_matches_in_memory_sort(self):
+
+        # Arrange
+        pings = generate_trip(stops=4, pings_per_stop=50, out_of_order_fraction=0.3, seed=5)
+        pings.append(Ping(pings[10].timestamp, 'tie', 'MIDPATH', 1.0))
+        file_path = self._write_pings(pings)
+        expected = sorted(pings, key=lambda x: x.timestamp)
+
+        # Act
+        with mock.patch.object(external_sort, 'MAX_MERGE_FAN_IN', 4):
+            result = list(iter_sorted_pings(file_path, memory_budget=7 * BYTES_PER_PING))
+
+        # Assert
+        self.assertEqual(self._get_values(expected), self._get_values(result))
+
+    def test_iter_sorted_pings_streams_sorted_file_without_spilling(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        test_file_path = mock_data_dir / "../data/mock_input.txt"
+
+        # Act
+        with mock.patch.object(external_sort, '_spill_run') as spill_run:
+            result = list(iter_sorted_pings(test_file_path, memory_budget=1))
+
+        # Assert
+        self.assertTrue(is_sorted_file(test_file_path))
+        self.assertEqual(5, len(result))
+        spill_run.assert_not_called()
+
+    def test_iter_sorted_pings_removes_spill_files(self):
+
+        # Arrange
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        file_path = self._write_pings(generate_trip(stops=2, pings_per_stop=20, out_of_order_fraction=0.5))
+
+        # Act
+        iterator = iter_sorted_pings(file_path, memory_budget=3 * BYTES_PER_PING, temp_dir=directory.name)
+        next(iterator)
+        spilled = os.listdir(directory.name)
+        iterator.close()
+
+        # Assert
+        self.assertEqual(1, len(spilled))
+        self.assertEqual([], os.listdir(directory.name))
+
+    def test_iter_sorted_pings_when_budget_invalid_throws(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            next(iter_sorted_pings(mock_data_dir / "../data/mock_input.txt", memory_budget=0))
+
+    def test_streaming_speed_map_from_unsorted_file_matches_bus_on_route(self):
+
+        # Arrange
+        file_path = self._write_pings(generate_trip(stops=5, pings_per_stop=40, out_of_order_fraction=0.05, seed=2))
+        target = StreamingBusOnRoute(25)
+
+        # Act
+        result = list(target.iter_speed_map_from_file(file_path, memory_budget=16 * BYTES_PER_PING))
+
+        # Assert
+        self.assertEqual(BusOnRoute.from_file(file_path).get_speed_map(25), result)
+
+    def test_main_memory_budget_streams_segments(self):
+
+        # Arrange
+        file_path = self._write_pings(generate_trip(stops=3, pings_per_stop=30, out_of_order_fraction=0.1))
+        output_path = self._write_pings([])
+
+        # Act
+        main([file_path, "50", "--format", "binary", "--output", output_path, "--memory-budget", "0.01"])
+
+        # Assert
+        self.assertEqual(BusOnRoute.from_file(file_path).get_speed_map(50), list(read_segment_binary(output_path)))
+
+    def _write_pings(self, pings):
+        file_descriptor, file_path = tempfile.mkstemp()
+        os.close(file_descriptor)
+        self.addCleanup(os.remove, file_path)
+        write_ping_file(pings, file_path)
+        return file_path
+
+    @staticmethod
+    def _get_values(pings):
+        return [(ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop) for ping in pings]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import os
+import random
+from pathlib import Path
+import sys
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.incremental_bus_on_route import IncrementalBusOnRoute, PingTimeline
+from speedmap.ping import Ping
+from speedmap.synthetic import generate_trip
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+
+class TestIncrementalBusOnRoute(unittest.TestCase):
+
+    def test_init_when_pings_in_order_equals_bus_on_route(self):
+
+        # Arrange
+        test_file_path = mock_data_dir / "../data/mock_input.txt"
+        bus_on_route = BusOnRoute.from_file(test_file_path)
+
+        # Act
+        test_object = IncrementalBusOnRoute(10, bus_on_route.ping_list)
+
+        # Assert
+        self.assertEqual(bus_on_route.get_speed_map(10), test_object.get_speed_map())
+
+    def test_add_ping_when_shuffled_equals_bus_on_route(self):
+
+        # Arrange
+        pings = generate_trip(stops=5, pings_per_stop=20, jitter=0.5, seed=3)
+        shuffled = list(pings)
+        random.Random(1).shuffle(shuffled)
+        expected = BusOnRoute(pings).get_speed_map(15)
+
+        # Act
+        test_object = IncrementalBusOnRoute(15)
+        for ping in shuffled:
+            test_object.add_ping(ping)
+
+        # Assert
+        self.assertEqual(expected, test_object.get_speed_map())
+        self.assertEqual([], test_object.incomplete_stop_ids)
+        self.assertEqual([ping.timestamp for ping in pings], [ping.timestamp for ping in test_object.ping_list])
+
+    @mock.patch('speedmap.incremental_bus_on_route.BLOCK_SIZE', 4)
+    def test_add_ping_when_timeline_splits_blocks_equals_bus_on_route(self):
+
+        # Arrange
+        pings = generate_trip(stops=4, pings_per_stop=25, jitter=0.5, seed=11)
+        shuffled = list(pings)
+        random.Random(2).shuffle(shuffled)
+
+        # Act
+        test_object = IncrementalBusOnRoute(10)
+        for ping in shuffled:
+            test_object.add_ping(ping)
+
+        # Assert
+        self.assertEqual(BusOnRoute(pings).get_speed_map(10), test_object.get_speed_map())
+        self.assertEqual(pings, test_object.ping_list)
+
+    @mock.patch('speedmap.incremental_bus_on_route.BLOCK_SIZE', 2)
+    def test_ping_timeline_inserts_finds_and_removes_across_blocks(self):
+
+        # Arrange
+        test_object = PingTimeline()
+        pings = [Ping(timestamp, '1', 'MIDPATH', float(timestamp)) for timestamp in range(10)]
+        previous = [test_object.insert((ping.timestamp, 0), ping) for ping in reversed(pings)]
+
+        # Act
+        removed = test_object.remove((4, 0))
+        result = [test_object.get_with_next((timestamp, 0)) for timestamp in (3, 9)]
+
+        # Assert
+        self.assertEqual([(None, None)] * 10, previous)
+        self.assertEqual(pings[4], removed)
+        self.assertEqual(pings[:4] + pings[5:], list(test_object))
+        self.assertEqual(9, len(test_object))
+        self.assertEqual([(pings[3], pings[5]), (pings[9], None)], result)
+
+    def test_add_ping_when_diffs_applied_tracks_speed_map(self):
+
+        # Arrange
+        pings = generate_trip(stops=4, pings_per_stop=15, jitter=0.5, seed=5)
+        late = pings[10::7]
+        on_time = [ping for ping in pings if ping not in late]
+        test_object = IncrementalBusOnRoute(10, on_time)
+        speed_map = {(segment.stop_id, segment.segment_index): segment for segment in test_object.get_speed_map()}
+
+        # Act
+        for ping in late:
+            updated, removed = test_object.add_ping(ping)
+            for key in removed:
+                del speed_map[key]
+            for segment in updated:
+                speed_map[(segment.stop_id, segment.segment_index)] = segment
+
+            # Assert
+            self.assertEqual(
+                sorted(test_object.get_speed_map(), key=lambda segment: (segment.stop_id, segment.segment_index)),
+                [speed_map[key] for key in sorted(speed_map)])
+
+        self.assertEqual(BusOnRoute(pings).get_speed_map(10), test_object.get_speed_map())
+
+    def test_add_ping_when_late_ping_at_end_of_stop_updates_only_the_last_segments(self):
+
+        # Arrange
+        pings = generate_trip(stops=2, pings_per_stop=40, jitter=0.5, seed=7)
+        late = pings[38]
+        test_object = IncrementalBusOnRoute(5, [ping for ping in pings if ping is not late])
+        segments_count = len(test_object.get_speed_map())
+
+        # Act
+        updated, removed = test_object.add_ping(late)
+
+        # Assert
+        self.assertEqual(BusOnRoute(pings).get_speed_map(5), test_object.get_speed_map())
+        self.assertLess(len(updated), segments_count // 4)
+        self.assertEqual([], removed)
+
+    def test_add_ping_when_stop_is_missing_pings_is_incomplete(self):
+
+        # Arrange
+        test_object = IncrementalBusOnRoute(10)
+
+        # Act
+        test_object.add_ping(Ping(30000, '1234', 'ARRIVAL', 75.0))
+        test_object.add_ping(Ping(40000, '5678', 'DEPARTURE', 0.0))
+        incomplete_stop_ids = test_object.incomplete_stop_ids
+        updated, removed = test_object.add_ping(Ping(10000, '1234', 'DEPARTURE', 0.0))
+
+        # Assert
+        self.assertEqual(['1234'], incomplete_stop_ids)
+        self.assertEqual([], test_object.incomplete_stop_ids)
+        self.assertEqual(8, len(updated))
+        self.assertEqual([], removed)
+
+    def test_add_ping_when_timestamp_is_duplicated_raises_and_keeps_state(self):
+
+        # Arrange
+        test_object = IncrementalBusOnRoute(10, [
+            Ping(10000, '1234', 'DEPARTURE', 0.0), Ping(35000, '1234', 'ARRIVAL', 75.0)])
+        speed_map = test_object.get_speed_map()
+
+        # Act and Assert
+        with self.assertRaises(ValueError):
+            test_object.add_ping(Ping(10000, '1234', 'MIDPATH', 5.0))
+        self.assertEqual(2, len(test_object.ping_list))
+        self.assertEqual(speed_map, test_object.get_speed_map())
+
+
+if __name__ == '__main__':
+    unittest.main()
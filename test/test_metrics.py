@@ -0,0 +1,94 @@
+import unittest
+import contextlib
+import io
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.__main__ import main
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.metrics import NULL_METRICS, PhaseMetrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_bus_on_route_records_each_phase(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        test_file_path = mock_data_dir / "../data/mock_input2.txt"
+
+        for bulk in (False, True):
+            metrics = PhaseMetrics()
+
+            # Act
+            target = BusOnRoute.from_file(test_file_path, bulk=bulk, metrics=metrics)
+            result = target.get_speed_map(50)
+            fine_result = target.get_speed_map(25)
+
+            # Assert
+            self.assertEqual(BusOnRoute.from_file(test_file_path).get_speed_map(50), result)
+            self.assertEqual(['parse', 'sort', 'graph', 'mesh'], list(metrics.records))
+            self.assertEqual(10, metrics.records['parse'].items)
+            self.assertEqual(9, metrics.records['graph'].items)
+            self.assertEqual(1, metrics.records['graph'].calls)
+            self.assertEqual(2, metrics.records['mesh'].calls)
+            self.assertEqual(len(result) + len(fine_result), metrics.records['mesh'].items)
+            self.assertIsNone(metrics.records['mesh'].peak_memory)
+
+    def test_phase_metrics_traces_memory_and_calls_back(self):
+
+        # Arrange
+        calls = []
+        metrics = PhaseMetrics(trace_memory=True, callback=lambda record, seconds: calls.append(record.name))
+        self.addCleanup(metrics.close)
+
+        # Act
+        with metrics.phase('allocate') as phase:
+            data = [bytearray(1024) for _ in range(100)]
+            phase.items = len(data)
+
+        # Assert
+        record = metrics.records['allocate']
+        self.assertEqual(['allocate'], calls)
+        self.assertEqual(100, record.items)
+        self.assertGreaterEqual(record.peak_memory, 100 * 1024)
+        self.assertGreaterEqual(record.seconds, 0)
+
+    def test_bus_on_route_records_nothing_by_default(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act
+        target.get_speed_map(50)
+
+        # Assert
+        self.assertIs(NULL_METRICS, target.metrics)
+        self.assertEqual({}, NULL_METRICS.records)
+
+    def test_main_profile_prints_phase_breakdown(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        test_file_path = mock_data_dir / "../data/mock_input.txt"
+        file_descriptor, output_path = tempfile.mkstemp()
+        os.close(file_descriptor)
+        self.addCleanup(os.remove, output_path)
+        error = io.StringIO()
+
+        # Act
+        with contextlib.redirect_stderr(error):
+            main([str(test_file_path), "50", "--output", output_path, "--profile"])
+
+        # Assert
+        lines = error.getvalue().splitlines()
+        self.assertEqual(['phase', 'parse', 'sort', 'graph', 'mesh', 'write', 'total'],
+                         [line.split()[0] for line in lines])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import os
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.mesh import mesh_speed_graph
+from speedmap.parallel_mesh import mesh_speed_graph_parallel
+from speedmap.ping import Ping
+from speedmap.segment_array import SegmentArray
+from speedmap.synthetic import generate_trip
+
+
+class TestParallelMesh(unittest.TestCase):
+
+    def test_mesh_speed_graph_parallel_matches_serial_meshing(self):
+
+        # Arrange
+        target = BusOnRoute(sorted(generate_trip(stops=12, pings_per_stop=30, seed=4), key=lambda x: x.timestamp))
+        stop_lengths, speed_graph = target._get_stop_lengths(), target._get_speed_graph()
+        engines = ('python', 'numpy') if vectorized.HAS_NUMPY else ('python',)
+
+        for engine in engines:
+            expected = mesh_speed_graph(stop_lengths, speed_graph, 7, engine=engine)
+
+            # Act
+            result = mesh_speed_graph_parallel(stop_lengths, speed_graph, 7, workers=2, engine=engine, chunk_size=5)
+
+            # Assert
+            self.assertEqual(expected, result)
+            self.assertTrue(all(type(expected_segment.segment_length) is type(segment.segment_length)
+                                for expected_segment, segment in zip(expected, result)))
+
+    def test_get_speed_map_with_workers_matches_serial_for_columnar_pings(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input2.txt", bulk=True)
+
+        # Act
+        result = target.get_speed_map(10, workers=2)
+        compact_result = target.get_speed_map(10, compact=True, workers=2)
+
+        # Assert
+        self.assertEqual(target.get_speed_map(10), result)
+        self.assertIsInstance(compact_result, SegmentArray)
+        self.assertEqual(result, list(compact_result))
+
+    def test_mesh_speed_graph_parallel_when_edges_run_out_throws(self):
+
+        # Arrange
+        ping_list = [
+            Ping(0, 'a', 'DEPARTURE', 0.0),
+            Ping(1000, 'a', 'MIDPATH', 10.0),
+            Ping(2000, 'b', 'DEPARTURE', 0.0),
+            Ping(3000, 'b', 'MIDPATH', 10.0),
+            Ping(4000, 'a', 'ARRIVAL', 20.0),
+            Ping(5000, 'b', 'ARRIVAL', 10.0),
+        ]
+        target = BusOnRoute(ping_list)
+
+        # Act & Assert
+        with self.assertRaises(IndexError):
+            target.get_speed_map(5, workers=2)
+
+    def test_mesh_speed_graph_parallel_when_workers_invalid_throws(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input2.txt")
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            target.get_speed_map(10, workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
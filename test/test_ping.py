@@ -2,7 +2,7 @@ import unittest
 import os
 import sys
 sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
-from speedmap.ping import Ping
+from speedmap.ping import Ping, SlottedPing
 
 
 class TestPing(unittest.TestCase):
@@ -30,5 +30,22 @@ class TestPing(unittest.TestCase):
             Ping.from_json(test_json)
 
 
+    def test_slotted_ping_from_json_has_no_instance_dictionary(self):
+
+        # Arrange
+        test_json = '{"timestamp": 10000, "stopId": "1234", "pingType": "DEPARTURE", "distanceFromStop": 0.0}'
+
+        # Act
+        test_object = SlottedPing.from_json(test_json)
+
+        # Assert
+        self.assertIsInstance(test_object, SlottedPing)
+        self.assertEqual((10000, "1234", "DEPARTURE", 0.0), (
+            test_object.timestamp, test_object.stop_id, test_object.ping_type, test_object.distance_from_stop))
+        self.assertFalse(hasattr(test_object, '__dict__'))
+        with self.assertRaises(AttributeError):
+            test_object.speed = 1.0
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping_array import ARRIVAL, DEPARTURE, PingArray, PingFormatError
+
+
+class TestPingArray(unittest.TestCase):
+
+    def test_from_file_when_valid_file_succeeds(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        test_file_path = mock_data_dir / "../data/mock_input.txt"
+
+        # Act
+        test_object = PingArray.from_file(test_file_path, chunk_size=64)
+
+        # Assert
+        self.assertEqual(5, len(test_object))
+        self.assertEqual([10000, 35000, 40000, 65000, 90000], list(test_object.timestamps))
+        self.assertEqual(['1234', '5678'], test_object.stop_ids)
+        self.assertEqual([0, 0, 1, 1, 1], list(test_object.stop_id_codes))
+        self.assertEqual(DEPARTURE, test_object.ping_type_codes[0])
+        self.assertEqual(ARRIVAL, test_object.ping_type_codes[1])
+        self.assertEqual(75.0, test_object.distances[1])
+
+    def test_from_file_parses_other_field_orders(self):
+
+        # Arrange
+        lines = [
+            '{"stopId": "a", "timestamp": 1000, "distanceFromStop": 0, "pingType": "DEPARTURE"}',
+            '{"timestamp": 2000, "stopId": "a", "pingType": "ARRIVAL", "distanceFromStop": 10.5}']
+
+        # Act
+        test_object = PingArray.from_file(self._write_lines(lines))
+
+        # Assert
+        self.assertEqual([1000, 2000], list(test_object.timestamps))
+        self.assertEqual([0.0, 10.5], list(test_object.distances))
+
+    def test_from_file_when_line_malformed_throws_with_line_number(self):
+
+        # Arrange
+        lines = [
+            '{"timestamp": 1000, "stopId": "a", "pingType": "DEPARTURE", "distanceFromStop": 0}',
+            '{"timestamp": 2000, "stopId": "a", "pingType": "MIDPATH"}',
+            '{"timestamp": 3000, "stopId": "a", "pingType": "ARRIVAL", "distanceFromStop": 10}']
+
+        # Act & Assert
+        with self.assertRaises(PingFormatError) as context:
+            PingArray.from_file(self._write_lines(lines), chunk_size=16)
+        self.assertEqual(2, context.exception.line_number)
+
+    def test_from_file_when_errors_skip_records_malformed_lines(self):
+
+        # Arrange
+        lines = [
+            '{"timestamp": 1000, "stopId": "a", "pingType": "DEPARTURE", "distanceFromStop": 0}',
+            'not json',
+            '{"timestamp": 3000, "stopId": "a", "pingType": "TELEPORT", "distanceFromStop": 10}',
+            '{"timestamp": 4000, "stopId": "a", "pingType": "ARRIVAL", "distanceFromStop": 10}']
+
+        # Act
+        test_object = PingArray.from_file(self._write_lines(lines), errors='skip')
+
+        # Assert
+        self.assertEqual([1000, 4000], list(test_object.timestamps))
+        self.assertEqual([2, 3], [line_number for line_number, _ in test_object.malformed_lines])
+
+    def test_from_file_bulk_matches_from_file(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+        for file_name in ("mock_input.txt", "mock_input2.txt"):
+            test_file_path = mock_data_dir / "../data" / file_name
+            expected_object = BusOnRoute.from_file(test_file_path)
+
+            # Act
+            test_object = BusOnRoute.from_file(test_file_path, bulk=True)
+
+            # Assert
+            self.assertEqual(expected_object._get_stop_lengths(), test_object._get_stop_lengths())
+            self.assertEqual(expected_object._get_speed_graph(), test_object._get_speed_graph())
+            self.assertEqual(
+                [s.to_dict() for s in expected_object.get_speed_map(10)],
+                [s.to_dict() for s in test_object.get_speed_map(10)])
+
+    def test_getitem_returns_pings(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        expected_object = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act
+        test_object = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt", bulk=True)
+
+        # Assert
+        self.assertEqual(10000, test_object.ping_list[0].timestamp)
+        self.assertEqual('1234', test_object.ping_list[0].stop_id)
+        self.assertEqual('DEPARTURE', test_object.ping_list[0].ping_type)
+        self.assertEqual(3, len(test_object.ping_list[2:]))
+        self.assertEqual(
+            [(p.timestamp, p.stop_id, p.ping_type, p.distance_from_stop) for p in expected_object.ping_list],
+            [(p.timestamp, p.stop_id, p.ping_type, p.distance_from_stop) for p in test_object.ping_list])
+
+    def _write_lines(self, lines):
+        file = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False)
+        with file:
+            file.write("\n".join(lines))
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+
+if __name__ == '__main__':
+    unittest.main()
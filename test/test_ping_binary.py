@@ -0,0 +1,110 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping_array import PingArray
+from speedmap.ping_binary import convert_jsonl_to_binary, read_ping_binary, write_ping_binary
+
+
+class TestPingBinary(unittest.TestCase):
+
+    def test_convert_jsonl_to_binary_round_trips(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        test_file_path = mock_data_dir / "../data/mock_input2.txt"
+        binary_file_path = self._get_temporary_path()
+
+        # Act
+        count = convert_jsonl_to_binary(test_file_path, binary_file_path)
+        result = read_ping_binary(binary_file_path)
+
+        # Assert
+        expected = PingArray.from_file(test_file_path).sort_by_timestamp()
+        self.assertEqual(10, count)
+        self.assertTrue(result.is_sorted())
+        self.assertEqual(list(expected.timestamps), list(result.timestamps))
+        self.assertEqual(list(expected.distances), list(result.distances))
+        self.assertEqual(list(expected.stop_id_codes), list(result.stop_id_codes))
+        self.assertEqual(list(expected.ping_type_codes), list(result.ping_type_codes))
+        self.assertEqual(expected.stop_ids, result.stop_ids)
+
+    def test_read_ping_binary_maps_columns_without_copy(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        binary_file_path = self._get_temporary_path()
+        convert_jsonl_to_binary(mock_data_dir / "../data/mock_input.txt", binary_file_path)
+
+        # Act
+        result = read_ping_binary(binary_file_path)
+
+        # Assert
+        self.assertIsInstance(result.timestamps, memoryview)
+        self.assertTrue(result.timestamps.readonly)
+
+    def test_write_ping_binary_when_unsorted_clears_flag(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        binary_file_path = self._get_temporary_path()
+        convert_jsonl_to_binary(mock_data_dir / "../data/mock_input2.txt", binary_file_path, sort=False)
+
+        # Act
+        result = BusOnRoute.from_binary(binary_file_path)
+
+        # Assert that the pings are sorted when loaded
+        self.assertFalse(read_ping_binary(binary_file_path)._is_sorted)
+        self.assertEqual(sorted(result.ping_list.timestamps), list(result.ping_list.timestamps))
+
+    def test_from_binary_matches_from_file(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+        for file_name in ("mock_input.txt", "mock_input2.txt"):
+            test_file_path = mock_data_dir / "../data" / file_name
+            binary_file_path = self._get_temporary_path()
+            convert_jsonl_to_binary(test_file_path, binary_file_path)
+
+            # Act
+            result = BusOnRoute.from_binary(binary_file_path).get_speed_map(10)
+
+            # Assert
+            expected = BusOnRoute.from_file(test_file_path).get_speed_map(10)
+            self.assertEqual([s.to_dict() for s in expected], [s.to_dict() for s in result])
+
+    def test_read_ping_binary_when_not_binary_throws(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            read_ping_binary(mock_data_dir / "../data/mock_input.txt")
+
+    def test_write_ping_binary_when_empty_succeeds(self):
+
+        # Arrange
+        binary_file_path = self._get_temporary_path()
+
+        # Act
+        write_ping_binary(PingArray(), binary_file_path)
+        result = read_ping_binary(binary_file_path)
+
+        # Assert
+        self.assertEqual(0, len(result))
+
+    def _get_temporary_path(self):
+        file_descriptor, file_path = tempfile.mkstemp(suffix=".spmp")
+        os.close(file_descriptor)
+        self.addCleanup(os.remove, file_path)
+        return file_path
+
+
+if __name__ == '__main__':
+    unittest.main()
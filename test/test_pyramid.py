@@ -0,0 +1,104 @@
+import unittest
+import os
+import random
+from pathlib import Path
+from unittest import mock
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import pyramid, vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping import Ping
+
+
+class TestPyramid(unittest.TestCase):
+
+    def test_get_speed_maps_matches_get_speed_map(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        segment_lengths = [50, 5, 25, 100, 500, 10, 7, 0.1, 0.3]
+        engines = ('python', 'numpy') if vectorized.HAS_NUMPY else ('python',)
+
+        for file_name in ("mock_input.txt", "mock_input2.txt"):
+            target = BusOnRoute.from_file(mock_data_dir / "../data" / file_name)
+
+            for engine in engines:
+
+                # Act
+                result = target.get_speed_maps(segment_lengths, engine=engine)
+
+                # Assert
+                self.assertEqual(segment_lengths, list(result.keys()))
+                for segment_length in segment_lengths:
+                    self.assertEqual(target.get_speed_map(segment_length), result[segment_length])
+
+    def test_get_speed_maps_matches_get_speed_map_for_random_trip(self):
+
+        # Arrange
+        generator = random.Random(3)
+        ping_list, timestamp = [], 0
+        for stop_id in ('a', 'b', 'c'):
+            distance = 0.0
+            ping_list.append(Ping(timestamp, stop_id, 'DEPARTURE', distance))
+            for _ in range(200):
+                timestamp += generator.randint(500, 1500)
+                distance += generator.uniform(0.5, 20)
+                ping_list.append(Ping(timestamp, stop_id, 'MIDPATH', distance))
+            timestamp += 1000
+            ping_list.append(Ping(timestamp, stop_id, 'ARRIVAL', distance + 3.7))
+            timestamp += 1000
+        target = BusOnRoute(ping_list)
+        segment_lengths = [1, 5, 25, 50, 100, 500, 2.5]
+
+        # Act
+        result = target.get_speed_maps(segment_lengths)
+
+        # Assert
+        for segment_length in segment_lengths:
+            self.assertEqual(target.get_speed_map(segment_length), result[segment_length])
+
+    def test_get_speed_maps_merges_multiples_of_finer_lengths(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act
+        with mock.patch.object(
+                pyramid, 'get_segment_boundaries', wraps=pyramid.get_segment_boundaries) as get_segment_boundaries:
+            target.get_speed_maps([5, 25, 50, 100, 500])
+
+        # Assert that only the finest length was interpolated, once per stop_id
+        self.assertEqual(2, get_segment_boundaries.call_count)
+        self.assertEqual({5}, {call.args[2] for call in get_segment_boundaries.call_args_list})
+
+    def test_get_speed_maps_caches_speed_graph(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act
+        with mock.patch.object(target, '_get_speed_graph', wraps=target._get_speed_graph) as get_speed_graph:
+            target.get_speed_maps([5, 7])
+            target.get_speed_map(50)
+            target.clear_cache()
+            target.get_speed_map(50)
+
+        # Assert
+        self.assertEqual(2, get_speed_graph.call_count)
+
+    def test_get_speed_maps_when_segment_invalid_throws(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            target.get_speed_maps([50, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.__main__ import main
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.result_cache import ResultCache
+from speedmap.segment import Segment
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'mock_input.txt')
+        shutil.copy(mock_data_dir / "../data/mock_input.txt", self.file_path)
+        self.cache_dir = os.path.join(self.directory.name, 'cache')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_key_when_input_or_segment_length_changes_differs(self):
+
+        # Arrange
+        test_object = ResultCache(self.cache_dir)
+        key = test_object.get_key(self.file_path, 10)
+
+        # Act
+        same_key = test_object.get_key(self.file_path, 10.0)
+        other_length_key = test_object.get_key(self.file_path, 20)
+        with open(self.file_path, "a") as file:
+            file.write('{"timestamp": 95000, "stopId": "5678", "pingType": "ARRIVAL", "distanceFromStop": 1.0}\n')
+        modified_key = test_object.get_key(self.file_path, 10)
+        with mock.patch('speedmap.__version__', '0.0.0-test'):
+            other_version_key = test_object.get_key(self.file_path, 10)
+
+        # Assert
+        self.assertEqual(key, same_key)
+        self.assertEqual(4, len({key, other_length_key, modified_key, other_version_key}))
+
+    def test_get_key_when_content_mode_ignores_file_identity(self):
+
+        # Arrange
+        test_object = ResultCache(self.cache_dir, key_mode='content')
+        copy_path = os.path.join(self.directory.name, 'copy.txt')
+        shutil.copy(self.file_path, copy_path)
+
+        # Act and Assert
+        self.assertEqual(test_object.get_key(self.file_path, 10), test_object.get_key(copy_path, 10))
+
+    def test_put_when_get_returns_the_segments(self):
+
+        # Arrange
+        test_object = ResultCache(self.cache_dir)
+        segments = BusOnRoute.from_file(self.file_path).get_speed_map(10)
+        key = test_object.get_key(self.file_path, 10)
+
+        # Act
+        missed = test_object.get(key)
+        stored = test_object.put(key, segments)
+
+        # Assert
+        self.assertIsNone(missed)
+        self.assertTrue(stored)
+        self.assertEqual(segments, test_object.get(key).to_list())
+
+    def test_put_when_stop_id_is_too_long_is_not_cached(self):
+
+        # Arrange
+        test_object = ResultCache(self.cache_dir)
+
+        # Act
+        stored = test_object.put('key', [Segment('a' * 17, 0, 10.0, 1.0)])
+
+        # Assert
+        self.assertFalse(stored)
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_get_when_file_is_corrupted_returns_none(self):
+
+        # Arrange
+        test_object = ResultCache(self.cache_dir)
+        test_object.put('key', [Segment('1234', 0, 10.0, 1.0)])
+        with open(os.path.join(self.cache_dir, 'key.spms'), "wb") as file:
+            file.write(b'not a segment file')
+
+        # Act and Assert
+        self.assertIsNone(test_object.get('key'))
+        self.assertEqual(0, test_object.get_size())
+
+    def test_evict_when_over_size_removes_least_recently_used(self):
+
+        # Arrange
+        segments = [Segment('1234', index, 10.0, 1.0) for index in range(10)]
+        test_object = ResultCache(self.cache_dir)
+        for key in ('first', 'second', 'third'):
+            test_object.put(key, segments)
+        entry_size = test_object.get_size() // 3
+        os.utime(os.path.join(self.cache_dir, 'first.spms'), ns=(3 * 10 ** 18, 3 * 10 ** 18))
+        os.utime(os.path.join(self.cache_dir, 'second.spms'), ns=(1 * 10 ** 18, 1 * 10 ** 18))
+        os.utime(os.path.join(self.cache_dir, 'third.spms'), ns=(2 * 10 ** 18, 2 * 10 ** 18))
+
+        # Act
+        test_object.max_size = 2 * entry_size
+        evicted = test_object.evict()
+
+        # Assert
+        self.assertEqual(1, evicted)
+        self.assertIsNone(test_object.get('second'))
+        self.assertIsNotNone(test_object.get('first'))
+        self.assertIsNotNone(test_object.get('third'))
+
+    def test_main_when_cached_skips_parsing(self):
+
+        # Arrange
+        first_output = os.path.join(self.directory.name, 'first.jsonl')
+        second_output = os.path.join(self.directory.name, 'second.jsonl')
+        arguments = [self.file_path, '10', '--cache', '--cache-dir', self.cache_dir]
+
+        # Act
+        main(arguments + ['--output', first_output])
+        with mock.patch.object(BusOnRoute, 'from_file', side_effect=AssertionError("parsed")):
+            main(arguments + ['--output', second_output])
+
+        # Assert
+        with open(first_output) as first, open(second_output) as second:
+            self.assertEqual(first.read(), second.read())
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+    def test_main_when_clean_or_memory_budget_does_not_cache(self):
+
+        # Arrange
+        output = os.path.join(self.directory.name, 'output.jsonl')
+        arguments = [self.file_path, '10', '--cache', '--cache-dir', self.cache_dir, '--output', output]
+
+        # Act
+        with mock.patch('sys.stderr'):
+            main(arguments + ['--clean'])
+            main(arguments + ['--memory-budget', '1'])
+
+        # Assert
+        self.assertFalse(os.path.exists(self.cache_dir) and os.listdir(self.cache_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import math
+import os
+import random
+from datetime import datetime, timezone
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.rolling_statistics import RollingSpeedStatistics, SpeedHistogram
+from speedmap.segment import Segment, round_speed
+
+HOUR = 3600 * 1000
+
+
+class TestRollingStatistics(unittest.TestCase):
+
+    def test_histogram_quantiles_match_exact_quantiles_of_rounded_speeds(self):
+
+        # Arrange
+        generator = random.Random(1)
+        speeds = [round_speed(generator.uniform(0, 30)) for _ in range(5000)]
+        target = SpeedHistogram()
+
+        # Act
+        for speed in speeds:
+            target.add(speed)
+
+        # Assert
+        ordered = sorted(speeds)
+        for quantile in (0.0, 0.5, 0.85, 0.95, 1.0):
+            self.assertEqual(ordered[max(1, math.ceil(quantile * len(ordered))) - 1], target.get_quantile(quantile))
+        self.assertLessEqual(len(target.bins), 301)
+        self.assertAlmostEqual(sum(speeds) / len(speeds), target.mean)
+
+    def test_histogram_clamps_out_of_range_speeds(self):
+
+        # Arrange
+        target = SpeedHistogram(max_speed=10.0)
+
+        # Act
+        for speed in (-2.0, 5.0, 99.0):
+            target.add(speed)
+
+        # Assert
+        self.assertEqual(0.0, target.get_quantile(0))
+        self.assertEqual(5.0, target.get_quantile(0.5))
+        self.assertEqual(10.0, target.get_quantile(1))
+        with self.assertRaises(ValueError):
+            target.get_quantile(1.5)
+
+    def test_rolling_statistics_queries_windows_and_weekday_hours(self):
+
+        # Arrange
+        monday_8am = int(datetime(2024, 1, 1, 8, tzinfo=timezone.utc).timestamp() * 1000)
+        target = RollingSpeedStatistics(retention_seconds=14 * 24 * 3600)
+
+        # Act
+        for week in range(2):
+            for speed in (4.0, 5.0, 6.0):
+                target.add_speed_map([Segment('1', 0, 50.0, speed + week)], monday_8am + week * 7 * 24 * HOUR)
+        target.add_speed_map([Segment('1', 0, 50.0, 20.0)], monday_8am + 7 * 24 * HOUR + 3 * HOUR)
+
+        # Assert
+        self.assertEqual({0.5: 20.0}, target.get_window_quantiles('1', 0, 3600, (0.5,)))
+        self.assertEqual({0.5: 5.0, 1: 7.0}, target.get_weekday_hour_quantiles('1', 0, 0, 8, (0.5, 1)))
+        self.assertEqual({0.5: None}, target.get_weekday_hour_quantiles('1', 0, 1, 8, (0.5,)))
+        self.assertEqual({0.5: None}, target.get_quantiles('2', 0, (0.5,)))
+
+    def test_rolling_statistics_evicts_expired_buckets(self):
+
+        # Arrange
+        target = RollingSpeedStatistics(bucket_seconds=3600, retention_seconds=2 * 3600)
+
+        # Act
+        for hour in range(10):
+            target.add_speed_map([Segment('1', 0, 50.0, float(hour))], hour * HOUR + 1)
+        target.add_speed_map([Segment('1', 0, 50.0, 99.0)], 0)
+
+        # Assert
+        self.assertEqual([7 * HOUR, 8 * HOUR, 9 * HOUR], list(target.buckets))
+        self.assertEqual(3, target.get_histogram('1', 0).count)
+        self.assertEqual(3, target.evict(12 * HOUR))
+
+    def test_rolling_statistics_orders_late_buckets(self):
+
+        # Arrange
+        target = RollingSpeedStatistics()
+
+        # Act
+        target.add_speed_map([Segment('1', 0, 50.0, 1.0)], 5 * HOUR)
+        target.add_speed_map([Segment('1', 0, 50.0, 2.0)], 3 * HOUR)
+
+        # Assert
+        self.assertEqual([3 * HOUR, 5 * HOUR], list(target.buckets))
+        self.assertEqual({0.5: 2.0}, target.get_quantiles('1', 0, (0.5,), end=4 * HOUR))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.segment import Segment, SlottedSegment
+from speedmap.segment_array import SegmentArray
+
+
+class TestSegmentArray(unittest.TestCase):
+
+    def test_from_segments_is_indexable_like_list(self):
+
+        # Arrange
+        segments = [Segment('1234', 0, 50.0, 3.0), Segment('1234', 1, 25.0, 3.0), Segment('5678', 0, 50.0, 1.5)]
+
+        # Act
+        result = SegmentArray.from_segments(segments)
+
+        # Assert
+        self.assertEqual(3, len(result))
+        self.assertEqual(['1234', '5678'], result.stop_ids)
+        self.assertEqual(segments[2], result[-1])
+        self.assertEqual(segments[1:], list(result[1:]))
+        self.assertEqual(segments, result.to_list())
+
+    def test_get_speed_map_when_compact_matches_list(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+        engines = ('python', 'numpy') if vectorized.HAS_NUMPY else ('python',)
+
+        for engine in engines:
+
+            # Act
+            result = target.get_speed_map(segment_length=1, engine=engine, compact=True)
+
+            # Assert
+            self.assertIsInstance(result, SegmentArray)
+            self.assertEqual(target.get_speed_map(segment_length=1), result)
+            self.assertEqual(Segment('5678', 75, 1.0, 1.0), result[150])
+
+    def test_segment_has_instance_dictionary_and_is_unhashable(self):
+
+        # Arrange
+        segment = Segment('1234', 0, 50.0, 3.0)
+
+        # Act & Assert
+        self.assertEqual({'stop_id': '1234', 'segment_index': 0, 'segment_length': 50.0, 'speed': 3.0},
+                         vars(segment))
+        self.assertEqual(vars(segment), segment.to_dict())
+        with self.assertRaises(TypeError):
+            hash(segment)
+        with self.assertRaises(TypeError):
+            hash(SegmentArray.from_segments([segment]))
+
+
+    def test_slotted_segment_has_no_instance_dictionary_and_equals_segment(self):
+
+        # Arrange
+        segments = [Segment('1', 0, 5.0, 1.0), Segment('2', 0, 5.0, 2.0)]
+
+        # Act
+        result = [SlottedSegment(**segment.to_dict()) for segment in segments]
+
+        # Assert
+        self.assertFalse(hasattr(result[0], '__dict__'))
+        self.assertEqual(segments, result)
+        self.assertEqual(SegmentArray.from_segments(segments), result)
+        self.assertEqual(segments[1].to_dict(), result[1].to_dict())
+        self.assertEqual("SlottedSegment(stop_id='1', segment_index=0, segment_length=5.0, speed=1.0)", repr(result[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import csv
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.__main__ import main
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.segment import Segment
+from speedmap.segment_writers import BinarySegmentWriter, SegmentWriter, get_segment_writer, read_segment_binary
+
+
+class TestSegmentWriters(unittest.TestCase):
+
+    segments = [Segment('1234', 0, 50.0, 3.0), Segment('1234', 1, 25.0, 3.0), Segment('5678', 0, 50.0, 1.5)]
+
+    def test_jsonl_writer_writes_json_objects(self):
+
+        # Arrange
+        stream = io.BytesIO()
+
+        # Act
+        with get_segment_writer('jsonl', stream, batch_size=2) as writer:
+            writer.write_all(self.segments)
+
+        # Assert
+        lines = stream.getvalue().decode().splitlines()
+        self.assertEqual(3, writer.count)
+        self.assertEqual([segment.to_dict() for segment in self.segments], [json.loads(line) for line in lines])
+
+    def test_csv_writer_writes_header_and_rows(self):
+
+        # Arrange
+        stream = io.BytesIO()
+
+        # Act
+        with get_segment_writer('csv', stream) as writer:
+            writer.write_all(self.segments)
+
+        # Assert
+        rows = list(csv.reader(io.StringIO(stream.getvalue().decode())))
+        self.assertEqual(['stop_id', 'segment_index', 'segment_length', 'speed'], rows[0])
+        self.assertEqual(['5678', '0', '50.0', '1.5'], rows[3])
+
+    def test_binary_writer_round_trips(self):
+
+        # Arrange
+        file_path = self._get_temporary_path()
+
+        # Act
+        with open(file_path, "wb") as file, get_segment_writer('binary', file, batch_size=2) as writer:
+            writer.write_all(self.segments)
+        result = read_segment_binary(file_path)
+
+        # Assert
+        self.assertEqual(16 + 3 * 40, os.path.getsize(file_path))
+        self.assertEqual(self.segments, list(result))
+
+    def test_binary_writer_when_stop_id_too_long_throws(self):
+
+        # Arrange
+        writer = BinarySegmentWriter(io.BytesIO())
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            writer.write(Segment('a' * 17, 0, 1.0, 1.0))
+            writer.flush()
+
+    def test_segment_writer_when_format_not_implemented_throws(self):
+
+        # Act & Assert
+        with self.assertRaises(TypeError):
+            SegmentWriter(io.BytesIO())
+
+    def test_get_segment_writer_when_format_unknown_throws(self):
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            get_segment_writer('xml', io.BytesIO())
+
+    def test_main_writes_output_file(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        test_file_path = mock_data_dir / "../data/mock_input.txt"
+        output_path = self._get_temporary_path()
+
+        # Act
+        main([str(test_file_path), "50", "--format", "binary", "--output", output_path])
+
+        # Assert
+        self.assertEqual(BusOnRoute.from_file(test_file_path).get_speed_map(50), list(read_segment_binary(output_path)))
+
+    def _get_temporary_path(self):
+        file_descriptor, file_path = tempfile.mkstemp()
+        os.close(file_descriptor)
+        self.addCleanup(os.remove, file_path)
+        return file_path
+
+
+if __name__ == '__main__':
+    unittest.main()
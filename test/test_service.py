@@ -0,0 +1,214 @@
+import unittest
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping import Ping
+from speedmap.service import SpeedMapService
+from speedmap.synthetic import generate_trip
+
+
+class TestSpeedMapService(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.service = SpeedMapService(25)
+        self.server = await self.service.start()
+        port = self.server.sockets[0].getsockname()[1]
+        self.reader, self.writer = await asyncio.open_connection('127.0.0.1', port)
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.service.stop()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_service_maintains_speed_map_of_each_bus(self):
+
+        # Arrange
+        trips = {bus_id: generate_trip(stops=3, pings_per_stop=40, seed=seed) for seed, bus_id in enumerate('ab')}
+        lines = [
+            json.dumps({'busId': bus_id, 'timestamp': ping.timestamp, 'stopId': ping.stop_id,
+                        'pingType': ping.ping_type, 'distanceFromStop': ping.distance_from_stop})
+            for bus_id, trip in trips.items() for ping in trip]
+
+        # Act
+        self.writer.write(('\n'.join(lines) + '\n').encode())
+        await self.writer.drain()
+        await self._wait_for_pings(len(lines))
+        bus_answer = await self._query({'query': 'bus', 'busId': 'b'})
+        stop_answer = await self._query({'query': 'stop', 'stopId': '1001'})
+
+        # Assert
+        expected = BusOnRoute(trips['b']).get_speed_map(25)
+        self.assertEqual([segment.to_dict() for segment in expected], bus_answer['segments'])
+        self.assertEqual([], bus_answer['openStopIds'])
+        self.assertEqual(['a', 'b'], sorted(stop_answer['buses']))
+        self.assertEqual(expected, self.service.get_bus_speed_map('b'))
+
+    async def test_service_answers_malformed_lines_and_rejects_out_of_order_pings(self):
+
+        # Arrange
+        lines = [
+            '{"timestamp": 2000, "stopId": "1", "pingType": "DEPARTURE", "distanceFromStop": 0.0}',
+            '{"timestamp": 1000, "stopId": "1", "pingType": "MIDPATH", "distanceFromStop": 5.0}',
+            '{"timestamp": 3000, "stopId": "1"}',
+            'not json',
+        ]
+
+        # Act
+        self.writer.write(('\n'.join(lines) + '\n').encode())
+        await self.writer.drain()
+        errors = [json.loads(await self.reader.readline()) for _ in range(2)]
+        await self._wait_for_pings(2)
+        stats = await self._query({'query': 'stats'})
+
+        # Assert
+        self.assertTrue(all('error' in error for error in errors))
+        self.assertEqual(2, stats['pingsReceived'])
+        self.assertEqual(1, stats['pingsProcessed'])
+        self.assertEqual(1, stats['pingsRejected'])
+        self.assertEqual(['default'], (await self._query({'query': 'buses'}))['busIds'])
+        self.assertIn('error', await self._query({'query': 'unknown'}))
+
+    async def test_service_when_ping_field_is_invalid_rejects_it_and_keeps_answering(self):
+
+        # Arrange
+        lines = [
+            '{"timestamp": 1000, "stopId": "1", "pingType": "DEPARTURE", "distanceFromStop": 0.0}',
+            '{"timestamp": 2000, "stopId": "1", "pingType": "MIDPATH", "distanceFromStop": null}',
+            '{"timestamp": "3000", "stopId": "1", "pingType": "MIDPATH", "distanceFromStop": 5.0}',
+            '{"timestamp": 4000, "stopId": "1", "pingType": "ARRIVAL", "distanceFromStop": 20.0}',
+        ]
+
+        # Act
+        self.writer.write(('\n'.join(lines) + '\n').encode())
+        await self.writer.drain()
+        errors = [json.loads(await self.reader.readline()) for _ in range(2)]
+        await self._wait_for_pings(4)
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.sockets[0].getsockname()[1])
+        writer.write(b'{"query": "stats"}\n')
+        await writer.drain()
+        stats = json.loads(await asyncio.wait_for(reader.readline(), 1))
+        writer.close()
+
+        # Assert
+        self.assertTrue(all(error['error'].startswith('Invalid ping') for error in errors))
+        self.assertEqual((4, 2, 2), (stats['pingsReceived'], stats['pingsProcessed'], stats['pingsRejected']))
+        self.assertEqual(1, len(self.service.get_bus_speed_map('default')))
+
+    async def test_add_pings_when_ping_field_has_wrong_type_rejects_it(self):
+
+        # Arrange
+        service = SpeedMapService(25)
+        pings = [Ping(0, '1', 'DEPARTURE', 0.0), Ping(1000, '1', 'MIDPATH', None), Ping('2000', '1', 'MIDPATH', 5.0),
+                 Ping(3000, '1', 'ARRIVAL', 30.0)]
+
+        # Act
+        service.add_pings([('a', ping) for ping in pings])
+
+        # Assert
+        self.assertEqual((2, 2), (service.pings_processed, service.pings_rejected))
+        self.assertEqual(BusOnRoute([pings[0], pings[3]]).get_speed_map(25), service.get_bus_speed_map('a'))
+
+    async def test_service_when_bus_runs_route_again_serves_latest_trip(self):
+
+        # Arrange, a second trip of the same stop_ids at a quarter of the speed
+        first_trip = [Ping(0, '1', 'DEPARTURE', 0.0), Ping(10000, '1', 'MIDPATH', 30.0),
+                      Ping(20000, '1', 'ARRIVAL', 60.0)]
+        second_trip = [Ping(30000, '1', 'DEPARTURE', 0.0), Ping(70000, '1', 'MIDPATH', 30.0),
+                       Ping(110000, '1', 'ARRIVAL', 60.0)]
+        pings = [('a', ping) for ping in first_trip]
+
+        # Act
+        self.service.add_pings(pings)
+        first_speed_map = self.service.get_bus_speed_map('a')
+        self.service.add_pings([('a', ping) for ping in second_trip])
+
+        # Assert
+        self.assertEqual(BusOnRoute(first_trip).get_speed_map(25), first_speed_map)
+        self.assertEqual(BusOnRoute(second_trip).get_speed_map(25), self.service.get_bus_speed_map('a'))
+        self.assertEqual([0.8, 0.8, 0.8], [segment.speed for segment in self.service.get_bus_speed_map('a')])
+        self.assertEqual((6, 1), (self.service.pings_processed, self.service.trips_started))
+
+    async def test_add_pings_when_time_gap_starts_new_trip(self):
+
+        # Arrange
+        service = SpeedMapService(25, max_gap=60000)
+        pings = [Ping(0, '1', 'DEPARTURE', 0.0), Ping(10000, '1', 'MIDPATH', 30.0),
+                 Ping(500000, '1', 'MIDPATH', 40.0), Ping(510000, '1', 'ARRIVAL', 60.0)]
+
+        # Act
+        service.add_pings([('a', ping) for ping in pings])
+
+        # Assert
+        self.assertEqual(1, service.trips_started)
+        self.assertEqual(BusOnRoute(pings[2:]).get_speed_map(25), service.get_bus_speed_map('a'))
+
+    async def test_add_pings_when_too_many_buses_forgets_least_recently_updated(self):
+
+        # Arrange
+        service = SpeedMapService(25, max_buses=2)
+        pings = [('a', Ping(0, '1', 'DEPARTURE', 0.0)), ('b', Ping(0, '1', 'DEPARTURE', 0.0)),
+                 ('a', Ping(1000, '1', 'MIDPATH', 5.0)), ('c', Ping(0, '1', 'DEPARTURE', 0.0))]
+
+        # Act
+        service.add_pings(pings)
+
+        # Assert
+        self.assertEqual(['a', 'c'], sorted(service._buses))
+        self.assertEqual(['a', 'c'], sorted(service._speed_maps))
+        self.assertEqual(1, service.buses_evicted)
+
+    async def test_handle_connection_when_line_too_long_skips_it(self):
+
+        # Arrange
+        self.service.max_line_length = 100
+        line = '{"timestamp": 0, "stopId": "1", "pingType": "DEPARTURE", "distanceFromStop": 0.0}'
+
+        # Act
+        self.writer.write(b'x' * 150)
+        await self.writer.drain()
+        error = json.loads(await self.reader.readline())
+        self.writer.write(b'x' * 150 + b'\n' + line.encode() + b'\n')
+        await self._wait_for_pings(1)
+        stats = await self._query({'query': 'stats'})
+
+        # Assert
+        self.assertIn('error', error)
+        self.assertEqual((1, 1), (stats['pingsReceived'], stats['pingsProcessed']))
+
+    async def test_handle_lines_waits_while_queue_is_full(self):
+
+        # Arrange
+        service = SpeedMapService(25, queue_size=1)
+        service._queue = asyncio.Queue(1)
+        line = b'{"timestamp": 0, "stopId": "1", "pingType": "DEPARTURE", "distanceFromStop": 0.0}'
+        await service._handle_lines([line], self.writer)
+
+        # Act
+        blocked = asyncio.ensure_future(service._handle_lines([line], self.writer))
+        await asyncio.sleep(0.05)
+        was_blocked = not blocked.done()
+        service.add_pings(service._queue.get_nowait())
+        await asyncio.wait_for(blocked, 1)
+
+        # Assert
+        self.assertTrue(was_blocked)
+        self.assertEqual(1, service._queue.qsize())
+
+    async def _query(self, query):
+        self.writer.write((json.dumps(query) + '\n').encode())
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def _wait_for_pings(self, count):
+        while self.service.pings_received < count:
+            await asyncio.sleep(0.01)
+        await self.service.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import os
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping_array import PingArray
+from speedmap.speed_graph import SpeedGraph
+
+
+class TestSpeedGraph(unittest.TestCase):
+
+    def test_from_edges_matches_edge_lists(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        speed_graph = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")._get_speed_graph()
+
+        # Act
+        result = SpeedGraph.from_edges(speed_graph)
+
+        # Assert
+        self.assertEqual(['1234', '5678'], list(result.keys()))
+        self.assertEqual(3, result.get_edges_count())
+        self.assertEqual(2, len(result['5678']))
+        self.assertEqual(1.0, result['5678'][1].speed)
+        self.assertEqual(90000, result['5678'][-1].time_end)
+        self.assertEqual(speed_graph, result)
+        self.assertEqual(speed_graph, result.to_dict())
+
+    def test_ping_array_get_speed_graph_is_columnar(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        bus_on_route = BusOnRoute.from_file(mock_data_dir / "../data/mock_input2.txt")
+
+        # Act
+        result = PingArray.from_pings(bus_on_route.ping_list).get_speed_graph()
+
+        # Assert
+        self.assertIsInstance(result, SpeedGraph)
+        self.assertEqual(bus_on_route._get_speed_graph(), result)
+
+    def test_get_speed_map_from_speed_graph_matches_edge_lists(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        bus_on_route = BusOnRoute.from_file(mock_data_dir / "../data/mock_input2.txt")
+        target = BusOnRoute(PingArray.from_pings(bus_on_route.ping_list))
+        engines = ('python', 'numpy') if vectorized.HAS_NUMPY else ('python',)
+
+        for engine in engines:
+
+            # Act
+            result = target.get_speed_map(segment_length=10, engine=engine)
+
+            # Assert
+            self.assertEqual(bus_on_route.get_speed_map(segment_length=10), result)
+
+
+if __name__ == '__main__':
+    unittest.main()
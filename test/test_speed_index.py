@@ -0,0 +1,113 @@
+import unittest
+import os
+import random
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.mesh import get_segment_boundaries
+from speedmap.ping import Ping
+from speedmap.synthetic import generate_trip
+
+
+class TestSpeedIndex(unittest.TestCase):
+
+    engines = ('python', 'numpy') if vectorized.HAS_NUMPY else ('python',)
+
+    def test_time_at_matches_mesh_segment_boundaries(self):
+
+        # Arrange
+        target = BusOnRoute(sorted(generate_trip(stops=3, pings_per_stop=60, seed=9), key=lambda x: x.timestamp))
+        stop_lengths, speed_graph = target._get_cached_speed_graph()
+
+        for stop_id, stop_length in stop_lengths.items():
+            _, ends, _, time_ends = get_segment_boundaries(stop_length, speed_graph[stop_id], 10)
+
+            # Act
+            result = [target.time_at(stop_id, distance) for distance in ends]
+
+            # Assert
+            for expected, actual in zip(time_ends, result):
+                self.assertAlmostEqual(expected * 1000, actual, places=3)
+
+    def test_speed_at_matches_linear_scan(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input2.txt")
+        _, speed_graph = target._get_cached_speed_graph()
+
+        for stop_id, edges in speed_graph.items():
+            for distance in (0, 0.5, 10, 25, 79.9, 80, 1000):
+
+                # Act
+                result = target.speed_at(stop_id, distance)
+
+                # Assert
+                expected = next((edge.speed for edge in edges if edge.distance_end >= distance), None)
+                self.assertEqual(expected, result)
+
+    def test_position_at_interpolates_between_pings(self):
+
+        # Arrange
+        ping_list = [
+            Ping(0, 'a', 'DEPARTURE', 0.0),
+            Ping(10000, 'a', 'MIDPATH', 50.0),
+            Ping(20000, 'a', 'ARRIVAL', 60.0),
+            Ping(30000, 'b', 'DEPARTURE', 0.0),
+            Ping(40000, 'b', 'ARRIVAL', 100.0),
+        ]
+        target = BusOnRoute(ping_list)
+
+        # Act
+        result = [target.position_at(timestamp) for timestamp in (-1, 0, 5000, 15000, 25000, 35000, 40000, 40001)]
+
+        # Assert
+        self.assertEqual(
+            [None, ('a', 0.0), ('a', 25.0), ('a', 55.0), None, ('b', 50.0), ('b', 100.0), None], result)
+
+    def test_batched_queries_match_single_queries(self):
+
+        # Arrange
+        generator = random.Random(2)
+        target = BusOnRoute(sorted(generate_trip(stops=4, pings_per_stop=30, seed=3), key=lambda x: x.timestamp))
+        distances = [generator.uniform(-10, 1100) for _ in range(200)] + [0.0]
+        last_timestamp = target.ping_list[-1].timestamp
+        timestamps = [generator.uniform(-1000, last_timestamp + 1000) for _ in range(200)]
+
+        for engine in self.engines:
+
+            # Act & Assert
+            for stop_id in ('1000', '1003', 'unknown'):
+                self.assertEqual(
+                    [target.speed_at(stop_id, distance) for distance in distances],
+                    target.speed_at_many(stop_id, distances, engine=engine))
+                expected_times = [target.time_at(stop_id, distance) for distance in distances]
+                for expected, actual in zip(expected_times, target.time_at_many(stop_id, distances, engine=engine)):
+                    if expected is None:
+                        self.assertIsNone(actual)
+                    else:
+                        self.assertAlmostEqual(expected, actual, places=6)
+            expected_positions = [target.position_at(timestamp) for timestamp in timestamps]
+            for expected, actual in zip(expected_positions, target.position_at_many(timestamps, engine=engine)):
+                if expected is None:
+                    self.assertIsNone(actual)
+                else:
+                    self.assertEqual(expected[0], actual[0])
+                    self.assertAlmostEqual(expected[1], actual[1], places=6)
+
+    def test_queries_when_engine_unknown_throws(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            target.position_at_many([0], engine='gpu')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import unittest
+import multiprocessing
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.segment import Segment
+from speedmap.speed_map_store import SpeedMapStore, write_speed_map_store
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+
+def read_speeds(file_path: str, keys):
+    """
+    Reads the speeds of segments from a store in a separate process
+    """
+    with SpeedMapStore(file_path) as store:
+        return store.generation, [store.get_speed(stop_id, segment_index) for stop_id, segment_index in keys]
+
+
+class TestSpeedMapStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'speed_map.spmx')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_segment_when_mock_input_returns_every_segment(self):
+
+        # Arrange
+        segments = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt").get_speed_map(5)
+        write_speed_map_store(segments, self.file_path)
+
+        # Act
+        with SpeedMapStore(self.file_path) as store:
+            result = [store.get_segment(segment.stop_id, segment.segment_index) for segment in segments]
+
+            # Assert
+            self.assertEqual(list(segments), result)
+            self.assertEqual(len(segments), len(store))
+            self.assertEqual(sorted({segment.stop_id for segment in segments}), store.get_stop_ids())
+
+    def test_get_speed_when_segment_missing_returns_none(self):
+
+        # Arrange
+        write_speed_map_store([Segment('b', 0, 5.0, 1.5), Segment('b', 2, 5.0, 2.5), Segment('a', 0, 3.0, 0.5)],
+                              self.file_path)
+
+        # Act
+        with SpeedMapStore(self.file_path) as store:
+
+            # Assert
+            self.assertEqual(2.5, store.get_speed('b', 2))
+            self.assertEqual(0.5, store.get_speed('a', 0))
+            self.assertIsNone(store.get_speed('b', 1))
+            self.assertIsNone(store.get_speed('b', 3))
+            self.assertIsNone(store.get_speed('c', 0))
+            self.assertNotIn('c', store)
+            self.assertEqual(2, store.stops_count)
+
+    def test_get_stop_columns_returns_views_of_the_stop(self):
+
+        # Arrange
+        write_speed_map_store([Segment('1', 1, 5.0, 2.0), Segment('1', 0, 5.0, 1.0), Segment('2', 0, 4.0, 3.0)],
+                              self.file_path)
+        store = SpeedMapStore(self.file_path)
+
+        # Act
+        segment_indexes, segment_lengths, speeds = store.get_stop_columns('1')
+
+        # Assert
+        self.assertEqual([0, 1], list(segment_indexes))
+        self.assertEqual([5.0, 5.0], list(segment_lengths))
+        self.assertEqual([1.0, 2.0], list(speeds))
+        self.assertIsNone(store.get_stop_columns('3'))
+        for column in (segment_indexes, segment_lengths, speeds):
+            column.release()
+        store.close()
+
+    def test_refresh_when_republished_maps_the_new_version(self):
+
+        # Arrange
+        self.assertEqual(1, write_speed_map_store([Segment('1', 0, 5.0, 1.0)], self.file_path))
+        store = SpeedMapStore(self.file_path)
+        self.assertFalse(store.refresh())
+
+        # Act
+        generation = write_speed_map_store([Segment('1', 0, 5.0, 2.0)], self.file_path)
+
+        # Assert
+        self.assertEqual(2, generation)
+        self.assertEqual(1.0, store.get_speed('1', 0))
+        self.assertTrue(store.refresh())
+        self.assertEqual(2, store.generation)
+        self.assertEqual(2.0, store.get_speed('1', 0))
+        store.close()
+
+    def test_get_speed_when_read_by_many_processes(self):
+
+        # Arrange
+        segments = BusOnRoute.from_file(mock_data_dir / "../data/mock_input2.txt").get_speed_map(10)
+        write_speed_map_store(segments, self.file_path)
+        keys = [(segment.stop_id, segment.segment_index) for segment in segments]
+
+        # Act
+        with multiprocessing.get_context('spawn').Pool(2) as pool:
+            result = pool.starmap(read_speeds, [(self.file_path, keys)] * 2)
+
+        # Assert
+        self.assertEqual([(1, [segment.speed for segment in segments])] * 2, result)
+
+    @unittest.skipUnless(hasattr(os, 'fchmod'), "requires os.fchmod")
+    def test_write_speed_map_store_applies_umask_or_mode(self):
+
+        # Arrange
+        umask = os.umask(0o022)
+        try:
+
+            # Act
+            write_speed_map_store([Segment('1', 0, 5.0, 1.0)], self.file_path)
+            default_mode = os.stat(self.file_path).st_mode & 0o777
+            write_speed_map_store([Segment('1', 0, 5.0, 1.0)], self.file_path, mode=0o640)
+            mode = os.stat(self.file_path).st_mode & 0o777
+        finally:
+            os.umask(umask)
+
+        # Assert
+        self.assertEqual((0o644, 0o640), (default_mode, mode))
+
+    def test_init_when_file_is_not_a_store_throws(self):
+
+        # Arrange
+        with open(self.file_path, "wb") as file:
+            file.write(b'not a speed map store, but long enough for a header')
+
+        # Act and Assert
+        with self.assertRaises(ValueError):
+            SpeedMapStore(self.file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import os
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping import Ping
+from speedmap.streaming_bus_on_route import StreamingBusOnRoute
+
+
+class TestStreamingBusOnRoute(unittest.TestCase):
+
+    def test_add_ping_emits_segments_on_arrival(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        ping_list = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt").ping_list
+        target = StreamingBusOnRoute(segment_length=50)
+
+        # Act
+        result = [target.add_ping(ping) for ping in ping_list]
+
+        # Assert that segments are only emitted by the 'ARRIVAL' pings
+        self.assertEqual([0, 2, 0, 0, 2], [len(segments) for segments in result])
+        self.assertEqual(['1234', '1234'], [segment.stop_id for segment in result[1]])
+        self.assertEqual([3.0, 1.5], [segment.speed for segment in result[4]])
+        self.assertEqual([], target.open_stop_ids)
+
+    def test_add_ping_keeps_only_open_stop_edges(self):
+
+        # Arrange
+        target = StreamingBusOnRoute(segment_length=50)
+
+        # Act
+        target.add_ping(Ping(10000, '1234', 'DEPARTURE', 0.0))
+        target.add_ping(Ping(20000, '1234', 'MIDPATH', 30.0))
+        open_before_arrival = target.open_stop_ids
+        target.add_ping(Ping(35000, '1234', 'ARRIVAL', 75.0))
+
+        # Assert
+        self.assertEqual(['1234'], open_before_arrival)
+        self.assertEqual([], target.open_stop_ids)
+
+    def test_iter_speed_map_matches_get_speed_map(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+        for file_name in ("mock_input.txt", "mock_input2.txt"):
+            bus_on_route = BusOnRoute.from_file(mock_data_dir / "../data" / file_name)
+
+            for segment_length in (1, 10, 50, 1000):
+
+                # Act
+                expected = bus_on_route.get_speed_map(segment_length)
+                result = list(StreamingBusOnRoute(segment_length).iter_speed_map(bus_on_route.ping_list))
+
+                # Assert
+                self.assertEqual([s.to_dict() for s in expected], [s.to_dict() for s in result])
+
+    def test_add_ping_when_out_of_order_throws(self):
+
+        # Arrange
+        target = StreamingBusOnRoute(segment_length=50)
+        target.add_ping(Ping(20000, '1234', 'DEPARTURE', 0.0))
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            target.add_ping(Ping(10000, '1234', 'MIDPATH', 30.0))
+
+    def test_init_when_segment_invalid_throws(self):
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            StreamingBusOnRoute(segment_length=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
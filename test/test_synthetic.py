@@ -0,0 +1,83 @@
+import unittest
+import os
+import tempfile
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.synthetic import generate_buses, generate_trip, write_synthetic_files
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def test_generate_trip_is_deterministic(self):
+
+        # Act
+        first = generate_trip(stops=3, pings_per_stop=20, out_of_order_fraction=0.1, seed=7)
+        second = generate_trip(stops=3, pings_per_stop=20, out_of_order_fraction=0.1, seed=7)
+
+        # Assert
+        self.assertEqual(60, len(first))
+        self.assertEqual(
+            [(ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop) for ping in first],
+            [(ping.timestamp, ping.stop_id, ping.ping_type, ping.distance_from_stop) for ping in second])
+
+    def test_generate_trip_shapes_each_stop(self):
+
+        # Act
+        result = generate_trip(stops=2, pings_per_stop=5, jitter=0.5)
+
+        # Assert
+        for stop_pings in (result[:5], result[5:]):
+            self.assertEqual(['DEPARTURE', 'MIDPATH', 'MIDPATH', 'MIDPATH', 'ARRIVAL'],
+                             [ping.ping_type for ping in stop_pings])
+            self.assertEqual(0.0, stop_pings[0].distance_from_stop)
+            distances = [ping.distance_from_stop for ping in stop_pings]
+            self.assertEqual(sorted(distances), distances)
+        timestamps = [ping.timestamp for ping in result]
+        self.assertEqual(sorted(set(timestamps)), timestamps)
+
+    def test_generate_trip_out_of_order_pings_sort_back(self):
+
+        # Arrange
+        in_order = generate_trip(stops=2, pings_per_stop=50, seed=3)
+
+        # Act
+        result = generate_trip(stops=2, pings_per_stop=50, out_of_order_fraction=0.2, seed=3)
+
+        # Assert
+        timestamps = [ping.timestamp for ping in result]
+        self.assertNotEqual(sorted(timestamps), timestamps)
+        self.assertEqual(sorted(timestamps), [ping.timestamp for ping in in_order])
+
+    def test_generate_trip_when_parameter_invalid_throws(self):
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            generate_trip(pings_per_stop=1)
+        with self.assertRaises(ValueError):
+            generate_trip(jitter=1.0)
+        with self.assertRaises(ValueError):
+            generate_trip(out_of_order_fraction=1.5)
+
+    def test_write_synthetic_files_reads_back(self):
+
+        # Arrange
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        buses = generate_buses(buses=2, stops=2, pings_per_stop=30, out_of_order_fraction=0.1)
+
+        # Act
+        file_paths = write_synthetic_files(
+            directory.name, buses=2, stops=2, pings_per_stop=30, out_of_order_fraction=0.1)
+
+        # Assert
+        self.assertEqual(2, len(file_paths))
+        for file_path, pings in zip(file_paths, buses):
+            expected = BusOnRoute(sorted(pings, key=lambda x: x.timestamp)).get_speed_map(50)
+            self.assertEqual(expected, BusOnRoute.from_file(file_path).get_speed_map(50))
+            self.assertEqual(expected, BusOnRoute.from_file(file_path, bulk=True).get_speed_map(50))
+
+
+if __name__ == '__main__':
+    unittest.main()
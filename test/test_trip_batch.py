@@ -0,0 +1,147 @@
+import unittest
+import os
+import random
+from pathlib import Path
+from unittest import mock
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping import Ping
+from speedmap.ping_array import PingArray
+from speedmap.segment import round_speed
+from speedmap.synthetic import generate_trip
+from speedmap.trip_batch import TripBatch
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+
+def generate_faulty_trip(generator: random.Random):
+    """
+    Generates a short trip with a chance of repeated stop_ids, duplicate timestamps, distance regressions and missing
+    'DEPARTURE' or 'ARRIVAL' pings
+    """
+    pings, timestamp = [], 0
+    for _ in range(generator.randint(0, 4)):
+        stop_id, distance = str(generator.randint(0, 5)), 0.0
+        if generator.random() < 0.9:
+            pings.append(Ping(timestamp, stop_id, 'DEPARTURE', 0.0))
+        for _ in range(generator.randint(0, 8)):
+            timestamp += 0 if generator.random() < 0.03 else generator.randint(1, 5000)
+            distance += generator.choice([0.0, -3.0]) if generator.random() < 0.1 else generator.uniform(0, 20)
+            pings.append(Ping(timestamp, stop_id, 'MIDPATH', distance))
+        timestamp += generator.randint(1, 3000)
+        if generator.random() < 0.95:
+            pings.append(Ping(timestamp, stop_id, 'ARRIVAL', max(distance, 0.0) + generator.choice([0, 1, 5])))
+        timestamp += generator.randint(1, 100)
+    return pings
+
+
+class TestTripBatch(unittest.TestCase):
+
+    def test_get_speed_maps_when_mock_inputs_equals_per_trip(self):
+
+        # Arrange
+        trips = [BusOnRoute.from_file(mock_data_dir / "../data" / file_name).ping_list
+                 for file_name in ("mock_input.txt", "mock_input2.txt")]
+        test_object = TripBatch.from_trips(trips, trip_ids=['first', 'second'])
+
+        for segment_length in (0.1, 1, 7.5, 50, 1000):
+
+            # Act
+            result = test_object.get_speed_maps(segment_length)
+
+            # Assert
+            for trip_index, trip in enumerate(trips):
+                self.assertEqual(BusOnRoute(trip).get_speed_map(segment_length), result.get_trip(trip_index))
+            self.assertEqual(['first', 'second'], result.trip_ids)
+            self.assertEqual([0] * len(result.get_trip(0)) + [1] * len(result.get_trip(1)), list(result.trip_indexes))
+
+    def test_get_speed_maps_when_faulty_trips_equals_per_trip(self):
+
+        # Arrange
+        generator = random.Random(11)
+        engines = (True, False) if vectorized.HAS_NUMPY else (False,)
+
+        for _ in range(100):
+            trips = [generate_faulty_trip(generator) for _ in range(generator.randint(0, 10))]
+            test_object = TripBatch.from_trips(trips)
+
+            for has_numpy in engines:
+                for segment_length in (0.7, 5, 13):
+
+                    # Act
+                    with mock.patch.object(vectorized, 'HAS_NUMPY', has_numpy):
+                        result = test_object.get_speed_maps(segment_length, errors='skip')
+
+                    # Assert
+                    for trip_index, trip in enumerate(trips):
+                        try:
+                            expected = [segment.to_dict() for segment in BusOnRoute(trip).get_speed_map(segment_length)]
+                        except (KeyError, IndexError, ZeroDivisionError) as error:
+                            expected = type(error)
+                        if trip_index in result.trip_errors:
+                            self.assertEqual(expected, type(result.trip_errors[trip_index]))
+                        else:
+                            self.assertEqual(expected, [segment.to_dict() for segment in result.get_trip(trip_index)])
+
+    def test_get_speed_maps_when_trip_fails_raises_with_trip_id(self):
+
+        # Arrange
+        trips = [generate_trip(stops=2, pings_per_stop=5, seed=1),
+                 [Ping(10000, '1234', 'DEPARTURE', 0.0), Ping(10000, '1234', 'ARRIVAL', 50.0)]]
+        test_object = TripBatch.from_trips(trips, trip_ids=['good', 'bad'])
+
+        # Act and Assert
+        with self.assertRaisesRegex(ZeroDivisionError, "'bad'"):
+            test_object.get_speed_maps(10)
+        result = test_object.get_speed_maps(10, errors='skip')
+        self.assertEqual(['bad'], list(result.trip_errors))
+        self.assertEqual(0, len(result.get_trip(1)))
+        self.assertEqual(BusOnRoute(trips[0]).get_speed_map(10), result.to_list())
+
+    def test_from_ping_arrays_when_stop_ids_differ_equals_from_trips(self):
+
+        # Arrange
+        trips = [generate_trip(stops=3, pings_per_stop=6, seed=seed) for seed in range(4)]
+        for ping in trips[2]:
+            ping.stop_id = 'other-' + ping.stop_id
+
+        # Act
+        result = TripBatch.from_ping_arrays([PingArray.from_pings(trip) for trip in trips]).get_speed_maps(15)
+
+        # Assert
+        self.assertEqual(TripBatch.from_trips(trips).get_speed_maps(15), result)
+        self.assertEqual(BusOnRoute(trips[2]).get_speed_map(15), result.get_trip(2))
+
+    def test_init_when_offsets_do_not_cover_pings_throws(self):
+
+        # Arrange
+        pings = PingArray.from_pings(generate_trip(stops=1, pings_per_stop=3))
+
+        # Act and Assert
+        with self.assertRaises(ValueError):
+            TripBatch(pings, [0, 2])
+        with self.assertRaises(ValueError):
+            TripBatch(pings, [0, 4, 2, len(pings)])
+        with self.assertRaises(ValueError):
+            TripBatch(pings, [0, len(pings)], trip_ids=['a', 'b'])
+
+    @unittest.skipUnless(vectorized.HAS_NUMPY, "NumPy is not installed")
+    def test_round_speeds_matches_round_speed(self):
+
+        # Arrange
+        generator = random.Random(3)
+        speeds = [generator.uniform(-30, 30) for _ in range(10000)] + [index / 20 for index in range(-400, 400)] + [
+            2.675, 0.05, 0.15, -0.25, 1e300, float('inf')]
+
+        # Act
+        result = vectorized.round_speeds(vectorized.np.array(speeds)).tolist()
+
+        # Assert
+        self.assertEqual([round_speed(speed) for speed in speeds], result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import os
+import tempfile
+from pathlib import Path
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap.__main__ import main
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping import Ping
+from speedmap.synthetic import generate_trip, write_ping_file
+from speedmap.trip_splitter import TripSplitter
+
+mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+
+def generate_feed(trips_count: int, gap: int = 60000):
+    """
+    Generates a continuous feed of several synthetic trips of the same route, each starting `gap` milliseconds after
+    the previous trip
+    """
+    trips, start_timestamp = [], 0
+    for seed in range(trips_count):
+        trip = generate_trip(stops=3, pings_per_stop=8, seed=seed, start_timestamp=start_timestamp)
+        trips.append(trip)
+        start_timestamp = trip[-1].timestamp + gap
+    return trips
+
+
+class TestTripSplitter(unittest.TestCase):
+
+    def test_iter_trips_when_route_repeats_splits_on_stop_reset(self):
+
+        # Arrange
+        trips = generate_feed(5)
+        test_object = TripSplitter()
+
+        # Act
+        result = list(test_object.iter_trips(ping for trip in trips for ping in trip))
+
+        # Assert
+        self.assertEqual(5, len(result))
+        for trip, bus_on_route in zip(trips, result):
+            self.assertEqual(BusOnRoute(trip).get_speed_map(10), bus_on_route.get_speed_map(10))
+        self.assertEqual(5, test_object.trips_count)
+        self.assertEqual('end', test_object.split_reason)
+
+    def test_add_ping_when_trip_completes_releases_its_pings(self):
+
+        # Arrange
+        first_trip, second_trip = generate_feed(2)
+        test_object = TripSplitter()
+        completed = [test_object.add_ping(ping) for ping in first_trip]
+
+        # Act
+        result = test_object.add_ping(second_trip[0])
+
+        # Assert
+        self.assertEqual([None] * len(first_trip), completed)
+        self.assertEqual(len(first_trip), len(result.ping_list))
+        self.assertEqual(1, test_object.pending_pings_count)
+        self.assertEqual('stop_reset', test_object.split_reason)
+
+    def test_add_ping_when_time_gap_splits(self):
+
+        # Arrange
+        test_object = TripSplitter(max_gap=60000)
+        pings = [Ping(10000, '1', 'DEPARTURE', 0.0), Ping(20000, '1', 'MIDPATH', 50.0),
+                 Ping(200000, '1', 'MIDPATH', 60.0), Ping(210000, '1', 'ARRIVAL', 80.0)]
+
+        # Act
+        result = list(test_object.iter_trips(pings))
+
+        # Assert
+        self.assertEqual([2, 2], [len(trip.ping_list) for trip in result])
+        self.assertEqual(2, test_object.trips_count)
+
+    def test_add_ping_when_arrival_repeats_stays_in_trip(self):
+
+        # Arrange
+        test_object = TripSplitter(max_gap=None)
+        pings = [Ping(10000, '1', 'DEPARTURE', 0.0), Ping(20000, '1', 'ARRIVAL', 50.0),
+                 Ping(25000, '1', 'ARRIVAL', 50.0), Ping(30000, '2', 'DEPARTURE', 0.0),
+                 Ping(40000, '2', 'ARRIVAL', 30.0)]
+
+        # Act
+        result = list(test_object.iter_trips(pings))
+
+        # Assert
+        self.assertEqual(1, len(result))
+        self.assertEqual(BusOnRoute(pings).get_speed_map(10), result[0].get_speed_map(10))
+
+    def test_iter_speed_maps_when_mock_input_is_one_trip(self):
+
+        # Arrange
+        bus_on_route = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act
+        result = list(TripSplitter().iter_speed_maps(bus_on_route.ping_list, 10))
+
+        # Assert
+        self.assertEqual([bus_on_route.get_speed_map(10)], result)
+
+    def test_main_when_split_trips_writes_a_file_per_trip(self):
+
+        # Arrange
+        trips = generate_feed(3)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'feed.jsonl')
+            output_dir = os.path.join(directory, 'trips')
+            write_ping_file([ping for trip in trips for ping in trip], file_path)
+
+            # Act
+            main([file_path, '25', '--split-trips', output_dir, '--format', 'csv'])
+
+            # Assert
+            self.assertEqual(['trip_1.csv', 'trip_2.csv', 'trip_3.csv'], sorted(os.listdir(output_dir)))
+            with open(os.path.join(output_dir, 'trip_3.csv')) as file:
+                self.assertEqual(len(BusOnRoute(trips[2]).get_speed_map(25)) + 1, len(file.readlines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import random
+from pathlib import Path
+from unittest import mock
+import sys
+
+sys.path.append(os.path.join(os.path.abspath(os.path.curdir), '..'))
+from speedmap import vectorized
+from speedmap.bus_on_route import BusOnRoute
+from speedmap.ping import Ping
+
+
+class TestVectorized(unittest.TestCase):
+
+    @unittest.skipUnless(vectorized.HAS_NUMPY, "NumPy is not installed")
+    def test_get_speed_map_numpy_matches_python_for_mock_inputs(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+
+        for file_name in ("mock_input.txt", "mock_input2.txt"):
+            target = BusOnRoute.from_file(mock_data_dir / "../data" / file_name)
+
+            for segment_length in (0.1, 1, 3, 7.5, 10, 50, 1000):
+
+                # Act
+                expected = target.get_speed_map(segment_length, engine='python')
+                result = target.get_speed_map(segment_length, engine='numpy')
+
+                # Assert
+                self.assertEqual([s.to_dict() for s in expected], [s.to_dict() for s in result])
+
+    @unittest.skipUnless(vectorized.HAS_NUMPY, "NumPy is not installed")
+    def test_get_speed_map_numpy_matches_python_for_random_trips(self):
+
+        # Arrange
+        generator = random.Random(7)
+
+        for _ in range(50):
+            ping_list, timestamp, distance = [Ping(0, 'a', 'DEPARTURE', 0.0)], 0, 0.0
+            for _ in range(generator.randint(1, 30)):
+                timestamp += generator.randint(1, 5000)
+                distance += generator.uniform(-2, 20)
+                ping_list.append(Ping(timestamp, 'a', 'MIDPATH', distance))
+            ping_list.append(Ping(timestamp + 1000, 'a', 'ARRIVAL', max(distance, 0.0) + 1))
+            target = BusOnRoute(ping_list)
+
+            for segment_length in (0.7, 5, 13):
+
+                # Act
+                try:
+                    expected = [s.to_dict() for s in target.get_speed_map(segment_length, engine='python')]
+                except (IndexError, ZeroDivisionError) as error:
+                    expected = type(error)
+                try:
+                    result = [s.to_dict() for s in target.get_speed_map(segment_length, engine='numpy')]
+                except (IndexError, ZeroDivisionError) as error:
+                    result = type(error)
+
+                # Assert
+                self.assertEqual(expected, result)
+
+    @unittest.skipUnless(vectorized.HAS_NUMPY, "NumPy is not installed")
+    def test_get_speed_map_numpy_when_edges_run_out_throws(self):
+
+        # Arrange
+        target = BusOnRoute([
+            Ping(0, 'a', 'DEPARTURE', 0.0),
+            Ping(1000, 'a', 'MIDPATH', 10.0),
+            Ping(2000, 'b', 'DEPARTURE', 0.0),
+            Ping(3000, 'a', 'ARRIVAL', 20.0)])
+
+        # Act & Assert
+        with self.assertRaises(IndexError):
+            target.get_speed_map(segment_length=1, engine='numpy')
+
+    def test_get_speed_map_numpy_falls_back_without_numpy(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act
+        with mock.patch.object(vectorized, 'HAS_NUMPY', False),\
+                mock.patch.object(vectorized, 'mesh_stop', side_effect=AssertionError):
+            result = target.get_speed_map(segment_length=50, engine='numpy')
+
+        # Assert
+        self.assertEqual(4, len(result))
+        self.assertEqual(1.5, result[3].speed)
+
+    def test_get_speed_map_when_engine_unknown_throws(self):
+
+        # Arrange
+        mock_data_dir = Path(os.path.dirname(__file__))  # relative directory path
+        target = BusOnRoute.from_file(mock_data_dir / "../data/mock_input.txt")
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            target.get_speed_map(segment_length=50, engine='fortran')
+
+
+if __name__ == '__main__':
+    unittest.main()